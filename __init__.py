@@ -78,6 +78,13 @@ try:
 except Exception as e:
     logger.warning(f"Failed to start background LLM cache population: {e}")
 
+# Watch the model folders so new models are hashed in the background before they are first used
+try:
+    from .utils.model_metadata import start_model_folder_watcher
+    start_model_folder_watcher()
+except Exception as e:
+    logger.warning(f"Failed to start model folder watcher: {e}")
+
 # Print timing report if enabled.
 if SAGEUTILS_PRINT_TIMING:
     print_timing_report()
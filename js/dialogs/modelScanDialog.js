@@ -6,9 +6,10 @@
  * - Force metadata refresh
  * - Include cached models
  * - Rate limiting for Civitai API
- * - Progress tracking with cancel support
+ * - Progress tracking (pushed over the websocket) with cancel support
  */
 
+import { api } from '../../../../scripts/api.js';
 import { createDialog } from '../components/dialogManager.js';
 import { createInput } from '../components/formElements.js';
 import { notifications } from '../shared/notifications.js';
@@ -23,6 +24,8 @@ class ModelScanDialog {
         this.cancelRequested = false;
         this.currentRequest = null;
         this.progressInterval = null;
+        this.scanId = null;
+        this.lastScanStatus = null;
         this.scanResults = {
             totalFiles: 0,
             processed: 0,
@@ -120,6 +123,15 @@ class ModelScanDialog {
         );
         section.appendChild(forceRefreshGroup);
 
+        // Verify hashes checkbox
+        const verifyHashesGroup = this.createCheckboxOption(
+            'verifyHashes',
+            'Verify file hashes on forced refresh',
+            'Check to rehash every file. Otherwise files whose size and modification time are unchanged keep their cached hash.',
+            false
+        );
+        section.appendChild(verifyHashesGroup);
+
         // Include cached checkbox
         const includeCachedGroup = this.createCheckboxOption(
             'includeCached',
@@ -476,6 +488,7 @@ class ModelScanDialog {
             return {
                 folders: [],
                 forceRefresh: false,
+                verifyHashes: false,
                 includeCached: true,
                 rateLimitDelay: 1000
             };
@@ -496,6 +509,7 @@ class ModelScanDialog {
         return {
             folders: selectedFolders,
             forceRefresh: this.contentArea.querySelector('#forceRefresh').checked,
+            verifyHashes: this.contentArea.querySelector('#verifyHashes').checked,
             includeCached: this.contentArea.querySelector('#includeCached').checked,
             rateLimitDelay: parseInt(this.contentArea.querySelector('#rateLimitDelay').value, 10)
         };
@@ -528,7 +542,7 @@ class ModelScanDialog {
             // Start the scan
             await this.performScan(options);
             
-            // showScanComplete is called from pollScanProgress when complete
+            // showScanComplete is called from handleScanProgress when complete
         } catch (error) {
             console.error('Scan error:', error);
             this.addLogEntry(`Scan failed: ${error.message}`, 'error');
@@ -550,6 +564,7 @@ class ModelScanDialog {
         const scanData = {
             folders: options.folders,
             force: options.forceRefresh,
+            verify: options.verifyHashes,
             include_cached: options.includeCached
         };
 
@@ -568,8 +583,14 @@ class ModelScanDialog {
                 throw new Error(`Server error ${startResponse.status}: ${errorText}`);
             }
 
-            // Start polling for progress updates
-            await this.pollScanProgress();
+            const started = await startResponse.json();
+            this.scanId = started.scan_id;
+            if (started.status === 'queued') {
+                this.addLogEntry('Another scan is running; this one will start when it finishes', 'info');
+            }
+
+            // Progress is pushed over the websocket
+            await this.watchScanProgress(this.scanId);
             
         } catch (error) {
             throw error;
@@ -577,97 +598,119 @@ class ModelScanDialog {
     }
 
     /**
-     * Poll the server for scan progress updates
+     * Follow a scan's progress messages (sage_utils.scan_progress) until it ends.
+     * The server is also polled every few seconds in case a message was missed.
      */
-    async pollScanProgress() {
+    async watchScanProgress(scanId) {
         return new Promise((resolve, reject) => {
-            const pollInterval = setInterval(async () => {
+            let pollInterval = null;
+            let finished = false;
+
+            const onProgress = (progress) => {
+                if (finished || !progress || progress.scan_id !== scanId) {
+                    return;
+                }
                 try {
-                    if (this.cancelRequested) {
-                        clearInterval(pollInterval);
-                        await this.cancelServerScan();
+                    if (this.handleScanProgress(progress)) {
+                        stop();
                         resolve();
-                        return;
                     }
+                } catch (error) {
+                    stop();
+                    reject(error);
+                }
+            };
+            const onMessage = (event) => onProgress(event.detail);
+
+            const stop = () => {
+                finished = true;
+                clearInterval(pollInterval);
+                api.removeEventListener('sage_utils.scan_progress', onMessage);
+            };
 
-                    const response = await fetch('/sage_cache/scan_progress');
+            api.addEventListener('sage_utils.scan_progress', onMessage);
+            pollInterval = setInterval(async () => {
+                try {
+                    const response = await fetch(`/sage_cache/scan_progress?scan_id=${encodeURIComponent(scanId)}`);
                     if (!response.ok) {
                         throw new Error(`Failed to get progress: ${response.status}`);
                     }
 
                     const data = await response.json();
-                    
                     if (!data.success) {
                         throw new Error(data.error || 'Failed to get progress');
                     }
-
-                    const progress = data.progress;
-                    console.log('Received progress data:', progress);
-                    
-                    // Update UI based on progress
-                    if (progress.active) {
-                        // Calculate percentage
-                        const percentage = progress.total > 0 ? (progress.current / progress.total) * 100 : 0;
-                        
-                        // Update progress display
-                        const statusText = progress.current_file || progress.status || 'Processing...';
-                        console.log(`Updating progress: ${statusText}, ${percentage}%`);
-                        this.updateProgress(statusText, percentage);
-                        
-                        // Update scan results for stats display
-                        this.scanResults.totalFiles = progress.total;
-                        this.scanResults.processed = progress.current;
-                        
-                        // Log status updates
-                        if (progress.status === 'discovering_folders') {
-                            this.addLogEntry('Discovering model folders...', 'info');
-                        } else if (progress.status === 'scanning_files') {
-                            this.addLogEntry(`Found ${progress.total} files to process`, 'info');
-                        } else if (progress.status === 'hashing' && progress.current_file) {
-                            // Always log when hashing begins as it can take a while
-                            this.addLogEntry(`Calculating hash for ${progress.current_file}...`, 'info');
-                        } else if (progress.status === 'processing_metadata' && progress.current_file) {
-                            // Only log every 10th file to avoid spam
-                            if (progress.current % 10 === 0 || progress.current === progress.total) {
-                                this.addLogEntry(`Processing: ${progress.current_file}`, 'success');
-                            }
-                        }
-                        
-                    } else {
-                        // Scan is complete or stopped
-                        clearInterval(pollInterval);
-                        
-                        if (progress.status === 'completed') {
-                            this.updateProgress('Scan completed successfully', 100);
-                            this.addLogEntry(`Scan completed: ${progress.current}/${progress.total} files processed`, 'success');
-                            this.showScanComplete();
-                            resolve();
-                        } else if (progress.status === 'cancelled') {
-                            this.updateProgress('Scan cancelled', progress.total > 0 ? (progress.current / progress.total) * 100 : 0);
-                            this.addLogEntry('Scan cancelled by user', 'info');
-                            resolve();
-                        } else if (progress.status === 'error') {
-                            this.updateProgress('Scan failed', 0);
-                            this.addLogEntry(`Scan failed: ${progress.error}`, 'error');
-                            reject(new Error(progress.error || 'Scan failed'));
-                        } else {
-                            // Unknown status, assume completion
-                            this.updateProgress('Scan completed', 100);
-                            this.addLogEntry('Scan completed', 'success');
-                            this.showScanComplete();
-                            resolve();
-                        }
-                    }
-                    
+                    onProgress(data.progress);
                 } catch (error) {
-                    clearInterval(pollInterval);
+                    stop();
                     console.error('Progress polling error:', error);
                     reject(error);
                 }
-            }, 1000); // Poll every second
+            }, 5000);
         });
     }
 
+    /**
+     * Update the dialog from one progress message. Returns true once the scan has ended.
+     */
+    handleScanProgress(progress) {
+        // Update scan results for stats display
+        this.scanResults.totalFiles = progress.total;
+        this.scanResults.processed = progress.current;
+        this.scanResults.filesPerSecond = progress.files_per_second || 0;
+        this.scanResults.mbPerSecond = progress.mb_per_second || 0;
+        this.scanResults.eta = progress.eta_seconds;
+
+        // Files finished since the previous message
+        for (const file of progress.files || []) {
+            const name = file.path.split(/[\\/]/).pop();
+            if (file.result === 'error') {
+                this.scanResults.errors += 1;
+                this.addLogEntry(`Error processing ${name}`, 'error');
+            } else if (file.result === 'found') {
+                this.addLogEntry(`Found on Civitai: ${name}`, 'success');
+            }
+        }
+
+        if (progress.active) {
+            const percentage = progress.total > 0 ? (progress.current / progress.total) * 100 : 0;
+            const statusText = progress.current_file || progress.status || 'Processing...';
+            this.updateProgress(statusText, percentage);
+
+            if (progress.status !== this.lastScanStatus) {
+                if (progress.status === 'discovering_folders') {
+                    this.addLogEntry('Discovering model folders...', 'info');
+                } else if (progress.status === 'scanning_files') {
+                    this.addLogEntry('Looking for model files...', 'info');
+                } else if (progress.status === 'processing_metadata') {
+                    this.addLogEntry(`Found ${progress.total} files to process`, 'info');
+                }
+                this.lastScanStatus = progress.status;
+            }
+            return false;
+        }
+
+        this.lastScanStatus = null;
+        if (progress.status === 'completed') {
+            this.updateProgress('Scan completed successfully', 100);
+            this.addLogEntry(`Scan completed: ${progress.current}/${progress.total} files processed`, 'success');
+            this.showScanComplete();
+        } else if (progress.status === 'cancelled') {
+            this.updateProgress('Scan cancelled', progress.total > 0 ? (progress.current / progress.total) * 100 : 0);
+            this.addLogEntry('Scan cancelled by user', 'info');
+        } else if (progress.status === 'error') {
+            this.updateProgress('Scan failed', 0);
+            this.addLogEntry(`Scan failed: ${progress.error}`, 'error');
+            throw new Error(progress.error || 'Scan failed');
+        } else {
+            // Unknown status, assume completion
+            this.updateProgress('Scan completed', 100);
+            this.addLogEntry('Scan completed', 'success');
+            this.showScanComplete();
+        }
+        return true;
+    }
+
     /**
      * Cancel the scan on the server
      */
@@ -677,7 +720,8 @@ class ModelScanDialog {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
-                }
+                },
+                body: JSON.stringify(this.scanId ? { scan_id: this.scanId } : {})
             });
             
             if (response.ok) {
@@ -757,6 +801,18 @@ class ModelScanDialog {
                     if (errors > 0) {
                         statsText += `, ${errors} errors`;
                     }
+                    const { filesPerSecond, mbPerSecond, eta } = this.scanResults;
+                    if (filesPerSecond > 0) {
+                        statsText += `, ${filesPerSecond.toFixed(1)} files/s`;
+                    }
+                    if (mbPerSecond > 0) {
+                        statsText += `, ${mbPerSecond.toFixed(1)} MB/s hashed`;
+                    }
+                    if (eta !== null && eta !== undefined) {
+                        const etaMinutes = Math.floor(eta / 60);
+                        const etaSeconds = Math.floor(eta % 60);
+                        statsText += `, ${etaMinutes}:${etaSeconds.toString().padStart(2, '0')} left`;
+                    }
                 }
                 
                 const progressStatsEl = this.contentArea.querySelector('#progressStats');
@@ -835,7 +891,7 @@ class ModelScanDialog {
      */
     showScanComplete() {
         // This method is called from the polling system when scan completes
-        // The progress and log messages are already updated in pollScanProgress
+        // The progress and log messages are already updated in handleScanProgress
         this.scanResults.completed = true;
         notifications.success('Model scan completed successfully');
         
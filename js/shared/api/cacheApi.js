@@ -16,18 +16,47 @@ export let cacheData = {
     info: {}
 };
 
+// Last response and ETag per cache URL, so refreshes revalidate (304) instead of re-downloading unchanged data
+const cacheResponses = new Map();
+
+/**
+ * Fetch a cache section, revalidating against the last response with If-None-Match
+ * @param {string} path - Route path
+ * @param {Object|null} params - Optional query parameters (filters, fields, offset/limit)
+ * @returns {Promise<Object>} - Response data
+ */
+async function fetchCacheSection(path, params = null) {
+    const query = params
+        ? new URLSearchParams(Object.entries(params).filter(([, value]) => value !== undefined && value !== null && value !== '')).toString()
+        : '';
+    const url = query ? `${path}?${query}` : path;
+    const previous = cacheResponses.get(url);
+    const response = await api.fetchApi(url, previous ? { headers: { 'If-None-Match': previous.etag } } : {});
+    if (response.status === 304 && previous) {
+        return previous.data;
+    }
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        cacheResponses.set(url, { etag, data });
+    }
+    return data;
+}
+
 /**
  * Fetch cache hash data from server
+ * @param {Object|null} params - Optional query parameters: path_prefix, offset, limit
  * @returns {Promise<Object>} - Hash data mapping file paths to hashes
  */
-export async function fetchCacheHash() {
+export async function fetchCacheHash(params = null) {
     try {
-        const response = await api.fetchApi('/sage_cache/hash');
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
+        const data = await fetchCacheSection('/sage_cache/hash', params);
+        if (!params) {
+            cacheData.hash = data;
         }
-        const data = await response.json();
-        cacheData.hash = data;
         return data;
     } catch (error) {
         console.error('Error fetching cache hash:', error);
@@ -37,16 +66,16 @@ export async function fetchCacheHash() {
 
 /**
  * Fetch cache info data from server
+ * @param {Object|null} params - Optional query parameters: type, base_model, update_available, path_prefix,
+ *     last_used_after, last_used_before, fields, offset, limit
  * @returns {Promise<Object>} - Info data mapping hashes to model information
  */
-export async function fetchCacheInfo() {
+export async function fetchCacheInfo(params = null) {
     try {
-        const response = await api.fetchApi('/sage_cache/info');
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
+        const data = await fetchCacheSection('/sage_cache/info', params);
+        if (!params) {
+            cacheData.info = data;
         }
-        const data = await response.json();
-        cacheData.info = data;
         return data;
     } catch (error) {
         console.error('Error fetching cache info:', error);
@@ -4,7 +4,7 @@
 
 from __future__ import annotations
 from ..utils.logger import get_logger
-from ..utils.file_utils import get_files_in_dir
+from ..utils.library_index import library_index
 from ..utils.helpers_image import load_image_from_path
 
 import torch
@@ -18,7 +18,6 @@ import hashlib
 import json
 import folder_paths
 import os
-import datetime
 import nodes
 
 import comfy
@@ -288,20 +287,11 @@ class Sage_SaveImageWithMetadata(io.ComfyNode):
 class Sage_LoadImage(io.ComfyNode):
     @classmethod
     def define_schema(cls):
-        input_files = []
-        # INPUT_TYPES is called multiple times during workflow loading, 
-        # so cache the results for 20 seconds to avoid rescanning the input directory repeatedly.
-        if hasattr(cls, 'input_cache') and hasattr(cls, 'input_cache_creation_time') and cls.input_cache is not None:
-            if (datetime.datetime.now() - cls.input_cache_creation_time).total_seconds() < 20:
-                input_files = cls.input_cache
-
-        if not input_files:
-            input_files = get_files_in_dir(
-                input_dirs=folder_paths.get_input_directory(),
-                extensions=[".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".tif", ".webp"]
-            )
-            cls.input_cache = input_files  # Cache the list to avoid re-scanning on every call
-            cls.input_cache_creation_time = datetime.datetime.now()
+        # The input directory's listing comes from the library index, which keeps it current as images are added
+        input_files = library_index.files(
+            folder_paths.get_input_directory(),
+            [".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".tif", ".webp"]
+        )
 
         schema = io.Schema(
             node_id="Sage_LoadImage",
@@ -493,15 +493,13 @@ class Sage_ParseMetadataFlexible(io.ComfyNode):
     def _find_model_by_hash(cls, short_hash: str):
         """Search cache for a model matching the given short hash prefix.
         Returns (file_path, type, full_hash) or (None, None, None)."""
-        short_hash = short_hash.lower()
-        for file_path, full_hash in cache.hash.items():
-            if not full_hash.lower().startswith(short_hash):
-                continue
-            for ckpt_base in folder_paths.get_folder_paths("checkpoints"):
-                if file_path.startswith(str(ckpt_base)):
+        ckpt_bases = tuple(str(base) for base in folder_paths.get_folder_paths("checkpoints"))
+        unet_bases = tuple(str(base) for base in folder_paths.get_folder_paths("diffusion_models"))
+        for full_hash in cache.index.hashes_with_prefix(short_hash):
+            for file_path in cache.index.paths_for_hash(full_hash):
+                if file_path.startswith(ckpt_bases):
                     return file_path, "CKPT", full_hash
-            for unet_base in folder_paths.get_folder_paths("diffusion_models"):
-                if file_path.startswith(str(unet_base)):
+                if file_path.startswith(unet_bases):
                     return file_path, "UNET", full_hash
         return None, None, None
 
@@ -509,17 +507,15 @@ class Sage_ParseMetadataFlexible(io.ComfyNode):
     def _find_lora_by_hash(cls, short_hash: str) -> Optional[str]:
         """Search cache for a lora matching the given short hash prefix.
         Returns a relative lora name suitable for folder_paths lookup, or None."""
-        short_hash = short_hash.lower()
-        for file_path, full_hash in cache.hash.items():
-            if not full_hash.lower().startswith(short_hash):
-                continue
-            for lora_base in folder_paths.get_folder_paths("loras"):
-                lora_base_str = str(lora_base)
-                if file_path.startswith(lora_base_str):
-                    try:
-                        return str(Path(file_path).relative_to(lora_base_str))
-                    except ValueError:
-                        pass
+        lora_bases = [str(base) for base in folder_paths.get_folder_paths("loras")]
+        for full_hash in cache.index.hashes_with_prefix(short_hash):
+            for file_path in cache.index.paths_for_hash(full_hash):
+                for lora_base_str in lora_bases:
+                    if file_path.startswith(lora_base_str):
+                        try:
+                            return str(Path(file_path).relative_to(lora_base_str))
+                        except ValueError:
+                            pass
         return None
 
     @classmethod
@@ -516,22 +516,27 @@ class Sage_CheckLorasForUpdates(io.ComfyNode):
         lora_list = []
         lora_url_list = []
 
+        lora_paths = {}
         for lora in lora_stack:
             if lora is not None:
                 logger.info(f"Checking {lora[0]} for updates...")
-                lora_path = folder_paths.get_full_path_or_raise("loras", lora[0])
-                pull_metadata(lora_path, force_all=force)
-                logger.info(f"Update check complete for {lora[0]}")
-
-                info = cache.by_path(lora_path)
-                if info.get("update_available"):
-                    model_id = info.get("modelId")
-                    latest_version = get_latest_model_version(model_id) if model_id else None
-                    latest_url = f"https://civitai.com/models/{model_id}?modelVersionId={latest_version}" if latest_version else ""
-                    if latest_url:
-                        logger.info(f"Update found for {lora[0]}")
-                        lora_url_list.append(latest_url)
-                        lora_list.append(lora_path)
+                lora_paths[lora[0]] = folder_paths.get_full_path_or_raise("loras", lora[0])
+        # One pull for the whole stack, so the lookups run concurrently and share each model's /models/{id} fetch
+        if lora_paths:
+            pull_metadata(list(dict.fromkeys(lora_paths.values())), force_all=force)
+
+        for lora_name, lora_path in lora_paths.items():
+            logger.info(f"Update check complete for {lora_name}")
+
+            info = cache.by_path(lora_path)
+            if info.get("update_available"):
+                model_id = info.get("modelId")
+                latest_version = info.get("update_version_id") or (get_latest_model_version(model_id) if model_id else None)
+                latest_url = f"https://civitai.com/models/{model_id}?modelVersionId={latest_version}" if latest_version else ""
+                if latest_url:
+                    logger.info(f"Update found for {lora_name}")
+                    lora_url_list.append(latest_url)
+                    lora_list.append(lora_path)
 
         return io.NodeOutput(lora_stack, str(lora_list), str(lora_url_list))
 
@@ -4,6 +4,7 @@ Provides decorators, common utilities, and error handling patterns.
 """
 
 import asyncio
+import json
 import traceback
 from functools import wraps
 
@@ -93,10 +94,42 @@ def error_response(message, status=400):
     )
 
 
+def _etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value matches etag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    def opaque(tag):
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+    return any(opaque(tag) == opaque(etag) for tag in if_none_match.split(","))
+
+
+async def cached_json_response(request, build, etag):
+    """
+    JSON response with ETag revalidation and gzip.
+    Returns 304 Not Modified when the client's If-None-Match matches etag; otherwise build() is called
+    and its result serialized in the default executor, so large payloads don't block the event loop.
+    build() therefore runs while other threads write to the cache: it should copy what it needs under
+    cache.sections_lock and build the result from the copy.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("If-None-Match"), etag):
+        return web.Response(status=304, headers=headers)
+
+    loop = asyncio.get_running_loop()
+    body = await loop.run_in_executor(None, lambda: json.dumps(build()))
+    response = web.Response(text=body, content_type="application/json", headers=headers)
+    response.enable_compression()
+    return response
+
+
 __all__ = [
     'route_error_handler',
     'validate_json_body',
     'validate_query_params',
     'success_response',
     'error_response',
+    'cached_json_response',
 ]
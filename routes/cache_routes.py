@@ -3,9 +3,11 @@ Cache Routes Module
 Handles cache information and management endpoints.
 """
 
+import asyncio
+
 from ..utils.logger import get_logger
 from aiohttp import web
-from .base import route_error_handler, validate_query_params, validate_json_body, success_response, error_response
+from .base import route_error_handler, validate_query_params, validate_json_body, success_response, error_response, cached_json_response
 
 logger = get_logger('routes.cache')
 
@@ -32,6 +34,7 @@ def register_routes(routes_instance):
         """
         Returns the contents of SageCache.info as JSON.
         This contains model metadata, civitai information, and cache details.
+        Supports filters, field projection and pagination (see utils/cache_query.py), ETag revalidation and gzip.
         """
         try:
             # Dynamic import to avoid issues with ComfyUI dependencies at module load time
@@ -44,10 +47,17 @@ def register_routes(routes_instance):
                 sys.path.insert(0, comfyui_path)
             
             from ..utils.model_cache import cache
+            from ..utils.cache_query import has_query, parse_cache_query, query_info
             
             # Ensure cache is loaded
             cache.load()
-            return web.json_response(cache.info)
+            if not has_query(request.query):
+                return await cached_json_response(request, cache.full_info, cache.section_etag("hash", "info"))
+            try:
+                query = parse_cache_query(request.query)
+            except ValueError as e:
+                return error_response(str(e), status=400)
+            return await cached_json_response(request, lambda: query_info(cache, query), cache.section_etag("hash", "info"))
             
         except Exception as e:
             logger.error(f"Cache info error: {e}")
@@ -59,6 +69,7 @@ def register_routes(routes_instance):
         """
         Returns the contents of SageCache.hash as JSON.
         This contains the mapping from file paths to their SHA256 hashes.
+        Supports path_prefix, offset and limit (see utils/cache_query.py), ETag revalidation and gzip.
         """
         try:
             # Dynamic import to avoid ComfyUI dependency issues
@@ -71,10 +82,15 @@ def register_routes(routes_instance):
                 sys.path.insert(0, comfyui_path)
             
             from ..utils.model_cache import cache
+            from ..utils.cache_query import parse_cache_query, query_hash
             
             # Ensure cache is loaded
             cache.load()
-            return web.json_response(cache.hash)
+            try:
+                query = parse_cache_query(request.query)
+            except ValueError as e:
+                return error_response(str(e), status=400)
+            return await cached_json_response(request, lambda: query_hash(cache, query), cache.section_etag("hash"))
             
         except Exception as e:
             logger.error(f"Cache hash error: {e}")
@@ -100,12 +116,16 @@ def register_routes(routes_instance):
                 sys.path.insert(0, comfyui_path)
             
             from ..utils.model_cache import cache
+            from ..utils.model_metadata import pending_full_hashes
             
             # Ensure cache is loaded
             cache.load()
             stats = {
                 'total_models': len(cache.info),
-                'cache_status': 'loaded' if cache.info else 'empty'
+                'cache_status': 'loaded' if cache.info else 'empty',
+                'reloads_avoided': cache.reloads_avoided,
+                'journal_merges': cache.journal_merges,
+                'pending_full_hashes': len(pending_full_hashes())
             }
             return web.json_response(stats)
             
@@ -113,6 +133,28 @@ def register_routes(routes_instance):
             logger.error(f"Cache stats error: {e}")
             return error_response(f"Cache system error: {str(e)}", status=503)
 
+    @routes_instance.get('/sage_cache/duplicates')
+    @route_error_handler
+    async def get_sage_cache_duplicates(request):
+        """
+        Returns model files grouped by quick (sampled) fingerprint.
+        Groups whose files also share a full hash are marked confirmed; the rest are only candidates.
+        """
+        try:
+            from ..utils.model_cache import cache
+            from ..utils.model_metadata import duplicate_candidates
+
+            cache.load()
+            groups = duplicate_candidates()
+            return success_response(data={
+                "groups": groups,
+                "confirmed": sum(1 for group in groups if group["confirmed"])
+            })
+
+        except Exception as e:
+            logger.error(f"Cache duplicates error: {e}")
+            return error_response(f"Cache system error: {str(e)}", status=503)
+
     @routes_instance.get('/sage_cache/file/{file_hash}')
     @route_error_handler
     async def get_sage_cache_file_info(request):
@@ -143,7 +185,7 @@ def register_routes(routes_instance):
                 return error_response(f"No information found for hash: {file_hash}", status=404)
             
             # Also include which file paths use this hash
-            file_paths = [path for path, hash_val in cache.hash.items() if hash_val == file_hash]
+            file_paths = cache.index.paths_for_hash(file_hash)
             
             result = {
                 "hash": file_hash,
@@ -197,7 +239,7 @@ def register_routes(routes_instance):
                 )
             
             # Also include all file paths that use this same hash (duplicates)
-            all_file_paths = [path for path, hash_val in cache.hash.items() if hash_val == file_hash]
+            all_file_paths = cache.index.paths_for_hash(file_hash)
             
             result = {
                 "file_path": file_path,
@@ -237,7 +279,9 @@ def register_routes(routes_instance):
             force = data.get('force', False)
             
             try:
-                pull_metadata([file_path], force_all=force)
+                # Hashing and Civitai requests block, so run them off the event loop
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, lambda: pull_metadata([file_path], force_all=force))
                 return success_response(message=f"Metadata pulled successfully for {file_path}")
             except Exception as pull_error:
                 logger.error(f"Failed to pull metadata for {file_path}: {pull_error}")
@@ -382,6 +426,7 @@ def register_routes(routes_instance):
         {"method": "GET", "path": "/sage_cache/info", "description": "Get cache info"},
         {"method": "GET", "path": "/sage_cache/hash", "description": "Get cache hash mapping"},
         {"method": "GET", "path": "/sage_cache/stats", "description": "Get cache statistics"},
+        {"method": "GET", "path": "/sage_cache/duplicates", "description": "Get model files grouped by quick fingerprint"},
         {"method": "GET", "path": "/sage_cache/file/{file_hash}", "description": "Get info for specific file hash"},
         {"method": "GET", "path": "/sage_cache/path", "description": "Get info for file by path"},
         {"method": "POST", "path": "/sage_utils/pull_metadata", "description": "Pull metadata for file"},
@@ -4,37 +4,47 @@ SageUtils Scanning Routes
 
 Handles model folder scanning and metadata operations including:
 - scan_model_folders (GET/POST): Folder discovery and model scanning
-- scan_progress: Real-time progress tracking
+- scan_progress: Progress of a scan, by id (also pushed over the websocket)
+- scans: All tracked scans
 - cancel_scan: Scan cancellation
 - available_folders: Available model folder discovery
 
-Contains global scan progress store for real-time tracking.
+Scans are tracked by id in scan_tracker (see utils/scan_progress.py).
 """
 
 try:
     from aiohttp import web
     from ..utils.logger import get_logger
     import os
-    import time
     import asyncio
-    import pathlib
+    from concurrent.futures import ThreadPoolExecutor
+    from ..utils.scan_progress import ScanProgressTracker
     
     logger = get_logger('routes.scanning')
     
-    # Global scan progress storage
-    scan_progress_store = {
+    # Progress of each scan by id, pushed to the browser as it changes
+    scan_tracker = ScanProgressTracker()
+
+    # Reported by scan_progress when no scan has been started yet
+    IDLE_PROGRESS = {
+        'scan_id': None,
         'active': False,
         'current': 0,
         'total': 0,
         'status': 'idle',
         'error': None,
         'current_file': '',
-        'start_time': None
+        'start_time': None,
+        'elapsed_time': 0,
+        'queues': {}
     }
 
     # Route list for documentation and registration tracking
     _route_list = []
 
+    # Tasks of the scans started by the route (running or queued)
+    _scan_tasks = []
+
     def register_routes(routes_instance):
         """
         Register scanning-related routes.
@@ -57,23 +67,12 @@ try:
             try:
                 # Dynamic import to avoid ComfyUI dependency issues
                 import folder_paths
-                
-                def has_model_extension(filename):
-                    """Check if file has a model extension"""
-                    from ..utils.constants import MODEL_FILE_EXTENSIONS
-                    return any(filename.lower().endswith(ext) for ext in MODEL_FILE_EXTENSIONS)
+                from ..utils.constants import MODEL_FILE_EXTENSIONS
+                from ..utils.library_index import library_index
                 
                 def count_model_files(folder_path):
-                    """Count model files in a folder"""
-                    count = 0
-                    try:
-                        for root, dirs, files in os.walk(folder_path):
-                            for file in files:
-                                if has_model_extension(file):
-                                    count += 1
-                    except Exception:
-                        pass
-                    return count
+                    """Count model files in a folder (from the library index, without walking it)"""
+                    return library_index.count(folder_path, MODEL_FILE_EXTENSIONS)
                 
                 folders_info = []
                 
@@ -152,20 +151,21 @@ try:
         @routes_instance.get('/sage_cache/scan_progress')
         async def get_scan_progress(request):
             """
-            Returns the current progress of any active model scan.
+            Returns the progress of the scan given by the 'scan_id' query parameter, or of the running
+            (else most recent) scan. The same data is pushed as sage_utils.scan_progress messages.
             """
             try:
-                progress = scan_progress_store.copy()
-                
-                # Calculate elapsed time if scan is active
-                if progress['active'] and progress['start_time']:
-                    progress['elapsed_time'] = time.time() - progress['start_time']
-                else:
-                    progress['elapsed_time'] = 0
+                scan_id = request.query.get('scan_id')
+                scan = scan_tracker.get(scan_id) if scan_id else scan_tracker.latest()
+                if scan is None and scan_id:
+                    return web.json_response(
+                        {"success": False, "error": f"Unknown scan: {scan_id}"},
+                        status=404
+                    )
                 
                 return web.json_response({
                     'success': True,
-                    'progress': progress
+                    'progress': scan.snapshot() if scan is not None else dict(IDLE_PROGRESS)
                 })
                 
             except Exception as e:
@@ -177,58 +177,61 @@ try:
                     status=500
                 )
         
+        @routes_instance.get('/sage_cache/scans')
+        async def list_scans(request):
+            """
+            Returns the progress of every tracked scan (running, queued and recently finished), oldest first.
+            """
+            try:
+                scans = [scan.snapshot() for scan in scan_tracker.scans()]
+                return web.json_response({
+                    'success': True,
+                    'scans': scans,
+                    'active': [scan['scan_id'] for scan in scans if scan['active']]
+                })
+                
+            except Exception as e:
+                import traceback
+                error_details = traceback.format_exc()
+                logger.error(f"SageUtils list scans error: {error_details}")
+                return web.json_response(
+                    {"success": False, "error": f"Failed to list scans: {str(e)}"}, 
+                    status=500
+                )
+        
         @routes_instance.post('/sage_cache/scan_model_folders')
         async def perform_model_scan(request):
             """
             Starts actual model scanning and metadata pulling in the background.
-            Expects JSON body with optional 'folders', 'force', and 'include_cached' fields.
-            Uses progress tracking for real-time updates.
+            Expects JSON body with optional 'folders', 'force', 'verify', and 'include_cached' fields.
+            'verify' rehashes every file on a forced scan, even those whose size, mtime and inode are unchanged.
+            Returns the new scan's 'scan_id'; a scan started while another is running is queued behind it.
             """
             try:
-                # Dynamic import to avoid ComfyUI dependency issues
-                import folder_paths
-                
-                # Check if a scan is already in progress
-                if scan_progress_store['active']:
-                    return web.json_response({
-                        "success": False,
-                        "error": "A scan is already in progress"
-                    }, status=409)
-                
                 # Parse request body
                 data = await request.json()
                 folders = data.get('folders', [])
                 force = data.get('force', False)
+                verify = data.get('verify', False)
                 include_cached = data.get('include_cached', True)
                 
-                # Initialize progress tracking
-                scan_progress_store.update({
-                    'active': True,
-                    'current': 0,
-                    'total': 0,
-                    'status': 'initializing',
-                    'error': None,
-                    'current_file': '',
-                    'start_time': time.time()
-                })
+                # Register the scan (queued until the scan thread picks it up)
+                scan = scan_tracker.start(folders, force=force, verify=verify, include_cached=include_cached)
                 
                 # Start background scan task
-                asyncio.create_task(background_scan_task(folders, force, include_cached))
+                _scan_tasks[:] = [task for task in _scan_tasks if not task.done()]
+                _scan_tasks.append(asyncio.create_task(background_scan_task(scan, folders, force, include_cached, verify)))
                 
                 # Return immediately while scan runs in background
                 return web.json_response({
                     "success": True,
+                    "scan_id": scan.scan_id,
+                    "status": scan.state['status'],
                     "message": "Scan started successfully",
-                    "status": "Scan is running in the background. Use /sage_cache/scan_progress to monitor progress."
+                    "details": "Progress is sent as sage_utils.scan_progress messages and from /sage_cache/scan_progress?scan_id=..."
                 })
                 
             except Exception as e:
-                scan_progress_store.update({
-                    'active': False,
-                    'status': 'error',
-                    'error': str(e)
-                })
-                
                 import traceback
                 error_details = traceback.format_exc()
                 logger.error(f"SageUtils perform model scan error: {error_details}")
@@ -240,18 +243,15 @@ try:
         @routes_instance.post('/sage_cache/cancel_scan')
         async def cancel_model_scan(request):
             """
-            Cancels any active model scan.
+            Cancels the scan given by 'scan_id' in the JSON body, or every active (running or queued) scan.
             """
             try:
-                if scan_progress_store['active']:
-                    scan_progress_store.update({
-                        'active': False,
-                        'status': 'cancelled',
-                        'current_file': 'Scan cancelled by user'
-                    })
-                    
+                data = await request.json() if request.can_read_body else {}
+                cancelled = scan_tracker.cancel(data.get('scan_id'))
+                if cancelled:
                     return web.json_response({
                         "success": True,
+                        "cancelled": cancelled,
                         "message": "Scan cancelled successfully"
                     })
                 else:
@@ -273,6 +273,7 @@ try:
         _route_list.extend([
             {'method': 'GET', 'path': '/sage_cache/scan_model_folders', 'handler': 'get_available_folders'},
             {'method': 'GET', 'path': '/sage_cache/scan_progress', 'handler': 'get_scan_progress'},
+            {'method': 'GET', 'path': '/sage_cache/scans', 'handler': 'list_scans'},
             {'method': 'POST', 'path': '/sage_cache/scan_model_folders', 'handler': 'perform_model_scan'},
             {'method': 'POST', 'path': '/sage_cache/cancel_scan', 'handler': 'cancel_model_scan'}
         ])
@@ -282,171 +283,90 @@ try:
     # Configuration constant for checkpoint interval
     SCAN_CHECKPOINT_INTERVAL = 100  # Save every N files during scan
 
-    async def background_scan_task(folders, force, include_cached):
-        """Background task that performs the actual scanning with progress updates"""
+    # The scan runs on its own thread so hashing and Civitai requests never block the event loop
+    _scan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="SageModelScan")
+
+    async def background_scan_task(scan, folders, force, include_cached, verify=False):
+        """
+        Background task for a scan started by the route: runs run_model_scan() on the scan thread and waits
+        for it, leaving the event loop free to serve the UI (including progress polls) in the meantime.
+        Scans started while another is running wait their turn on the scan thread.
+        """
         try:
-            # Dynamic import to avoid ComfyUI dependency issues
-            import folder_paths
-            
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(_scan_executor, run_model_scan, scan, folders, force, include_cached, verify)
+        except Exception as scan_error:
+            scan_tracker.finish(scan, 'error', error=str(scan_error))
+            logger.error(f"Background scan task error: {scan_error}")
+
+    def run_model_scan(scan, folders, force, include_cached, verify=False):
+        """Performs the actual scanning, reporting progress to scan_tracker (blocking; run it off the event loop)"""
+        try:
+            if scan.cancelled.is_set():
+                # Cancelled while it was queued
+                return
+
             # If no specific folders provided, get all model folders
             if not folders:
-                scan_progress_store['status'] = 'discovering_folders'
-                folder_mappings = {
-                    'checkpoints': ['checkpoints'],
-                    'loras': ['loras'],
-                    'vae': ['vae', 'vae_approx'],
-                    'text_encoders': ['text_encoders', 'clip', 't5'],
-                    'diffusion_models': ['diffusion_models', 'unet']
-                }
-                
-                folders = []
-                for folder_keys in folder_mappings.values():
-                    for folder_key in folder_keys:
-                        try:
-                            if hasattr(folder_paths, 'get_folder_paths'):
-                                folder_list = folder_paths.get_folder_paths(folder_key)
-                            else:
-                                folder_list = getattr(folder_paths, f'folder_names_and_paths', {}).get(folder_key, [[]])[0]
-                            
-                            for folder_path in folder_list:
-                                if os.path.exists(folder_path):
-                                    folders.append(folder_path)
-                        except Exception:
-                            continue
+                scan_tracker.update(scan, status='discovering_folders')
+                from ..utils.model_discovery import get_model_folder_paths
+                folders = get_model_folder_paths()
             
             # Remove duplicates and filter existing paths
             folders = list(set(folder for folder in folders if os.path.exists(folder)))
             
             if not folders:
-                scan_progress_store.update({
-                    'active': False,
-                    'status': 'error',
-                    'error': 'No valid model folders found to scan'
-                })
+                scan_tracker.finish(scan, 'error', error='No valid model folders found to scan')
                 return
             
-            # Start manual scanning with progress tracking
-            scan_progress_store['status'] = 'scanning_files'
-            
-            # Dynamic import of helpers, constants, and cache
-            from ..utils.helpers import pull_metadata
-            from ..utils.constants import MODEL_FILE_EXTENSIONS
-            from ..utils.model_cache import cache
-            
-            # First pass: count all model files
-            model_list = []
-            for dir_path in folders:
-                scan_progress_store['current_file'] = f"Scanning {os.path.basename(dir_path)}..."
-                result = list(p.resolve() for p in pathlib.Path(dir_path).glob("**/*") if p.suffix in MODEL_FILE_EXTENSIONS)
-                model_list.extend(result)
-                # Allow other async tasks to run
-                await asyncio.sleep(0.01)
+            # Stream the files through the scan stages (see utils/scan_pipeline.py)
+            scan_tracker.update(scan, status='scanning_files', current_file=f"Scanning {len(folders)} folders...")
 
-            model_list = list(set(model_list))
-            model_list = [str(x) for x in model_list]
+            from ..utils.scan_pipeline import ScanPipeline
 
-            # Exclude blacklisted models unless force is enabled
-            if not force:
-                try:
-                    cache.load()
-                except Exception:
-                    pass
-                filtered = []
-                for fp in model_list:
-                    try:
-                        h = cache.hash.get(fp)
-                        info = cache.info.get(h, {}) if h else {}
-                        if info.get('blacklist', False):
-                            continue
-                    except Exception:
-                        # On any error, keep the item rather than over-filtering
-                        pass
-                    filtered.append(fp)
-                model_list = filtered
+            def on_progress(pipeline):
+                scan_tracker.update(
+                    scan,
+                    status='scanning_files' if pipeline.enumerating else 'processing_metadata',
+                    enumerating=pipeline.enumerating,
+                    current=pipeline.counts['processed'],
+                    total=pipeline.total,
+                    hashed=pipeline.counts['hashed'],
+                    hashed_bytes=pipeline.counts['hashed_bytes'],
+                    current_file=os.path.basename(pipeline.current_file),
+                    queues=pipeline.queue_depths(),
+                )
 
-            scan_progress_store['total'] = len(model_list)
-            scan_progress_store['status'] = 'processing_metadata'
-            
-            logger.info(f"Found {len(model_list)} models to process")
-            
-            # Enable batch mode for reduced I/O during bulk operations
-            cache.begin_batch()
-            
-            try:
-                # Process files with progress updates and checkpoint saves
-                processed_count = 0
-                for file_path in model_list:
-                    if not scan_progress_store['active']:  # Check if cancelled
-                        logger.info(f"Scan cancelled, stopping at {processed_count}/{len(model_list)} files")
-                        break
-                        
-                    file_name = os.path.basename(file_path)
-                    scan_progress_store['current_file'] = file_name
-                    scan_progress_store['current'] = processed_count
-                    
-                    # Debug progress update
-                    if processed_count % 10 == 0:  # Log every 10 files
-                        logger.debug(f"Progress: {processed_count}/{len(model_list)} files processed ({(processed_count/len(model_list)*100):.1f}%)")
-                    
-                    try:
-                        # If this file has no cached hash, indicate hashing in progress
-                        try:
-                            existing_hash = cache.hash.get(file_path)
-                        except Exception:
-                            existing_hash = None
-                        needs_hashing = (force is True) or (not existing_hash)
-                        if needs_hashing:
-                            # Update status so frontend can log a message
-                            scan_progress_store['status'] = 'hashing'
-                            scan_progress_store['current_file'] = file_name
-                            if force and existing_hash:
-                                logger.info(f"Recalculating hash (forced) for {file_path}")
-                            else:
-                                logger.info(f"Calculating hash for {file_path}")
+            pipeline = ScanPipeline(
+                folders, force=force, verify=verify,
+                should_cancel=scan.cancelled.is_set,
+                on_progress=on_progress,
+                on_file=lambda path, result: scan_tracker.file_done(scan, path, result),
+                checkpoint_interval=SCAN_CHECKPOINT_INTERVAL,
+            )
+            counts = pipeline.run()
+            processed_count = counts['processed']
 
-                        # Process single file without updating timestamp
-                        pull_metadata(file_path, timestamp=False, force_all=force)
-                        processed_count += 1
-                    except Exception as file_error:
-                        logger.error(f"Error processing {file_path}: {file_error}")
-                        # Continue with other files
-                        processed_count += 1
-                    
-                    # Checkpoint save: Save every N files to prevent data loss
-                    if processed_count % SCAN_CHECKPOINT_INTERVAL == 0:
-                        cache.end_batch(force_save=True)
-                        scan_progress_store['current_file'] = f"Checkpoint save ({processed_count} files)..."
-                        logger.info(f"Checkpoint save at {processed_count}/{len(model_list)} files")
-                        cache.begin_batch()
-                    
-                    # Restore general status after any hashing indicator
-                    if scan_progress_store['active']:
-                        scan_progress_store['status'] = 'processing_metadata'
+            if scan.cancelled.is_set():
+                logger.info(f"Scan cancelled, stopping at {processed_count}/{pipeline.total} files")
+                return
 
-                    # Allow other async tasks to run (important for progress updates)
-                    await asyncio.sleep(0.01)
-                
-            finally:
-                # Always end batch mode and perform final save, even on cancellation or error
-                cache.end_batch(force_save=True)
-                logger.info(f"Final batch save completed")
-            
             # Mark scan as complete
-            scan_progress_store.update({
-                'active': False,
-                'current': processed_count,
-                'status': 'completed',
-                'current_file': 'Scan completed'
-            })
+            scan_tracker.finish(
+                scan, 'completed',
+                enumerating=False,
+                current=processed_count,
+                total=pipeline.total,
+                hashed=counts['hashed'],
+                hashed_bytes=counts['hashed_bytes'],
+                current_file='Scan completed',
+                queues=pipeline.queue_depths(),
+            )
             
             logger.info(f"Background scan completed: {processed_count} files processed")
             
         except Exception as scan_error:
-            scan_progress_store.update({
-                'active': False,
-                'status': 'error',
-                'error': str(scan_error)
-            })
+            scan_tracker.finish(scan, 'error', error=str(scan_error))
             
             import traceback
             error_details = traceback.format_exc()
@@ -3,6 +3,7 @@ Custom routes for SageUtils to expose cache data and settings via HTTP endpoints
 This file now uses a modular route system for better maintainability.
 """
 
+import asyncio
 import logging
 from .utils.performance_timer import server_timer, log_init
 
@@ -177,11 +178,19 @@ try:
             """
             Returns the contents of SageCache.info as JSON.
             This contains model metadata, civitai information, and cache details.
+            Supports the same filters, projection, pagination, ETag and gzip as the modular route.
             """
             try:
+                from .routes.base import cached_json_response
+                from .utils.cache_query import has_query, parse_cache_query, query_info
                 # Ensure cache is loaded
                 cache.load()
-                return web.json_response(cache.info)
+                if not has_query(request.query):
+                    return await cached_json_response(request, cache.full_info, cache.section_etag("hash", "info"))
+                query = parse_cache_query(request.query)
+                return await cached_json_response(request, lambda: query_info(cache, query), cache.section_etag("hash", "info"))
+            except ValueError as e:
+                return web.json_response({"error": str(e)}, status=400)
             except Exception as e:
                 return web.json_response(
                     {"error": f"Failed to retrieve cache info: {str(e)}"}, 
@@ -193,11 +202,17 @@ try:
             """
             Returns the contents of SageCache.hash as JSON.
             This contains the mapping from file paths to their SHA256 hashes.
+            Supports path_prefix, offset and limit, ETag and gzip like the modular route.
             """
             try:
+                from .routes.base import cached_json_response
+                from .utils.cache_query import parse_cache_query, query_hash
                 # Ensure cache is loaded
                 cache.load()
-                return web.json_response(cache.hash)
+                query = parse_cache_query(request.query)
+                return await cached_json_response(request, lambda: query_hash(cache, query), cache.section_etag("hash"))
+            except ValueError as e:
+                return web.json_response({"error": str(e)}, status=400)
             except Exception as e:
                 return web.json_response(
                     {"error": f"Failed to retrieve cache hash: {str(e)}"}, 
@@ -276,7 +291,7 @@ try:
                     )
                 
                 # Also include which file paths use this hash
-                file_paths = [path for path, hash_val in cache.hash.items() if hash_val == file_hash]
+                file_paths = cache.index.paths_for_hash(file_hash)
                 
                 result = {
                     "hash": file_hash,
@@ -327,7 +342,7 @@ try:
                     )
                 
                 # Also include all file paths that use this same hash (duplicates)
-                all_file_paths = [path for path, hash_val in cache.hash.items() if hash_val == file_hash]
+                all_file_paths = cache.index.paths_for_hash(file_hash)
                 
                 result = {
                     "file_path": file_path,
@@ -365,7 +380,9 @@ try:
                 
                 # Call the pull_metadata function
                 try:
-                    pull_metadata(file_path, force_all=force)
+                    # Hashing and Civitai requests block, so run them off the event loop
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(None, lambda: pull_metadata(file_path, force_all=force))
                     
                     return web.json_response({
                         "success": True,
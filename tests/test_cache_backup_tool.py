@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from comfyui_sageutils.tools import cache_backup_tool as tool
+from comfyui_sageutils.utils import model_cache as model_cache_module
+from comfyui_sageutils.utils.path_manager import path_manager
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    users_path = tmp_path / 'SageUtils'
+    (users_path / 'backup').mkdir(parents=True)
+    monkeypatch.setattr(path_manager, 'sage_users_path', users_path)
+    monkeypatch.setattr(path_manager, 'backup_path', users_path / 'backup')
+    monkeypatch.setattr(model_cache_module, 'get_setting_or_default', lambda key, default: 0 if key == 'model_cache_watch_interval' else default)
+    test_cache = model_cache_module.SageCache()
+    if test_cache.prune_thread is not None:
+        test_cache.prune_thread.join(timeout=10)
+    monkeypatch.setattr(tool, '_get_cache', lambda: test_cache)
+    return test_cache
+
+
+def test_restore_cache_backup_writes_point_in_time(cache, tmp_path):
+    cache.backup_json('sage_cache_hash', {'/a': '1'}, '2026-01-01T00-00-00')
+    cache.backup_json('sage_cache_hash', {'/a': '1', '/b': '2'}, '2026-01-02T00-00-00')
+
+    output = tmp_path / 'restored.json'
+    result = tool.restore_cache_backup('sage_cache_hash', at='2026-01-01T23:59:59', output_path=output)
+
+    assert result['entries'] == 1
+    assert json.loads(output.read_text(encoding='utf-8')) == {'/a': '1'}
+    assert [b['backup_date'] for b in tool.list_cache_backups('sage_cache_hash')] == ['2026-01-01T00-00-00', '2026-01-02T00-00-00']
+
+
+def test_restore_cache_backup_applies_to_cache(cache):
+    cache.backup_json('sage_cache_hash', {'/a': '1'}, '2026-01-01T00-00-00')
+
+    tool.restore_cache_backup('sage_cache_hash', apply=True)
+
+    assert cache.hash == {'/a': '1'}
+    assert json.loads(cache.hash_path.read_text(encoding='utf-8')) == {'/a': '1'}
+
+
+def test_restore_cache_backup_without_backups_raises(cache):
+    with pytest.raises(FileNotFoundError):
+        tool.restore_cache_backup('sage_cache_info')
@@ -0,0 +1,124 @@
+import sys
+import threading
+
+import pytest
+from aiohttp import web
+
+from comfyui_sageutils.routes.cache_routes import register_routes
+from comfyui_sageutils.utils import model_cache as model_cache_module
+from comfyui_sageutils.utils.path_manager import path_manager
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    users_path = tmp_path / 'SageUtils'
+    (users_path / 'backup').mkdir(parents=True)
+    monkeypatch.setattr(path_manager, 'sage_users_path', users_path)
+    monkeypatch.setattr(path_manager, 'backup_path', users_path / 'backup')
+    monkeypatch.setattr(model_cache_module, 'get_setting_or_default', lambda key, default: 0 if key == 'model_cache_watch_interval' else default)
+
+    test_cache = model_cache_module.SageCache()
+    test_cache.load()
+    test_cache.add_or_update_entry('/models/loras/a.safetensors', {
+        'hash': 'AAA', 'id': 1, 'name': 'a', 'baseModel': 'SDXL 1.0', 'update_available': True,
+        'lastUsed': '2026-10-01T12:00:00', 'model': {'type': 'LORA', 'name': 'Lora A'},
+    })
+    test_cache.add_or_update_entry('/models/checkpoints/b.safetensors', {
+        'hash': 'BBB', 'id': 2, 'name': 'b', 'baseModel': 'SD 1.5', 'update_available': False,
+        'lastUsed': '2026-09-01T12:00:00', 'model': {'type': 'Checkpoint', 'name': 'Model B'},
+    })
+    monkeypatch.setattr(model_cache_module, 'cache', test_cache)
+    return test_cache
+
+
+@pytest.fixture
+def app(cache):
+    app = web.Application()
+    routes = web.RouteTableDef()
+    register_routes(routes)
+    app.add_routes(routes)
+    return app
+
+
+async def test_info_route_filters_projects_and_paginates(app, aiohttp_client):
+    client = await aiohttp_client(app)
+
+    response = await client.get('/sage_cache/info', params={'type': 'lora', 'fields': 'id,model.type'})
+    assert response.status == 200
+    assert await response.json() == {'AAA': {'id': 1, 'model': {'type': 'LORA'}}}
+
+    response = await client.get('/sage_cache/info', params={'update_available': 'false', 'path_prefix': '/models/checkpoints'})
+    assert list(await response.json()) == ['BBB']
+
+    response = await client.get('/sage_cache/info', params={'last_used_after': '2026-09-15', 'fields': 'name'})
+    assert await response.json() == {'AAA': {'name': 'a'}}
+
+    response = await client.get('/sage_cache/info', params={'offset': '1', 'limit': '1', 'fields': 'id'})
+    assert await response.json() == {'total': 2, 'offset': 1, 'limit': 1, 'items': {'BBB': {'id': 2}}}
+
+    response = await client.get('/sage_cache/hash', params={'path_prefix': '/models/loras'})
+    assert await response.json() == {'/models/loras/a.safetensors': 'AAA'}
+
+    response = await client.get('/sage_cache/info', params={'limit': 'many'})
+    assert response.status == 400
+
+
+async def test_info_route_revalidates_with_etag_and_compresses(app, aiohttp_client, cache):
+    client = await aiohttp_client(app)
+
+    response = await client.get('/sage_cache/info', headers={'Accept-Encoding': 'gzip'})
+    assert response.status == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert set(await response.json()) == {'AAA', 'BBB'}
+    etag = response.headers['ETag']
+
+    response = await client.get('/sage_cache/info', headers={'If-None-Match': etag})
+    assert response.status == 304
+
+    # Any change to the cache changes the ETag.
+    cache.by_hash('AAA')['name'] = 'renamed'
+    response = await client.get('/sage_cache/info', headers={'If-None-Match': etag})
+    assert response.status == 200
+    assert (await response.json())['AAA']['name'] == 'renamed'
+
+
+async def test_info_route_copies_the_cache_while_other_threads_write_it(app, aiohttp_client, cache):
+    client = await aiohttp_client(app)
+    stop = threading.Event()
+    errors = []
+
+    def write():
+        i = 0
+        try:
+            while not stop.is_set():
+                i += 1
+                cache.add_or_update_entry(f'/models/loras/new_{i % 200}.safetensors', {'hash': f'N{i % 200}', 'lastUsed': str(i)})
+                # Fields written together under the lock are never seen half-updated
+                with cache.sections_lock:
+                    entry = cache.by_hash('AAA')
+                    entry['id'] = i
+                    entry['name'] = str(i)
+        except Exception as e:
+            errors.append(e)
+
+    # Switch threads as often as possible, so the writer runs in the middle of the copy
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        for params in ({}, {'path_prefix': '/models/loras', 'fields': 'id,name'}, {'limit': '5'}) * 10:
+            response = await client.get('/sage_cache/info', params=params)
+            assert response.status == 200
+            body = await response.json()
+            entry = (body['items'] if 'items' in body else body).get('AAA')
+            if entry is not None:
+                assert str(entry['id']) == entry['name']
+            assert (await client.get('/sage_cache/hash', params={'path_prefix': '/models/loras'})).status == 200
+    finally:
+        stop.set()
+        writer.join(10)
+        sys.setswitchinterval(interval)
+    assert errors == []
@@ -0,0 +1,283 @@
+"""Tests for the pooled, rate-limited Civitai client, against a local stub server."""
+
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from comfyui_sageutils.utils import civitai_client, civitai_response_cache, helpers_civitai
+from comfyui_sageutils.utils import model_cache as model_cache_module
+from comfyui_sageutils.utils import model_metadata
+from comfyui_sageutils.utils.path_manager import path_manager
+
+
+class StubCivitai:
+    """
+    Serves GET /api/v1/... from a routes dict of path -> list of (status, body, headers), consumed in order,
+    and the bulk POST /api/v1/model-versions/by-hash from the versions dict of hash -> model version.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.versions = {}
+        self.posts = []
+        self.requests = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.delay = 0.05
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests.append((self.path, self.client_address[1]))
+                    stub.active += 1
+                    stub.peak = max(stub.peak, stub.active)
+                    responses = stub.routes.get(self.path) or [(404, {'error': 'Model not found'}, {})]
+                    status, body, headers = responses.pop(0) if len(responses) > 1 else responses[0]
+                time.sleep(stub.delay)
+                if headers.get('ETag') and self.headers.get('If-None-Match') == headers['ETag']:
+                    status, payload = 304, b''
+                else:
+                    payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+                with stub.lock:
+                    stub.active -= 1
+
+            def do_POST(self):
+                hashes = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.posts.append(hashes)
+                    found = [stub.versions[h.upper()] for h in hashes if h.upper() in stub.versions]
+                payload = json.dumps(found).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}/api/v1'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubCivitai()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def client(stub, monkeypatch, tmp_path):
+    monkeypatch.setattr(civitai_client, 'BACKOFF_BASE_SECONDS', 0.01)
+    now = [1000.0]
+    responses = civitai_response_cache.CivitaiResponseCache(path=tmp_path / 'responses.json', ttl=60, clock=lambda: now[0])
+    responses.now = now
+    test_client = civitai_client.CivitaiClient(
+        base_url=stub.base_url, max_concurrency=3, requests_per_second=0, max_retries=2, timeout=5, responses=responses,
+    )
+    old = civitai_client.set_civitai_client(test_client)
+    yield test_client
+    civitai_client.set_civitai_client(old)
+    test_client.close()
+
+
+def test_client_reuses_connections_and_retries_after_429(stub, client):
+    stub.routes['/api/v1/models/1'] = [
+        (429, {'error': 'Too many requests'}, {'Retry-After': '0'}),
+        (200, {'id': 1}, {}),
+    ]
+    assert client.get_json('/models/1') == {'id': 1}
+    assert client.get_json('/models/1') == {'id': 1}
+    assert [path for path, _ in stub.requests] == ['/api/v1/models/1'] * 3
+    # All three requests went over the same pooled connection.
+    assert len({port for _, port in stub.requests}) == 1
+
+    stub.routes['/api/v1/models/2'] = [(429, {'error': 'Too many requests'}, {})]
+    result = client.get_json('/models/2')
+    assert result['civitai_error'] == 'Too many requests' and '429' in result['error']
+    assert len(stub.requests) == 3 + 1 + client.max_retries
+
+    result = client.get_json('/models/3')
+    assert result['civitai_error'] == 'Model not found'
+
+
+def test_token_bucket_limits_rate_and_pauses():
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    bucket = civitai_client.TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+    assert [bucket.acquire() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+    bucket.pause(3)
+    assert bucket.acquire() == pytest.approx(3)
+    assert now[0] == pytest.approx(3.5)
+
+    assert civitai_client.parse_retry_after('12') == 12
+    assert civitai_client.parse_retry_after('Wed, 21 Oct 2015 07:28:10 GMT', now=1445412480) == 10
+    assert civitai_client.parse_retry_after('soon') is None
+
+
+def test_identical_concurrent_requests_are_coalesced(stub, client):
+    stub.delay = 0.3
+    stub.routes['/api/v1/models/5'] = [(200, {'id': 5}, {})]
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.get_json('/models/5'))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [{'id': 5}] * 5
+    assert len(stub.requests) == 1
+    # Each caller got its own copy.
+    assert len({id(result) for result in results}) == 5
+
+
+def test_cached_responses_expire_and_revalidate_with_etag(stub, client, tmp_path):
+    stub.routes['/api/v1/models/7'] = [(200, {'id': 7, 'modelVersions': []}, {'ETag': '"v1"'})]
+    assert client.get_json('/models/7', cached=True)['id'] == 7
+    assert client.get_json('/models/7', cached=True)['id'] == 7
+    assert len(stub.requests) == 1
+
+    # Once the TTL has passed, an unchanged payload is revalidated (304) rather than downloaded.
+    client.responses.now[0] += 61
+    assert client.get_json('/models/7', cached=True)['id'] == 7
+    assert len(stub.requests) == 2
+    assert client.get_json('/models/7', cached=True)['id'] == 7
+    assert len(stub.requests) == 2
+
+    # Uncached calls and errors always go to Civitai; errors aren't stored.
+    assert client.get_json('/models/7')['id'] == 7
+    assert 'error' in client.get_json('/models/8', cached=True)
+    assert 'error' in client.get_json('/models/8', cached=True)
+    assert len(stub.requests) == 5
+
+    assert client.responses.save()
+    reloaded = civitai_response_cache.CivitaiResponseCache(path=tmp_path / 'responses.json', ttl=60, clock=lambda: client.responses.now[0])
+    assert reloaded.data(stub.base_url + '/models/7') == {'id': 7, 'modelVersions': []}
+    assert reloaded.get(stub.base_url + '/models/8') is None
+
+
+@pytest.fixture
+def test_cache(tmp_path, monkeypatch):
+    users_path = tmp_path / 'SageUtils'
+    (users_path / 'backup').mkdir(parents=True)
+    monkeypatch.setattr(path_manager, 'sage_users_path', users_path)
+    monkeypatch.setattr(path_manager, 'backup_path', users_path / 'backup')
+    monkeypatch.setattr(model_cache_module, 'get_setting_or_default', lambda key, default: 0 if key == 'model_cache_watch_interval' else default)
+    test_cache = model_cache_module.SageCache()
+    test_cache.load()
+    monkeypatch.setattr(model_metadata, 'cache', test_cache)
+    return test_cache
+
+
+def test_pull_metadata_fans_out_lookups(tmp_path, test_cache, stub, client):
+    paths = []
+    for i in range(6):
+        path = tmp_path / f'lora_{i}.safetensors'
+        path.write_bytes(bytes([i]) * 100)
+        paths.append(str(path))
+    hashes = model_metadata.hash_files_for_scan(paths)
+    for i, path in enumerate(paths[:4]):
+        # Four versions of two models
+        version = {'id': 100 + i, 'modelId': i % 2, 'name': f'v{i}', 'model': {'type': 'LORA', 'name': f'L{i}'}, 'files': [{'hashes': {'AutoV2': hashes[path].upper()}}]}
+        stub.versions[hashes[path].upper()] = version
+    for model_id in (0, 1):
+        stub.routes[f'/api/v1/models/{model_id}'] = [(200, {'modelVersions': []}, {})]
+
+    model_metadata.pull_metadata(paths, known_hashes=hashes)
+
+    assert stub.peak > 1
+    assert stub.peak <= client.max_concurrency
+    # One bulk request found four files; only the two misses were looked up one by one.
+    assert len(stub.posts) == 1
+    assert sorted(path for path, _ in stub.requests if '/by-hash/' in path) == sorted(
+        f'/api/v1/model-versions/by-hash/{hashes[path]}' for path in paths[4:]
+    )
+    # Each model's payload was fetched once, however many of its versions were looked up.
+    assert sorted(path for path, _ in stub.requests if path.startswith('/api/v1/models/')) == ['/api/v1/models/0', '/api/v1/models/1']
+    assert (tmp_path / 'responses.json').is_file()
+    for i, path in enumerate(paths[:4]):
+        assert test_cache.by_path(path)['id'] == 100 + i
+        assert test_cache.by_path(path)['civitai'] == 'True'
+    for path in paths[4:]:
+        assert test_cache.by_path(path)['civitai'] == 'False'
+        assert test_cache.by_path(path)['blacklist'] is True
+
+
+def test_batch_hash_lookup_chunks_and_matches_any_file_hash(stub, client):
+    client.hash_batch_size = 2
+    stub.versions = {
+        'AAAAAAAAAA': {'id': 1, 'files': [{'hashes': {'AutoV2': 'AAAAAAAAAA', 'AutoV3': 'CCCCCCCCCCCC'}}]},
+        'CCCCCCCCCCCC': {'id': 1, 'files': [{'hashes': {'AutoV2': 'AAAAAAAAAA', 'AutoV3': 'CCCCCCCCCCCC'}}]},
+        'BBBBBBBBBB': {'id': 2, 'files': [{'hashes': {'AutoV2': 'BBBBBBBBBB'}}]},
+    }
+
+    found = helpers_civitai.get_civitai_model_versions_by_hashes(['aaaaaaaaaa', 'bbbbbbbbbb', 'cccccccccccc', 'dddddddddd', 'aaaaaaaaaa'])
+
+    assert stub.posts == [['aaaaaaaaaa', 'bbbbbbbbbb'], ['cccccccccccc', 'dddddddddd']]
+    assert {h: v['id'] for h, v in found.items()} == {'aaaaaaaaaa': 1, 'bbbbbbbbbb': 2, 'cccccccccccc': 1}
+
+
+def test_files_not_on_civitai_are_rechecked_with_backoff(tmp_path, monkeypatch, test_cache, stub, client):
+    settings = {'civitai_recheck_hours': 2, 'civitai_recheck_max_days': 0.25}
+    monkeypatch.setattr(model_metadata, 'get_setting_or_default', lambda key, default: settings.get(key, default))
+    path = tmp_path / 'private_lora.safetensors'
+    path.write_bytes(b'trained locally')
+    path = str(path)
+    file_hash = model_metadata.hash_files_for_scan([path])[path]
+    stub.routes[f'/api/v1/model-versions/by-hash/{file_hash}'] = [(404, {'error': 'Not found'}, {})]
+
+    def pull_and_count():
+        before = len(stub.requests)
+        model_metadata.pull_metadata(path, known_hashes={path: file_hash})
+        return len(stub.requests) - before
+
+    assert pull_and_count() == 1
+    entry = test_cache.by_path(path)
+    assert entry['civitai'] == 'False' and entry['civitai_failed_count'] == 1
+    assert not entry.get('blacklist')
+    delay = datetime.datetime.fromisoformat(entry['next_check_at']) - datetime.datetime.now()
+    assert datetime.timedelta(hours=1.9) < delay <= datetime.timedelta(hours=2)
+
+    # Later runs don't ask Civitai again until the recheck is due.
+    assert pull_and_count() == 0
+    assert pull_and_count() == 0
+
+    entry['next_check_at'] = (datetime.datetime.now() - datetime.timedelta(minutes=1)).isoformat()
+    assert pull_and_count() == 1
+    assert entry['civitai_failed_count'] == 2
+    assert model_metadata.civitai_recheck_delay(2) == datetime.timedelta(hours=4)
+    assert model_metadata.civitai_recheck_delay(3) == datetime.timedelta(hours=6)
+
+    # A forced pull ignores the wait, and a match clears it.
+    stub.routes[f'/api/v1/model-versions/by-hash/{file_hash}'] = [(200, {'id': 1, 'files': []}, {})]
+    assert pull_and_count() == 0
+    model_metadata.pull_metadata(path, force_all=True)
+    assert entry['civitai'] == 'True' and entry['civitai_failed_count'] == 0
+    assert entry['next_check_at'] is None
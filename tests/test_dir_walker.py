@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from comfyui_sageutils.utils import dir_walker
+from comfyui_sageutils.utils.file_utils import get_files_in_dir
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'models'
+    (root / 'sub' / 'deeper').mkdir(parents=True)
+    (root / 'a.safetensors').write_bytes(b'a' * 10)
+    (root / 'sub' / 'B.SAFETENSORS').write_bytes(b'b')
+    (root / 'sub' / 'deeper' / 'c.ckpt').write_bytes(b'c')
+    (root / 'sub' / 'notes.txt').write_text('x')
+    # A directory named like a model file is descended into, not reported
+    (root / 'odd.safetensors').mkdir()
+    (root / 'odd.safetensors' / 'd.safetensors').write_bytes(b'd')
+    dir_walker.invalidate_snapshots()
+    yield root
+    dir_walker.invalidate_snapshots()
+
+
+def test_walk_filters_by_extension(tree):
+    walked = {w.relative_path: w for w in dir_walker.walk_files(str(tree), ['.safetensors', '.ckpt'])}
+    assert set(walked) == {
+        'a.safetensors',
+        os.path.join('sub', 'B.SAFETENSORS'),
+        os.path.join('sub', 'deeper', 'c.ckpt'),
+        os.path.join('odd.safetensors', 'd.safetensors'),
+    }
+    assert walked['a.safetensors'].path == str(tree / 'a.safetensors')
+    assert walked['a.safetensors'].stat().st_size == 10
+
+    everything = {w.relative_path for w in dir_walker.walk_files(str(tree))}
+    assert os.path.join('sub', 'notes.txt') in everything and len(everything) == 5
+    assert list(dir_walker.walk_files(str(tree / 'missing'))) == []
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason='needs symlinks')
+def test_walk_follows_and_resolves_symlinks(tree, tmp_path):
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    (outside / 'e.safetensors').write_bytes(b'e')
+    os.symlink(outside, tree / 'linked')
+    # A link back to an ancestor isn't followed
+    os.symlink(tree, tree / 'sub' / 'loop')
+
+    walked = list(dir_walker.walk_files(str(tree), ['.safetensors'], resolve=True, use_snapshot=False))
+    paths = [w.path for w in walked]
+    assert str((outside / 'e.safetensors').resolve()) in paths
+    assert paths.count(str((tree / 'a.safetensors').resolve())) == 1
+    assert all(os.path.realpath(path) == path for path in paths)
+
+
+def test_repeated_walks_come_from_the_snapshot(tree, monkeypatch):
+    first = [w.path for w in dir_walker.walk_files(str(tree), ['.ckpt'])]
+    (tree / 'new.ckpt').write_bytes(b'n')
+
+    scanned = []
+    original_scan = dir_walker._scan
+    monkeypatch.setattr(dir_walker, '_scan', lambda *args: scanned.append(args) or original_scan(*args))
+
+    assert [w.path for w in dir_walker.walk_files(str(tree), ['.ckpt'])] == first
+    assert scanned == []
+
+    # Invalidating anything under the walked root, or walking past the snapshot, sees the new file
+    dir_walker.invalidate_snapshots(str(tree / 'new.ckpt'))
+    assert len(list(dir_walker.walk_files(str(tree), ['.ckpt']))) == 2
+    (tree / 'newer.ckpt').write_bytes(b'n')
+    assert len(list(dir_walker.walk_files(str(tree), ['.ckpt'], use_snapshot=False))) == 3
+    assert len(scanned) == 2
+
+    monkeypatch.setattr(dir_walker, 'SNAPSHOT_SECONDS', 0)
+    (tree / 'newest.ckpt').write_bytes(b'n')
+    assert len(list(dir_walker.walk_files(str(tree), ['.ckpt']))) == 4
+
+
+def test_get_files_in_dir_uses_relative_paths(tree):
+    assert get_files_in_dir(str(tree), ['.ckpt', '.txt']) == sorted([
+        os.path.join('sub', 'deeper', 'c.ckpt'),
+        os.path.join('sub', 'notes.txt'),
+    ])
+    assert get_files_in_dir([str(tree), ''], '.CKPT') == [os.path.join('sub', 'deeper', 'c.ckpt')]
+    with pytest.raises(ValueError):
+        get_files_in_dir(None)
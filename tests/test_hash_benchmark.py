@@ -0,0 +1,42 @@
+import hashlib
+import json
+
+from comfyui_sageutils.tools import hash_benchmark as tool
+
+
+def test_mmap_hash_matches_hashlib(tmp_path):
+    path = tmp_path / 'model.safetensors'
+    data = bytes(range(256)) * 5000
+    path.write_bytes(data)
+
+    assert tool.hash_file_mmap(str(path), buffer_size=4096) == hashlib.sha256(data).hexdigest()
+    (tmp_path / 'empty.bin').write_bytes(b'')
+    assert tool.hash_file_mmap(str(tmp_path / 'empty.bin')) == hashlib.sha256(b'').hexdigest()
+
+
+def test_run_hash_benchmark_reports_every_strategy(tmp_path):
+    output = tmp_path / 'report.json'
+    report = tool.run_hash_benchmark(
+        directory=tmp_path,
+        sizes=[3 * 1024 * 1024, 1024 * 1024],
+        buffer_sizes=[256 * 1024, 1024 * 1024],
+        workers=[1, 2],
+        algorithms=['sha256'],
+        output_path=output,
+    )
+
+    # 2 methods x 2 buffer sizes x 2 worker counts, plus the scan path per worker count
+    assert len(report['results']) == 10
+    assert {r['method'] for r in report['results']} == {'read', 'mmap', 'scan'}
+    assert all(r['mb_per_s'] > 0 for r in report['results'])
+    assert report['total_bytes'] == 4 * 1024 * 1024
+    assert set(report['timings']['runtime_stats']) == {r['strategy'] for r in report['results']}
+    assert json.loads(output.read_text(encoding='utf-8'))['results'] == report['results']
+    # Generated files are cleaned up
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['report.json']
+
+
+def test_parse_size():
+    assert tool.parse_size('512M') == 512 * 1024 * 1024
+    assert tool.parse_size('2GiB') == 2 * 1024 ** 3
+    assert tool.parse_size('4096') == 4096
@@ -0,0 +1,396 @@
+"""Tests for the parallel model hashing engine."""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+
+import pytest
+
+from comfyui_sageutils.utils import hash_queue, hashing
+from comfyui_sageutils.utils.constants import MODEL_FILE_EXTENSIONS
+from comfyui_sageutils.utils import model_cache as model_cache_module
+from comfyui_sageutils.utils import model_metadata
+from comfyui_sageutils.utils.file_utils import get_file_sha256
+from comfyui_sageutils.utils.library_index import LibraryIndex
+from comfyui_sageutils.utils.path_manager import path_manager
+
+
+def make_files(tmp_path, count=6):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f'model_{i}.safetensors'
+        # Sizes around the buffer size exercise partial and exact final reads.
+        path.write_bytes(bytes([i]) * (1000 + i * 512))
+        paths.append(str(path))
+    return paths
+
+
+def write_safetensors(path, metadata, payload):
+    header = json.dumps({'__metadata__': metadata, 't': {'dtype': 'U8', 'shape': [len(payload)], 'data_offsets': [0, len(payload)]}}).encode()
+    path.write_bytes(struct.pack('<Q', len(header)) + header + payload)
+    return str(path)
+
+
+def test_hash_file_matches_hashlib_across_buffer_sizes(tmp_path):
+    path = tmp_path / 'model.safetensors'
+    data = bytes(range(256)) * 100
+    path.write_bytes(data)
+    expected = hashlib.sha256(data).hexdigest()
+
+    for buffer_size in (1, 256, 4096, len(data), hashing.DEFAULT_BUFFER_SIZE):
+        assert hashing.hash_file(str(path), buffer_size=buffer_size) == expected
+    assert get_file_sha256(str(path)) == expected[:10]
+
+
+def test_engine_hashes_in_parallel_within_device_limit(tmp_path, monkeypatch):
+    paths = make_files(tmp_path)
+    active, peak = 0, 0
+    lock = threading.Lock()
+    real_hash_file = hashing.hash_file
+
+    def tracking_hash_file(path, **kwargs):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        try:
+            return real_hash_file(path, **kwargs)
+        finally:
+            with lock:
+                active -= 1
+
+    monkeypatch.setattr(hashing, 'hash_file', tracking_hash_file)
+    seen = []
+    engine = hashing.HashingEngine(max_workers=4, per_device=2, buffer_size=700)
+    results = engine.hash_files(paths + [str(tmp_path / 'missing.safetensors')], on_result=lambda p, d, e: seen.append((p, e is None)))
+
+    assert results == {p: hashlib.sha256(open(p, 'rb').read()).hexdigest() for p in paths}
+    assert peak <= 2  # all files are on the same device
+    assert len(seen) == len(paths) + 1
+    assert (str(tmp_path / 'missing.safetensors'), False) in seen
+
+    assert hashing.HashingEngine(max_workers=2).hash_files(paths, should_cancel=lambda: True) == {}
+
+
+@pytest.fixture
+def test_cache(tmp_path, monkeypatch):
+    users_path = tmp_path / 'SageUtils'
+    (users_path / 'backup').mkdir(parents=True)
+    monkeypatch.setattr(path_manager, 'sage_users_path', users_path)
+    monkeypatch.setattr(path_manager, 'backup_path', users_path / 'backup')
+    monkeypatch.setattr(model_cache_module, 'get_setting_or_default', lambda key, default: 0 if key == 'model_cache_watch_interval' else default)
+    test_cache = model_cache_module.SageCache()
+    test_cache.load()
+    monkeypatch.setattr(model_metadata, 'cache', test_cache)
+    return test_cache
+
+
+def test_hash_files_for_scan_skips_cached_files_unless_forced(tmp_path, test_cache):
+    paths = make_files(tmp_path, count=3)
+    test_cache.hash[paths[0]] = 'cached'
+
+    hashes = model_metadata.hash_files_for_scan(paths)
+    assert set(hashes) == set(paths[1:])
+    assert hashes[paths[1]] == get_file_sha256(paths[1])
+
+    assert set(model_metadata.hash_files_for_scan(paths, force=True)) == set(paths)
+
+
+def test_forced_rescan_reuses_hashes_of_unchanged_files(tmp_path, test_cache, monkeypatch):
+    paths = make_files(tmp_path, count=3)
+    first = model_metadata.hash_files_for_scan(paths)
+    test_cache.hash.update(first)
+    test_cache.save()
+
+    # A fresh process loads the fingerprints from disk.
+    reloaded = model_cache_module.SageCache()
+    reloaded.load()
+    assert set(reloaded.fingerprints) == set(paths)
+    monkeypatch.setattr(model_metadata, 'cache', reloaded)
+
+    hashed = []
+    real_hash_model_file = hashing.hash_model_file
+    monkeypatch.setattr(model_metadata, 'hash_model_file', lambda path, **kwargs: hashed.append(path) or real_hash_model_file(path, **kwargs))
+
+    assert model_metadata.hash_files_for_scan(paths, force=True) == first
+    assert hashed == []
+    assert model_metadata.recheck_hash(paths[0], first[paths[0]]) == first[paths[0]]
+    assert hashed == []
+
+    # Rewriting a file changes its fingerprint; verify rehashes everything.
+    with open(paths[1], 'ab') as f:
+        f.write(b'more')
+    os.utime(paths[1], ns=(1, 1))
+    rescanned = model_metadata.hash_files_for_scan(paths, force=True)
+    assert hashed == [paths[1]]
+    assert rescanned[paths[1]] != first[paths[1]]
+
+    hashed.clear()
+    model_metadata.hash_files_for_scan(paths, force=True, verify=True)
+    assert sorted(hashed) == sorted(paths)
+
+
+def test_autov3_ignores_safetensors_header(tmp_path):
+    payload = bytes(range(256)) * 50
+    first = write_safetensors(tmp_path / 'a.safetensors', {'name': 'a'}, payload)
+    edited = write_safetensors(tmp_path / 'b.safetensors', {'name': 'a much longer edited name'}, payload)
+
+    digests = hashing.hash_model_file(first, buffer_size=100)
+    assert digests['sha256'] == hashlib.sha256(open(first, 'rb').read()).hexdigest()
+    assert digests['autov3'] == hashlib.sha256(payload).hexdigest()
+    edited_digests = hashing.hash_model_file(edited)
+    assert edited_digests['autov3'] == digests['autov3']
+    assert edited_digests['sha256'] != digests['sha256']
+
+    not_safetensors = tmp_path / 'c.ckpt'
+    not_safetensors.write_bytes(payload)
+    assert 'autov3' not in hashing.hash_model_file(str(not_safetensors))
+    assert hashing.safetensors_payload_offset(str(tmp_path / 'missing.safetensors')) is None
+
+
+def test_blake3_is_computed_only_when_enabled(tmp_path, monkeypatch):
+    path = write_safetensors(tmp_path / 'a.safetensors', {'name': 'a'}, bytes(range(256)) * 50)
+    fake_blake3 = type('blake3', (), {'blake3': staticmethod(hashlib.sha512)})
+    monkeypatch.setattr(hashing, '_blake3', fake_blake3, raising=False)
+    monkeypatch.setattr(hashing, '_BLAKE3_AVAILABLE', True)
+
+    assert 'blake3' not in hashing.hash_model_file(path)
+    assert hashing.hash_model_file(path, blake3=True)['blake3'] == hashlib.sha512(open(path, 'rb').read()).hexdigest()
+    monkeypatch.setattr(hashing, 'get_setting_or_default', lambda key, default: True if key == 'model_hash_blake3' else default)
+    assert 'blake3' in hashing.hash_model_file(path)
+
+
+def test_renamed_and_header_edited_files_keep_their_metadata(tmp_path, test_cache, monkeypatch):
+    payload = bytes(range(256)) * 50
+    original = write_safetensors(tmp_path / 'a.safetensors', {'name': 'a'}, payload)
+    original_hash = model_metadata.add_file_to_cache(original)
+    test_cache.info[original_hash].update({'civitai': 'True', 'id': 7, 'model': {'type': 'LORA', 'name': 'A'}})
+
+    # A rename keeps size, mtime and inode, so nothing is rehashed.
+    renamed = str(tmp_path / 'renamed.safetensors')
+    os.rename(original, renamed)
+    real_hash_model_file = model_metadata.hash_model_file
+    monkeypatch.setattr(model_metadata, 'hash_model_file', lambda *args, **kwargs: pytest.fail('rehashed a renamed file'))
+    assert model_metadata.hash_files_for_scan([renamed]) == {renamed: original_hash}
+    monkeypatch.setattr(model_metadata, 'hash_model_file', real_hash_model_file)
+
+    # A copy with an edited header has a new AutoV2 hash but starts with the original's metadata.
+    edited = write_safetensors(tmp_path / 'edited.safetensors', {'name': 'edited'}, payload)
+    edited_hash = model_metadata.add_file_to_cache(edited)
+    assert edited_hash != original_hash
+    assert model_metadata.local_autov3(edited) == model_metadata.local_autov3(renamed)
+    assert test_cache.info[edited_hash]['id'] == 7
+    assert test_cache.info[edited_hash]['hash'] == edited_hash
+    autov3 = model_metadata.local_autov3(edited)
+    assert sorted(test_cache.fingerprint_index.paths_with_autov3(autov3)) == sorted([original, renamed, edited])
+
+    # Civitai is asked for the AutoV3 hash when the AutoV2 hash isn't found.
+    lookups = []
+
+    def by_hash(hash_value):
+        lookups.append(hash_value)
+        if hash_value == edited_hash:
+            return {'error': 'Model not found', 'civitai_error': 'Model not found'}
+        return {'id': 7, 'modelId': 3, 'name': 'v1', 'model': {'type': 'LORA', 'name': 'A'}, 'files': []}
+
+    monkeypatch.setattr(model_metadata, 'get_civitai_model_version_json_by_hash', by_hash)
+    monkeypatch.setattr(model_metadata, 'get_latest_model_version', lambda model_id: 7)
+    model_metadata.pull_metadata(edited, force_all=True)
+    assert lookups == [edited_hash, model_metadata.local_autov3(edited)]
+    assert test_cache.info[edited_hash]['civitai'] == 'True'
+    assert not test_cache.info[edited_hash].get('blacklist')
+
+
+def test_renamed_file_matches_only_a_record_from_the_same_device(tmp_path, test_cache, monkeypatch):
+    path = make_files(tmp_path, count=1)[0]
+    original_hash = model_metadata.add_file_to_cache(path)
+    record = test_cache.fingerprints[path]
+    assert record['device'] == os.stat(path).st_dev
+
+    # The same size, mtime and inode on another disk is a different file
+    renamed = str(tmp_path / 'renamed.safetensors')
+    os.rename(path, renamed)
+    test_cache.fingerprints[path] = dict(record, device=record['device'] + 1)
+    assert model_metadata.fingerprinted_hash(renamed) is None
+
+    # Records saved before the device was recorded are still trusted for their own path
+    legacy = {key: value for key, value in record.items() if key != 'device'}
+    test_cache.fingerprints[renamed] = legacy
+    assert model_metadata.fingerprinted_hash(renamed) == original_hash
+    del test_cache.fingerprints[renamed]
+    test_cache.fingerprints[path] = legacy
+    assert model_metadata.fingerprinted_hash(renamed) is None
+
+
+def test_moved_file_is_found_through_the_fingerprint_index(tmp_path, test_cache):
+    paths = make_files(tmp_path, count=3)
+    hashes = [model_metadata.add_file_to_cache(path) for path in paths]
+    index = test_cache.fingerprint_index
+    key = index.stat_key(test_cache.fingerprints[paths[1]])
+    assert index.paths_with_stat(key) == [paths[1]]
+
+    moved = str(tmp_path / 'moved.safetensors')
+    os.rename(paths[1], moved)
+    assert model_metadata.fingerprinted_hash(moved) == hashes[1]
+
+    # Replaced and removed records are re-indexed by the section's listener
+    test_cache.fingerprints[moved] = test_cache.fingerprints[paths[1]]
+    del test_cache.fingerprints[paths[1]]
+    assert index.paths_with_stat(key) == [moved]
+    test_cache.fingerprints[moved] = dict(test_cache.fingerprints[moved], size=0)
+    assert index.paths_with_stat(key) == []
+    assert model_metadata.fingerprinted_hash(moved) is None
+    assert test_cache.fingerprint_index is index
+
+
+def test_quick_fingerprint_samples_and_ignores_the_name(tmp_path):
+    data = bytearray(os.urandom(64 * 1024))
+    a = tmp_path / 'a.ckpt'
+    a.write_bytes(bytes(data))
+    b = tmp_path / 'b.ckpt'
+    b.write_bytes(bytes(data))
+    assert hashing.quick_fingerprint(str(a), sample_size=1024) == hashing.quick_fingerprint(str(b), sample_size=1024)
+
+    # A change inside a sample changes it; a change between samples only shows up in the full hash.
+    data[0] ^= 0xFF
+    b.write_bytes(bytes(data))
+    assert hashing.quick_fingerprint(str(a), sample_size=1024) != hashing.quick_fingerprint(str(b), sample_size=1024)
+    data[0] ^= 0xFF
+    data[5000] ^= 0xFF
+    b.write_bytes(bytes(data))
+    assert hashing.quick_fingerprint(str(a), sample_size=1024) == hashing.quick_fingerprint(str(b), sample_size=1024)
+    assert hashing.hash_file(str(a)) != hashing.hash_file(str(b))
+
+
+def test_loaders_hash_large_new_files_in_the_background(tmp_path, test_cache, monkeypatch):
+    paths = make_files(tmp_path, count=2)
+    copy_path = tmp_path / 'copy.safetensors'
+    copy_path.write_bytes(open(paths[0], 'rb').read())
+    monkeypatch.setattr(model_metadata, 'full_hash_defer_bytes', lambda: 1)
+    monkeypatch.setattr(model_metadata, 'get_civitai_model_version_json_by_hash', lambda h: {'error': 'Model not found', 'civitai_error': 'Model not found'})
+
+    release = threading.Event()
+    real_runner = model_metadata.hash_queue.runner
+    monkeypatch.setattr(model_metadata.hash_queue, 'runner', lambda *args, **kwargs: release.wait(5) and real_runner(*args, **kwargs))
+
+    model_metadata.pull_and_update_model_timestamp(paths[0], model_type='lora')
+    # The loader returned with only the quick fingerprint recorded.
+    assert paths[0] not in test_cache.hash
+    record = test_cache.fingerprints[paths[0]]
+    assert record['quick_source'] == hashing.QUICK_FINGERPRINT_SOURCE and 'hash' not in record
+    assert model_metadata.pending_full_hashes() == [paths[0]]
+
+    release.set()
+    assert model_metadata.hash_queue.wait_idle(timeout=5)
+    assert model_metadata.pending_full_hashes() == []
+    assert test_cache.hash[paths[0]] == get_file_sha256(paths[0])
+    assert test_cache.get_last_used_by_path(paths[0]) is not None
+    record = test_cache.fingerprints[paths[0]]
+    assert record['hash_source'] == hashing.FULL_HASH_SOURCE and record['quick'] == hashing.quick_fingerprint(paths[0])
+    assert test_cache.by_path(paths[0])['model_type'] == 'lora'
+
+    # Files with the same quick fingerprint are duplicate candidates, confirmed once both full hashes match.
+    model_metadata.hash_files_for_scan([str(copy_path), paths[1]])
+    candidates = model_metadata.duplicate_candidates()
+    assert candidates == [{'quick': record['quick'], 'paths': sorted([paths[0], str(copy_path)]), 'confirmed': True}]
+
+
+def test_model_info_nodes_hash_large_new_files_in_the_background(tmp_path, test_cache, monkeypatch):
+    model_info = pytest.importorskip('comfyui_sageutils.utils.model_info')
+
+    paths = make_files(tmp_path, count=2)
+    monkeypatch.setattr(model_info, 'cache', test_cache)
+    monkeypatch.setattr(model_info.folder_paths, 'get_full_path_or_raise', lambda folder, name: str(tmp_path / name))
+    monkeypatch.setattr(model_metadata, 'full_hash_defer_bytes', lambda: 1500)
+    monkeypatch.setattr(model_metadata, 'get_civitai_model_version_json_by_hash', lambda h: {'error': 'Model not found', 'civitai_error': 'Model not found'})
+
+    release = threading.Event()
+    real_runner = model_metadata.hash_queue.runner
+    monkeypatch.setattr(model_metadata.hash_queue, 'runner', lambda path, **kwargs: (path != paths[1] or release.wait(5)) and real_runner(path, **kwargs))
+
+    # model_1 is over the threshold: the selector returns without its hash, which is filled in in the background.
+    (info,) = model_info.get_model_info_clips(['model_0.safetensors', 'model_1.safetensors'])
+    assert info['hash'] == [get_file_sha256(paths[0]), '']
+    assert model_metadata.pending_full_hashes() == [paths[1]]
+
+    release.set()
+    assert model_metadata.hash_queue.wait_idle(timeout=5)
+    assert test_cache.hash[paths[1]] == get_file_sha256(paths[1])
+    assert test_cache.get_last_used_by_path(paths[1]) is not None
+    (info,) = model_info.get_model_info_vae('model_1.safetensors')
+    assert info['hash'] == get_file_sha256(paths[1])
+
+
+def test_hash_queue_runs_by_priority_and_never_twice():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def runner(path, **options):
+        calls.append((path, options))
+        if path == 'busy':
+            started.set()
+            release.wait(5)
+        return path.upper()
+
+    queue = hash_queue.HashQueue(runner, name='TestHashQueue')
+    busy = queue.submit('busy')
+    assert started.wait(5)
+    queue.submit('watched', hash_queue.PRIORITY_WATCHER)
+    queue.submit('loaded', hash_queue.PRIORITY_LOADER, timestamp=True)
+    # Submitting again merges into the queued job and can move it up.
+    assert queue.submit('watched', hash_queue.PRIORITY_NOW, timestamp=True) is queue.submit('watched')
+
+    # A job still waiting in the queue is taken over by run_now() instead of running twice.
+    assert queue.run_now('loaded') == 'LOADED'
+    # run_now() on a running job waits for it.
+    waiter = threading.Thread(target=lambda: calls.append(('waited', queue.run_now('busy'))))
+    waiter.start()
+    release.set()
+    waiter.join(5)
+    assert busy.result(5) == 'BUSY'
+    assert queue.wait_idle(timeout=5)
+
+    assert [path for path, _ in calls if path != 'waited'] == ['busy', 'loaded', 'watched']
+    assert ('waited', 'BUSY') in calls
+    assert ('watched', {'timestamp': True}) in calls
+    assert sum(1 for path, _ in calls if path == 'busy') == 1
+
+
+def test_model_folder_watcher_reports_settled_new_files(tmp_path):
+    (tmp_path / 'old.safetensors').write_bytes(b'old')
+    index = LibraryIndex(path=tmp_path / 'sage_library_index.json', poll_interval=0, watch=False)
+    ready = []
+    now = [100]
+    watcher = hash_queue.ModelFolderWatcher([str(tmp_path)], ready.append, index=index, settle_seconds=5, clock=lambda: now[0])
+    # The library index tells the watcher what changed
+    index.add_listener(watcher.folders, MODEL_FILE_EXTENSIONS, watcher.files_changed)
+    assert watcher.tick() == []
+
+    new_file = tmp_path / 'sub' / 'new.safetensors'
+    new_file.parent.mkdir()
+    new_file.write_bytes(b'partial')
+    (tmp_path / 'notes.txt').write_text('not a model')
+    index.mark_changed(str(new_file))
+    index.check()
+    assert watcher.tick(now=100) == []
+
+    # Still being written: the settle timer restarts.
+    new_file.write_bytes(b'partial and more')
+    assert watcher.tick(now=104) == []
+    assert watcher.tick(now=106) == []
+    assert watcher.tick(now=109) == [str(new_file)]
+    assert ready == [str(new_file)]
+    assert watcher.tick(now=200) == []
+
+    # Reported again only when the index sees it change
+    index.mark_changed(str(new_file))
+    index.check()
+    assert watcher.tick(now=300) == []
+    new_file.write_bytes(b'rewritten in place')
+    index.mark_changed(str(new_file))
+    now[0] = 400
+    index.check()
+    assert watcher.tick(now=406) == [str(new_file)]
@@ -0,0 +1,163 @@
+import os
+import shutil
+
+import pytest
+
+from comfyui_sageutils.utils import library_index as library_index_module
+from comfyui_sageutils.utils import model_discovery
+from comfyui_sageutils.utils.library_index import LibraryIndex
+
+EXTENSIONS = ['.safetensors', '.ckpt']
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'models'
+    (root / 'sub' / 'deeper').mkdir(parents=True)
+    (root / 'a.safetensors').write_bytes(b'a' * 10)
+    (root / 'sub' / 'B.SAFETENSORS').write_bytes(b'b')
+    (root / 'sub' / 'deeper' / 'c.ckpt').write_bytes(b'c')
+    (root / 'sub' / 'notes.txt').write_text('x')
+    return root
+
+
+def make_index(tmp_path):
+    return LibraryIndex(path=tmp_path / 'sage_library_index.json', poll_interval=0, watch=False)
+
+
+def bump_mtime(path):
+    # Directory mtimes can be coarse; make sure a change is visible
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_files_counts_and_fingerprints(tree, tmp_path):
+    index = make_index(tmp_path)
+    expected = sorted(['a.safetensors', os.path.join('sub', 'B.SAFETENSORS'), os.path.join('sub', 'deeper', 'c.ckpt')])
+    assert index.files(str(tree), EXTENSIONS) == expected
+    assert index.count(str(tree), EXTENSIONS) == 3
+    assert index.count(str(tree)) == 4
+    assert index.fingerprint(str(tree), 'a.safetensors', EXTENSIONS)[0] == 10
+    assert index.fingerprint(str(tree), 'missing.ckpt', EXTENSIONS) is None
+    assert index.files(str(tmp_path / 'missing'), EXTENSIONS) == []
+
+    # Answers are reused until the folder changes
+    assert index.files(str(tree), EXTENSIONS) is index.files(str(tree), EXTENSIONS)
+
+
+def test_changes_are_picked_up_by_directory(tree, tmp_path, monkeypatch):
+    index = make_index(tmp_path)
+    index.files(str(tree), EXTENSIONS)
+
+    (tree / 'sub' / 'deeper' / 'c.ckpt').unlink()
+    (tree / 'new_dir').mkdir()
+    (tree / 'new_dir' / 'd.ckpt').write_bytes(b'd')
+    bump_mtime(tree / 'sub' / 'deeper')
+    bump_mtime(tree)
+
+    # Nothing is noticed until a check (the poll) or a watchdog event
+    assert index.count(str(tree), EXTENSIONS) == 3
+    read = []
+    original_read = LibraryIndex._read_dir
+    monkeypatch.setattr(LibraryIndex, '_read_dir', lambda self, t, reldir: read.append(reldir) or original_read(self, t, reldir))
+    assert index.check() == 2
+    assert sorted(read) == sorted(['', 'new_dir', os.path.join('sub', 'deeper')])
+    assert index.files(str(tree), EXTENSIONS) == sorted([
+        'a.safetensors', os.path.join('new_dir', 'd.ckpt'), os.path.join('sub', 'B.SAFETENSORS'),
+    ])
+
+    # A watchdog event marks the directory it happened in
+    read.clear()
+    (tree / 'sub' / 'e.ckpt').write_bytes(b'e')
+    index.mark_changed(str(tree / 'sub' / 'e.ckpt'))
+    assert index.count(str(tree), EXTENSIONS) == 4
+    assert read == ['sub']
+
+    shutil.rmtree(tree / 'sub')
+    index.mark_changed(str(tree / 'sub'))
+    assert index.files(str(tree), EXTENSIONS) == ['a.safetensors', os.path.join('new_dir', 'd.ckpt')]
+
+
+def test_saved_index_is_checked_not_walked(tree, tmp_path, monkeypatch):
+    index = make_index(tmp_path)
+    index.files(str(tree), EXTENSIONS)
+    assert (tmp_path / 'sage_library_index.json').exists()
+
+    (tree / 'sub' / 'deeper' / 'f.ckpt').write_bytes(b'f')
+    bump_mtime(tree / 'sub' / 'deeper')
+
+    read = []
+    original_read = LibraryIndex._read_dir
+    monkeypatch.setattr(LibraryIndex, '_read_dir', lambda self, t, reldir: read.append(reldir) or original_read(self, t, reldir))
+    restarted = make_index(tmp_path)
+    assert restarted.count(str(tree), EXTENSIONS) == 4
+    assert read == [os.path.join('sub', 'deeper')]
+
+
+def test_get_model_list_merges_folders(tree, tmp_path, monkeypatch):
+    other = tmp_path / 'text_encoders'
+    other.mkdir()
+    (other / 'a.safetensors').write_bytes(b'a')
+    (other / 't5.gguf').write_bytes(b't')
+    monkeypatch.setattr(model_discovery.folder_paths, 'folder_names_and_paths', {
+        'clip': ([str(tree)], {'.safetensors'}),
+        'text_encoders': ([str(other)], {'.safetensors'}),
+        'clip_gguf': ([str(other)], {'.gguf'}),
+    }, raising=False)
+    monkeypatch.setattr(model_discovery, 'library_index', make_index(tmp_path))
+
+    clips = model_discovery.get_model_list('clip')
+    assert clips == sorted(['a.safetensors', os.path.join('sub', 'B.SAFETENSORS'), 't5.gguf'])
+    assert model_discovery.get_model_list('clip') is clips
+    assert model_discovery.get_model_list('loras') == []
+    assert model_discovery.get_model_list('unknown') == []
+
+
+def test_poll_interval_setting(monkeypatch, tmp_path):
+    monkeypatch.setattr(library_index_module, 'get_setting_or_default', lambda key, default: 12)
+    assert LibraryIndex(path=tmp_path / 'index.json', watch=False).poll_interval == 12.0
+
+
+def test_listeners_hear_about_added_changed_and_removed_files(tree, tmp_path):
+    index = make_index(tmp_path)
+    events = []
+    index.add_listener([str(tree)], EXTENSIONS, lambda *change: events.append(tuple(sorted(paths) for paths in change)))
+    # The first walk only builds the index
+    assert events == []
+
+    (tree / 'new.ckpt').write_bytes(b'n')
+    (tree / 'sub' / 'skipped.txt').write_text('not indexed')
+    bump_mtime(tree)
+    index.check()
+    assert events == [([str(tree / 'new.ckpt')], [], [])]
+
+    # A file rewritten in place is only seen through a watchdog event
+    events.clear()
+    (tree / 'a.safetensors').write_bytes(b'a' * 20)
+    index.mark_changed(str(tree / 'a.safetensors'))
+    index.check()
+    assert events == [([], [str(tree / 'a.safetensors')], [])]
+
+    events.clear()
+    shutil.rmtree(tree / 'sub')
+    bump_mtime(tree)
+    index.check()
+    assert events == [([], [], sorted([str(tree / 'sub' / 'B.SAFETENSORS'), str(tree / 'sub' / 'deeper' / 'c.ckpt')]))]
+
+    # A restarted index reports what changed while it wasn't running
+    index.save()
+    (tree / 'new.ckpt').unlink()
+    bump_mtime(tree)
+    restarted = make_index(tmp_path)
+    events.clear()
+    listener = lambda *change: events.append(change)
+    restarted.add_listener([str(tree)], EXTENSIONS, listener)
+    assert events == [([], [], [str(tree / 'new.ckpt')])]
+
+    events.clear()
+    restarted.remove_listener(listener)
+    (tree / 'later.ckpt').write_bytes(b'l')
+    bump_mtime(tree)
+    restarted.check()
+    assert events == []
+    assert restarted.count(str(tree), EXTENSIONS) == 2
@@ -0,0 +1,589 @@
+"""Tests for the SageCache persistence backends."""
+
+import json
+import pathlib
+import threading
+
+import pytest
+
+from comfyui_sageutils.utils import cache_sqlite
+from comfyui_sageutils.utils import model_cache as model_cache_module
+from comfyui_sageutils.utils.cache_journal import CacheJournal
+from comfyui_sageutils.utils.cache_lazy import LazyInfoEntry, capture_info, full_entry, get_model_summary
+from comfyui_sageutils.utils.cache_lock import CacheFileLock, CacheLockTimeout
+from comfyui_sageutils.utils.cache_tracking import TrackedCacheDict
+from comfyui_sageutils.utils.path_manager import path_manager
+
+
+@pytest.fixture
+def user_dir(tmp_path, monkeypatch):
+    """Point the path manager at a temporary SageUtils user directory."""
+    users_path = tmp_path / 'SageUtils'
+    backup_path = users_path / 'backup'
+    backup_path.mkdir(parents=True)
+    monkeypatch.setattr(path_manager, 'sage_users_path', users_path)
+    monkeypatch.setattr(path_manager, 'backup_path', backup_path)
+    return users_path
+
+
+def make_cache(monkeypatch, backend='json', watch_interval=0, journal=True):
+    settings = {
+        'model_cache_backend': backend,
+        'model_cache_watch_interval': watch_interval,
+        'model_cache_journal': journal,
+    }
+    monkeypatch.setattr(model_cache_module, 'get_setting_or_default', lambda key, default: settings.get(key, default))
+    return model_cache_module.SageCache()
+
+
+def write_json_cache(user_dir, hash_data, info_data):
+    (user_dir / 'sage_cache_hash.json').write_text(json.dumps(hash_data), encoding='utf-8')
+    (user_dir / 'sage_cache_info.json').write_text(json.dumps(info_data), encoding='utf-8')
+
+
+def test_json_backend_round_trip(user_dir, monkeypatch):
+    cache = make_cache(monkeypatch)
+    cache.load()
+    cache.add_or_update_entry('/models/a.safetensors', {'hash': 'abc123', 'lastUsed': ''})
+    cache.save()
+
+    reloaded = make_cache(monkeypatch)
+    reloaded.load()
+    assert reloaded.hash == {'/models/a.safetensors': 'abc123'}
+    assert reloaded.by_path('/models/a.safetensors')['hash'] == 'abc123'
+
+
+def test_sqlite_backend_migrates_json_once(user_dir, monkeypatch):
+    write_json_cache(
+        user_dir,
+        {'/models/a.safetensors': 'abc123'},
+        {'abc123': {'hash': 'abc123', 'civitai': 'True', 'lastUsed': ''}},
+    )
+
+    cache = make_cache(monkeypatch, 'sqlite')
+    cache.load()
+    assert (user_dir / 'sage_cache.db').is_file()
+    assert cache.by_path('/models/a.safetensors')['civitai'] == 'True'
+
+    # Later edits to the JSON files are not re-imported.
+    write_json_cache(user_dir, {'/models/b.safetensors': 'def456'}, {'def456': {'hash': 'def456'}})
+    reloaded = make_cache(monkeypatch, 'sqlite')
+    reloaded.load()
+    assert reloaded.hash == {'/models/a.safetensors': 'abc123'}
+
+
+def test_sqlite_backend_saves_only_changed_rows(user_dir, monkeypatch):
+    cache = make_cache(monkeypatch, 'sqlite')
+    cache.load()
+    cache.add_or_update_entry('/models/a.safetensors', {'hash': 'abc123', 'lastUsed': ''})
+    cache.add_or_update_entry('/models/b.safetensors', {'hash': 'def456', 'lastUsed': ''})
+    cache.save()
+
+    upserts = []
+    original_apply = cache.sqlite_store.apply_changes
+
+    def recording_apply(hash_upserts, hash_deletes, info_upserts, info_deletes):
+        upserts.append((dict(hash_upserts), list(hash_deletes), dict(info_upserts), list(info_deletes)))
+        original_apply(hash_upserts, hash_deletes, info_upserts, info_deletes)
+
+    monkeypatch.setattr(cache.sqlite_store, 'apply_changes', recording_apply)
+    cache.update_last_used_by_path('/models/a.safetensors')
+    cache.remove_entry('/models/b.safetensors')
+    cache.save()
+
+    assert len(upserts) == 1
+    hash_upserts, hash_deletes, info_upserts, info_deletes = upserts[0]
+    assert hash_upserts == {}
+    assert hash_deletes == ['/models/b.safetensors']
+    assert list(info_upserts) == ['abc123']
+    assert info_deletes == ['def456']
+
+    reloaded = make_cache(monkeypatch, 'sqlite')
+    reloaded.load()
+    assert reloaded.hash == {'/models/a.safetensors': 'abc123'}
+    assert reloaded.by_hash('abc123')['lastUsed'] != ''
+
+
+def test_json_backend_skips_save_when_nothing_changed(user_dir, monkeypatch):
+    write_json_cache(user_dir, {'/models/a.safetensors': 'abc123'}, {'abc123': {'hash': 'abc123'}})
+    cache = make_cache(monkeypatch, journal=False)
+    cache.load()
+
+    writes = []
+    monkeypatch.setattr(cache, '_atomic_write_json', lambda path, data: writes.append(path.name))
+    cache.hash['/models/a.safetensors'] = 'abc123'
+    cache.save()
+    assert writes == []
+
+    # Writes into an entry returned by by_path are tracked without re-assigning it.
+    cache.by_path('/models/a.safetensors')['civitai'] = 'True'
+    cache.save()
+    assert writes == ['sage_cache_info.json']
+
+
+def test_tracked_cache_dict_acknowledge_keeps_newer_changes():
+    tracked = TrackedCacheDict({'a': {'x': 1}}, wrap_entries=True)
+    assert not tracked.has_changes
+
+    tracked['a']['x'] = 2
+    changed, removed = tracked.pending_changes()
+    tracked['a']['x'] = 3
+    tracked.acknowledge(changed, removed)
+    assert tracked.has_changes
+
+    del tracked['a']
+    changed, removed = tracked.pending_changes()
+    assert changed == {} and list(removed) == ['a']
+    tracked.acknowledge(changed, removed)
+    assert not tracked.has_changes
+
+
+def test_watcher_skips_reloads_until_another_process_writes(user_dir, monkeypatch):
+    write_json_cache(user_dir, {'/models/a.safetensors': 'abc123'}, {'abc123': {'hash': 'abc123'}})
+    cache = make_cache(monkeypatch, watch_interval=60)
+    try:
+        cache.load()
+        assert cache.watcher is not None
+
+        stats = []
+        monkeypatch.setattr(cache, '_load_json_caches', lambda current_date: stats.append(current_date))
+        cache.load()
+        cache.load()
+        assert stats == []
+        assert cache.reloads_avoided == 2
+
+        # Our own saves are not treated as external changes.
+        cache.by_path('/models/a.safetensors')['civitai'] = 'True'
+        cache.save()
+        assert not cache.watcher.check_all()
+        stats.clear()  # (saves check the files themselves, under the cache lock)
+
+        # Another process rewriting the files is.
+        write_json_cache(user_dir, {'/models/b.safetensors': 'def456'}, {'def456': {'hash': 'def456'}})
+        assert cache.watcher.check_all()
+        cache.load()
+        assert len(stats) == 1
+    finally:
+        cache.stop_watcher()
+
+
+def test_journal_appends_changes_and_replays_on_load(user_dir, monkeypatch):
+    write_json_cache(user_dir, {'/models/a.safetensors': 'abc123'}, {'abc123': {'hash': 'abc123', 'lastUsed': ''}})
+    cache = make_cache(monkeypatch)
+    cache.load()
+    snapshot = (user_dir / 'sage_cache_info.json').read_text(encoding='utf-8')
+
+    cache.update_last_used_by_path('/models/a.safetensors')
+    cache.save()
+    cache.add_or_update_entry('/models/b.safetensors', {'hash': 'def456', 'lastUsed': ''})
+    cache.by_hash('abc123')['civitai'] = 'True'
+    cache.save()
+
+    # Snapshot files are untouched; the journal holds only the changes.
+    assert (user_dir / 'sage_cache_info.json').read_text(encoding='utf-8') == snapshot
+    ops = [record['op'] for record in CacheJournal(cache.journal_path).read()]
+    assert ops == ['touch_last_used', 'set_hash', 'set_info', 'merge_info']
+
+    # A crash mid-append leaves a torn line, which replay skips.
+    with cache.journal_path.open('a', encoding='utf-8') as f:
+        f.write('{"op": "set_hash", "pa')
+
+    reloaded = make_cache(monkeypatch)
+    reloaded.load()
+    assert reloaded.hash == {'/models/a.safetensors': 'abc123', '/models/b.safetensors': 'def456'}
+    assert reloaded.by_hash('abc123')['civitai'] == 'True'
+    assert reloaded.by_hash('abc123')['lastUsed'] != ''
+    assert not reloaded.hash.has_changes and not reloaded.info.has_changes
+
+
+def test_journal_compacts_into_snapshot_past_threshold(user_dir, monkeypatch):
+    write_json_cache(user_dir, {'/models/a.safetensors': 'abc123'}, {'abc123': {'hash': 'abc123'}})
+    cache = make_cache(monkeypatch)
+    cache.journal_compact_bytes = 1
+    cache.load()
+
+    cache.remove_entry('/models/a.safetensors')
+    cache.add_or_update_entry('/models/b.safetensors', {'hash': 'def456'})
+    cache.save()
+
+    assert cache.journal.size() == 0
+    assert json.loads((user_dir / 'sage_cache_hash.json').read_text(encoding='utf-8')) == {'/models/b.safetensors': 'def456'}
+    assert json.loads((user_dir / 'sage_cache_info.json').read_text(encoding='utf-8')) == {'def456': {'hash': 'def456'}}
+
+
+def test_backup_prune_trusts_manifest_and_runs_in_background(user_dir, monkeypatch):
+    cache = make_cache(monkeypatch)
+    if cache.prune_thread is not None:
+        cache.prune_thread.join(timeout=10)
+    cache.backup_json('sage_cache_hash', {f'/models/{i}': str(i) for i in range(10)}, '2026-01-01T00-00-00')
+    cache.backup_json('sage_cache_hash', {f'/models/{i}': str(i) for i in range(40)}, '2026-01-02T00-00-00')
+    backup_dir = user_dir / 'backup'
+
+    reads = []
+    original_read_bytes = pathlib.Path.read_bytes
+
+    def recording_read_bytes(self):
+        reads.append(self.name)
+        return original_read_bytes(self)
+
+    monkeypatch.setattr(pathlib.Path, 'read_bytes', recording_read_bytes)
+
+    cache.prune_all_backups()
+    assert reads == []
+
+    # A backup missing from the manifest is read once and indexed; an exact duplicate of it is removed.
+    legacy = {'/models/x': 'x'}
+    (backup_dir / 'sage_cache_hash-2025-01-01T00-00-00.json').write_text(json.dumps(legacy), encoding='utf-8')
+    (backup_dir / 'sage_cache_hash-2025-01-02T00-00-00.json').write_text(json.dumps(legacy, indent=4), encoding='utf-8')
+    thread = cache.schedule_backup_prune()
+    thread.join(timeout=10)
+    assert sorted(reads) == ['sage_cache_hash-2025-01-01T00-00-00.json', 'sage_cache_hash-2025-01-02T00-00-00.json']
+    remaining = sorted(f.name for f in backup_dir.glob('sage_cache_hash-*'))
+    assert len(remaining) == 3
+    assert all(name in cache.backup_manifest for name in remaining)
+
+    reads.clear()
+    cache.prune_all_backups()
+    assert reads == []
+
+
+def test_backups_are_compressed_deltas_and_restore_any_point(user_dir, monkeypatch):
+    cache = make_cache(monkeypatch)
+    if cache.prune_thread is not None:
+        cache.prune_thread.join(timeout=10)
+
+    def info_entries(count):
+        return {f'hash{i}': {'hash': f'hash{i}', 'lastUsed': '', 'description': 'x' * 200} for i in range(count)}
+
+    states = [info_entries(20), info_entries(22), info_entries(30)]
+    dates = ['2026-01-01T00-00-00', '2026-01-02T00-00-00', '2026-01-03T00-00-00']
+    for state, date in zip(states, dates):
+        cache.backup_json('sage_cache_info', state, date)
+
+    backups = cache.list_backups('sage_cache_info')
+    assert [b['kind'] for b in backups] == ['snapshot', 'delta', 'delta']
+    assert backups[1]['base'] == backups[0]['name']
+    assert backups[1]['file_size'] < backups[0]['file_size']
+
+    assert cache.restore_backup('sage_cache_info', at='2026-01-02T12:00:00') == (backups[1]['name'], states[1])
+    assert cache.restore_backup('sage_cache_info')[1] == states[2]
+    assert cache.restore_backup('sage_cache_info', at='2025-12-31T00:00:00') is None
+
+    # Pruning down to one restore point keeps the snapshot the newest delta is based on.
+    cache.num_of_backups_to_keep = 1
+    cache.prune_all_backups()
+    assert [b['name'] for b in cache.list_backups('sage_cache_info')] == [backups[0]['name'], backups[2]['name']]
+    assert cache.restore_backup('sage_cache_info')[1] == states[2]
+
+
+def test_index_tracks_model_ids_paths_and_short_hashes(user_dir, monkeypatch):
+    cache = make_cache(monkeypatch)
+    cache.load()
+    cache.add_or_update_entry('/models/a.safetensors', {'hash': 'ABC123', 'modelId': 7, 'id': 70, 'update_version_id': 71})
+    cache.add_or_update_entry('/models/a_copy.safetensors', {'hash': 'ABC123', 'modelId': 7, 'id': 70, 'update_version_id': 71})
+    cache.add_or_update_entry('/models/b.safetensors', {'hash': 'ABD999', 'modelId': 8, 'id': 80})
+
+    index = cache.index
+    assert index.hashes_with_prefix('ab') == ['ABC123', 'ABD999']
+    assert index.hashes_with_prefix('abc') == ['ABC123']
+    assert index.paths_for_hash('ABC123') == ['/models/a.safetensors', '/models/a_copy.safetensors']
+    cache.save()
+    models = cache.get_models_by_model_id(7)
+    assert [m['hash'] for m in models] == ['ABC123']
+    assert models[0]['latest_version_present'] is False
+    # Lookups return copies; the cached entry isn't changed (or marked unsaved)
+    assert 'latest_version_present' not in cache.by_hash('ABC123')
+    assert not cache.info.has_changes
+
+    # Field writes inside an entry re-index it.
+    cache.by_hash('ABD999')['modelId'] = 7
+    cache.by_hash('ABD999')['id'] = 71
+    assert sorted(index.hashes_for_model_id(7)) == ['ABC123', 'ABD999']
+    assert index.hashes_for_model_id(8) == []
+    assert cache.get_models_by_model_id(7)[0]['latest_version_present'] is True
+
+    # The info entry goes only once its last path is removed.
+    cache.remove_entry('/models/a.safetensors')
+    assert 'ABC123' in cache.info
+    cache.remove_entry('/models/a_copy.safetensors')
+    assert 'ABC123' not in cache.info
+    assert index.hashes_with_prefix('ab') == ['ABD999']
+
+    # Reloading replaces the sections, and the index is rebuilt for them.
+    cache.save()
+    reloaded = make_cache(monkeypatch)
+    reloaded.load()
+    assert reloaded.index.hash_for_version_id(71) == 'ABD999'
+
+
+def test_lazy_info_loads_summary_and_reads_payload_on_demand(user_dir, monkeypatch):
+    info = {
+        'abc123': {
+            'hash': 'abc123', 'id': 70, 'name': 'v1', 'lastUsed': '', 'description': 'x' * 1000,
+            'model': {'type': 'LORA', 'name': 'Model A', 'tags': ['a', 'b']}, 'trainedWords': ['word'],
+        },
+        'def456': {'hash': 'def456', 'id': 80, 'name': 'v2', 'lastUsed': ''},
+    }
+    write_json_cache(user_dir, {'/models/a.safetensors': 'abc123', '/models/b.safetensors': 'def456'}, info)
+
+    # The first load parses the info file once and writes the summary and blob files for it.
+    make_cache(monkeypatch).load()
+    assert (user_dir / 'sage_cache_info.summary.json').is_file()
+    assert len(list(user_dir.glob('sage_cache_info-*.blob'))) == 1
+
+    cache = make_cache(monkeypatch)
+    cache.load()
+    entry = cache.by_hash('abc123')
+    assert isinstance(entry, LazyInfoEntry) and not entry.loaded
+    assert get_model_summary(entry) == {'type': 'LORA', 'name': 'Model A'}
+    assert entry['id'] == 70 and 'model' in entry and not entry.loaded
+
+    # Scalar writes don't load the payload, and are saved without losing it.
+    cache.update_last_used_by_hash('abc123')
+    cache.save()
+    assert not entry.loaded
+    cache.compact_journal()
+    assert not entry.loaded
+    assert entry['model']['tags'] == ['a', 'b'] and entry.loaded
+    assert json.loads(json.dumps(entry)) == dict(entry)
+
+    on_disk = json.loads((user_dir / 'sage_cache_info.json').read_text(encoding='utf-8'))
+    assert on_disk['abc123']['model'] == info['abc123']['model']
+    assert on_disk['abc123']['lastUsed'] == entry['lastUsed'] != ''
+
+    # Reloading after the compaction uses the rewritten summary.
+    reloaded = make_cache(monkeypatch)
+    reloaded.load()
+    assert reloaded.by_hash('abc123') == on_disk['abc123']
+    assert len(list(user_dir.glob('sage_cache_info-*.blob'))) == 2
+
+
+def test_lazy_info_entries_survive_their_blob_being_removed(user_dir, monkeypatch):
+    info = {'abc123': {'hash': 'abc123', 'lastUsed': '', 'model': {'type': 'LORA', 'name': 'Model A'}}}
+    write_json_cache(user_dir, {'/models/a.safetensors': 'abc123'}, info)
+    cache = make_cache(monkeypatch)
+    cache.load()
+    entry = cache.by_hash('abc123')
+    captured = dict(capture_info(cache.info))['abc123']
+    (first_blob,) = user_dir.glob('sage_cache_info-*.blob')
+
+    # Blobs unloaded entries of this process point into are kept, however many newer ones are written.
+    other = make_cache(monkeypatch)
+    other.load()
+    for _ in range(3):
+        other.update_last_used_by_hash('abc123')
+        other.save()
+        other.compact_journal()
+    assert first_blob.is_file()
+
+    # Another process may remove it anyway: the entry is rebound to the current summary's blob.
+    first_blob.unlink()
+    assert entry['model'] == info['abc123']['model']
+
+    # Without a current summary, the nested fields are read from the info file.
+    (user_dir / 'sage_cache_info.summary.json').unlink()
+    for blob in user_dir.glob('sage_cache_info-*.blob'):
+        blob.unlink()
+    assert full_entry(captured)['model'] == info['abc123']['model']
+
+
+def test_whole_file_saves_write_only_the_info_snapshot(user_dir, monkeypatch):
+    info = {'abc123': {'hash': 'abc123', 'lastUsed': '', 'model': {'type': 'LORA', 'name': 'Model A'}}}
+    write_json_cache(user_dir, {'/models/a.safetensors': 'abc123'}, info)
+    cache = make_cache(monkeypatch, journal=False)
+    cache.load()
+    blobs = sorted(user_dir.glob('sage_cache_info-*.blob'))
+
+    cache.update_last_used_by_hash('abc123')
+    cache.save()
+    assert not cache.by_hash('abc123').loaded
+    assert sorted(user_dir.glob('sage_cache_info-*.blob')) == blobs
+    assert not (user_dir / 'sage_cache_info.summary.json').exists()
+    on_disk = json.loads((user_dir / 'sage_cache_info.json').read_text(encoding='utf-8'))
+    assert on_disk['abc123']['model'] == info['abc123']['model'] and on_disk['abc123']['lastUsed'] != ''
+
+    # The next load rebuilds the summary for the new snapshot.
+    reloaded = make_cache(monkeypatch, journal=False)
+    reloaded.load()
+    assert (user_dir / 'sage_cache_info.summary.json').is_file()
+    assert reloaded.by_hash('abc123') == on_disk['abc123']
+
+
+def test_processes_sharing_a_cache_merge_instead_of_losing_updates(user_dir, monkeypatch):
+    write_json_cache(user_dir, {'/models/a.safetensors': 'abc123'}, {'abc123': {'hash': 'abc123', 'lastUsed': ''}})
+    first, second = make_cache(monkeypatch), make_cache(monkeypatch)
+    first.load()
+    second.load()
+
+    first.add_or_update_entry('/models/b.safetensors', {'hash': 'def456', 'lastUsed': ''})
+    first.save()
+    second.by_hash('abc123')['civitai'] = 'True'
+    second.add_or_update_entry('/models/c.safetensors', {'hash': 'ghi789', 'lastUsed': ''})
+    second.save()
+
+    # Only the journal records the other process appended are applied; nothing is reloaded.
+    first.load()
+    assert first.journal_merges == 1
+    assert sorted(first.hash) == ['/models/a.safetensors', '/models/b.safetensors', '/models/c.safetensors']
+    assert first.by_hash('abc123')['civitai'] == 'True'
+    assert not first.hash.has_changes and not first.info.has_changes
+
+    # Unsaved changes survive the other process compacting the journal into new snapshot files.
+    second.update_last_used_by_hash('def456')
+    first.compact_journal()
+    second.save()
+    third = make_cache(monkeypatch)
+    third.load()
+    assert sorted(third.hash) == sorted(first.hash)
+    assert third.by_hash('def456')['lastUsed'] != ''
+    assert third.by_hash('abc123')['civitai'] == 'True'
+
+
+def test_whole_file_saves_merge_other_processes_changes(user_dir, monkeypatch):
+    write_json_cache(user_dir, {'/models/a.safetensors': 'abc123'}, {'abc123': {'hash': 'abc123', 'lastUsed': ''}})
+    first, second = make_cache(monkeypatch, journal=False), make_cache(monkeypatch, journal=False)
+    first.load()
+    second.load()
+
+    first.add_or_update_entry('/models/b.safetensors', {'hash': 'def456'})
+    first.save()
+    second.remove_entry('/models/a.safetensors')
+    second.save()
+
+    on_disk = json.loads((user_dir / 'sage_cache_hash.json').read_text(encoding='utf-8'))
+    assert on_disk == {'/models/b.safetensors': 'def456'}
+
+    # The lock is exclusive across open lock files, not just threads.
+    with first.lock:
+        other = CacheFileLock(first.lock.path, timeout=0.1)
+        with pytest.raises(CacheLockTimeout):
+            other.acquire()
+
+
+def test_sqlite_reload_keeps_unsaved_changes_of_this_process(user_dir, monkeypatch):
+    first, second = make_cache(monkeypatch, 'sqlite'), make_cache(monkeypatch, 'sqlite')
+    second.add_or_update_entry('/models/a.safetensors', {'hash': 'abc123', 'lastUsed': ''})
+    second.save()
+    first.load()
+    second.load()
+
+    first.begin_batch()
+    first.add_or_update_entry('/models/b.safetensors', {'hash': 'def456', 'lastUsed': ''})
+    first.by_hash('abc123')['civitai'] = 'True'
+    second.add_or_update_entry('/models/c.safetensors', {'hash': 'ghi789', 'lastUsed': ''})
+    second.by_hash('abc123')['lastUsed'] = '2024-01-01T00:00:00'
+    second.save()
+
+    # Reloading what the other process wrote keeps this process's unsaved changes on top
+    first.load()
+    assert sorted(first.hash) == ['/models/a.safetensors', '/models/b.safetensors', '/models/c.safetensors']
+    first.end_batch()
+
+    third = make_cache(monkeypatch, 'sqlite')
+    third.load()
+    assert sorted(third.hash) == ['/models/a.safetensors', '/models/b.safetensors', '/models/c.safetensors']
+    # Each process's field changes to the same entry are kept
+    assert third.by_hash('abc123')['civitai'] == 'True'
+    assert third.by_hash('abc123')['lastUsed'] == '2024-01-01T00:00:00'
+
+
+def test_sqlite_reload_reads_only_rows_changed_by_other_processes(user_dir, monkeypatch):
+    first, second = make_cache(monkeypatch, 'sqlite'), make_cache(monkeypatch, 'sqlite')
+    for name, file_hash in (('a', 'abc123'), ('b', 'def456'), ('c', 'ghi789')):
+        second.add_or_update_entry(f'/models/{name}.safetensors', {'hash': file_hash, 'lastUsed': ''})
+    second.save()
+    first.load()
+    second.load()
+
+    second.add_or_update_entry('/models/d.safetensors', {'hash': 'jkl012', 'lastUsed': ''})
+    second.by_hash('abc123')['civitai'] = 'True'
+    second.remove_entry('/models/b.safetensors')
+    second.save()
+
+    def no_full_reload():
+        raise AssertionError('reloaded every row')
+
+    monkeypatch.setattr(first.sqlite_store, 'load_hashes', no_full_reload)
+    monkeypatch.setattr(first.sqlite_store, 'load_info', no_full_reload)
+    first.load()
+    assert sorted(first.hash) == ['/models/a.safetensors', '/models/c.safetensors', '/models/d.safetensors']
+    assert sorted(first.info) == ['abc123', 'ghi789', 'jkl012']
+    assert first.by_hash('abc123')['civitai'] == 'True'
+    assert not first.hash.has_changes and not first.info.has_changes
+
+
+def test_sqlite_reload_is_full_once_deletions_were_forgotten(user_dir, monkeypatch):
+    monkeypatch.setattr(cache_sqlite, 'TOMBSTONES_TO_KEEP', 1)
+    first, second = make_cache(monkeypatch, 'sqlite'), make_cache(monkeypatch, 'sqlite')
+    for name in 'abc':
+        second.add_or_update_entry(f'/models/{name}.safetensors', {'hash': f'{name}00', 'lastUsed': ''})
+    second.save()
+    first.load()
+    second.load()
+
+    for name in 'ab':
+        second.remove_entry(f'/models/{name}.safetensors')
+        second.save()
+    assert first.sqlite_store.load_changes(first.sqlite_change_seq) is None
+    first.load()
+    assert sorted(first.hash) == ['/models/c.safetensors']
+
+
+def test_journal_saves_merge_disk_changes_once(user_dir, monkeypatch):
+    cache = make_cache(monkeypatch)
+    cache.load()
+    cache.journal_compact_bytes = 1
+    merges = []
+    original_merge = cache._merge_disk_changes
+    monkeypatch.setattr(cache, '_merge_disk_changes', lambda: merges.append(1) or original_merge())
+
+    cache.add_or_update_entry('/models/a.safetensors', {'hash': 'abc123', 'lastUsed': ''})
+    cache.save()
+    assert len(merges) == 1
+    assert not (user_dir / 'sage_cache_journal.jsonl').stat().st_size
+
+
+def test_writer_threads_and_saves_share_the_sections_lock(user_dir, monkeypatch):
+    cache = make_cache(monkeypatch, 'sqlite')
+    cache.load()
+    assert cache.hash.lock is cache.info.lock is cache.fingerprints.lock is cache.sections_lock
+
+    # A batch only defers the saves of the thread that started it
+    cache.begin_batch()
+    errors = []
+
+    def write(worker):
+        try:
+            for i in range(50):
+                path = f'/models/{worker}_{i}.safetensors'
+                cache.add_or_update_entry(path, {'hash': f'{worker}{i:04d}', 'lastUsed': ''})
+                cache.by_path(path)['civitai'] = 'True'
+                if i % 10 == 0:
+                    cache.save()
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write, args=(worker,)) for worker in 'abcd']
+    for thread in writers:
+        thread.start()
+    for thread in writers:
+        thread.join(10)
+    assert errors == []
+
+    other = make_cache(monkeypatch, 'sqlite')
+    other.load()
+    assert len(other.hash) >= 4  # Written by the writers' own saves while the batch was open
+    cache.end_batch()
+
+    # end_batch() from another thread doesn't end this thread's batch
+    cache.begin_batch()
+    closer = threading.Thread(target=cache.end_batch)
+    closer.start()
+    closer.join(5)
+    assert cache.in_batch()
+    cache.end_batch()
+    assert not cache.batch_mode
+
+    other.load()
+    assert len(other.hash) == 200
+    assert all(other.by_hash(file_hash)['civitai'] == 'True' for file_hash in other.hash.values())
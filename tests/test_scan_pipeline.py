@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from comfyui_sageutils.utils import dir_walker, hashing
+from comfyui_sageutils.utils import model_cache as model_cache_module
+from comfyui_sageutils.utils import model_metadata, scan_pipeline
+from comfyui_sageutils.utils.path_manager import path_manager
+
+NOT_FOUND = ({'error': 'Not found'}, False, False, None)
+
+
+@pytest.fixture
+def test_cache(tmp_path, monkeypatch):
+    users_path = tmp_path / 'SageUtils'
+    (users_path / 'backup').mkdir(parents=True)
+    monkeypatch.setattr(path_manager, 'sage_users_path', users_path)
+    monkeypatch.setattr(path_manager, 'backup_path', users_path / 'backup')
+    monkeypatch.setattr(model_cache_module, 'get_setting_or_default', lambda key, default: 0 if key == 'model_cache_watch_interval' else default)
+    test_cache = model_cache_module.SageCache()
+    test_cache.load()
+    monkeypatch.setattr(model_metadata, 'cache', test_cache)
+    monkeypatch.setattr(scan_pipeline, 'cache', test_cache)
+    return test_cache
+
+
+@pytest.fixture
+def models(tmp_path):
+    folder = tmp_path / 'models'
+    (folder / 'sub').mkdir(parents=True)
+    paths = []
+    for i in range(6):
+        path = folder / ('sub' if i % 2 else '') / f'model_{i}.safetensors'
+        path.write_bytes(bytes([i]) * 1000)
+        paths.append(str(path.resolve()))
+    (folder / 'notes.txt').write_text('not a model')
+    return folder, paths
+
+
+def fake_resolver(calls, delay=0.0):
+    def resolve(lookups):
+        calls.append(sorted(lookups))
+        for path in lookups:
+            time.sleep(delay)
+            yield path, NOT_FOUND, None
+    return resolve
+
+
+def test_pipeline_overlaps_hashing_and_lookups(test_cache, models, monkeypatch):
+    folder, paths = models
+    calls = []
+    monkeypatch.setattr(scan_pipeline, 'resolve_civitai_lookups', fake_resolver(calls, delay=0.1))
+
+    hashing_threads = set()
+
+    def slow_hash(path, **kwargs):
+        hashing_threads.add(threading.current_thread().name)
+        time.sleep(0.1)
+        return hashing.hash_model_file(path, **kwargs)
+
+    engine = hashing.HashingEngine(max_workers=1, per_device=1, hash_function=slow_hash)
+    progress = []
+    pipeline = scan_pipeline.ScanPipeline([str(folder)], engine=engine, batch_size=1, on_progress=lambda p: progress.append(p.queue_depths()))
+
+    start = time.perf_counter()
+    counts = pipeline.run()
+    elapsed = time.perf_counter() - start
+
+    # 0.6s of hashing and 0.6s of lookups overlap instead of adding up
+    assert elapsed < 1.0
+    assert counts['found'] == 6 and counts['hashed'] == 6 and counts['looked_up'] == 6 and counts['processed'] == 6
+    assert sorted(path for batch in calls for path in batch) == sorted(paths)
+    assert hashing_threads == {'SageScanHash0'}
+    assert progress and set(progress[-1]) == {'filter', 'hash', 'write', 'resolve', 'apply'}
+    for path in paths:
+        entry = test_cache.by_path(path)
+        assert entry['civitai'] == 'False' and entry['next_check_at']
+        assert test_cache.fingerprints[path]['hash'] == test_cache.hash[path]
+
+
+def test_pipeline_reuses_cached_hashes_and_skips_blacklisted(test_cache, models, monkeypatch):
+    folder, paths = models
+    calls = []
+    monkeypatch.setattr(scan_pipeline, 'resolve_civitai_lookups', fake_resolver(calls))
+    scan_pipeline.ScanPipeline([str(folder)]).run()
+
+    test_cache.by_path(paths[0])['blacklist'] = True
+    renamed = folder / 'renamed.safetensors'
+    (folder / 'model_2.safetensors').rename(renamed)
+    # The first scan's walk would otherwise be replayed for a few seconds
+    dir_walker.invalidate_snapshots(str(folder))
+    old_hash = test_cache.hash[paths[2]]
+
+    calls.clear()
+    counts = scan_pipeline.ScanPipeline([str(folder)]).run()
+
+    # Nothing is rehashed: cached files aren't due for a recheck, and the renamed file keeps its fingerprint.
+    assert counts['hashed'] == 0 and counts['skipped'] == 1 and counts['processed'] == 5
+    assert test_cache.hash[str(renamed.resolve())] == old_hash
+    assert calls == []
+
+    # A forced scan looks everything up again, blacklisted files included, still without rehashing.
+    counts = scan_pipeline.ScanPipeline([str(folder)], force=True, batch_size=100).run()
+    assert counts['hashed'] == 0 and counts['looked_up'] == 6
+
+
+def test_pipeline_stops_when_cancelled(test_cache, models, monkeypatch):
+    folder, _ = models
+    monkeypatch.setattr(scan_pipeline, 'resolve_civitai_lookups', fake_resolver([], delay=0.05))
+    cancelled = threading.Event()
+
+    def on_progress(pipeline):
+        if pipeline.counts['processed'] >= 1:
+            cancelled.set()
+
+    pipeline = scan_pipeline.ScanPipeline([str(folder)], batch_size=1, should_cancel=cancelled.is_set, on_progress=on_progress)
+    counts = pipeline.run()
+
+    assert 1 <= counts['processed'] < 6
+    assert not test_cache.batch_mode
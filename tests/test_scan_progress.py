@@ -0,0 +1,47 @@
+import time
+
+from comfyui_sageutils.utils.scan_progress import SCAN_PROGRESS_EVENT, ScanProgressTracker
+
+
+def test_updates_are_coalesced():
+    sent = []
+    tracker = ScanProgressTracker(send=lambda event, data: sent.append(data), max_per_second=10)
+    scan = tracker.start(['/models'], force=False)
+    tracker.update(scan, status='processing_metadata', total=100, enumerating=False)
+    assert [data['status'] for data in sent] == ['queued', 'processing_metadata']
+
+    for i in range(1, 51):
+        tracker.file_done(scan, f'/models/model_{i}.safetensors', 'cached')
+        tracker.update(scan, current=i, hashed_bytes=i * 1024 * 1024)
+    # Fifty updates within 100ms of the last message are merged into the next one
+    assert len(sent) == 2
+    time.sleep(0.25)
+    assert len(sent) == 3
+    merged = sent[-1]
+    assert merged['current'] == 50 and len(merged['files']) == 50
+    assert merged['files_per_second'] > 0 and merged['mb_per_second'] > 0
+    assert merged['eta_seconds'] is not None
+
+    # Status changes go out at once; a finished scan ignores further updates
+    tracker.finish(scan, 'completed')
+    tracker.update(scan, current=99)
+    time.sleep(0.15)
+    assert [data['status'] for data in sent[3:]] == ['completed']
+    assert sent[-1]['active'] is False and sent[-1]['files'] == []
+
+
+def test_scans_are_tracked_by_id():
+    sent = []
+    tracker = ScanProgressTracker(send=lambda event, data: sent.append((event, data)), max_per_second=0)
+    first = tracker.start(['/a'])
+    second = tracker.start(['/b'])
+    tracker.update(first, status='scanning_files')
+
+    assert tracker.get(second.scan_id) is second
+    assert tracker.latest() is first
+    assert tracker.cancel(second.scan_id) == [second.scan_id]
+    assert second.cancelled.is_set() and not first.cancelled.is_set()
+    assert tracker.busy()
+    assert tracker.cancel() == [first.scan_id]
+    assert not tracker.busy()
+    assert {event for event, _ in sent} == {SCAN_PROGRESS_EVENT}
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from comfyui_sageutils.routes import scanning_routes
+from comfyui_sageutils.utils import model_cache as model_cache_module
+from comfyui_sageutils.utils import model_metadata, scan_pipeline
+from comfyui_sageutils.utils.path_manager import path_manager
+from comfyui_sageutils.utils.scan_progress import ScanProgressTracker
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    sent = []
+    monkeypatch.setattr(scanning_routes, 'scan_tracker', ScanProgressTracker(send=lambda event, data: sent.append((event, data)), max_per_second=20))
+    return sent
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, messages):
+    users_path = tmp_path / 'SageUtils'
+    (users_path / 'backup').mkdir(parents=True)
+    monkeypatch.setattr(path_manager, 'sage_users_path', users_path)
+    monkeypatch.setattr(path_manager, 'backup_path', users_path / 'backup')
+    monkeypatch.setattr(model_cache_module, 'get_setting_or_default', lambda key, default: 0 if key == 'model_cache_watch_interval' else default)
+    test_cache = model_cache_module.SageCache()
+    test_cache.load()
+    monkeypatch.setattr(model_cache_module, 'cache', test_cache)
+    monkeypatch.setattr(model_metadata, 'cache', test_cache)
+    monkeypatch.setattr(scan_pipeline, 'cache', test_cache)
+
+    app = web.Application()
+    routes = web.RouteTableDef()
+    scanning_routes.register_routes(routes)
+    app.add_routes(routes)
+    yield app
+    # Stop and wait for the scan thread before the cache and paths are restored
+    scanning_routes.scan_tracker.cancel()
+    scanning_routes._scan_executor.submit(lambda: None).result(timeout=30)
+
+
+async def test_scan_runs_off_the_event_loop(app, aiohttp_client, tmp_path, monkeypatch, messages):
+    models = tmp_path / 'models'
+    models.mkdir()
+    for i in range(3):
+        (models / f'model_{i}.safetensors').write_bytes(bytes([i]) * 10)
+
+    pulled = []
+
+    def slow_lookups(lookups):
+        for file_path in lookups:
+            # Blocking work, like a Civitai request
+            time.sleep(0.2)
+            pulled.append(file_path)
+            yield file_path, ({'error': 'Not found'}, False, False, None), None
+
+    monkeypatch.setattr(scan_pipeline, 'resolve_civitai_lookups', slow_lookups)
+    client = await aiohttp_client(app)
+
+    first = await (await client.post('/sage_cache/scan_model_folders', json={'folders': [str(models)]})).json()
+    assert first['success'] is True
+    # A second scan is queued behind the first and tracked by its own id.
+    second = await (await client.post('/sage_cache/scan_model_folders', json={'folders': [str(models)]})).json()
+    assert second['status'] == 'queued' and second['scan_id'] != first['scan_id']
+
+    # Progress requests are answered while the scan is blocked on Civitai.
+    await asyncio.sleep(0.3)
+    start = time.perf_counter()
+    response = await client.get('/sage_cache/scan_progress')
+    assert time.perf_counter() - start < 0.15
+    progress = (await response.json())['progress']
+    assert progress['scan_id'] == first['scan_id']
+    assert progress['active'] is True and progress['status'] in ('scanning_files', 'processing_metadata')
+    assert set(progress['queues']) >= {'hash', 'resolve'}
+
+    scans = (await (await client.get('/sage_cache/scans')).json())
+    assert scans['active'] == [first['scan_id'], second['scan_id']]
+
+    for scan_id in (first['scan_id'], second['scan_id']):
+        for _ in range(100):
+            progress = (await (await client.get('/sage_cache/scan_progress', params={'scan_id': scan_id})).json())['progress']
+            if not progress['active']:
+                break
+            await asyncio.sleep(0.05)
+        assert progress['status'] == 'completed' and progress['current'] == 3
+        assert progress['files_per_second'] > 0 and progress['eta_seconds'] is None
+    # The second scan found the files already looked up
+    assert len(pulled) == 3
+
+    # Every state was pushed as a message as well, ending with each scan's completion
+    pushed = [data for event, data in messages if event == 'sage_utils.scan_progress']
+    finished = {data['scan_id']: data for data in pushed if data['status'] == 'completed'}
+    assert set(finished) == {first['scan_id'], second['scan_id']}
+    files = [f for data in pushed if data['scan_id'] == first['scan_id'] for f in data['files']]
+    assert sorted(f['result'] for f in files) == ['not_found'] * 3
+    assert [f['result'] for data in pushed if data['scan_id'] == second['scan_id'] for f in data['files']] == ['cached'] * 3
+
+    response = await client.get('/sage_cache/scan_progress', params={'scan_id': 'nope'})
+    assert response.status == 404
+
+
+async def test_cancel_scan_by_id(app, aiohttp_client, tmp_path, monkeypatch):
+    models = tmp_path / 'models'
+    models.mkdir()
+    (models / 'model.safetensors').write_bytes(b'x' * 10)
+
+    def slow_lookups(lookups):
+        for file_path in lookups:
+            time.sleep(0.5)
+            yield file_path, ({'error': 'Not found'}, False, False, None), None
+
+    monkeypatch.setattr(scan_pipeline, 'resolve_civitai_lookups', slow_lookups)
+    client = await aiohttp_client(app)
+
+    first = await (await client.post('/sage_cache/scan_model_folders', json={'folders': [str(models)]})).json()
+    second = await (await client.post('/sage_cache/scan_model_folders', json={'folders': [str(models)]})).json()
+    result = await (await client.post('/sage_cache/cancel_scan', json={'scan_id': second['scan_id']})).json()
+    assert result['cancelled'] == [second['scan_id']]
+
+    progress = (await (await client.get('/sage_cache/scan_progress', params={'scan_id': second['scan_id']})).json())['progress']
+    assert progress['status'] == 'cancelled' and not progress['active']
+    progress = (await (await client.get('/sage_cache/scan_progress', params={'scan_id': first['scan_id']})).json())['progress']
+    assert progress['active'] is True
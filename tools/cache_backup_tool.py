@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+# Usage:
+#   cd /home/ai/programs/comfyui
+#   ./venv/bin/python -c "import os, sys; root=os.path.abspath('.'); sys.path.insert(0, os.path.join(root, 'custom_nodes')); sys.path.insert(0, root); from comfyui_sageutils.tools.cache_backup_tool import list_cache_backups; [print(b['backup_date'], b['kind'], b['name']) for b in list_cache_backups('sage_cache_info')]"
+#   ./venv/bin/python -c "import os, sys; root=os.path.abspath('.'); sys.path.insert(0, os.path.join(root, 'custom_nodes')); sys.path.insert(0, root); from comfyui_sageutils.tools.cache_backup_tool import restore_cache_backup; print(restore_cache_backup('sage_cache_info', at='2026-10-01T12:00:00', output_path='restored_info.json'))"
+#   Pass apply=True instead of output_path to replace the live cache section (stop ComfyUI first).
+
+RESTORABLE_SECTIONS = {
+    "sage_cache_hash": "hash",
+    "sage_cache_info": "info",
+    "sage_cache_ollama": "ollama_models",
+}
+
+
+def _get_cache() -> Any:
+    from ..utils.model_cache import cache
+    return cache
+
+
+def list_cache_backups(prefix: str | None = None) -> list[dict[str, Any]]:
+    """List backups (snapshots and deltas) recorded in the backup manifest, oldest first."""
+    return _get_cache().list_backups(prefix)
+
+
+def restore_cache_backup(
+    prefix: str,
+    at: str | None = None,
+    output_path: str | Path | None = None,
+    apply: bool = False,
+) -> dict[str, Any]:
+    """
+    Rebuild a cache section from the newest backup taken at or before `at` (None = newest backup).
+
+    With output_path, the restored data is written there as plain JSON. With apply=True,
+    it replaces the live cache section and is saved through the normal cache save path.
+    """
+    if apply and prefix not in RESTORABLE_SECTIONS:
+        raise ValueError(f"Cannot apply backups of '{prefix}' to the cache; expected one of {sorted(RESTORABLE_SECTIONS)}")
+
+    cache = _get_cache()
+    restored = cache.restore_backup(prefix, at)
+    if restored is None:
+        raise FileNotFoundError(f"No backup of '{prefix}' found" + (f" at or before {at}" if at else ""))
+    name, data = restored
+
+    if output_path is not None:
+        output = Path(output_path)
+        output.write_text(json.dumps(data, indent=4, sort_keys=True), encoding="utf-8")
+
+    if apply:
+        cache.load()
+        setattr(cache, RESTORABLE_SECTIONS[prefix], data)
+        cache.save()
+        if cache.journal is not None:
+            cache.compact_journal()
+
+    return {
+        "backup": name,
+        "entries": len(data) if isinstance(data, dict) else 0,
+        "output_path": str(output_path) if output_path is not None else None,
+        "applied": apply,
+    }
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import argparse
+import functools
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from ..utils import hashing
+from ..utils.performance_timer import PerformanceTimer
+
+# Usage:
+#   cd /home/ai/programs/comfyui
+#   ./venv/bin/python -c "import os, sys; root=os.path.abspath('.'); sys.path.insert(0, os.path.join(root, 'custom_nodes')); sys.path.insert(0, root); from comfyui_sageutils.tools.hash_benchmark import run_hash_benchmark; run_hash_benchmark(sizes=[2 * 1024**3], output_path='hash_benchmark.json')"
+#   Pass directory= to benchmark on a specific drive (e.g. the one holding the models); generated files are removed afterwards.
+#   Or: ./venv/bin/python -m comfyui_sageutils.tools.hash_benchmark --size 2G --directory /mnt/models --output hash_benchmark.json
+
+MIB = 1024 * 1024
+DEFAULT_SIZES = (256 * MIB, 256 * MIB, 256 * MIB, 256 * MIB)
+DEFAULT_BUFFER_SIZES = (1 * MIB, hashing.DEFAULT_BUFFER_SIZE, 32 * MIB)
+DEFAULT_WORKERS = (1, 2, 4)
+METHODS = ("read", "mmap")
+
+
+def parse_size(text: str) -> int:
+    """Parse a size like 512M, 2G or 1048576 into bytes."""
+    text = str(text).strip().upper().rstrip("B").rstrip("I")
+    units = {"K": 1024, "M": MIB, "G": 1024 * MIB, "T": 1024 * 1024 * MIB}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def make_test_files(directory: str | Path, sizes: Iterable[int], sparse: bool = False) -> list[Path]:
+    """
+    Write one file per size into directory. Random files are filled from os.urandom; sparse files are
+    truncated to size, so they take no space and measure hashing speed more than the drive.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    block = os.urandom(4 * MIB) if not sparse else b""
+    files = []
+    for index, size in enumerate(sizes):
+        path = directory / f"sage_hash_benchmark_{index}.safetensors"
+        with open(path, "wb") as f:
+            if sparse:
+                f.truncate(size)
+            else:
+                remaining = size
+                while remaining > 0:
+                    # Vary each block so files aren't trivially deduplicated by the filesystem
+                    chunk = hashlib.sha256(block[:64] + remaining.to_bytes(8, "little")).digest() + block
+                    f.write(chunk[:min(remaining, len(chunk))])
+                    remaining -= min(remaining, len(chunk))
+        files.append(path)
+    return files
+
+
+def hash_file_mmap(path: str, algorithm: str = "sha256", buffer_size: int = hashing.DEFAULT_BUFFER_SIZE) -> str:
+    """Hex digest of a file hashed from a memory map, buffer_size bytes per update."""
+    digest = hashing.new_digest(algorithm)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, buffer_size):
+                    digest.update(view[offset:offset + buffer_size])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+
+def _drop_from_page_cache(paths: Iterable[Path]) -> bool:
+    """Ask the OS to evict the files from the page cache, so the next read comes from the drive."""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            return False
+        finally:
+            os.close(fd)
+    return True
+
+
+def _strategies(
+    buffer_sizes: Iterable[int],
+    workers: Iterable[int],
+    methods: Iterable[str],
+    algorithms: Iterable[str],
+) -> list[tuple[str, dict[str, Any], Callable[..., Any]]]:
+    strategies = []
+    for method, algorithm, buffer_size, worker_count in itertools.product(methods, algorithms, buffer_sizes, workers):
+        function = hashing.hash_file if method == "read" else hash_file_mmap
+        params = {"method": method, "algorithm": algorithm, "buffer_size": buffer_size, "workers": worker_count}
+        name = f"{method}/{algorithm}/{buffer_size // 1024}KiB/{worker_count}w"
+        strategies.append((name, params, functools.partial(function, algorithm=algorithm)))
+    # What a model scan does per file: SHA-256 + AutoV3 (+ BLAKE3 with model_hash_blake3) + quick fingerprint in one pass
+    for worker_count in workers:
+        params = {"method": "scan", "algorithm": "hash_model_file", "buffer_size": hashing.DEFAULT_BUFFER_SIZE, "workers": worker_count}
+        strategies.append((f"scan/hash_model_file/{worker_count}w", params, functools.partial(hashing.hash_model_file, autov3=True)))
+    return strategies
+
+
+def run_hash_benchmark(
+    directory: str | Path | None = None,
+    sizes: Iterable[int] = DEFAULT_SIZES,
+    buffer_sizes: Iterable[int] = DEFAULT_BUFFER_SIZES,
+    workers: Iterable[int] = DEFAULT_WORKERS,
+    methods: Iterable[str] = METHODS,
+    algorithms: Iterable[str] | None = None,
+    sparse: bool = False,
+    repeat: int = 1,
+    cold: bool = True,
+    output_path: str | Path | None = None,
+    timer: PerformanceTimer | None = None,
+) -> dict[str, Any]:
+    """
+    Hash generated files with every combination of method (read/mmap), algorithm (sha256, plus blake3 when
+    installed), buffer size and worker count, plus the scan path (hash_model_file), and report MB/s for each.
+
+    Each run is timed through a PerformanceTimer; its export is included in the returned report, which is
+    also written to output_path as JSON. With cold=True the files are evicted from the page cache before
+    every run where the OS allows it, so the numbers reflect the drive rather than memory.
+    """
+    sizes = [int(size) for size in sizes]
+    methods = [m for m in methods if m in METHODS]
+    if algorithms is None:
+        algorithms = ["sha256"] + (["blake3"] if hashing.blake3_available() else [])
+    algorithms = [a for a in algorithms if a != "blake3" or hashing.blake3_available()]
+    timer = timer or PerformanceTimer("HashBenchmark")
+
+    with tempfile.TemporaryDirectory(prefix="sage_hash_benchmark_", dir=directory) as work_dir:
+        files = make_test_files(work_dir, sizes, sparse=sparse)
+        total_bytes = sum(sizes)
+        results = []
+        evicted = False
+        for name, params, function in _strategies(buffer_sizes, workers, methods, algorithms):
+            engine = hashing.HashingEngine(
+                max_workers=params["workers"],
+                per_device=params["workers"],
+                buffer_size=params["buffer_size"],
+                hash_function=function,
+            )
+            for _ in range(max(1, repeat)):
+                if cold:
+                    evicted = _drop_from_page_cache(files)
+                start = time.perf_counter()
+                with timer.timer_context(name):
+                    hashed = engine.hash_files(str(path) for path in files)
+                elapsed = time.perf_counter() - start
+                if len(hashed) != len(files):
+                    raise RuntimeError(f"{name}: hashed {len(hashed)} of {len(files)} files")
+            stats = timer.get_stats(name)
+            results.append({
+                "strategy": name,
+                **params,
+                "runs": stats["count"],
+                "seconds": stats["average"],
+                "best_seconds": stats["min"],
+                "mb_per_s": total_bytes / MIB / stats["average"] if stats["average"] else None,
+                "best_mb_per_s": total_bytes / MIB / stats["min"] if stats["min"] else None,
+            })
+
+    report = {
+        "files": len(sizes),
+        "total_bytes": total_bytes,
+        "sparse": sparse,
+        "cold_cache": cold and evicted,
+        "blake3_available": hashing.blake3_available(),
+        "results": sorted(results, key=lambda r: r["mb_per_s"] or 0, reverse=True),
+        "timings": timer.export_to_dict(),
+    }
+    if output_path is not None:
+        Path(output_path).write_text(json.dumps(report, indent=4), encoding="utf-8")
+    return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark model hashing strategies on generated files.")
+    parser.add_argument("--directory", help="Where to write the test files (default: the temp directory)")
+    parser.add_argument("--size", action="append", help="File size such as 512M or 2G; repeat for more files")
+    parser.add_argument("--buffer-size", action="append", help="Read size such as 8M; repeat for more")
+    parser.add_argument("--workers", action="append", type=int, help="Thread count; repeat for more")
+    parser.add_argument("--method", action="append", choices=METHODS)
+    parser.add_argument("--algorithm", action="append", choices=("sha256", "blake3"))
+    parser.add_argument("--sparse", action="store_true", help="Use sparse files instead of random data")
+    parser.add_argument("--warm", action="store_true", help="Don't evict the files from the page cache between runs")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args(argv)
+
+    report = run_hash_benchmark(
+        directory=args.directory,
+        sizes=[parse_size(s) for s in args.size] if args.size else DEFAULT_SIZES,
+        buffer_sizes=[parse_size(s) for s in args.buffer_size] if args.buffer_size else DEFAULT_BUFFER_SIZES,
+        workers=args.workers or DEFAULT_WORKERS,
+        methods=args.method or METHODS,
+        algorithms=args.algorithm,
+        sparse=args.sparse,
+        repeat=args.repeat,
+        cold=not args.warm,
+        output_path=args.output,
+    )
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compressed, incremental backup files for the SageUtils model cache.
+
+Backups of a cache section are written as a compressed full snapshot, followed by
+compressed deltas (changed and removed top-level keys) against that snapshot.
+Restoring a delta is the base snapshot plus one delta, so any backup can be rebuilt.
+Compression uses zstandard when it is installed and gzip otherwise.
+"""
+
+import gzip
+import json
+import os
+import pathlib
+import re
+import tempfile
+from typing import Any, Dict, Optional
+
+from .logger import get_logger
+
+logger = get_logger('model.cache.backups')
+
+try:
+    import zstandard as _zstd
+    _ZSTD_AVAILABLE = True
+except ImportError:  # pragma: no cover
+    _ZSTD_AVAILABLE = False
+
+_MISSING = object()
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+COMPRESSED_SUFFIX = ".zst" if _ZSTD_AVAILABLE else ".gz"
+
+# <prefix>-<YYYY-MM-DDTHH-MM-SS>[.snap|.delta].json[.zst|.gz]
+_BACKUP_NAME_RE = re.compile(
+    r"^(?P<prefix>.+?)-(?P<date>\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2})"
+    r"(?:\.(?P<kind>snap|delta))?\.json(?P<compression>\.zst|\.gz)?$"
+)
+
+
+def parse_backup_name(name: str) -> Optional[Dict[str, str]]:
+    """Split a backup file name into prefix, date, kind and compression; None if it isn't a backup file."""
+    match = _BACKUP_NAME_RE.match(name)
+    if not match:
+        return None
+    return {
+        "prefix": match.group("prefix"),
+        "date": match.group("date"),
+        "kind": DELTA if match.group("kind") == "delta" else SNAPSHOT,
+        "compression": match.group("compression") or "",
+    }
+
+
+def backup_file_name(prefix: str, date: str, kind: str) -> str:
+    """Name for a new compressed snapshot or delta backup."""
+    marker = "delta" if kind == DELTA else "snap"
+    return f"{prefix}-{date}.{marker}.json{COMPRESSED_SUFFIX}"
+
+
+def _compress(raw: bytes) -> bytes:
+    if _ZSTD_AVAILABLE:
+        return _zstd.ZstdCompressor(level=10).compress(raw)
+    return gzip.compress(raw, compresslevel=6)
+
+
+def _decompress(raw: bytes, compression: str) -> bytes:
+    if compression == ".zst":
+        if not _ZSTD_AVAILABLE:
+            raise RuntimeError("zstandard is required to read .zst backups (pip install zstandard)")
+        return _zstd.ZstdDecompressor().decompressobj().decompress(raw)
+    if compression == ".gz":
+        return gzip.decompress(raw)
+    return raw
+
+
+def read_backup_file(path: pathlib.Path) -> Any:
+    """Read a backup file (compressed or plain JSON) and return its parsed content."""
+    path = pathlib.Path(path)
+    parsed = parse_backup_name(path.name)
+    compression = parsed["compression"] if parsed else ""
+    return json.loads(_decompress(path.read_bytes(), compression).decode("utf-8"))
+
+
+def write_backup_file(path: pathlib.Path, data: Any) -> None:
+    """Write data as compact, compressed JSON, atomically."""
+    path = pathlib.Path(path)
+    payload = _compress(json.dumps(data, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+    with tempfile.NamedTemporaryFile('wb', dir=path.parent, delete=False) as tf:
+        tf.write(payload)
+        tf.flush()
+        os.fsync(tf.fileno())
+        tempname = tf.name
+    os.replace(tempname, path)
+
+
+def compute_delta(base: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """Top-level keys of data that differ from base ("set"), and keys of base missing from data ("del")."""
+    return {
+        "set": {key: value for key, value in data.items() if base.get(key, _MISSING) != value},
+        "del": [key for key in base if key not in data],
+    }
+
+
+def apply_delta(base: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild the backed-up data from its base snapshot and a delta."""
+    data = dict(base)
+    for key in delta.get("del", []):
+        data.pop(key, None)
+    data.update(delta.get("set", {}))
+    return data
+
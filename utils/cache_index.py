@@ -0,0 +1,200 @@
+"""
+Secondary indexes over the SageUtils model cache.
+Kept up to date from TrackedCacheDict change notifications, so lookups by Civitai model id,
+version id, hash -> paths, short-hash prefix and file fingerprint don't scan the whole cache.
+"""
+
+import bisect
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cache_tracking import TrackedCacheDict
+from .hashing import FINGERPRINT_FIELDS
+
+StatKey = Tuple[Any, ...]
+
+
+class SageCacheIndex:
+    """
+    Indexes for one pair of hash (path -> hash) and info (hash -> entry) sections:
+
+    - hash -> paths that currently have that hash (its reference count is len(paths))
+    - Civitai modelId -> hashes, and version id -> hash
+    - a sorted list of lower-cased hashes for short-hash prefix lookups (O(log N))
+    """
+
+    def __init__(self, hash_section: TrackedCacheDict, info_section: TrackedCacheDict):
+        self.hash_section = hash_section
+        self.info_section = info_section
+        self.hash_paths: Dict[str, Dict[str, None]] = {}
+        self.model_hashes: Dict[Any, Dict[str, None]] = {}
+        self.version_hash: Dict[Any, str] = {}
+        # hash -> (modelId, id) as last indexed, so changes can be undone without the old entry
+        self._indexed_ids: Dict[str, Tuple[Any, Any]] = {}
+        self._sorted_hashes: List[Tuple[str, str]] = []
+
+        for path, file_hash in hash_section.items():
+            self._add_path(path, file_hash)
+        for file_hash in info_section.keys():
+            self._reindex_info(file_hash)
+
+        hash_section.add_listener(self._on_hash_change)
+        info_section.add_listener(self._on_info_change)
+
+    def is_for(self, hash_section: TrackedCacheDict, info_section: TrackedCacheDict) -> bool:
+        """True if this index was built over (and is listening to) these exact section objects."""
+        return self.hash_section is hash_section and self.info_section is info_section
+
+    # hash -> paths
+
+    def _add_path(self, path: str, file_hash: str) -> None:
+        paths = self.hash_paths.get(file_hash)
+        if paths is None:
+            paths = self.hash_paths[file_hash] = {}
+            bisect.insort(self._sorted_hashes, (file_hash.lower(), file_hash))
+        paths[path] = None
+
+    def _remove_path(self, path: str, file_hash: str) -> None:
+        paths = self.hash_paths.get(file_hash)
+        if paths is None:
+            return
+        paths.pop(path, None)
+        if not paths:
+            del self.hash_paths[file_hash]
+            item = (file_hash.lower(), file_hash)
+            pos = bisect.bisect_left(self._sorted_hashes, item)
+            if pos < len(self._sorted_hashes) and self._sorted_hashes[pos] == item:
+                del self._sorted_hashes[pos]
+
+    def _on_hash_change(self, path: str, old_hash: Any) -> None:
+        if isinstance(old_hash, str):
+            self._remove_path(path, old_hash)
+        new_hash = self.hash_section.get(path)
+        if isinstance(new_hash, str):
+            self._add_path(path, new_hash)
+
+    # modelId / version id
+
+    def _reindex_info(self, file_hash: str) -> None:
+        old_model_id, old_version_id = self._indexed_ids.pop(file_hash, (None, None))
+        if old_model_id is not None:
+            hashes = self.model_hashes.get(old_model_id)
+            if hashes is not None:
+                hashes.pop(file_hash, None)
+                if not hashes:
+                    del self.model_hashes[old_model_id]
+        if old_version_id is not None and self.version_hash.get(old_version_id) == file_hash:
+            del self.version_hash[old_version_id]
+
+        entry = self.info_section.get(file_hash)
+        if not isinstance(entry, dict):
+            return
+        model_id, version_id = entry.get("modelId"), entry.get("id")
+        if model_id is not None:
+            self.model_hashes.setdefault(model_id, {})[file_hash] = None
+        if version_id is not None:
+            self.version_hash[version_id] = file_hash
+        if model_id is not None or version_id is not None:
+            self._indexed_ids[file_hash] = (model_id, version_id)
+
+    def _on_info_change(self, file_hash: str, old_entry: Any) -> None:
+        self._reindex_info(file_hash)
+
+    # Lookups
+
+    def paths_for_hash(self, file_hash: str) -> List[str]:
+        """Paths currently cached with this hash."""
+        return list(self.hash_paths.get(file_hash, ()))
+
+    def hash_refcount(self, file_hash: str) -> int:
+        """Number of cached paths with this hash."""
+        return len(self.hash_paths.get(file_hash, ()))
+
+    def hashes_for_model_id(self, model_id: Any) -> List[str]:
+        """Hashes of info entries with this Civitai modelId."""
+        return list(self.model_hashes.get(model_id, ()))
+
+    def hash_for_version_id(self, version_id: Any) -> Optional[str]:
+        """Hash of the info entry with this Civitai version id, if any."""
+        return self.version_hash.get(version_id)
+
+    def hashes_with_prefix(self, prefix: str) -> List[str]:
+        """Cached file hashes starting with prefix (case-insensitive), in sorted order."""
+        prefix = prefix.lower()
+        pos = bisect.bisect_left(self._sorted_hashes, (prefix, ""))
+        matches: List[str] = []
+        while pos < len(self._sorted_hashes) and self._sorted_hashes[pos][0].startswith(prefix):
+            matches.append(self._sorted_hashes[pos][1])
+            pos += 1
+        return matches
+
+
+class FingerprintIndex:
+    """
+    Index over the fingerprints section (path -> record of the file when it was hashed): stat key
+    (size, mtime_ns, inode, device) -> paths, so a renamed or moved file's record is found without
+    scanning every record, and AutoV3 hash -> paths, for files with the same tensors.
+    """
+
+    def __init__(self, section: TrackedCacheDict):
+        self.section = section
+        self.stat_paths: Dict[StatKey, Dict[str, None]] = {}
+        self.autov3_paths: Dict[str, Dict[str, None]] = {}
+        # path -> (stat key, autov3) as last indexed, so changes can be undone without the old record
+        self._indexed: Dict[str, Tuple[Optional[StatKey], Optional[str]]] = {}
+
+        for path in section.keys():
+            self._reindex(path)
+
+        section.add_listener(self._on_change)
+
+    def is_for(self, section: TrackedCacheDict) -> bool:
+        """True if this index was built over (and is listening to) this exact section object."""
+        return self.section is section
+
+    @staticmethod
+    def stat_key(record: Any) -> Optional[StatKey]:
+        """
+        (size, mtime_ns, inode, device) of a fingerprint record, or None for records written before the device
+        id was recorded: those are only trusted for their own path, since their inode may belong to another disk.
+        """
+        if not isinstance(record, dict) or record.get("device") is None:
+            return None
+        return tuple(record.get(field) for field in FINGERPRINT_FIELDS)
+
+    @staticmethod
+    def _unlink(mapping: Dict[Any, Dict[str, None]], key: Any, path: str) -> None:
+        paths = mapping.get(key)
+        if paths is not None:
+            paths.pop(path, None)
+            if not paths:
+                del mapping[key]
+
+    def _reindex(self, path: str) -> None:
+        old_key, old_autov3 = self._indexed.pop(path, (None, None))
+        if old_key is not None:
+            self._unlink(self.stat_paths, old_key, path)
+        if old_autov3:
+            self._unlink(self.autov3_paths, old_autov3, path)
+
+        record = self.section.get(path)
+        key = self.stat_key(record)
+        autov3 = record.get("autov3") if isinstance(record, dict) else None
+        if key is not None:
+            self.stat_paths.setdefault(key, {})[path] = None
+        if autov3:
+            self.autov3_paths.setdefault(autov3, {})[path] = None
+        if key is not None or autov3:
+            self._indexed[path] = (key, autov3)
+
+    def _on_change(self, path: str, old_record: Any) -> None:
+        self._reindex(path)
+
+    # Lookups
+
+    def paths_with_stat(self, key: Optional[StatKey]) -> List[str]:
+        """Paths whose record has this stat key."""
+        return list(self.stat_paths.get(key, ())) if key is not None else []
+
+    def paths_with_autov3(self, autov3: Optional[str]) -> List[str]:
+        """Paths whose record has this AutoV3 (tensor data) hash."""
+        return list(self.autov3_paths.get(autov3, ())) if autov3 else []
@@ -0,0 +1,127 @@
+"""
+Append-only journal for the SageUtils model cache (JSON backend).
+Each save appends the changed paths/entries as newline-delimited JSON operations and fsyncs them,
+so a crash loses nothing that was saved, without rewriting the full cache files every time.
+The journal is replayed on load and compacted into the snapshot files once it grows past a threshold.
+
+Operations:
+    {"op": "set_hash", "path": ..., "hash": ...}
+    {"op": "del_hash", "path": ...}
+    {"op": "set_info", "hash": ..., "info": {...}}          whole entry
+    {"op": "merge_info", "hash": ..., "info": {...}}        changed top-level fields only
+    {"op": "touch_last_used", "hash": ..., "lastUsed": ...}
+    {"op": "del_info", "hash": ...}
+"""
+
+import json
+import os
+import pathlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .logger import get_logger
+
+logger = get_logger('model.cache.journal')
+
+
+class CacheJournal:
+    """Newline-delimited JSON journal of hash/info cache operations."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+
+    def size(self) -> int:
+        """Current journal size in bytes (0 if it does not exist)."""
+        try:
+            return self.path.stat().st_size
+        except OSError:
+            return 0
+
+    def append(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Append records and fsync them. Returns the number of records written."""
+        lines = [json.dumps(record, separators=(",", ":")) for record in records]
+        if not lines:
+            return 0
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # Start on a new line if a crashed writer left a torn record, so it doesn't swallow ours
+            if os.lseek(fd, 0, os.SEEK_END) > 0:
+                os.lseek(fd, -1, os.SEEK_END)
+                if os.read(fd, 1) != b"\n":
+                    payload = b"\n" + payload
+            os.write(fd, payload)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return len(lines)
+
+    def read(self) -> List[Dict[str, Any]]:
+        """Read all records. A torn final line (from a crash mid-append) is skipped."""
+        return self.read_from(0)[0]
+
+    def read_from(self, offset: int) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        """
+        Read the records appended after byte offset, returning (records, offset after the last complete line).
+        An incomplete final line is left for the next read. Returns None if the journal is now shorter than
+        offset (it was truncated), so the caller has to reload from the snapshot files.
+        """
+        try:
+            with self.path.open("rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < offset:
+                    return None
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return None if offset else ([], 0)
+
+        end = data.rfind(b"\n") + 1
+        records = []
+        for line_number, line in enumerate(data[:end].split(b"\n"), 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable journal record {line_number} in {self.path.name}: {e}")
+        return records, offset + end
+
+    def truncate(self) -> None:
+        """Empty the journal once its records are in the snapshot files."""
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def replay(records: Iterable[Dict[str, Any]], hash_data: Dict[str, str], info_data: Dict[str, Any]) -> int:
+        """Apply records, in order, to plain hash/info dicts. Returns the number of records applied."""
+        applied = 0
+        for record in records:
+            op = record.get("op") if isinstance(record, dict) else None
+            try:
+                applied += CacheJournal._apply(op, record, hash_data, info_data)
+            except (KeyError, TypeError, AttributeError) as e:
+                logger.warning(f"Skipping malformed journal operation {op!r}: {e}")
+        return applied
+
+    @staticmethod
+    def _apply(op: Any, record: Dict[str, Any], hash_data: Dict[str, str], info_data: Dict[str, Any]) -> int:
+        if op == "set_hash":
+            hash_data[record["path"]] = record["hash"]
+        elif op == "del_hash":
+            hash_data.pop(record["path"], None)
+        elif op == "set_info":
+            info_data[record["hash"]] = record["info"]
+        elif op == "merge_info":
+            info_data.setdefault(record["hash"], {}).update(record["info"])
+        elif op == "touch_last_used":
+            info_data.setdefault(record["hash"], {})["lastUsed"] = record["lastUsed"]
+        elif op == "del_info":
+            info_data.pop(record["hash"], None)
+        else:
+            logger.warning(f"Skipping unknown journal operation: {op!r}")
+            return 0
+        return 1
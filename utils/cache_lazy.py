@@ -0,0 +1,485 @@
+"""
+Lazy loading for the SageUtils info cache (JSON backend).
+
+Whenever sage_cache_info.json is written (or first read), two derived files are written next to it:
+- sage_cache_info.summary.json: per hash, the entry's scalar fields, its model type/name, and where
+  its nested fields are stored in the blob file.
+- sage_cache_info-<id>.blob: the nested fields (model, trainedWords, hashes, images, ...) and long
+  strings (description) of every entry, as compact JSON objects written back to back.
+
+If the summary still matches the info file on load, only the summary is parsed. Each entry's nested
+fields are read from the blob (one seek and read) the first time anything reads them. A blob is kept while
+any entry in this process still points into it; if another process removed it anyway, the entry's fields
+are read from the current summary or the info file instead.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+import threading
+import uuid
+import weakref
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .cache_tracking import TrackedCacheEntry
+from .logger import get_logger
+
+logger = get_logger('model.cache.lazy')
+
+SUMMARY_VERSION = 1
+BLOBS_TO_KEEP = 2  # current blob plus the previous one, for other processes that haven't reloaded yet
+COLD_STRING_LENGTH = 256  # Longer strings (e.g. version descriptions) are stored in the blob too
+
+
+def is_cold_value(value: Any) -> bool:
+    """Nested values (dicts and lists) and long strings live in the blob file; other scalars stay resident."""
+    return isinstance(value, (dict, list)) or (isinstance(value, str) and len(value) > COLD_STRING_LENGTH)
+
+
+class BlobFile:
+    """A blob file that unloaded entries point into. Shared by those entries, so it is alive while any of them is."""
+    __slots__ = ('path', 'info_path', '__weakref__')
+
+    def __init__(self, path: pathlib.Path, info_path: pathlib.Path):
+        self.path = path
+        self.info_path = info_path
+
+
+# Blob files referenced by unloaded entries of this process, by path; old blobs in here are never removed
+_live_blobs: "weakref.WeakValueDictionary[str, BlobFile]" = weakref.WeakValueDictionary()
+_live_blobs_lock = threading.Lock()
+
+
+def get_blob_file(path: pathlib.Path, info_path: pathlib.Path) -> BlobFile:
+    with _live_blobs_lock:
+        blob = _live_blobs.get(str(path))
+        if blob is None:
+            blob = BlobFile(path, info_path)
+            _live_blobs[str(path)] = blob
+        return blob
+
+
+class LazyInfoEntry(TrackedCacheEntry):
+    """
+    An info entry holding only its scalar fields until one of its nested fields is read.
+    Reading a nested field, iterating, comparing or copying the entry loads the rest from the blob file.
+    """
+    __slots__ = ('_blob', '_offset', '_length', '_cold_keys', '_key', 'model_summary')
+
+    def __init__(self, key: str, data: Dict[str, Any], blob: BlobFile, offset: int, length: int,
+                 cold_keys: Tuple[str, ...], model_summary: Dict[str, Any]):
+        TrackedCacheEntry.__init__(self, None, None, data)
+        self._blob: Optional[BlobFile] = blob if cold_keys else None
+        self._offset = offset
+        self._length = length
+        self._cold_keys = tuple(cold_keys)
+        self._key = key
+        self.model_summary = model_summary
+
+    @property
+    def loaded(self) -> bool:
+        return self._blob is None
+
+    def cold_bytes(self) -> bytes:
+        """Raw JSON of the not-yet-loaded nested fields."""
+        blob = self._blob
+        if blob is None:
+            return b"{}"
+        try:
+            with open(blob.path, "rb") as f:
+                f.seek(self._offset)
+                return f.read(self._length)
+        except FileNotFoundError:
+            return self._reread_cold_bytes(blob)
+
+    def _reread_cold_bytes(self, blob: BlobFile) -> bytes:
+        """
+        The blob file was removed by another process: read the nested fields from the current summary's blob
+        (rebinding the entry to it) or, failing that, from the info file.
+        """
+        logger.debug(f"Info blob {blob.path.name} is gone, re-reading {self._key} from the current cache files.")
+        located = _locate_current_entry(blob.info_path, self._key)
+        if located is not None:
+            blob_path, offset, length, cold_keys = located
+            try:
+                with open(blob_path, "rb") as f:
+                    f.seek(offset)
+                    raw = f.read(length)
+            except OSError:
+                raw = None
+            if raw is not None and set(cold_keys) == set(self._cold_keys):
+                self.rebind(get_blob_file(blob_path, blob.info_path), offset, length)
+                return raw
+            if raw is not None:
+                cold = json.loads(raw)
+                return _dump_cold({field: cold[field] for field in self._cold_keys if field in cold})
+
+        try:
+            with open(blob.info_path, "r", encoding="utf-8") as f:
+                stored = json.load(f).get(self._key)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to re-read info entry {self._key} from {blob.info_path.name}: {e}")
+            stored = None
+        if not isinstance(stored, dict):
+            logger.warning(f"Info entry {self._key} is no longer in the cache files; its nested fields are lost.")
+            return b"{}"
+        return _dump_cold({field: stored[field] for field in self._cold_keys if field in stored})
+
+    def _materialize(self) -> None:
+        if self._blob is None:
+            return
+        with self._lock():
+            if self._blob is None:
+                return  # Loaded by another thread meanwhile
+            cold = json.loads(self.cold_bytes())
+            for field, value in cold.items():
+                # Fields written while unloaded win over the stored ones
+                if not dict.__contains__(self, field):
+                    dict.__setitem__(self, field, value)
+            self._cold_keys = ()
+            # Last, so other threads never see the entry as loaded before its fields are in
+            self._blob = None
+
+    def rebind(self, blob: BlobFile, offset: int, length: int) -> None:
+        """Point an unloaded entry at its new location after the blob file was rewritten."""
+        if self._blob is not None:
+            self._blob = blob
+            self._offset = offset
+            self._length = length
+
+    # Reads
+
+    def __getitem__(self, field: str) -> Any:
+        if self._blob is not None and field in self._cold_keys:
+            self._materialize()
+        return dict.__getitem__(self, field)
+
+    def get(self, field: str, default: Any = None) -> Any:
+        if self._blob is not None and field in self._cold_keys:
+            self._materialize()
+        return dict.get(self, field, default)
+
+    def __contains__(self, field: object) -> bool:
+        return dict.__contains__(self, field) or (self._blob is not None and field in self._cold_keys)
+
+    def __iter__(self) -> Iterator[str]:
+        self._materialize()
+        return dict.__iter__(self)
+
+    def __len__(self) -> int:
+        self._materialize()
+        return dict.__len__(self)
+
+    def keys(self):
+        self._materialize()
+        return dict.keys(self)
+
+    def values(self):
+        self._materialize()
+        return dict.values(self)
+
+    def items(self):
+        self._materialize()
+        return dict.items(self)
+
+    def __eq__(self, other: object) -> bool:
+        self._materialize()
+        if isinstance(other, LazyInfoEntry):
+            other._materialize()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other: object) -> bool:
+        self._materialize()
+        if isinstance(other, LazyInfoEntry):
+            other._materialize()
+        return dict.__ne__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        self._materialize()
+        return dict.__repr__(self)
+
+    def copy(self) -> dict:
+        self._materialize()
+        return dict(dict.items(self))
+
+    def __copy__(self) -> dict:
+        return self.copy()
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> dict:
+        self._materialize()
+        return TrackedCacheEntry.__deepcopy__(self, memo)
+
+    def __reduce__(self):
+        self._materialize()
+        return TrackedCacheEntry.__reduce__(self)
+
+    # Writes
+
+    def __setitem__(self, field: str, value: Any) -> None:
+        if self._blob is not None and field in self._cold_keys:
+            self._materialize()
+        TrackedCacheEntry.__setitem__(self, field, value)
+
+    def setdefault(self, field: str, default: Any = None) -> Any:
+        if self._blob is not None and field in self._cold_keys:
+            self._materialize()
+        return TrackedCacheEntry.setdefault(self, field, default)
+
+    def __delitem__(self, field: str) -> None:
+        self._materialize()
+        TrackedCacheEntry.__delitem__(self, field)
+
+    def pop(self, field: str, *default: Any) -> Any:
+        self._materialize()
+        return TrackedCacheEntry.pop(self, field, *default)
+
+    def popitem(self) -> Tuple[str, Any]:
+        self._materialize()
+        return TrackedCacheEntry.popitem(self)
+
+    def clear(self) -> None:
+        self._materialize()
+        TrackedCacheEntry.clear(self)
+
+
+def get_model_summary(entry: Any) -> Dict[str, Any]:
+    """Return {"type", "name"} of an info entry's Civitai model without loading its nested fields."""
+    if isinstance(entry, LazyInfoEntry) and not entry.loaded:
+        return dict(entry.model_summary)
+    model = entry.get("model") if isinstance(entry, dict) else None
+    if not isinstance(model, dict):
+        return {}
+    return {field: model[field] for field in ("type", "name") if field in model}
+
+
+def full_entry(entry: Any) -> Any:
+    """A plain copy of an entry with its nested fields, without keeping them loaded on the entry."""
+    if isinstance(entry, LazyInfoEntry) and not entry.loaded:
+        full = {field: dict.__getitem__(entry, field) for field in dict.keys(entry)}
+        for field, value in json.loads(entry.cold_bytes()).items():
+            full.setdefault(field, value)
+        return full
+    return dict(entry.items()) if isinstance(entry, dict) else entry
+
+
+def has_unloaded_entries(info: Dict[str, Any]) -> bool:
+    return any(isinstance(entry, LazyInfoEntry) and not entry.loaded for entry in dict.values(info))
+
+
+def capture_info(info: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    """
+    Capture the info section so it can be read on another thread while this one keeps changing it.
+    Loaded entries are shallow-copied; unloaded ones are captured as detached entries at their current blob location.
+    """
+    captured: List[Tuple[str, Any]] = []
+    for key, entry in list(dict.items(info)):
+        if isinstance(entry, LazyInfoEntry) and not entry.loaded:
+            entry = LazyInfoEntry(key, dict(dict.items(entry)), entry._blob, entry._offset, entry._length,
+                                  entry._cold_keys, entry.model_summary)
+        elif isinstance(entry, dict):
+            entry = dict(entry.items())
+        captured.append((key, entry))
+    return captured
+
+
+def expand_info(captured: List[Tuple[str, Any]]) -> Dict[str, Any]:
+    """Plain info data, with all nested fields, from capture_info()."""
+    return {key: full_entry(entry) for key, entry in captured}
+
+
+def _split_entry(entry: Any) -> Tuple[Dict[str, Any], bytes, Tuple[str, ...], Dict[str, Any], Dict[str, Any]]:
+    """Return (scalars, nested fields as JSON, nested field names, model summary, full entry) for one entry."""
+    if isinstance(entry, LazyInfoEntry) and not entry.loaded:
+        scalars = {field: dict.__getitem__(entry, field) for field in dict.keys(entry)}
+        cold_raw = entry.cold_bytes()
+        return scalars, cold_raw, entry._cold_keys, dict(entry.model_summary), full_entry(entry)
+
+    full = dict(entry.items())
+    scalars = {field: value for field, value in full.items() if not is_cold_value(value)}
+    cold = {field: value for field, value in full.items() if is_cold_value(value)}
+    cold_raw = _dump_cold(cold)
+    return scalars, cold_raw, tuple(cold), get_model_summary(full), full
+
+
+def _dump_cold(cold: Dict[str, Any]) -> bytes:
+    return json.dumps(cold, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def _summary_path_for(info_path: pathlib.Path) -> pathlib.Path:
+    return info_path.with_name(f"{info_path.stem}.summary.json")
+
+
+# The last summary read by _locate_current_entry, by (path, size, mtime), so entries falling back together parse it once
+_located_summary: Dict[str, Any] = {}
+_located_summary_lock = threading.Lock()
+
+
+def _locate_current_entry(info_path: pathlib.Path, key: str) -> Optional[Tuple[pathlib.Path, int, int, List[str]]]:
+    """(blob path, offset, length, nested field names) of an entry in the current summary, or None if it isn't there."""
+    summary_path = _summary_path_for(info_path)
+    try:
+        with _located_summary_lock:
+            st = summary_path.stat()
+            signature = (str(summary_path), st.st_size, st.st_mtime_ns)
+            if _located_summary.get("signature") != signature:
+                with summary_path.open("r", encoding="utf-8") as f:
+                    _located_summary["summary"] = json.load(f)
+                _located_summary["signature"] = signature
+            summary = _located_summary["summary"]
+        record = summary.get("entries", {}).get(key)
+        if not isinstance(record, list):
+            return None
+        return info_path.with_name(summary["blob"]), record[1], record[2], record[3]
+    except (OSError, ValueError, KeyError, IndexError):
+        return None
+
+
+def write_info_files(info_path: pathlib.Path, info: Dict[str, Any], write_snapshot: bool = True,
+                     source_stat: Optional[os.stat_result] = None, write_derived: bool = True) -> str:
+    """
+    Write the info snapshot (formatted like file_manager.atomic_write_json), the blob file and the summary,
+    one entry at a time so unloaded entries are never all in memory at once.
+    With write_snapshot=False the existing info file is kept and only the derived files are written for it;
+    pass the stat of the info file taken before it was read as source_stat, so a change since then invalidates them.
+    With write_derived=False only the snapshot is written, and the summary is removed so the next load rebuilds it.
+    Returns the SHA-256 of the canonical JSON of the data, as used by the backup manifest.
+    """
+    info_path = pathlib.Path(info_path)
+    directory = info_path.parent
+    blob_path = info_path.with_name(f"{info_path.stem}-{uuid.uuid4().hex[:12]}.blob")
+    content_hash = hashlib.sha256()
+    records: Dict[str, Any] = {}
+    rebinds = []
+
+    blob_file = tempfile.NamedTemporaryFile('wb', dir=directory, delete=False) if write_derived else None
+    snapshot_file = tempfile.NamedTemporaryFile('w', dir=directory, delete=False, encoding='utf-8') if write_snapshot else None
+    keys = sorted(info.keys())
+    try:
+        content_hash.update(b"{")
+        if snapshot_file is not None:
+            snapshot_file.write("{")
+        for position, key in enumerate(keys):
+            entry = dict.__getitem__(info, key)
+            separator = "," if position else ""
+            if blob_file is None:
+                full = full_entry(entry)
+            elif isinstance(entry, dict):
+                scalars, cold_raw, cold_keys, model_summary, full = _split_entry(entry)
+                offset = blob_file.tell()
+                blob_file.write(cold_raw)
+                records[key] = [scalars, offset, len(cold_raw), list(cold_keys), model_summary]
+                if isinstance(entry, LazyInfoEntry) and not entry.loaded:
+                    rebinds.append((entry, offset, len(cold_raw)))
+            else:
+                full = entry
+                records[key] = {"value": entry}
+
+            content_hash.update(f"{separator}{json.dumps(key)}:".encode("utf-8"))
+            content_hash.update(json.dumps(full, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+            if snapshot_file is not None:
+                value_json = json.dumps(full, separators=(",", ":"), sort_keys=True, indent=4).replace("\n", "\n    ")
+                snapshot_file.write(f"{separator}\n    {json.dumps(key)}:{value_json}")
+        content_hash.update(b"}")
+        if snapshot_file is not None:
+            snapshot_file.write("\n}" if keys else "}")
+
+        for f in (blob_file, snapshot_file):
+            if f is not None:
+                f.flush()
+                os.fsync(f.fileno())
+    finally:
+        if blob_file is not None:
+            blob_file.close()
+        if snapshot_file is not None:
+            snapshot_file.close()
+
+    summary_path = _summary_path_for(info_path)
+    if blob_file is None:
+        if snapshot_file is not None:
+            summary_path.unlink(missing_ok=True)
+            os.replace(snapshot_file.name, info_path)
+        return content_hash.hexdigest()
+
+    os.replace(blob_file.name, blob_path)
+    if snapshot_file is not None:
+        os.replace(snapshot_file.name, info_path)
+
+    st = source_stat if source_stat is not None and not write_snapshot else info_path.stat()
+    summary = {
+        "version": SUMMARY_VERSION,
+        "source": {"size": st.st_size, "mtime_ns": st.st_mtime_ns},
+        "blob": blob_path.name,
+        "blob_size": blob_path.stat().st_size,
+        "content_hash": content_hash.hexdigest(),
+        "entries": records,
+    }
+    with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, encoding='utf-8') as tf:
+        json.dump(summary, tf, separators=(",", ":"))
+        tf.flush()
+        os.fsync(tf.fileno())
+        tempname = tf.name
+    os.replace(tempname, summary_path)
+
+    blob = get_blob_file(blob_path, info_path)
+    for entry, offset, length in rebinds:
+        entry.rebind(blob, offset, length)
+    _remove_old_blobs(info_path, blob_path)
+    return summary["content_hash"]
+
+
+def _remove_old_blobs(info_path: pathlib.Path, current: pathlib.Path) -> None:
+    """
+    Remove blobs older than the newest BLOBS_TO_KEEP, except those unloaded entries of this process still point into.
+    Other processes may still point into a removed blob; their entries fall back to the current files.
+    """
+    blobs = sorted(info_path.parent.glob(f"{info_path.stem}-*.blob"), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+    keep = {current}
+    keep.update(blobs[:BLOBS_TO_KEEP])
+    with _live_blobs_lock:
+        keep.update(blob for blob in blobs if str(blob) in _live_blobs)
+    for blob in blobs:
+        if blob not in keep:
+            try:
+                blob.unlink()
+            except OSError as e:
+                # e.g. still open in another process on Windows; retried on the next write
+                logger.debug(f"Unable to remove old info blob {blob.name}: {e}")
+
+
+def load_info_summary(info_path: pathlib.Path) -> Optional[Tuple[Dict[str, Any], str]]:
+    """
+    Build lazy info entries from the summary file, if it was written for the current info file.
+    Returns (hash -> entry, content hash of the info file), or None if the info file has to be parsed in full.
+    """
+    info_path = pathlib.Path(info_path)
+    summary_path = _summary_path_for(info_path)
+    try:
+        if not summary_path.is_file():
+            return None
+        with summary_path.open("r", encoding="utf-8") as f:
+            summary = json.load(f)
+        st = info_path.stat()
+        source = summary.get("source", {})
+        if (summary.get("version") != SUMMARY_VERSION
+                or source.get("size") != st.st_size or source.get("mtime_ns") != st.st_mtime_ns):
+            return None
+        blob_path = info_path.with_name(summary["blob"])
+        if not blob_path.is_file() or blob_path.stat().st_size != summary.get("blob_size"):
+            return None
+    except Exception as e:
+        logger.warning(f"Unable to read info cache summary {summary_path.name}: {e}")
+        return None
+
+    info: Dict[str, Any] = {}
+    blob = get_blob_file(blob_path, info_path)
+    for key, record in summary.get("entries", {}).items():
+        if isinstance(record, dict):
+            info[key] = record.get("value")
+            continue
+        scalars, offset, length, cold_keys, model_summary = record
+        info[key] = LazyInfoEntry(key, scalars, blob, offset, length, tuple(cold_keys), model_summary)
+    return info, summary.get("content_hash", "")
@@ -0,0 +1,106 @@
+"""
+Cross-process lock for the SageUtils model cache files.
+Several ComfyUI processes can share one user directory; saves take this lock so they can merge
+what the other processes wrote before writing their own changes, instead of overwriting them.
+"""
+
+import os
+import pathlib
+import threading
+import time
+from typing import Optional
+
+from .logger import get_logger
+
+logger = get_logger('model.cache.lock')
+
+try:
+    import fcntl as _fcntl
+except ImportError:  # pragma: no cover
+    _fcntl = None
+
+try:
+    import msvcrt as _msvcrt
+except ImportError:  # pragma: no cover
+    _msvcrt = None
+
+
+class CacheLockTimeout(TimeoutError):
+    """Raised when the cache lock could not be acquired in time."""
+
+
+class CacheFileLock:
+    """
+    Advisory exclusive lock on a lock file (fcntl.flock on POSIX, msvcrt.locking on Windows).
+    Re-entrant within a process, and also serializes threads of the same process.
+    Where neither locking call is available, only the in-process lock is taken.
+    """
+
+    def __init__(self, path: pathlib.Path, timeout: float = 30.0, poll_interval: float = 0.05):
+        self.path = pathlib.Path(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._depth > 0
+
+    def acquire(self) -> None:
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise CacheLockTimeout(f"Timed out waiting for {self.path.name} in this process")
+        if self._depth:
+            self._depth += 1
+            return
+        try:
+            self._fd = self._lock_file()
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._depth = 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            try:
+                self._unlock_file(self._fd)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self) -> 'CacheFileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+    def _lock_file(self) -> Optional[int]:
+        if _fcntl is None and _msvcrt is None:
+            return None
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                if _fcntl is not None:
+                    _fcntl.flock(fd, _fcntl.LOCK_EX | _fcntl.LOCK_NB)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    _msvcrt.locking(fd, _msvcrt.LK_NBLCK, 1)
+                return fd
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise CacheLockTimeout(f"Timed out waiting for {self.path.name}, held by another process")
+                time.sleep(self.poll_interval)
+
+    @staticmethod
+    def _unlock_file(fd: int) -> None:
+        if _fcntl is not None:
+            _fcntl.flock(fd, _fcntl.LOCK_UN)
+        elif _msvcrt is not None:
+            os.lseek(fd, 0, os.SEEK_SET)
+            _msvcrt.locking(fd, _msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,172 @@
+"""
+Filtering, field projection and pagination of the model cache for the /sage_cache routes,
+so clients can fetch only the entries and fields they render instead of the whole cache.
+
+Query parameters (all optional):
+    type              Civitai model type(s), comma separated (e.g. LORA,Checkpoint)      [info]
+    base_model        baseModel value(s), comma separated (e.g. SDXL 1.0)                  [info]
+    update_available  true/false                                                           [info]
+    path_prefix       only files whose path starts with this                               [info, hash]
+    last_used_after   ISO date/time; entries last used at or after it                      [info]
+    last_used_before  ISO date/time; entries last used before it                           [info]
+    fields            top-level fields to return, comma separated; model.type and
+                      model.name are read without loading the full Civitai data           [info]
+    offset, limit     page through the results in key order; the response is then
+                      {"total", "offset", "limit", "items"} instead of the plain mapping  [info, hash]
+"""
+
+import datetime
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple
+
+from .cache_lazy import capture_info, full_entry, get_model_summary
+from .type_utils import str_to_bool
+
+QUERY_PARAMS = (
+    "type", "base_model", "update_available", "path_prefix",
+    "last_used_after", "last_used_before", "fields", "offset", "limit",
+)
+
+
+def has_query(params: Mapping[str, str]) -> bool:
+    """True if any cache query parameter was given (otherwise the routes return the whole section)."""
+    return any(params.get(name) not in (None, "") for name in QUERY_PARAMS)
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+def _parse_datetime(name: str, value: Optional[str]) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: expected an ISO date/time, got {value!r}")
+
+
+def _parse_int(name: str, value: Optional[str]) -> Optional[int]:
+    if value in (None, ""):
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: expected a whole number, got {value!r}")
+    if number < 0:
+        raise ValueError(f"Invalid {name}: must not be negative")
+    return number
+
+
+def parse_cache_query(params: Mapping[str, str]) -> Dict[str, Any]:
+    """Parse and validate cache query parameters. Raises ValueError for invalid values."""
+    update_available = params.get("update_available")
+    return {
+        "types": {t.lower() for t in _split(params.get("type"))},
+        "base_models": {b.lower() for b in _split(params.get("base_model"))},
+        "update_available": str_to_bool(update_available) if update_available not in (None, "") else None,
+        "path_prefix": params.get("path_prefix") or None,
+        "last_used_after": _parse_datetime("last_used_after", params.get("last_used_after")),
+        "last_used_before": _parse_datetime("last_used_before", params.get("last_used_before")),
+        "fields": _split(params.get("fields")),
+        "offset": _parse_int("offset", params.get("offset")),
+        "limit": _parse_int("limit", params.get("limit")),
+    }
+
+
+def _last_used_in_range(entry: Dict[str, Any], after: Optional[datetime.datetime], before: Optional[datetime.datetime]) -> bool:
+    last_used = entry.get("lastUsed")
+    if not last_used:
+        return False
+    try:
+        when = datetime.datetime.fromisoformat(last_used)
+    except (TypeError, ValueError):
+        return False
+    if after is not None and when < after:
+        return False
+    if before is not None and when >= before:
+        return False
+    return True
+
+
+def _info_matches(entry: Any, query: Dict[str, Any], hashes_in_path: Optional[Set[str]], file_hash: str) -> bool:
+    if not isinstance(entry, dict):
+        return False
+    if hashes_in_path is not None and file_hash not in hashes_in_path:
+        return False
+    if query["types"] and str(get_model_summary(entry).get("type", "")).lower() not in query["types"]:
+        return False
+    if query["base_models"] and str(entry.get("baseModel", "")).lower() not in query["base_models"]:
+        return False
+    if query["update_available"] is not None and bool(entry.get("update_available")) != query["update_available"]:
+        return False
+    if query["last_used_after"] is not None or query["last_used_before"] is not None:
+        if not _last_used_in_range(entry, query["last_used_after"], query["last_used_before"]):
+            return False
+    return True
+
+
+def _project(entry: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Copy only the requested fields; dotted names select one nested field (e.g. model.type)."""
+    projected: Dict[str, Any] = {}
+    summary = None
+    for field in fields:
+        head, _, rest = field.partition(".")
+        if not rest:
+            if field in entry:
+                projected[field] = entry[field]
+            continue
+        if head == "model" and rest in ("type", "name"):
+            if summary is None:
+                summary = get_model_summary(entry)
+            if rest not in summary:
+                continue
+            value = summary[rest]
+        else:
+            parent = entry.get(head)
+            if not isinstance(parent, dict) or rest not in parent:
+                continue
+            value = parent[rest]
+        target = projected.setdefault(head, {})
+        if isinstance(target, dict):
+            target[rest] = value
+    return projected
+
+
+def _paginate(items: List[Tuple[str, Any]], query: Dict[str, Any], transform: Callable[[Any], Any] = lambda value: value) -> Any:
+    """Apply offset/limit (in key order) to the matching items; transform is applied to the returned values only."""
+    if query["offset"] is None and query["limit"] is None:
+        return {key: transform(value) for key, value in items}
+    items.sort(key=lambda item: item[0])
+    offset = query["offset"] or 0
+    limit = query["limit"]
+    page = items[offset:] if limit is None else items[offset:offset + limit]
+    return {"total": len(items), "offset": offset, "limit": limit, "items": {key: transform(value) for key, value in page}}
+
+
+def query_info(cache: Any, query: Dict[str, Any]) -> Any:
+    """Info entries (hash -> entry) matching the query, projected to the requested fields."""
+    # Runs off the event loop while other threads write to the cache: copy under the sections lock, filter the copy
+    with cache.sections_lock:
+        hash_items = list(dict.items(cache.hash)) if query["path_prefix"] else None
+        captured = capture_info(cache.info)
+
+    hashes_in_path = None
+    if hash_items is not None:
+        prefix = query["path_prefix"]
+        hashes_in_path = {h for path, h in hash_items if path.startswith(prefix)}
+
+    items = [
+        (file_hash, entry) for file_hash, entry in captured
+        if _info_matches(entry, query, hashes_in_path, file_hash)
+    ]
+    fields = query["fields"]
+    return _paginate(items, query, (lambda entry: _project(entry, fields)) if fields else full_entry)
+
+
+def query_hash(cache: Any, query: Dict[str, Any]) -> Any:
+    """Path -> hash entries matching the query's path_prefix."""
+    prefix = query["path_prefix"]
+    with cache.sections_lock:
+        hash_items = list(dict.items(cache.hash))
+    items = [(path, h) for path, h in hash_items if not prefix or path.startswith(prefix)]
+    return _paginate(items, query)
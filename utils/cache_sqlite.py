@@ -0,0 +1,229 @@
+"""
+SQLite storage backend for the SageUtils model cache.
+Stores one row per file path and one row per hash, so saves only touch changed rows.
+Every save stamps the rows it writes (and the keys it deletes) with a new change sequence number,
+so other processes reload only what changed since the sequence number they last saw.
+"""
+
+import json
+import pathlib
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .logger import get_logger
+
+logger = get_logger('model.cache.sqlite')
+
+SCHEMA_VERSION = 2
+TOMBSTONES_TO_KEEP = 10000  # Deleted keys remembered for incremental reloads; older ones force a full reload
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS paths (
+    path TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS paths_hash_idx ON paths (hash);
+CREATE TABLE IF NOT EXISTS info (
+    hash TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS deleted (
+    tbl TEXT NOT NULL,
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (tbl, key)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Indexes on the seq columns, created after databases from schema 1 got the columns
+_SEQ_INDEXES = """
+CREATE INDEX IF NOT EXISTS paths_seq_idx ON paths (seq);
+CREATE INDEX IF NOT EXISTS info_seq_idx ON info (seq);
+CREATE INDEX IF NOT EXISTS deleted_seq_idx ON deleted (seq);
+"""
+
+# (hash upserts, hash deletes, info upserts, info deletes, change sequence number they go up to)
+SQLiteChanges = Tuple[Dict[str, str], List[str], Dict[str, Any], List[str], int]
+
+
+class SageCacheSQLiteStore:
+    """
+    Embedded SQLite store for the hash (path -> hash) and info (hash -> metadata) caches.
+    Uses WAL mode so readers in other processes are not blocked by writers.
+    """
+
+    def __init__(self, db_path: pathlib.Path):
+        self.db_path = pathlib.Path(db_path)
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database connection on first use and make sure the schema exists."""
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            for table in ("paths", "info"):
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if "seq" not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+            conn.executescript(_SEQ_INDEXES)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                (str(SCHEMA_VERSION),)
+            )
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('change_seq', '0')")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('tombstone_floor', '0')")
+            conn.commit()
+            self._conn = conn
+            logger.debug(f"Opened SQLite cache at {self.db_path}")
+        return self._conn
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def is_empty(self) -> bool:
+        """Return True if neither the path nor the info table holds any rows."""
+        with self._lock:
+            conn = self._connect()
+            has_paths = conn.execute("SELECT 1 FROM paths LIMIT 1").fetchone() is not None
+            has_info = conn.execute("SELECT 1 FROM info LIMIT 1").fetchone() is not None
+            return not (has_paths or has_info)
+
+    def data_version(self) -> int:
+        """
+        Return SQLite's data_version counter for this connection.
+        The value changes only when another connection commits, so it doubles as a cheap reload check.
+        """
+        with self._lock:
+            return self._connect().execute("PRAGMA data_version").fetchone()[0]
+
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Get a value from the meta table."""
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else default
+
+    def set_meta(self, key: str, value: str) -> None:
+        """Set a value in the meta table."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def change_seq(self) -> int:
+        """The sequence number of the last save. Read it before loading rows, so nothing saved meanwhile is skipped."""
+        return int(self.get_meta("change_seq", "0") or 0)
+
+    def load_changes(self, since: int) -> Optional[SQLiteChanges]:
+        """
+        Load the rows written and the keys deleted after change sequence number `since`.
+        Returns None if deletions that old are no longer remembered, and a full reload is needed.
+        """
+        with self._lock:
+            conn = self._connect()
+            seq = self.change_seq()
+            if since < int(self.get_meta("tombstone_floor", "0") or 0):
+                return None
+            hashes = dict(conn.execute("SELECT path, hash FROM paths WHERE seq > ?", (since,)))
+            info = self._decode_info(conn.execute("SELECT hash, data FROM info WHERE seq > ?", (since,)))
+            hash_deletes: List[str] = []
+            info_deletes: List[str] = []
+            for table, key in conn.execute("SELECT tbl, key FROM deleted WHERE seq > ?", (since,)):
+                (hash_deletes if table == "paths" else info_deletes).append(key)
+            return hashes, hash_deletes, info, info_deletes, seq
+
+    def load_hashes(self) -> Dict[str, str]:
+        """Load the full path -> hash mapping."""
+        with self._lock:
+            return dict(self._connect().execute("SELECT path, hash FROM paths"))
+
+    def load_info(self) -> Dict[str, Any]:
+        """Load the full hash -> info mapping."""
+        with self._lock:
+            return self._decode_info(self._connect().execute("SELECT hash, data FROM info"))
+
+    @staticmethod
+    def _decode_info(rows: Iterable[Tuple[str, str]]) -> Dict[str, Any]:
+        info = {}
+        for file_hash, data in rows:
+            try:
+                info[file_hash] = json.loads(data)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable info row for {file_hash}: {e}")
+        return info
+
+    def apply_changes(
+        self,
+        hash_upserts: Dict[str, str],
+        hash_deletes: Iterable[str],
+        info_upserts: Dict[str, Any],
+        info_deletes: Iterable[str],
+    ) -> None:
+        """Write only the changed rows, all in a single transaction, stamped with the next change sequence number."""
+        hash_deletes = list(hash_deletes)
+        info_deletes = list(info_deletes)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                # The UPDATE takes the write lock first, so concurrent saves get distinct sequence numbers
+                conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'change_seq'")
+                seq = int(conn.execute("SELECT value FROM meta WHERE key = 'change_seq'").fetchone()[0])
+                if hash_upserts:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO paths (path, hash, seq) VALUES (?, ?, ?)",
+                        ((p, h, seq) for p, h in hash_upserts.items())
+                    )
+                    conn.executemany("DELETE FROM deleted WHERE tbl = 'paths' AND key = ?", ((p,) for p in hash_upserts))
+                conn.executemany("DELETE FROM paths WHERE path = ?", ((p,) for p in hash_deletes))
+                if info_upserts:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO info (hash, data, seq) VALUES (?, ?, ?)",
+                        ((h, json.dumps(i, separators=(",", ":"), sort_keys=True), seq) for h, i in info_upserts.items())
+                    )
+                    conn.executemany("DELETE FROM deleted WHERE tbl = 'info' AND key = ?", ((h,) for h in info_upserts))
+                conn.executemany("DELETE FROM info WHERE hash = ?", ((h,) for h in info_deletes))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO deleted (tbl, key, seq) VALUES (?, ?, ?)",
+                    [("paths", p, seq) for p in hash_deletes] + [("info", h, seq) for h in info_deletes]
+                )
+                if hash_deletes or info_deletes:
+                    self._prune_tombstones(conn)
+
+    @staticmethod
+    def _prune_tombstones(conn: sqlite3.Connection) -> None:
+        """Forget all but the newest TOMBSTONES_TO_KEEP deletions; loads from before them reload in full."""
+        row = conn.execute(
+            "SELECT seq FROM deleted ORDER BY seq DESC LIMIT 1 OFFSET ?", (TOMBSTONES_TO_KEEP,)
+        ).fetchone()
+        if row is None:
+            return
+        conn.execute("DELETE FROM deleted WHERE seq <= ?", (row[0],))
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'tombstone_floor'", (str(row[0]),))
+
+    def import_all(self, hash_data: Dict[str, str], info_data: Dict[str, Any]) -> None:
+        """Replace the store contents with the given mappings. Used by the JSON migrator."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM paths")
+                conn.execute("DELETE FROM info")
+                conn.execute("DELETE FROM deleted")
+                # Loads from before the import can't be brought up to date incrementally
+                conn.execute(
+                    "UPDATE meta SET value = (SELECT CAST(value AS INTEGER) + 1 FROM meta WHERE key = 'change_seq') "
+                    "WHERE key = 'tombstone_floor'"
+                )
+            self.apply_changes(hash_data, [], info_data, [])
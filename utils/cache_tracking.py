@@ -0,0 +1,306 @@
+"""
+Change tracking containers for the SageUtils model cache.
+Records which keys were written or removed so saves only touch what changed,
+instead of deep-copying and comparing the whole cache.
+
+Writes (to a section or to an entry stored in it) and the change bookkeeping run under the section's lock,
+a re-entrant lock SageCache shares between all of its sections, since the cache is written from several
+threads at once (scans, the background hash queue, nodes and routes). Hold it around a read-modify-write
+that has to be atomic.
+"""
+
+import contextlib
+import copy
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+_MISSING = object()
+_NO_LOCK = contextlib.nullcontext()
+
+
+class TrackedCacheEntry(dict):
+    """
+    A cache info entry that reports top-level writes to the TrackedCacheDict that owns it.
+    Writes through `cache.by_path(...)` or `cache.info[hash]` are therefore picked up automatically.
+    Nested edits (e.g. entry['model']['name'] = ...) are not seen; call `owner.mark(key)` for those.
+    """
+    __slots__ = ('_owner', '_key')
+
+    def __init__(self, owner: 'TrackedCacheDict', key: str, data: Any = ()):
+        dict.__init__(self, data)
+        self._owner = owner
+        self._key = key
+
+    def _notify(self, field: Optional[str] = None) -> None:
+        if self._owner is not None:
+            self._owner.entry_changed(self._key, field)
+
+    def _lock(self):
+        """The owning section's lock (nothing to lock while the entry isn't stored in a section)."""
+        return self._owner.lock if self._owner is not None else _NO_LOCK
+
+    def __setitem__(self, field: str, value: Any) -> None:
+        with self._lock():
+            if dict.get(self, field, _MISSING) == value:
+                return
+            dict.__setitem__(self, field, value)
+            self._notify(field)
+
+    def __delitem__(self, field: str) -> None:
+        with self._lock():
+            dict.__delitem__(self, field)
+            self._notify()
+
+    def pop(self, field: str, *default: Any) -> Any:
+        with self._lock():
+            had_field = field in self
+            value = dict.pop(self, field, *default)
+            if had_field:
+                self._notify()
+            return value
+
+    def popitem(self) -> Tuple[str, Any]:
+        with self._lock():
+            item = dict.popitem(self)
+            self._notify()
+            return item
+
+    def clear(self) -> None:
+        with self._lock():
+            if self:
+                dict.clear(self)
+                self._notify()
+
+    def setdefault(self, field: str, default: Any = None) -> Any:
+        with self._lock():
+            if field not in self:
+                self[field] = default
+            return dict.__getitem__(self, field)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        with self._lock():
+            for field, value in dict(*args, **kwargs).items():
+                self[field] = value
+
+    def __ior__(self, other: Any) -> 'TrackedCacheEntry':
+        self.update(other)
+        return self
+
+    def __copy__(self) -> dict:
+        return dict(self)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> dict:
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class TrackedCacheDict(dict):
+    """
+    A dict that records which keys were changed or removed since the last save.
+
+    `version` increases on every change and is never reset, so callers can cheaply
+    tell whether anything happened since they last looked (e.g. for backups).
+    With `wrap_entries=True`, dict values are stored as TrackedCacheEntry objects so
+    writes into the stored entries are tracked as well.
+    """
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None, wrap_entries: bool = False, lock: Optional[Any] = None):
+        dict.__init__(self)
+        self.wrap_entries = wrap_entries
+        self.lock = lock if lock is not None else threading.RLock()
+        self.version = 0
+        # key -> version at which it was last changed/removed
+        self._changed: Dict[str, int] = {}
+        self._removed: Dict[str, int] = {}
+        # key -> top-level fields written since the last acknowledge (None: the whole value changed)
+        self._changed_fields: Dict[str, Optional[Set[str]]] = {}
+        self._listeners: List[Callable[[str, Any], None]] = []
+        if data:
+            for key, value in data.items():
+                dict.__setitem__(self, key, self._wrap(key, value))
+
+    def _wrap(self, key: str, value: Any) -> Any:
+        if not self.wrap_entries or not isinstance(value, dict):
+            return value
+        if isinstance(value, TrackedCacheEntry):
+            if value._owner is self and value._key == key:
+                return value
+            if value._owner is None:
+                # Not yet bound to a section (e.g. a lazily loaded entry): adopt it as-is
+                value._owner, value._key = self, key
+                return value
+        return TrackedCacheEntry(self, key, value)
+
+    def mark(self, key: str, field: Optional[str] = None) -> None:
+        """Record that the value stored under key changed; field narrows it to one top-level field of that value."""
+        with self.lock:
+            self.version += 1
+            if field is None or key not in self._changed:
+                fields = None if field is None else set()
+            else:
+                fields = self._changed_fields.get(key)
+            if fields is not None:
+                fields.add(field)
+            self._changed_fields[key] = fields
+            self._changed[key] = self.version
+            self._removed.pop(key, None)
+
+    def add_listener(self, listener: Callable[[str, Any], None]) -> None:
+        """
+        Call listener(key, old_value) after a key is set, changed or removed (e.g. to maintain secondary indexes).
+        old_value is the value replaced or removed, or None for new keys and writes inside a stored entry.
+        """
+        self._listeners.append(listener)
+
+    def _notify_listeners(self, key: str, old_value: Any) -> None:
+        for listener in self._listeners:
+            listener(key, old_value)
+
+    def entry_changed(self, key: str, field: Optional[str] = None) -> None:
+        """Called by a TrackedCacheEntry after one of its fields was written."""
+        with self.lock:
+            self.mark(key, field)
+            if self._listeners:
+                self._notify_listeners(key, None)
+
+    def mark_removed(self, key: str) -> None:
+        """Record that key was removed."""
+        with self.lock:
+            self.version += 1
+            self._removed[key] = self.version
+            self._changed.pop(key, None)
+            self._changed_fields.pop(key, None)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        with self.lock:
+            current = dict.get(self, key, _MISSING)
+            if current is value:
+                return
+            if not self.wrap_entries and current is not _MISSING and current == value:
+                return
+            dict.__setitem__(self, key, self._wrap(key, value))
+            self.mark(key)
+            if self._listeners:
+                self._notify_listeners(key, None if current is _MISSING else current)
+
+    def __delitem__(self, key: str) -> None:
+        with self.lock:
+            value = dict.pop(self, key)
+            self.mark_removed(key)
+            if self._listeners:
+                self._notify_listeners(key, value)
+
+    def pop(self, key: str, *default: Any) -> Any:
+        with self.lock:
+            had_key = key in self
+            value = dict.pop(self, key, *default)
+            if had_key:
+                self.mark_removed(key)
+                if self._listeners:
+                    self._notify_listeners(key, value)
+            return value
+
+    def popitem(self) -> Tuple[str, Any]:
+        with self.lock:
+            key, value = dict.popitem(self)
+            self.mark_removed(key)
+            if self._listeners:
+                self._notify_listeners(key, value)
+            return key, value
+
+    def clear(self) -> None:
+        with self.lock:
+            for key in list(self.keys()):
+                del self[key]
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        with self.lock:
+            if key not in self:
+                self[key] = default
+            return dict.__getitem__(self, key)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        with self.lock:
+            for key, value in dict(*args, **kwargs).items():
+                self[key] = value
+
+    def __ior__(self, other: Any) -> 'TrackedCacheDict':
+        self.update(other)
+        return self
+
+    def __copy__(self) -> dict:
+        return dict(self)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> dict:
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+    @property
+    def has_changes(self) -> bool:
+        """True if any key was changed or removed since the last acknowledged save."""
+        return bool(self._changed or self._removed)
+
+    def pending_changes(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Return snapshots of the changed and removed keys, each mapped to the version of its last change."""
+        with self.lock:
+            return dict(self._changed), dict(self._removed)
+
+    def acknowledge(self, changed: Dict[str, int], removed: Dict[str, int]) -> None:
+        """Forget changes from a pending_changes() snapshot once persisted. Keys changed again since are kept."""
+        with self.lock:
+            for key, version in changed.items():
+                if self._changed.get(key) == version:
+                    del self._changed[key]
+                    self._changed_fields.pop(key, None)
+            for key, version in removed.items():
+                if self._removed.get(key) == version:
+                    del self._removed[key]
+
+    def changed_fields(self, key: str) -> Optional[Set[str]]:
+        """Return the top-level fields of key written since the last acknowledge, or None if the whole value changed."""
+        with self.lock:
+            fields = self._changed_fields.get(key)
+            return None if fields is None else set(fields)
+
+    def unsaved_changes(self) -> Dict[str, Any]:
+        """
+        The keys changed or removed since the last acknowledge, with their current values and changed fields,
+        so they can be re-applied with reapply_changes() over data reloaded from disk.
+        """
+        with self.lock:
+            return {
+                "changed": {
+                    key: (dict.__getitem__(self, key), self.changed_fields(key))
+                    for key in self._changed if dict.__contains__(self, key)
+                },
+                "removed": list(self._removed),
+            }
+
+    def reapply_changes(self, changes: Dict[str, Any]) -> None:
+        """
+        Apply unsaved_changes() from another section on top of this one (they are tracked as changes again).
+        Where only some fields of an entry changed and the entry still exists here, only those fields are written.
+        """
+        with self.lock:
+            for key, (value, fields) in changes.get("changed", {}).items():
+                current = dict.get(self, key)
+                if fields is not None and isinstance(current, dict) and isinstance(value, dict):
+                    for field in fields:
+                        if field in value:
+                            current[field] = value[field]
+                        else:
+                            current.pop(field, None)
+                else:
+                    self[key] = value
+            for key in changes.get("removed", []):
+                self.pop(key, None)
+
+    def mark_all_changed(self) -> None:
+        """Mark every current key as changed, e.g. after replacing the contents wholesale."""
+        with self.lock:
+            for key in self.keys():
+                self.mark(key)
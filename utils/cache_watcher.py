@@ -0,0 +1,148 @@
+"""
+File watcher for the SageUtils model cache.
+Runs a background thread that notices when the cache files are written by another process,
+so SageCache.load() can skip its stat() checks while nothing has changed.
+"""
+
+import os
+import pathlib
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from .logger import get_logger
+
+logger = get_logger('model.cache.watcher')
+
+try:
+    from watchdog.events import FileSystemEventHandler as _FileSystemEventHandler
+    from watchdog.observers import Observer as _Observer
+    _WATCHDOG_AVAILABLE = True
+except ImportError:  # pragma: no cover
+    _FileSystemEventHandler = object
+    _WATCHDOG_AVAILABLE = False
+
+FileSignature = Optional[Tuple[int, int, int]]
+
+
+def file_signature(path: pathlib.Path) -> FileSignature:
+    """Return (mtime_ns, size, inode) for path, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class _WatchdogHandler(_FileSystemEventHandler):
+    """Forwards watchdog events for the watched files to the CacheFileWatcher."""
+
+    def __init__(self, watcher: 'CacheFileWatcher'):
+        super().__init__()
+        self._watcher = watcher
+
+    def on_any_event(self, event) -> None:
+        for attr in ('src_path', 'dest_path'):
+            path = getattr(event, attr, None)
+            if path:
+                self._watcher.check(pathlib.Path(os.fsdecode(path)))
+
+
+class CacheFileWatcher:
+    """
+    Watches a fixed set of files and calls on_change(path) when one of them is created, modified or removed.
+    Uses watchdog (inotify and friends) when it is installed, otherwise polls stat() every poll_interval seconds.
+    Writes made by this process should be reported with refresh() so they are not mistaken for external changes.
+    """
+
+    def __init__(self, paths: Iterable[pathlib.Path], on_change: Callable[[pathlib.Path], None], poll_interval: float = 2.0):
+        self.paths = [pathlib.Path(p) for p in paths]
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._signatures: Dict[pathlib.Path, FileSignature] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+
+    @property
+    def running(self) -> bool:
+        if self._observer is not None:
+            return self._observer.is_alive()
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Record the current state of the watched files and start watching them."""
+        if self.running:
+            return
+        with self._lock:
+            self._signatures = {p: file_signature(p) for p in self.paths}
+        self._stop_event.clear()
+
+        if _WATCHDOG_AVAILABLE:
+            try:
+                observer = _Observer()
+                handler = _WatchdogHandler(self)
+                for directory in {p.parent for p in self.paths}:
+                    directory.mkdir(parents=True, exist_ok=True)
+                    observer.schedule(handler, str(directory), recursive=False)
+                observer.daemon = True
+                observer.start()
+                self._observer = observer
+                logger.debug(f"Watching {len(self.paths)} cache files with watchdog")
+                return
+            except Exception as e:
+                logger.warning(f"Unable to start watchdog observer, falling back to polling: {e}")
+                self._observer = None
+
+        self._thread = threading.Thread(target=self._poll_loop, name="SageCacheWatcher", daemon=True)
+        self._thread.start()
+        logger.debug(f"Polling {len(self.paths)} cache files every {self.poll_interval}s")
+
+    def stop(self) -> None:
+        """Stop watching."""
+        self._stop_event.set()
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+                self._observer.join(timeout=5)
+            except Exception as e:
+                logger.debug(f"Error stopping watchdog observer: {e}")
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def refresh(self, *paths: pathlib.Path) -> None:
+        """Accept the current state of paths (e.g. after this process wrote them) without reporting a change."""
+        with self._lock:
+            for path in paths:
+                path = pathlib.Path(path)
+                if path in self._signatures:
+                    self._signatures[path] = file_signature(path)
+
+    def check(self, path: pathlib.Path) -> bool:
+        """Re-stat one watched path and report it if it changed. Returns whether it changed."""
+        with self._lock:
+            if path not in self._signatures:
+                return False
+            signature = file_signature(path)
+            if signature == self._signatures[path]:
+                return False
+            self._signatures[path] = signature
+        try:
+            self.on_change(path)
+        except Exception as e:
+            logger.error(f"Cache watcher callback failed for {path}: {e}")
+        return True
+
+    def check_all(self) -> bool:
+        """Re-stat every watched path. Returns whether any of them changed."""
+        changed = False
+        for path in self.paths:
+            if self.check(path):
+                changed = True
+        return changed
+
+    def _poll_loop(self) -> None:
+        while not self._stop_event.wait(self.poll_interval):
+            self.check_all()
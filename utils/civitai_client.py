@@ -0,0 +1,327 @@
+"""
+Shared HTTP client for the Civitai API.
+
+All Civitai requests go through one CivitaiClient, so nodes, routes and scans share:
+    - a requests.Session with a connection pool, so repeated calls reuse open connections
+      instead of paying a new TCP+TLS handshake each time;
+    - a limit on requests in flight at once (civitai_max_concurrency);
+    - a token bucket limiting the request rate (civitai_requests_per_second, with bursts of up to
+      civitai_max_concurrency requests);
+    - backoff on 429/503 responses and connection errors: Retry-After is honoured when sent, otherwise
+      the delay doubles on each retry (up to civitai_max_retries retries). The delay pauses the shared
+      bucket, so every caller waits, not only the one that was throttled.
+
+post_json() sends JSON bodies the same way, for bulk endpoints such as POST /model-versions/by-hash
+(up to civitai_hash_batch_size hashes per request).
+
+Concurrent identical get_json() calls are coalesced: one request is made and the other callers get a
+copy of its result. get_json(cached=True) also keeps the response in the persisted CivitaiResponseCache
+(civitai_response_cache.py), so payloads many lookups share, such as a model's /models/{id}, are fetched
+once per model rather than once per version.
+
+fan_out() runs a function over many items on up to civitai_max_concurrency threads, for batches such as
+the lookups of a metadata pull.
+"""
+
+import copy
+import email.utils
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import HTTPError
+
+from .civitai_response_cache import CivitaiResponseCache
+from .logger import get_logger
+from .settings import get_setting_or_default
+
+logger = get_logger('helpers.civitai.client')
+
+CIVITAI_API_BASE = "https://civitai.com/api/v1"
+CIVITAI_REQUEST_TIMEOUT_SECONDS = 30
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_SECOND = 4.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_HASH_BATCH_SIZE = 100
+RETRY_STATUSES = (429, 503)
+BACKOFF_BASE_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delay in seconds or an HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: acquire() takes a token, waiting until one is available. Tokens refill at
+    rate per second up to capacity (a rate of 0 means no limit). pause(seconds) holds every caller until
+    the pause is over.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for the next seconds (e.g. after a 429)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + max(0.0, seconds))
+
+    def acquire(self) -> float:
+        """Take a token, waiting for it if needed. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self.rate <= 0:
+                    return waited
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    delay = (1 - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+
+class CivitaiClient:
+    """Pooled, rate-limited client for the Civitai API (see the module docstring)."""
+
+    def __init__(
+        self,
+        base_url: str = CIVITAI_API_BASE,
+        max_concurrency: Optional[int] = None,
+        requests_per_second: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        timeout: float = CIVITAI_REQUEST_TIMEOUT_SECONDS,
+        session: Optional[requests.Session] = None,
+        sleep: Callable[[float], None] = time.sleep,
+        responses: Optional[CivitaiResponseCache] = None,
+        hash_batch_size: Optional[int] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max(1, int(max_concurrency or get_setting_or_default("civitai_max_concurrency", DEFAULT_MAX_CONCURRENCY)))
+        if requests_per_second is None:
+            requests_per_second = get_setting_or_default("civitai_requests_per_second", DEFAULT_REQUESTS_PER_SECOND)
+        if max_retries is None:
+            max_retries = get_setting_or_default("civitai_max_retries", DEFAULT_MAX_RETRIES)
+        self.max_retries = max(0, int(max_retries))
+        if hash_batch_size is None:
+            hash_batch_size = get_setting_or_default("civitai_hash_batch_size", DEFAULT_HASH_BATCH_SIZE)
+        self.hash_batch_size = max(0, int(hash_batch_size))
+        self.timeout = timeout
+        self._sleep = sleep
+        self.bucket = TokenBucket(float(requests_per_second), capacity=self.max_concurrency, sleep=sleep)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.responses = responses if responses is not None else CivitaiResponseCache()
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+    def url_for(self, path_or_url: str) -> str:
+        if path_or_url.startswith(("http://", "https://")):
+            return path_or_url
+        return f"{self.base_url}/{path_or_url.lstrip('/')}"
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        delay = parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+        if delay is None:
+            delay = BACKOFF_BASE_SECONDS * (2 ** attempt)
+        return min(delay, MAX_BACKOFF_SECONDS)
+
+    def request(self, method: str, path_or_url: str, **kwargs: Any) -> requests.Response:
+        """
+        Send a request to a Civitai URL (or a path under base_url) through the pool, rate limiter and
+        concurrency limit, retrying throttled (429/503) responses and connection errors. kwargs are passed
+        to requests. Returns the last response.
+        """
+        url = self.url_for(path_or_url)
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                with self._slots:
+                    response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"Civitai request failed ({e}); retrying in {delay:.1f}s")
+                self._sleep(delay)
+                attempt += 1
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                logger.warning(f"Civitai returned {response.status_code}; pausing requests for {delay:.1f}s")
+                self.bucket.pause(delay)
+                response.close()
+                attempt += 1
+                continue
+            return response
+
+    def get(
+        self,
+        path_or_url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> requests.Response:
+        """GET through request()."""
+        return self.request("GET", path_or_url, params=params, headers=headers)
+
+    def get_json(self, path_or_url: str, params: Optional[Dict[str, Any]] = None, cached: bool = False) -> Dict[str, Any]:
+        """
+        Fetch JSON from the Civitai API. Errors are returned, not raised, as
+        {"error": ..., "civitai_error": ...} (civitai_error is the API's own error message, if any).
+        A call made while the same request is in flight waits for it and gets a copy of its result.
+        With cached=True, a fresh response from the response cache is returned without a request.
+        """
+        key = requests.Request("GET", self.url_for(path_or_url), params=params).prepare().url
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            logger.debug(f"Waiting for the request already in flight for {key}")
+            return copy.deepcopy(future.result())
+
+        try:
+            result = self._fetch_json(key, cached)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def post_json(self, path_or_url: str, payload: Any) -> Any:
+        """POST a JSON payload and return the JSON response; errors are returned as in get_json()."""
+        return self._fetch_json(self.url_for(path_or_url), cached=False, method="POST", payload=payload)
+
+    def _fetch_json(self, url: str, cached: bool, method: str = "GET", payload: Any = None) -> Any:
+        entry = self.responses.get(url) if cached else None
+        headers = None
+        if entry is not None:
+            if self.responses.is_fresh(entry):
+                logger.debug(f"Using cached response for {url}")
+                return self.responses.data(url)
+            if entry.get("etag"):
+                headers = {"If-None-Match": entry["etag"]}
+
+        r_json = None
+        r_json_error = ""
+        try:
+            r = self.request(method, url, headers=headers, json=payload)
+            if r.status_code == 304 and entry is not None:
+                logger.debug(f"Cached response for {url} is still current")
+                return self.responses.revalidated(url)
+            r_json = r.json()
+            r_json_error = r_json.get("error", "") if isinstance(r_json, dict) else ""
+            if r_json_error:
+                logger.error(f"Civitai error: {r_json_error}")
+            r.raise_for_status()
+        except HTTPError as http_err:
+            logger.error(f"HTTP error occurred: {http_err}")
+            return {"error": f"HTTP error occurred: {http_err}", "civitai_error": r_json_error}
+        except Exception as err:
+            logger.error(f"Other error occurred: {err}")
+            return {"error": f"Other error occurred: {err}", "civitai_error": r_json_error}
+        else:
+            logger.debug(f"Retrieved JSON from {url}")
+            if cached:
+                self.responses.store(url, r_json, r.headers.get("ETag"))
+            return r_json
+
+    def fan_out(self, function: Callable[[Any], Any], items: Iterable[Any]) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+        """
+        Call function(item) for each item on up to max_concurrency threads, yielding (item, result, error)
+        in the calling thread as each call finishes.
+        """
+        items = list(items)
+        if len(items) <= 1 or self.max_concurrency <= 1:
+            for item in items:
+                try:
+                    yield item, function(item), None
+                except Exception as e:
+                    yield item, None, e
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items)), thread_name_prefix="SageCivitai") as pool:
+            futures = {pool.submit(function, item): item for item in items}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
+
+    def close(self) -> None:
+        self.responses.save()
+        self.session.close()
+
+
+_client: Optional[CivitaiClient] = None
+_client_lock = threading.Lock()
+
+
+def get_civitai_client() -> CivitaiClient:
+    """The shared client, created from the settings on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CivitaiClient()
+        return _client
+
+
+def set_civitai_client(client: Optional[CivitaiClient]) -> Optional[CivitaiClient]:
+    """Replace the shared client (None: recreate it from the settings on next use). Returns the old one."""
+    global _client
+    with _client_lock:
+        old, _client = _client, client
+    return old
@@ -0,0 +1,115 @@
+"""
+Persisted cache of Civitai API responses.
+
+Responses the client is asked to cache (the /models/{id} payloads get_latest_model_version() reads, which
+every version of a model shares) are kept, keyed by URL, for civitai_response_ttl seconds in
+sage_civitai_responses.json. After that they are revalidated with If-None-Match when Civitai sent an ETag,
+so an unchanged payload costs a 304 instead of a download. Entries not used for a week are dropped.
+"""
+
+import copy
+import pathlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .logger import get_logger
+from .settings import get_setting_or_default
+
+logger = get_logger('helpers.civitai.responses')
+
+RESPONSE_CACHE_FILE = "sage_civitai_responses.json"
+DEFAULT_RESPONSE_TTL = 3600.0
+KEEP_UNUSED_SECONDS = 7 * 24 * 3600
+SAVE_INTERVAL_SECONDS = 30.0
+
+
+class CivitaiResponseCache:
+    """
+    URL -> {"data", "etag", "fetched_at", "used_at"} entries, loaded on first use and saved at most every
+    SAVE_INTERVAL_SECONDS while entries are added (save() writes pending changes at once).
+    path defaults to sage_civitai_responses.json in the SageUtils user directory; a ttl of 0 disables caching.
+    """
+
+    def __init__(self, path: Optional[pathlib.Path] = None, ttl: Optional[float] = None, clock: Callable[[], float] = time.time):
+        self._path = pathlib.Path(path) if path is not None else None
+        if ttl is None:
+            ttl = get_setting_or_default("civitai_response_ttl", DEFAULT_RESPONSE_TTL)
+        self.ttl = max(0.0, float(ttl))
+        self._clock = clock
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+        self._last_save = clock()
+        self._lock = threading.RLock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @property
+    def path(self) -> pathlib.Path:
+        if self._path is None:
+            from .path_manager import path_manager
+            return path_manager.get_user_file_path(RESPONSE_CACHE_FILE)
+        return self._path
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            from .path_manager import file_manager
+            data = file_manager.load_json_file(self.path, "Civitai response cache")
+            self._entries = {
+                key: entry for key, entry in (data or {}).items()
+                if isinstance(entry, dict) and "data" in entry
+            }
+        return self._entries
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The entry for key (fresh or not), or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            return self._load().get(key)
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return self._clock() - entry.get("fetched_at", 0) < self.ttl
+
+    def data(self, key: str) -> Any:
+        """A copy of the cached payload for key, marking it used."""
+        with self._lock:
+            entry = self._load()[key]
+            entry["used_at"] = self._clock()
+            self._dirty = True
+            return copy.deepcopy(entry["data"])
+
+    def store(self, key: str, data: Any, etag: Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            now = self._clock()
+            self._load()[key] = {"data": copy.deepcopy(data), "etag": etag, "fetched_at": now, "used_at": now}
+            self._dirty = True
+            if now - self._last_save >= SAVE_INTERVAL_SECONDS:
+                self.save()
+
+    def revalidated(self, key: str) -> Any:
+        """Record that Civitai confirmed the entry is unchanged (304) and return a copy of its payload."""
+        with self._lock:
+            self._load()[key]["fetched_at"] = self._clock()
+            return self.data(key)
+
+    def save(self) -> bool:
+        """Write pending changes, dropping entries unused for KEEP_UNUSED_SECONDS. Returns True if written."""
+        with self._lock:
+            if not self._dirty or self._entries is None:
+                return False
+            now = self._clock()
+            self._entries = {
+                key: entry for key, entry in self._entries.items()
+                if now - entry.get("used_at", entry.get("fetched_at", 0)) < KEEP_UNUSED_SECONDS
+            }
+            from .path_manager import file_manager
+            saved = file_manager.save_json_file(self.path, self._entries, "Civitai response cache")
+            self._last_save = now
+            if saved:
+                self._dirty = False
+            return saved
@@ -0,0 +1,135 @@
+"""
+The directory walker shared by model and input file discovery.
+
+walk_files() is an os.scandir() generator. A file's extension is checked against its name before anything
+else, so entries of other types cost no system calls, and directory/file checks use the type information
+scandir already returned. Each WalkedFile keeps its DirEntry, whose stat() result is cached after the first
+call. Symlinked directories are followed, each target once.
+
+A complete walk is kept as an in-memory snapshot for SNAPSHOT_SECONDS, so the same folders walked again
+within that window (a scan started right after another, or several callers listing the same folder) are
+answered without touching the disk. use_snapshot=False walks the disk regardless.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .logger import get_logger
+
+logger = get_logger('utils.dir_walker')
+
+SNAPSHOT_SECONDS = 5.0
+
+
+class WalkedFile(NamedTuple):
+    """A file found by walk_files(): its full path, its path relative to the walked root, and its DirEntry."""
+    path: str
+    relative_path: str
+    entry: os.DirEntry
+
+    def stat(self) -> os.stat_result:
+        """The file's stat result (following symlinks), fetched at most once."""
+        return self.entry.stat()
+
+
+_SnapshotKey = Tuple[str, Optional[FrozenSet[str]], bool]
+_snapshots: Dict[_SnapshotKey, Tuple[float, List[WalkedFile]]] = {}
+_snapshots_lock = threading.Lock()
+
+
+def normalize_extensions(extensions: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+    """Lower-cased extensions (with their dot) as a frozenset; None, '*' or '.*' mean every file."""
+    if extensions is None or extensions in ('*', '.*'):
+        return None
+    if isinstance(extensions, str):
+        extensions = [extensions]
+    return frozenset(ext.lower() for ext in extensions)
+
+
+def _scan(root: str, extensions: Optional[FrozenSet[str]], resolve: bool) -> Iterator[WalkedFile]:
+    if resolve:
+        root = os.path.realpath(root)
+    visited_links = {os.path.realpath(root)}
+    # (directory, its path relative to root, whether its path is already resolved)
+    stack = [(root, "", True)]
+    while stack:
+        directory, relative_dir, real = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    relative = os.path.join(relative_dir, name) if relative_dir else name
+                    try:
+                        # Checked by name first: entries with other extensions never need a stat
+                        if extensions is None or os.path.splitext(name)[1].lower() in extensions:
+                            if entry.is_file():
+                                path = entry.path
+                                if resolve and (not real or entry.is_symlink()):
+                                    path = os.path.realpath(path)
+                                yield WalkedFile(path, relative, entry)
+                                continue
+                        if entry.is_dir():
+                            if entry.is_symlink():
+                                target = os.path.realpath(entry.path)
+                                if target in visited_links:
+                                    continue
+                                visited_links.add(target)
+                                stack.append((target if resolve else entry.path, relative, resolve))
+                            else:
+                                stack.append((entry.path, relative, real))
+                    except OSError:
+                        continue
+        except OSError as e:
+            if directory != root:
+                logger.debug(f"Unable to read {directory}: {e}")
+
+
+def walk_files(
+    root: str,
+    extensions: Optional[Iterable[str]] = None,
+    resolve: bool = False,
+    use_snapshot: bool = True,
+) -> Iterator[WalkedFile]:
+    """
+    Yield the files under root (recursively) whose extension is in extensions (all files if None), as they
+    are found. With resolve=True paths have their symlinks resolved, like Path.resolve(). A missing root
+    yields nothing. Unless use_snapshot is False, a walk of the same root and extensions finished within the
+    last SNAPSHOT_SECONDS is replayed from memory instead.
+    """
+    root = os.fspath(root)
+    extensions = normalize_extensions(extensions)
+    key = (os.path.abspath(root), extensions, resolve)
+    if use_snapshot:
+        with _snapshots_lock:
+            snapshot = _snapshots.get(key)
+        if snapshot is not None and time.monotonic() - snapshot[0] < SNAPSHOT_SECONDS:
+            yield from snapshot[1]
+            return
+
+    started = time.monotonic()
+    found = []
+    for walked in _scan(root, extensions, resolve):
+        found.append(walked)
+        yield walked
+    # Only a walk that ran to the end is complete enough to replay
+    with _snapshots_lock:
+        for stale in [k for k, (taken, _) in _snapshots.items() if started - taken >= SNAPSHOT_SECONDS]:
+            del _snapshots[stale]
+        _snapshots[key] = (started, found)
+
+
+def invalidate_snapshots(path: Optional[str] = None) -> None:
+    """Forget the snapshots of walks that include path (or of every walk), e.g. after a file changed there."""
+    with _snapshots_lock:
+        if path is None:
+            _snapshots.clear()
+            return
+        path = os.path.abspath(os.fspath(path))
+
+        def overlaps(root: str) -> bool:
+            return root == path or path.startswith(root.rstrip(os.sep) + os.sep) or root.startswith(path + os.sep)
+
+        for key in [key for key in _snapshots if overlaps(key[0])]:
+            del _snapshots[key]
@@ -1,11 +1,12 @@
 """File and path utility helpers extracted from helpers.py."""
 
 import datetime
-import hashlib
 import os
 import pathlib
 
 from .constants import MODEL_FILE_EXTENSIONS
+from .dir_walker import walk_files
+from .hashing import hash_file
 from .logger import get_logger
 from .model_cache import cache
 
@@ -45,65 +46,29 @@ def is_model_file(path: str) -> bool:
     return has_model_extension(path)
 
 
-# fast_hash_threshold=100*1024*1024  # 100MB threshold
-def get_file_sha256(path, fast_hash_threshold=0):  # Full hashing by default
-    """Calculate SHA256 hash of a file with optimizations for large files."""
+def get_file_sha256(path, fast_hash_threshold=0):
+    """
+    Calculate the SHA256 hash of a file, returning the first 10 hex digits (Civitai's AutoV2 hash).
+    The whole file is always hashed; fast_hash_threshold is accepted for compatibility and ignored.
+    Sampled hashes are kept separately (hashing.quick_fingerprint()) and never used as the cache key.
+    """
     logger.debug(f'Calculating hash for {path}')
 
-    buffer_size = 65536  # 64KB chunks
-
     try:
         file_size = os.path.getsize(path)
         logger.debug(f'File size: {file_size / (1024*1024):.1f} MB')
-
-        m = hashlib.sha256()
-
-        if fast_hash_threshold > 0 and file_size > fast_hash_threshold:
-            logger.debug('Large file detected, using fast hashing strategy')
-            sample_size = min(buffer_size * 4, file_size // 10)
-
-            with open(path, 'rb') as f:
-                m.update(str(file_size).encode())
-                m.update(os.path.basename(path).encode())
-
-                beginning = f.read(sample_size)
-                m.update(beginning)
-
-                if file_size > sample_size * 2:
-                    middle_pos = file_size // 2 - sample_size // 2
-                    f.seek(middle_pos)
-                    middle = f.read(sample_size)
-                    m.update(middle)
-
-                if file_size > sample_size * 3:
-                    f.seek(-sample_size, 2)
-                    end = f.read(sample_size)
-                    m.update(end)
-        else:
-            with open(path, 'rb') as f:
-                while True:
-                    chunk = f.read(buffer_size)
-                    if not chunk:
-                        break
-                    m.update(chunk)
-
+        # Large reads into a reused buffer; see utils/hashing.py for hashing many files in parallel
+        full_hash = hash_file(path)
     except (OSError, IOError) as e:
         logger.error(f'Error reading file {path}: {e}')
         raise
 
-    full_hash = m.hexdigest()
     logger.debug(f'Calculated hash: {full_hash[:10]}')
     return full_hash[:10]
 
 
 def get_files_in_dir(input_dirs=None, extensions=None):
-    if extensions is None or extensions in ('*', '.*'):
-        allowed_extensions = None
-    elif isinstance(extensions, str):
-        allowed_extensions = {extensions.lower()}
-    else:
-        allowed_extensions = {ext.lower() for ext in extensions}
-
+    """Sorted paths (relative to their directory) of the files under input_dirs with one of the extensions."""
     if input_dirs is None:
         raise ValueError('input_dirs cannot be None')
 
@@ -114,19 +79,7 @@ def get_files_in_dir(input_dirs=None, extensions=None):
     for directory in input_dirs:
         if directory is None or directory == '':
             continue
-        if pathlib.Path(directory).exists():
-            file_list = pathlib.Path(directory).rglob('*')
-            for file in file_list:
-                if file.exists() and not file.is_dir():
-                    if allowed_extensions is not None and file.suffix.lower() not in allowed_extensions:
-                        continue
-
-                    try:
-                        file_path = str(file.relative_to(directory))
-                    except ValueError:
-                        file_path = str(file)
-
-                    input_files.append(file_path)
+        input_files.extend(walked.relative_path for walked in walk_files(directory, extensions))
 
     input_files = sorted(set(input_files))
     return input_files
@@ -0,0 +1,285 @@
+"""
+Background hashing/metadata queue for model files.
+
+A worker thread takes model files from a priority queue and pulls their metadata (hashing them first if
+needed), so nodes don't do it inline during graph execution. Jobs are keyed by path: submitting a file
+that is already queued or being processed returns the existing job, and run_now() waits for a job that is
+already running instead of starting a second one.
+
+ModelFolderWatcher feeds the queue: it listens to the library index (library_index.py, which watches the
+folders with watchdog when it is installed and checks their directories every library_index_poll_interval
+seconds) for model files that were added or changed, and reports them once they have stopped changing, so a
+file is hashed after it has finished copying and before it is used. The watcher never walks the folders itself.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .constants import MODEL_FILE_EXTENSIONS
+from .dir_walker import invalidate_snapshots
+from .logger import get_logger
+
+logger = get_logger('model.hash_queue')
+
+# Lower runs first
+PRIORITY_NOW = 0        # A node is waiting for the result
+PRIORITY_LOADER = 10    # A loader left a large file's full hash to the background
+PRIORITY_WATCHER = 20   # A new or changed file in a model folder
+
+FileSignature = Optional[Tuple[int, int, int]]
+
+
+class HashJob:
+    """One queued file. options are passed to the queue's runner; merged when the file is submitted again."""
+
+    __slots__ = ("path", "priority", "options", "future", "started")
+
+    def __init__(self, path: str, priority: int, options: Dict[str, Any]):
+        self.path = path
+        self.priority = priority
+        self.options = options
+        self.future: Future = Future()
+        self.started = False
+
+
+class HashQueue:
+    """
+    Priority queue of per-file jobs run by runner(path, **options) on a background thread.
+    Started on the first submit().
+    """
+
+    def __init__(self, runner: Callable[..., Any], name: str = "SageHashQueue"):
+        self.runner = runner
+        self.name = name
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[int, int, HashJob]] = []
+        self._jobs: Dict[str, HashJob] = {}
+        self._counter = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, path: str, priority: int = PRIORITY_WATCHER, **options: Any) -> Future:
+        """
+        Queue a file, or return the future of the job already queued or running for it.
+        A queued job is moved up if this priority is more urgent; boolean options are OR-ed into it.
+        """
+        path = str(path)
+        with self._cond:
+            job = self._jobs.get(path)
+            if job is None:
+                job = self._jobs[path] = HashJob(path, priority, dict(options))
+                heapq.heappush(self._heap, (priority, next(self._counter), job))
+            else:
+                self._merge_options(job, options)
+                if not job.started and priority < job.priority:
+                    # The old heap entry is skipped when it comes up
+                    job.priority = priority
+                    heapq.heappush(self._heap, (priority, next(self._counter), job))
+            self._ensure_worker()
+            self._cond.notify()
+            return job.future
+
+    def run_now(self, path: str, **options: Any) -> Any:
+        """
+        Run a file's job in the calling thread and return its result. If the worker is already running one
+        for this file, wait for it instead; a job still waiting in the queue is taken over.
+        """
+        path = str(path)
+        with self._cond:
+            job = self._jobs.get(path)
+            if job is not None and job.started:
+                future = job.future
+            else:
+                if job is None:
+                    job = self._jobs[path] = HashJob(path, PRIORITY_NOW, dict(options))
+                else:
+                    self._merge_options(job, options)
+                job.started = True
+                future = None
+        if future is not None:
+            logger.debug(f"Waiting for the background job already processing {path}")
+            return future.result()
+        self._run(job)
+        return job.future.result()
+
+    def pending(self) -> List[str]:
+        """Paths queued or being processed."""
+        with self._cond:
+            return sorted(self._jobs)
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Wait until no jobs are left. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._jobs:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    @staticmethod
+    def _merge_options(job: HashJob, options: Dict[str, Any]) -> None:
+        for key, value in options.items():
+            current = job.options.get(key)
+            if isinstance(value, bool):
+                job.options[key] = bool(current) or value
+            elif current is None:
+                job.options[key] = value
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self, job: HashJob) -> None:
+        try:
+            job.future.set_result(self.runner(job.path, **job.options))
+        except BaseException as e:
+            logger.error(f"Background processing of {job.path} failed: {e}")
+            job.future.set_exception(e)
+        finally:
+            with self._cond:
+                if self._jobs.get(job.path) is job:
+                    del self._jobs[job.path]
+                self._cond.notify_all()
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                priority, _, job = heapq.heappop(self._heap)
+                if job.started or priority != job.priority:
+                    continue
+                job.started = True
+            self._run(job)
+
+
+def _signature(path: str) -> FileSignature:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ModelFolderWatcher:
+    """
+    Calls on_ready(path) for model files added to or changed in the watched folders (recursively), once
+    their size/mtime have stayed the same for settle_seconds. Changes come from the library index (index,
+    the shared library_index by default); files already there when watching starts are not reported. Only
+    files waiting to settle are statted, once a second; an idle watcher does no work.
+    """
+
+    def __init__(
+        self,
+        folders: Iterable[str],
+        on_ready: Callable[[str], None],
+        index=None,
+        settle_seconds: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.folders = sorted({os.path.abspath(f) for f in folders if os.path.isdir(f)})
+        self.on_ready = on_ready
+        self.settle_seconds = settle_seconds
+        self._index = index
+        self._clock = clock
+        self._reported: Dict[str, FileSignature] = {}
+        self._candidates: Dict[str, Tuple[FileSignature, float]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            from .library_index import library_index
+            self._index = library_index
+        return self._index
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running or not self.folders:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="SageModelFolderWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wake.set()
+        self.index.remove_listener(self.files_changed)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def files_changed(self, added: List[str], changed: List[str], removed: List[str]) -> None:
+        """Library index listener: files added or changed start waiting to settle."""
+        now = self._clock()
+        with self._lock:
+            for path in removed:
+                self._reported.pop(path, None)
+                self._candidates.pop(path, None)
+            for path in itertools.chain(added, changed):
+                self._candidates[path] = (_signature(path), now)
+        for path in itertools.chain(added, changed, removed):
+            invalidate_snapshots(path)
+        if added or changed:
+            self._wake.set()
+
+    def tick(self, now: Optional[float] = None) -> List[str]:
+        """Report the files that have settled. Returns the reported paths."""
+        now = self._clock() if now is None else now
+        with self._lock:
+            candidates = list(self._candidates.items())
+
+        ready = []
+        for path, (signature, since) in candidates:
+            current = _signature(path)
+            with self._lock:
+                if self._candidates.get(path) != (signature, since):
+                    continue  # Changed again meanwhile
+                if current is None:
+                    del self._candidates[path]
+                elif current != signature:
+                    self._candidates[path] = (current, now)
+                elif now - since >= self.settle_seconds:
+                    del self._candidates[path]
+                    if self._reported.get(path) != signature:
+                        self._reported[path] = signature
+                        ready.append(path)
+
+        for path in ready:
+            try:
+                self.on_ready(path)
+            except Exception as e:
+                logger.error(f"Model folder watcher callback failed for {path}: {e}")
+        return ready
+
+    def _loop(self) -> None:
+        try:
+            self.index.add_listener(self.folders, MODEL_FILE_EXTENSIONS, self.files_changed)
+        except Exception as e:
+            logger.error(f"Unable to watch the model folders: {e}")
+            return
+        logger.info(f"Watching {len(self.folders)} model folders for new models")
+        while not self._stop_event.is_set():
+            with self._lock:
+                waiting = bool(self._candidates)
+            self._wake.wait(1.0 if waiting else None)
+            self._wake.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Model folder watcher error: {e}")
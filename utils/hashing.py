@@ -0,0 +1,271 @@
+"""
+Model file hashing engine.
+
+Files are read in large blocks into a buffer reused per thread (readinto, so no per-chunk allocations),
+and several files are hashed at once on a bounded thread pool; hashlib releases the GIL while hashing,
+so the threads run in parallel. At most `per_device` files are read at a time from each storage device,
+so a spinning disk isn't made to seek between many files at once.
+
+hash_model_file() also computes, in the same read pass, the AutoV3 hash of .safetensors files (SHA-256 of
+the tensor data after the JSON header, so it survives header-only metadata edits) and, if the
+model_hash_blake3 setting is on and the blake3 package is available, a BLAKE3 hash of the whole file.
+Civitai lists both alongside AutoV2/SHA256.
+
+quick_fingerprint() is the cheap identity tier: a hash of the file size and three samples. It is never
+used as a cache key or for Civitai lookups; it tells changed files apart instantly and groups possible
+duplicates, and lets loaders leave the full hash of a large new file to a background thread.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .logger import get_logger
+from .settings import get_setting_or_default
+
+logger = get_logger('utils.hashing')
+
+try:
+    import blake3 as _blake3
+    _BLAKE3_AVAILABLE = True
+except ImportError:  # pragma: no cover
+    _BLAKE3_AVAILABLE = False
+
+DEFAULT_BUFFER_SIZE = 8 * 1024 * 1024  # 8 MiB reads
+DEFAULT_WORKERS = 4
+DEFAULT_PER_DEVICE = 2
+
+SAFETENSORS_EXTENSIONS = (".safetensors", ".sft")
+MAX_SAFETENSORS_HEADER = 100 * 1024 * 1024  # Same limit the safetensors library enforces
+AUTOV3_LENGTH = 12
+
+# Provenance of the identities kept in fingerprint records
+FULL_HASH_SOURCE = "sha256-full"
+QUICK_FINGERPRINT_SOURCE = "sampled-sha256-v1"
+FINGERPRINT_FIELDS = ("size", "mtime_ns", "inode", "device")
+QUICK_SAMPLE_SIZE = 256 * 1024
+DEFAULT_DEFER_BYTES = 1024 * 1024 * 1024  # 1 GiB
+DEFAULT_WATCH_INTERVAL = 30.0
+
+_buffers = threading.local()
+
+
+def full_hash_defer_bytes() -> int:
+    """Size from which loaders hash a model that needs a full hash in the background (0: never)."""
+    try:
+        return max(0, int(get_setting_or_default("model_hash_defer_bytes", DEFAULT_DEFER_BYTES) or 0))
+    except (TypeError, ValueError):
+        return DEFAULT_DEFER_BYTES
+
+
+def model_watch_interval() -> float:
+    """0 turns off hashing new models found in the model folders; any other value leaves it on (the folders are checked by the library index)."""
+    try:
+        return max(0.0, float(get_setting_or_default("model_watch_interval", DEFAULT_WATCH_INTERVAL) or 0))
+    except (TypeError, ValueError):
+        return DEFAULT_WATCH_INTERVAL
+
+
+def _thread_buffer(size: int) -> memoryview:
+    """A read buffer of at least size bytes, allocated once per thread."""
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = _buffers.buffer = bytearray(size)
+    return memoryview(buffer)[:size]
+
+
+def file_fingerprint(path: str, st: Optional[os.stat_result] = None) -> Dict[str, int]:
+    """
+    Stat fingerprint of a file (size, mtime_ns, inode, device); any rewrite or replacement of the file changes it.
+    Inode numbers are only unique within one filesystem, so the device id is part of it.
+    """
+    if st is None:
+        st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino, "device": st.st_dev}
+
+
+def new_digest(algorithm: str = "sha256") -> Any:
+    """A hashlib object for algorithm; "blake3" needs the blake3 package."""
+    if algorithm == "blake3":
+        if not _BLAKE3_AVAILABLE:
+            raise ValueError("BLAKE3 hashing needs the blake3 package")
+        return _blake3.blake3()
+    return hashlib.new(algorithm)
+
+
+def blake3_available() -> bool:
+    return _BLAKE3_AVAILABLE
+
+
+def hash_file(path: str, algorithm: str = "sha256", buffer_size: int = DEFAULT_BUFFER_SIZE) -> str:
+    """Return the full hex digest of a file, reading it in buffer_size blocks into a reused buffer."""
+    digest = new_digest(algorithm)
+    view = _thread_buffer(buffer_size)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            count = f.readinto(view)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
+
+
+def quick_fingerprint(path: str, sample_size: int = QUICK_SAMPLE_SIZE) -> str:
+    """
+    Sampled fingerprint: SHA-256 of the file size and sample_size bytes from the start, middle and end,
+    so it costs three small reads however large the file is. Different fingerprints mean different contents;
+    equal ones only make files candidates for being identical. The file name isn't included, so copies and
+    renamed files share a fingerprint.
+    """
+    m = hashlib.sha256()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        m.update(struct.pack('<Q', size))
+        if size <= sample_size * 3:
+            m.update(f.read())
+        else:
+            for offset in (0, size // 2 - sample_size // 2, size - sample_size):
+                f.seek(offset)
+                m.update(f.read(sample_size))
+    return m.hexdigest()
+
+
+def safetensors_payload_offset(path: str) -> Optional[int]:
+    """
+    Offset of the tensor data in a .safetensors file (8-byte little-endian header length + JSON header),
+    or None if the file doesn't look like one.
+    """
+    if not str(path).lower().endswith(SAFETENSORS_EXTENSIONS):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            prefix = f.read(9)
+            size = os.fstat(f.fileno()).st_size
+    except OSError:
+        return None
+    if len(prefix) < 9 or prefix[8:9] != b'{':
+        return None
+    header_length = struct.unpack('<Q', prefix[:8])[0]
+    if header_length > MAX_SAFETENSORS_HEADER or 8 + header_length > size:
+        return None
+    return 8 + header_length
+
+
+def hash_model_file(path: str, buffer_size: int = DEFAULT_BUFFER_SIZE, autov3: Optional[bool] = None,
+                    blake3: Optional[bool] = None) -> Dict[str, str]:
+    """
+    Hash a model file in one read pass. Returns {"sha256": full-file digest}, plus "autov3" (SHA-256 of the
+    safetensors tensor data, full hex; AutoV3 is its first 12 characters) for safetensors files unless
+    autov3 (default: the model_hash_autov3 setting) is off, "blake3" (full file) when blake3 (default:
+    the model_hash_blake3 setting, off) is on and the blake3 package is available, and "quick"
+    (quick_fingerprint(), read while the file is still cached).
+    """
+    if autov3 is None:
+        autov3 = bool(get_setting_or_default("model_hash_autov3", True))
+    if blake3 is None:
+        blake3 = bool(get_setting_or_default("model_hash_blake3", False))
+    full = hashlib.sha256()
+    whole_blake3 = _blake3.blake3() if blake3 and _BLAKE3_AVAILABLE else None
+    payload_offset = safetensors_payload_offset(path) if autov3 else None
+    payload = hashlib.sha256() if payload_offset is not None else None
+
+    view = _thread_buffer(buffer_size)
+    position = 0
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            count = f.readinto(view)
+            if not count:
+                break
+            chunk = view[:count]
+            full.update(chunk)
+            if whole_blake3 is not None:
+                whole_blake3.update(chunk)
+            if payload is not None and position + count > payload_offset:
+                payload.update(chunk[max(0, payload_offset - position):])
+            position += count
+
+    digests = {"sha256": full.hexdigest()}
+    if payload is not None:
+        digests["autov3"] = payload.hexdigest()
+    if whole_blake3 is not None:
+        digests["blake3"] = whole_blake3.hexdigest()
+    digests["quick"] = quick_fingerprint(path)
+    return digests
+
+
+class HashingEngine:
+    """
+    Hashes many files in parallel: a pool of max_workers threads, with at most per_device files
+    being read at once from any one device (by st_dev). hash_function(path, buffer_size=...) defaults
+    to hash_file(); hash_model_file() gives each file's AutoV3/BLAKE3 hashes as well.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        per_device: Optional[int] = None,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        hash_function: Optional[Callable[..., Any]] = None,
+    ):
+        self.max_workers = max(1, int(max_workers or get_setting_or_default("model_hash_workers", DEFAULT_WORKERS)))
+        self.per_device = max(1, int(per_device or get_setting_or_default("model_hash_per_device", DEFAULT_PER_DEVICE)))
+        self.buffer_size = buffer_size
+        self.hash_function = hash_function
+        self._device_slots: Dict[int, threading.Semaphore] = {}
+        self._device_lock = threading.Lock()
+
+    def _slot_for(self, path: str) -> threading.Semaphore:
+        try:
+            device = os.stat(path).st_dev
+        except OSError:
+            device = -1
+        with self._device_lock:
+            slot = self._device_slots.get(device)
+            if slot is None:
+                slot = self._device_slots[device] = threading.BoundedSemaphore(self.per_device)
+            return slot
+
+    def hash_path(self, path: str, should_cancel: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        Hash one file on the calling thread, waiting for a free slot on its device first.
+        Returns None if should_cancel() was set by then.
+        """
+        with self._slot_for(path):
+            if should_cancel is not None and should_cancel():
+                return None
+            return (self.hash_function or hash_file)(path, buffer_size=self.buffer_size)
+
+    def hash_files(
+        self,
+        paths: Iterable[str],
+        on_result: Optional[Callable[[str, Any, Optional[Exception]], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Hash files in parallel and return {path: result of hash_function} for the ones that were hashed.
+        on_result(path, digest, error) is called (from the calling thread) as each file finishes;
+        files that could not be read are logged and left out. should_cancel() stops files not yet started.
+        """
+        paths = list(dict.fromkeys(str(p) for p in paths))
+        results: Dict[str, Any] = {}
+        if not paths:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(paths)), thread_name_prefix="SageHash") as pool:
+            futures = {pool.submit(self.hash_path, path, should_cancel): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                digest, error = None, None
+                try:
+                    digest = future.result()
+                except Exception as e:
+                    error = e
+                    logger.error(f"Error hashing {path}: {e}")
+                if digest is not None:
+                    results[path] = digest
+                if on_result is not None:
+                    on_result(path, digest, error)
+        return results
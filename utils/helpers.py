@@ -25,8 +25,15 @@ from .model_metadata import (
     pull_and_update_model_timestamp,
     update_model_timestamp,
     pull_metadata,
+    hash_files_for_scan,
+    fingerprinted_hash,
+    local_autov3,
+    duplicate_candidates,
+    pending_full_hashes,
+    ensure_metadata,
+    start_model_folder_watcher,
 )
-from .model_discovery import model_scan, grab_model_list, get_model_list
+from .model_discovery import model_scan, grab_model_list, get_model_list, get_model_folder_paths
 from .prompt_utils import (
     normalize_prompt_weights,
     clean_keywords,
@@ -46,12 +53,14 @@ __all__ = [
     # LoRA helpers
     'lora_to_string', 'lora_to_prompt', 'get_lora_hash',
     # Model discovery helpers
-    'model_scan', 'grab_model_list', 'get_model_list',
+    'model_scan', 'grab_model_list', 'get_model_list', 'get_model_folder_paths',
     # Prompt helpers
     'normalize_prompt_weights', 'clean_keywords', 'clean_text', 'clean_if_needed',
     'condition_text', 'get_save_file_path', 'unwrap_tuple',
     # Metadata/cache helpers
     'update_cache_from_civitai_json', 'update_cache_without_civitai_json', 'add_file_to_cache',
     'recheck_hash', 'pull_and_update_model_timestamp', 'update_model_timestamp', 'pull_metadata',
+    'hash_files_for_scan', 'fingerprinted_hash', 'local_autov3', 'duplicate_candidates', 'pending_full_hashes',
+    'ensure_metadata', 'start_model_folder_watcher',
 ]
 
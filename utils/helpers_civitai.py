@@ -1,63 +1,76 @@
 # Helper functions for Civitai API interactions
 
 import datetime
-import requests
-from requests.exceptions import HTTPError
 
 from .model_cache import cache
+from .cache_lazy import get_model_summary
+from .civitai_client import get_civitai_client
 from .logger import get_logger
 
 logger = get_logger('helpers.civitai')
 
-CIVITAI_API_BASE = "https://civitai.com/api/v1"
-CIVITAI_REQUEST_TIMEOUT_SECONDS = 30
-
-def _get_civitai_json(url):
-    """Helper to fetch JSON from Civitai API with error handling."""
-    r_json = None
-    r_json_error = ""
-    try:
-        r = requests.get(url, timeout=CIVITAI_REQUEST_TIMEOUT_SECONDS)
-        r_json = r.json()
-        r_json_error = r_json.get("error", "")
-        if r_json_error:
-            logger.error(f"Civitai error: {r_json_error}")
-        r.raise_for_status()
-    except HTTPError as http_err:
-        logger.error(f"HTTP error occurred: {http_err}")
-        return {"error": f"HTTP error occurred: {http_err}", "civitai_error": r_json_error}
-    except Exception as err:
-        logger.error(f"Other error occurred: {err}")
-        return {"error": f"Other error occurred: {err}", "civitai_error": r_json_error}
-    else:
-        logger.debug(f"Retrieved JSON from {url}")
-        return r_json
+def _get_civitai_json(path, cached=False):
+    """
+    Fetch JSON from the Civitai API (a path under the API base, or a full URL) through the shared client.
+    cached=True serves the response from the persisted response cache while it is fresh.
+    """
+    return get_civitai_client().get_json(path, cached=cached)
 
 def get_civitai_model_version_json_by_hash(hash_):
     """Get model version JSON by hash from Civitai API."""
-    url = f"{CIVITAI_API_BASE}/model-versions/by-hash/{hash_}"
-    return _get_civitai_json(url)
+    return _get_civitai_json(f"/model-versions/by-hash/{hash_}")
 
 def get_civitai_model_version_json_by_id(the_id):
     """Get model version JSON by ID from Civitai API."""
-    url = f"{CIVITAI_API_BASE}/model-versions/{the_id}"
-    return _get_civitai_json(url)
+    return _get_civitai_json(f"/model-versions/{the_id}")
+
+def get_civitai_model_versions_by_hashes(hashes):
+    """
+    Look up many hashes at once with Civitai's bulk POST /model-versions/by-hash, in batches of the client's
+    hash_batch_size. Returns {hash: model version JSON} for the hashes found; a version matches a hash when
+    one of its files lists that hash (AutoV2, AutoV3, SHA256, BLAKE3..., compared case-insensitively).
+    Hashes in a batch whose request failed are left out, like misses.
+    """
+    client = get_civitai_client()
+    wanted = {str(h).lower(): h for h in hashes if h}
+    keys = list(wanted)
+    batch_size = client.hash_batch_size or max(1, len(keys))
+    found = {}
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        versions = client.post_json("/model-versions/by-hash", [wanted[key] for key in batch])
+        if not isinstance(versions, list):
+            error = versions.get("error") if isinstance(versions, dict) else versions
+            logger.warning(f"Batch hash lookup of {len(batch)} hashes failed: {error}")
+            continue
+        for version in versions:
+            if not isinstance(version, dict):
+                continue
+            for file in version.get("files") or []:
+                file_hashes = file.get("hashes") if isinstance(file, dict) else None
+                for value in (file_hashes or {}).values():
+                    key = str(value).lower()
+                    if key in wanted and wanted[key] not in found:
+                        found[wanted[key]] = version
+    logger.debug(f"Batch hash lookup found {len(found)} of {len(keys)} hashes")
+    return found
 
 def get_civitai_model_json(model_id):
-    """Get model JSON by model ID from Civitai API."""
-    url = f"{CIVITAI_API_BASE}/models/{model_id}"
-    return _get_civitai_json(url)
+    """Get model JSON by model ID from Civitai API (cached; every version of a model shares it)."""
+    return _get_civitai_json(f"/models/{model_id}", cached=True)
 
 def get_model_dict(lora_path, weight=None):
     """Get model info from cache by path."""
     ret = {}
     try:
         info = cache.by_path(lora_path)
-        ret["type"] = info["model"]["type"]
+        # Only the resident summary fields are read, so this doesn't load the entry's full Civitai payload
+        model = get_model_summary(info)
+        ret["type"] = model["type"]
         if ret["type"] == "LORA" and weight is not None:
             ret["weight"] = weight
         ret["modelVersionId"] = info["id"]
-        ret["modelName"] = info["model"]["name"]
+        ret["modelName"] = model["name"]
         ret["modelVersionName"] = info["name"]
     except Exception:
         ret = {}
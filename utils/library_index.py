@@ -0,0 +1,498 @@
+"""
+Persistent index of the model and input folders.
+
+Each folder asked about (with a set of extensions) becomes a tree in the index: for every directory under it,
+the directory's mtime and the matching files in it with their (size, mtime_ns, inode) fingerprints. Sorted
+file lists and counts are built from the tree when it changes and returned as they are until it changes
+again, so the model lists in node definitions, Sage_LoadImage's input images and the scan dialog's folder
+counts are answered from memory.
+
+Trees are saved to sage_library_index.json in the SageUtils user directory. When ComfyUI starts, a saved
+tree is checked by statting its directories, and only directories whose mtime changed are read again, so a
+large (e.g. NAS-mounted) library isn't walked on every start. After that, changes are picked up from
+watchdog events when watchdog is installed, and by re-checking directory mtimes every
+library_index_poll_interval seconds, which also covers network shares that don't report changes. Changed
+directories are read again on the next query.
+
+The index is the only thing that walks these folders. Code that needs to know about new files (the model
+folder watcher in hash_queue.py) registers with add_listener() and is told which files were added, changed or
+removed whenever a refresh finds them; watchdog events wake the polling thread so listeners hear about them
+within about a second.
+
+Adding, removing or renaming a file changes its directory's mtime; a file rewritten in place doesn't, so its
+fingerprint is only updated from a watchdog event (or when its directory changes for another reason).
+"""
+
+import os
+import pathlib
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .dir_walker import normalize_extensions
+from .logger import get_logger
+from .settings import get_setting_or_default
+
+logger = get_logger('utils.library_index')
+
+try:
+    from watchdog.events import FileSystemEventHandler as _FileSystemEventHandler
+    from watchdog.observers import Observer as _Observer
+    _WATCHDOG_AVAILABLE = True
+except ImportError:  # pragma: no cover
+    _FileSystemEventHandler = object
+    _WATCHDOG_AVAILABLE = False
+
+LIBRARY_INDEX_FILE = "sage_library_index.json"
+LIBRARY_INDEX_VERSION = 1
+DEFAULT_POLL_INTERVAL = 30.0
+SAVE_INTERVAL_SECONDS = 30.0
+EVENT_DELAY_SECONDS = 1.0  # Collect a burst of watchdog events before reading the directories involved
+MISSING = -1  # The mtime recorded for a root that doesn't exist (yet)
+
+Fingerprint = Tuple[int, int, int]
+Source = Tuple[str, Optional[Iterable[str]]]
+Listener = Callable[[List[str], List[str], List[str]], None]
+
+
+class IndexedTree:
+    """
+    One indexed folder. dirs maps each directory (relative to root, "" for root) to its mtime_ns, files maps
+    it to {name: fingerprint}. dirty holds directories to read again before the next answer.
+    """
+
+    def __init__(self, root: str, extensions: Optional[frozenset]):
+        self.root = root
+        self.extensions = extensions
+        self.dirs: Dict[str, int] = {}
+        self.files: Dict[str, Dict[str, Fingerprint]] = {}
+        self.children: Dict[str, Set[str]] = {}
+        self.dirty: Set[str] = set()
+        self.listeners: List[Listener] = []
+        self.checked = False  # Loaded from disk and not yet compared with it
+        self.version = 0
+        self._listing: Optional[List[str]] = None
+
+    @property
+    def key(self) -> str:
+        return self.root + "|" + ",".join(sorted(self.extensions)) if self.extensions is not None else self.root + "|*"
+
+    def listing(self) -> List[str]:
+        if self._listing is None:
+            self._listing = sorted(
+                os.path.join(reldir, name) if reldir else name
+                for reldir, names in self.files.items()
+                for name in names
+            )
+        return self._listing
+
+    def changed(self) -> None:
+        self.version += 1
+        self._listing = None
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "root": self.root,
+            "extensions": sorted(self.extensions) if self.extensions is not None else None,
+            "dirs": self.dirs,
+            "files": {reldir: {name: list(fp) for name, fp in names.items()} for reldir, names in self.files.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "IndexedTree":
+        extensions = data.get("extensions")
+        tree = cls(data["root"], frozenset(extensions) if extensions is not None else None)
+        tree.dirs = {reldir: int(mtime) for reldir, mtime in data.get("dirs", {}).items()}
+        tree.files = {
+            reldir: {name: tuple(fp) for name, fp in names.items()}
+            for reldir, names in data.get("files", {}).items() if reldir in tree.dirs
+        }
+        for reldir in tree.dirs:
+            tree.children.setdefault(reldir, set())
+            if reldir:
+                tree.children.setdefault(os.path.dirname(reldir), set()).add(reldir)
+        tree.checked = True
+        return tree
+
+
+class _WatchdogHandler(_FileSystemEventHandler):
+    def __init__(self, index: "LibraryIndex"):
+        super().__init__()
+        self._index = index
+
+    def on_any_event(self, event):
+        for path in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+            if path:
+                self._index.mark_changed(os.fsdecode(path))
+
+
+class LibraryIndex:
+    """
+    The indexed folders, keyed by root and extensions. path defaults to sage_library_index.json in the
+    SageUtils user directory; poll_interval to the library_index_poll_interval setting (0 disables
+    polling). watch=False doesn't use watchdog even when it is installed.
+    """
+
+    def __init__(
+        self,
+        path: Optional[pathlib.Path] = None,
+        poll_interval: Optional[float] = None,
+        watch: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._path = path
+        self._poll_interval = poll_interval
+        self._watch = watch and _WATCHDOG_AVAILABLE
+        self._clock = clock
+        self._trees: Dict[Tuple[str, Optional[frozenset]], IndexedTree] = {}
+        self._saved: Optional[Dict[str, Dict[str, Any]]] = None
+        self._merged: Dict[Tuple, Tuple[Tuple[int, ...], List[str]]] = {}
+        self._lock = threading.RLock()
+        self._unsaved = False
+        self._last_save = clock()
+        self._observer = None
+        self._watched: Set[str] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+        self._events: List[Tuple[Listener, List[str], List[str], List[str]]] = []
+
+    @property
+    def path(self) -> pathlib.Path:
+        if self._path is None:
+            from .path_manager import path_manager
+            return path_manager.get_user_file_path(LIBRARY_INDEX_FILE)
+        return pathlib.Path(self._path)
+
+    @property
+    def poll_interval(self) -> float:
+        if self._poll_interval is None:
+            return max(0.0, float(get_setting_or_default("library_index_poll_interval", DEFAULT_POLL_INTERVAL)))
+        return self._poll_interval
+
+    # Queries
+
+    def files(self, root: str, extensions: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        The files under root (recursively) with one of the extensions (every file if None), as sorted paths
+        relative to root. The list is shared; don't modify it.
+        """
+        with self._lock:
+            files = self._fresh(self._tree(root, extensions)).listing()
+        self._publish()
+        return files
+
+    def count(self, root: str, extensions: Optional[Iterable[str]] = None) -> int:
+        """How many files files(root, extensions) would return."""
+        return len(self.files(root, extensions))
+
+    def fingerprint(self, root: str, relative_path: str, extensions: Optional[Iterable[str]] = None) -> Optional[Fingerprint]:
+        """The indexed (size, mtime_ns, inode) of a file under root, or None if it isn't indexed."""
+        reldir, name = os.path.split(relative_path)
+        with self._lock:
+            fingerprint = self._fresh(self._tree(root, extensions)).files.get(reldir, {}).get(name)
+        self._publish()
+        return fingerprint
+
+    def merged_files(self, sources: Iterable[Source]) -> List[str]:
+        """
+        The union of files() over several (root, extensions) sources, sorted, like folder_paths.get_filename_list()
+        for a folder name with several paths. Rebuilt only when one of the sources changed.
+        """
+        sources = tuple((os.path.abspath(os.fspath(root)), normalize_extensions(exts)) for root, exts in sources)
+        with self._lock:
+            trees = [self._fresh(self._tree(root, exts)) for root, exts in sources]
+            versions = tuple(tree.version for tree in trees)
+            merged = self._merged.get(sources)
+            if merged is None or merged[0] != versions:
+                if len(trees) == 1:
+                    files = trees[0].listing()
+                else:
+                    files = sorted(set().union(*(tree.listing() for tree in trees)))
+                merged = (versions, files)
+                self._merged[sources] = merged
+        self._publish()
+        return merged[1]
+
+    # Change notifications
+
+    def add_listener(self, roots: Iterable[str], extensions: Optional[Iterable[str]], listener: Listener) -> None:
+        """
+        Index roots (with extensions) and call listener(added, changed, removed), with absolute paths, whenever a
+        refresh finds files added to, changed in or removed from them. Files found by a root's first walk aren't
+        reported; differences from a saved tree are. Listeners are called on the thread that did the refresh,
+        outside the index's lock.
+        """
+        with self._lock:
+            for root in roots:
+                tree = self._tree(root, extensions)
+                tree.listeners.append(listener)
+                self._fresh(tree)
+            self._start_thread()
+        self._publish()
+
+    def remove_listener(self, listener: Listener) -> None:
+        with self._lock:
+            for tree in self._trees.values():
+                if listener in tree.listeners:
+                    tree.listeners.remove(listener)
+
+    # Keeping the index current
+
+    def mark_changed(self, path: str) -> None:
+        """Note that something at path changed; the directories involved are read again on the next query."""
+        path = os.path.abspath(os.fspath(path))
+        with self._lock:
+            for tree in self._trees.values():
+                if path != tree.root and not path.startswith(tree.root.rstrip(os.sep) + os.sep):
+                    continue
+                relative = os.path.relpath(path, tree.root)
+                relative = "" if relative == os.curdir else relative
+                if relative in tree.dirs:
+                    tree.dirty.add(relative)
+                if relative:
+                    tree.dirty.add(os.path.dirname(relative))
+                if tree.listeners:
+                    self._wake.set()
+
+    def check(self) -> int:
+        """Compare every tree's directory mtimes with the disk and read changed directories. Returns how many."""
+        changed = 0
+        with self._lock:
+            for tree in list(self._trees.values()):
+                changed += self._check_tree(tree)
+                self._refresh(tree)
+        self._publish()
+        return changed
+
+    def save(self) -> bool:
+        """Write the index if it changed since it was last written. Returns True if written."""
+        with self._lock:
+            if not self._unsaved:
+                return False
+            data = dict(self._load_saved())
+            data.update({tree.key: tree.to_json() for tree in self._trees.values() if not tree.checked})
+            from .path_manager import file_manager
+            saved = file_manager.save_json_file(self.path, {"version": LIBRARY_INDEX_VERSION, "trees": data}, "library index")
+            self._last_save = self._clock()
+            if saved:
+                self._unsaved = False
+            return saved
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wake.set()
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+                self._observer.join(timeout=5)
+            except Exception as e:
+                logger.debug(f"Error stopping library index observer: {e}")
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.save()
+
+    # Internals
+
+    def _load_saved(self) -> Dict[str, Dict[str, Any]]:
+        if self._saved is None:
+            from .path_manager import file_manager
+            data = file_manager.load_json_file(self.path, "library index") or {}
+            trees = data.get("trees") if data.get("version") == LIBRARY_INDEX_VERSION else None
+            self._saved = trees if isinstance(trees, dict) else {}
+        return self._saved
+
+    def _tree(self, root: str, extensions) -> IndexedTree:
+        root = os.path.abspath(os.fspath(root))
+        extensions = normalize_extensions(extensions)
+        tree = self._trees.get((root, extensions))
+        if tree is None:
+            tree = IndexedTree(root, extensions)
+            saved = self._load_saved().get(tree.key)
+            if saved is not None:
+                try:
+                    tree = IndexedTree.from_json(saved)
+                except Exception as e:
+                    logger.debug(f"Ignoring the saved index of {root}: {e}")
+            if not tree.checked:
+                tree.dirty.add("")
+            self._trees[(root, extensions)] = tree
+            self._start(root)
+        return tree
+
+    def _fresh(self, tree: IndexedTree) -> IndexedTree:
+        if tree.checked:
+            self._check_tree(tree)
+        full_scan = "" in tree.dirty and not tree.dirs
+        if self._refresh(tree) and (full_scan or self._clock() - self._last_save >= SAVE_INTERVAL_SECONDS):
+            self.save()
+        return tree
+
+    def _check_tree(self, tree: IndexedTree) -> int:
+        before = len(tree.dirty)
+        if tree.checked:
+            started = time.perf_counter()
+        for reldir, mtime in tree.dirs.items():
+            try:
+                current = os.stat(os.path.join(tree.root, reldir) if reldir else tree.root).st_mtime_ns
+            except OSError:
+                current = MISSING
+            if current != mtime:
+                tree.dirty.add(reldir)
+        if tree.checked:
+            tree.checked = False
+            logger.debug(f"Checked {len(tree.dirs)} indexed directories of {tree.root} in {time.perf_counter() - started:.3f}s")
+        return len(tree.dirty) - before
+
+    def _refresh(self, tree: IndexedTree) -> bool:
+        """Read the dirty directories (and any new subdirectories) again. Returns True if anything changed."""
+        changed = False
+        # A root's first walk finds every file; only later differences are news to listeners
+        report = bool(tree.listeners and tree.dirs)
+        added: List[str] = []
+        modified: List[str] = []
+        removed: List[str] = []
+        pending = sorted(tree.dirty, key=lambda d: d.count(os.sep), reverse=True)
+        tree.dirty.clear()
+        while pending:
+            reldir = pending.pop()
+            # An event inside a directory the index doesn't know yet refreshes its nearest known ancestor
+            while reldir and reldir not in tree.dirs:
+                reldir = os.path.dirname(reldir)
+            mtime, files, subdirs = self._read_dir(tree, reldir)
+            if mtime == MISSING and reldir:
+                removed.extend(self._drop(tree, reldir))
+                changed = True
+                continue
+            old_subdirs = tree.children.get(reldir, set())
+            old_files = tree.files.get(reldir, {})
+            if files != old_files or subdirs != old_subdirs:
+                changed = True
+                if report:
+                    directory = os.path.join(tree.root, reldir) if reldir else tree.root
+                    for name, fingerprint in files.items():
+                        old = old_files.get(name)
+                        if old != fingerprint:
+                            (added if old is None else modified).append(os.path.join(directory, name))
+                    removed.extend(os.path.join(directory, name) for name in old_files if name not in files)
+            tree.dirs[reldir] = mtime
+            tree.files[reldir] = files
+            tree.children[reldir] = subdirs
+            for gone in old_subdirs - subdirs:
+                removed.extend(self._drop(tree, gone))
+            for new in subdirs - old_subdirs:
+                tree.dirs[new] = MISSING
+                tree.children.setdefault(new, set())
+                pending.append(new)
+        if changed:
+            tree.changed()
+            self._unsaved = True
+            if report and (added or modified or removed):
+                self._events.extend((listener, added, modified, removed) for listener in tree.listeners)
+        return changed
+
+    def _publish(self) -> None:
+        """Call listeners with the changes found since the last call (outside the lock)."""
+        if not self._events:
+            return
+        with self._lock:
+            events, self._events = self._events, []
+        for listener, added, changed, removed in events:
+            try:
+                listener(added, changed, removed)
+            except Exception as e:
+                logger.error(f"Library index listener failed: {e}")
+
+    def _read_dir(self, tree: IndexedTree, reldir: str) -> Tuple[int, Dict[str, Fingerprint], Set[str]]:
+        directory = os.path.join(tree.root, reldir) if reldir else tree.root
+        files: Dict[str, Fingerprint] = {}
+        subdirs: Set[str] = set()
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    try:
+                        # Checked by name first: entries with other extensions never need a stat
+                        if tree.extensions is None or os.path.splitext(name)[1].lower() in tree.extensions:
+                            if entry.is_file():
+                                st = entry.stat()
+                                files[name] = (st.st_size, st.st_mtime_ns, st.st_ino)
+                                continue
+                        if entry.is_dir() and not (entry.is_symlink() and self._is_loop(entry.path)):
+                            subdirs.add(os.path.join(reldir, name) if reldir else name)
+                    except OSError:
+                        continue
+        except OSError:
+            return MISSING, {}, set()
+        return mtime, files, subdirs
+
+    @staticmethod
+    def _is_loop(link: str) -> bool:
+        """Whether a symlinked directory points at the directory it is in or one of its ancestors."""
+        target = os.path.realpath(link)
+        parent = os.path.realpath(os.path.dirname(link))
+        return parent == target or parent.startswith(target.rstrip(os.sep) + os.sep)
+
+    @staticmethod
+    def _drop(tree: IndexedTree, reldir: str) -> List[str]:
+        """Forget a directory and everything under it. Returns the paths of the files that were in it."""
+        removed = []
+        stack = [reldir]
+        while stack:
+            current = stack.pop()
+            tree.dirs.pop(current, None)
+            directory = os.path.join(tree.root, current) if current else tree.root
+            removed.extend(os.path.join(directory, name) for name in tree.files.pop(current, {}))
+            stack.extend(tree.children.pop(current, ()))
+        if reldir:
+            tree.children.get(os.path.dirname(reldir), set()).discard(reldir)
+        return removed
+
+    def _start(self, root: str) -> None:
+        """Watch a newly indexed root, and start polling with the first one."""
+        if self._watch and root not in self._watched and os.path.isdir(root):
+            try:
+                if self._observer is None:
+                    self._observer = _Observer()
+                    self._observer.daemon = True
+                    self._observer.start()
+                self._observer.schedule(_WatchdogHandler(self), root, recursive=True)
+                self._watched.add(root)
+            except Exception as e:
+                logger.warning(f"Unable to watch {root} for the library index, relying on polling: {e}")
+        self._start_thread()
+
+    def _start_thread(self) -> None:
+        """Poll every poll_interval seconds, and, while anything listens, read directories watchdog reported."""
+        listening = self._observer is not None and any(tree.listeners for tree in self._trees.values())
+        if self._thread is None and (self.poll_interval > 0 or listening):
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._loop, name="SageLibraryIndex", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stop_event.is_set():
+            interval = self.poll_interval
+            woken = self._wake.wait(interval if interval > 0 else None)
+            if self._stop_event.is_set():
+                break
+            try:
+                if woken:
+                    self._stop_event.wait(EVENT_DELAY_SECONDS)
+                    self._wake.clear()
+                    with self._lock:
+                        for tree in list(self._trees.values()):
+                            if tree.listeners and tree.dirty:
+                                self._refresh(tree)
+                    self._publish()
+                else:
+                    self.check()
+                self.save()
+            except Exception as e:
+                logger.error(f"Library index error: {e}")
+
+
+library_index = LibraryIndex()
@@ -7,14 +7,25 @@ import json
 import pathlib
 import hashlib
 import datetime
-import tempfile
-import copy
+import threading
 import os
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, Optional, List, Tuple
 
 from .path_manager import path_manager, file_manager
+from .cache_sqlite import SageCacheSQLiteStore
+from .cache_tracking import TrackedCacheDict
+from .cache_index import FingerprintIndex, SageCacheIndex
+from .cache_journal import CacheJournal
+from .cache_backups import (
+    DELTA, SNAPSHOT, apply_delta, backup_file_name, compute_delta, parse_backup_name,
+    read_backup_file, write_backup_file,
+)
+from .cache_watcher import CacheFileWatcher, file_signature
+from .cache_lock import CacheFileLock, CacheLockTimeout
+from .cache_lazy import capture_info, expand_info, full_entry, has_unloaded_entries, load_info_summary, write_info_files
 
 from .logger import get_logger
+from .settings import get_setting_or_default
 from .type_utils import str_to_bool
 logger = get_logger('model.cache')
 
@@ -29,19 +40,27 @@ class SageCache:
         self.info_path = path_manager.get_user_file_path("sage_cache_info.json")
         self.hash_path = path_manager.get_user_file_path("sage_cache_hash.json")
         self.ollama_models_path = path_manager.get_user_file_path("sage_cache_ollama.json")
+        self.db_path = path_manager.get_user_file_path("sage_cache.db")
+        self.journal_path = path_manager.get_user_file_path("sage_cache_journal.jsonl")
+        self.fingerprints_path = path_manager.get_user_file_path("sage_cache_fingerprints.json")
 
         self.data: Dict[str, Any] = {}
-        self.hash: Dict[str, str] = {}
-        self.info: Dict[str, Any] = {}
-        self.ollama_models: Dict[str, Any] = {}
-        self.last_hash: Dict[str, str] = {}
-        self.last_info: Dict[str, Any] = {}
-        self.last_ollama_models: Dict[str, Any] = {}
+        # Tracked dicts record changed/removed keys, so saves and backups only do work when something changed.
+        # They share one lock: writes from any thread, and loads and saves, run under it (taken before self.lock).
+        self.sections_lock = threading.RLock()
+        self._hash = TrackedCacheDict(lock=self.sections_lock)
+        self._info = TrackedCacheDict(wrap_entries=True, lock=self.sections_lock)
+        self._ollama_models = TrackedCacheDict(lock=self.sections_lock)
+        self._fingerprints = TrackedCacheDict(lock=self.sections_lock)
+        self.backup_versions: Dict[str, int] = {}
+        self._index: Optional[SageCacheIndex] = None
+        self._fingerprint_index: Optional[FingerprintIndex] = None
         self.num_of_backups_to_keep = 7
         self.backup_counter = 0
 
-        # Batch mode attributes for deferred saves/backups
+        # Batch mode attributes for deferred saves/backups (only the thread that started the batch defers its saves)
         self.batch_mode = False
+        self.batch_thread: Optional[int] = None
         self.pending_changes = 0
         self.batch_start_changes = 0
         self.save_count_since_backup = 0
@@ -51,13 +70,123 @@ class SageCache:
         self.save_threshold = 10  # Save after N changes in batch mode (safety)
         self.backup_threshold = 50  # Backup after N saves
         self.backup_interval_seconds = 300  # 5 minutes between backups
+        self.journal_compact_bytes = 4 * 1024 * 1024  # Fold the journal into the snapshot files past this size
+        self.backup_max_deltas = 10  # Take a new full backup snapshot after N delta backups
+        self.backup_delta_ratio = 0.5  # ...or when a delta would touch more than this fraction of the entries
+
+        # Storage backend for the hash/info caches: "json" (whole-file) or "sqlite" (row-level)
+        self.backend = get_setting_or_default("model_cache_backend", "json")
+        self.sqlite_store: Optional[SageCacheSQLiteStore] = None
+        self.sqlite_data_version: Optional[int] = None
+        self.sqlite_change_seq: Optional[int] = None  # Change sequence number of the rows loaded so far
+        if self.backend == "sqlite":
+            self.sqlite_store = SageCacheSQLiteStore(self.db_path)
+
+        # JSON backend: saves append changed paths/entries to a journal instead of rewriting the whole files.
+        # (SQLite already writes only changed rows through its own write-ahead log.)
+        self.journal: Optional[CacheJournal] = None
+        self.journal_signature = None
+        self.journal_offset = 0  # Bytes of the journal already applied to the in-memory sections
+        if self.sqlite_store is None and get_setting_or_default("model_cache_journal", True):
+            self.journal = CacheJournal(self.journal_path)
+
+        # JSON backend: keep only a summary of each info entry in memory; nested Civitai payloads are read on demand.
+        self.lazy_info = self.sqlite_store is None and bool(get_setting_or_default("model_cache_lazy_info", True))
+        # (section version, content hash) of the info data last written to or read from sage_cache_info.json
+        self.info_content_hash: Optional[Tuple[Optional[int], str]] = None
+        self.backup_thread: Optional[threading.Thread] = None
+
+        # load() only re-checks the files on disk after the watcher saw another process write them.
+        # generation is bumped by the watcher thread; loaded_generation is the value the last full load saw.
+        self.watch_interval = float(get_setting_or_default("model_cache_watch_interval", 2.0) or 0)
+        self.watcher: Optional[CacheFileWatcher] = None
+        self.generation = 0
+        self.loaded_generation: Optional[int] = None
+        self.reloads_avoided = 0
+        # Section versions restart with each process; this keeps HTTP ETags from one run valid only for that run
+        self.instance_id = os.urandom(4).hex()
+
+        # Held (across processes) while saving, so each save first merges what other processes wrote
+        self.lock = CacheFileLock(path_manager.get_user_file_path("sage_cache.lock"))
+        self.journal_merges = 0  # Loads/saves that applied only the journal records other processes appended
         
         # Backup manifest for fast comparison
         self.backup_manifest_path = path_manager.get_backup_file_path("backup_manifest.json")
         self.backup_manifest: Dict[str, Dict[str, Any]] = {}
+        # Guards backup_manifest and the backup files, since pruning runs on a background thread
+        self.backup_lock = threading.RLock()
+        self.prune_thread: Optional[threading.Thread] = None
         self._load_backup_manifest()
 
-        self.prune_all_backups()
+        self.schedule_backup_prune()
+
+    @property
+    def hash(self) -> TrackedCacheDict:
+        """Mapping of file path -> hash."""
+        return self._hash
+
+    @hash.setter
+    def hash(self, value: Dict[str, str]) -> None:
+        self._hash = self._replaced_section(self._hash, value)
+
+    @property
+    def info(self) -> TrackedCacheDict:
+        """Mapping of hash -> model info dict."""
+        return self._info
+
+    @info.setter
+    def info(self, value: Dict[str, Any]) -> None:
+        self._info = self._replaced_section(self._info, value)
+
+    @property
+    def ollama_models(self) -> TrackedCacheDict:
+        """Cached Ollama model data."""
+        return self._ollama_models
+
+    @ollama_models.setter
+    def ollama_models(self, value: Dict[str, Any]) -> None:
+        self._ollama_models = self._replaced_section(self._ollama_models, value)
+
+    @property
+    def fingerprints(self) -> TrackedCacheDict:
+        """Mapping of file path -> {"size", "mtime_ns", "inode", "device", "hash"} recorded when the file was last hashed."""
+        return self._fingerprints
+
+    @fingerprints.setter
+    def fingerprints(self, value: Dict[str, Any]) -> None:
+        self._fingerprints = self._replaced_section(self._fingerprints, value)
+
+    @property
+    def index(self) -> SageCacheIndex:
+        """Secondary indexes over hash/info; built on first use and again after the sections are reloaded or replaced."""
+        if self._index is None or not self._index.is_for(self._hash, self._info):
+            self._index = SageCacheIndex(self._hash, self._info)
+        return self._index
+
+    @property
+    def fingerprint_index(self) -> FingerprintIndex:
+        """Stat-key and AutoV3 index over fingerprints; built on first use and again after the section is reloaded or replaced."""
+        if self._fingerprint_index is None or not self._fingerprint_index.is_for(self._fingerprints):
+            self._fingerprint_index = FingerprintIndex(self._fingerprints)
+        return self._fingerprint_index
+
+    @staticmethod
+    def _loaded_section(current: TrackedCacheDict, data: Optional[Dict[str, Any]]) -> TrackedCacheDict:
+        """Build a clean (nothing pending) section from freshly loaded data, keeping its version counter monotonic."""
+        section = TrackedCacheDict(data, wrap_entries=current.wrap_entries, lock=current.lock)
+        section.version = current.version + 1
+        return section
+
+    @staticmethod
+    def _replaced_section(current: TrackedCacheDict, data: Dict[str, Any]) -> TrackedCacheDict:
+        """Build a section that replaces current wholesale; every key is pending so the next save persists it."""
+        section = SageCache._loaded_section(current, data)
+        for key in current.keys():
+            if key not in section:
+                section.pop(key, None)
+                section.mark_removed(key)
+        section.mark_all_changed()
+        return section
 
     def _load_backup_manifest(self) -> None:
         """Load the backup manifest from disk."""
@@ -80,37 +209,191 @@ class SageCache:
         except Exception as e:
             logger.warning(f"Failed to save backup manifest: {e}")
     
-    def _update_manifest_for_backup(self, backup_path: pathlib.Path, data: Any) -> None:
-        """Update manifest entry for a backup file."""
+    @staticmethod
+    def _content_hash(data: Any) -> str:
+        """SHA-256 of the canonical (compact, sorted) JSON form of data, independent of how a backup was formatted."""
+        data_json = json.dumps(data, separators=(",", ":"), sort_keys=True)
+        return hashlib.sha256(data_json.encode("utf-8")).hexdigest()
+
+    def _update_manifest_for_backup(
+        self,
+        backup_path: pathlib.Path,
+        entry_count: int,
+        content_hash: str,
+        kind: str = SNAPSHOT,
+        base: Optional[str] = None,
+    ) -> None:
+        """Update manifest entry for a backup file. file_size and mtime_ns let the pruner trust it without re-reading."""
         try:
-            data_json = json.dumps(data, separators=(",", ":"), sort_keys=True)
-            entry_count = len(data) if isinstance(data, dict) else 0
-            file_size = len(data_json)
-            content_hash = hashlib.sha256(data_json.encode("utf-8")).hexdigest()
-            
-            self.backup_manifest[backup_path.name] = {
+            st = backup_path.stat()
+            parsed = parse_backup_name(backup_path.name) or {}
+            entry = {
                 "timestamp": datetime.datetime.now().isoformat(),
+                "prefix": parsed.get("prefix"),
+                "backup_date": parsed.get("date"),
+                "kind": kind,
                 "entry_count": entry_count,
-                "file_size": file_size,
+                "file_size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
                 "content_hash": content_hash
             }
-            self._save_backup_manifest()
+            if base:
+                entry["base"] = base
+            with self.backup_lock:
+                self.backup_manifest[backup_path.name] = entry
+                self._save_backup_manifest()
         except Exception as e:
             logger.warning(f"Failed to update manifest for {backup_path.name}: {e}")
 
+    def _backup_file_metadata(self, f: pathlib.Path, st: os.stat_result) -> Dict[str, Any]:
+        """
+        Return the manifest metadata for a backup file.
+        The manifest entry is trusted if its size and mtime still match the file; otherwise the file is read,
+        hashed, and the manifest entry recorded, so each backup is only ever read once.
+        """
+        entry = self.backup_manifest.get(f.name)
+        if (entry and "content_hash" in entry and "entry_count" in entry
+                and entry.get("file_size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns):
+            return entry
+
+        parsed = parse_backup_name(f.name) or {}
+        base = None
+        try:
+            if parsed.get("kind") == DELTA:
+                base = read_backup_file(f).get("base")
+            data = self.load_backup_data(f.name)
+        except Exception as e:
+            logger.warning(f"Error parsing backup {f.name}: {e}")
+            # Keep it anyway, use file size as proxy for entry count; not recorded in the manifest
+            return {
+                "entry_count": st.st_size,
+                "file_size": st.st_size,
+                "content_hash": hashlib.sha256(f.read_bytes()).hexdigest(),
+            }
+
+        entry = {
+            "timestamp": (entry or {}).get("timestamp") or datetime.datetime.fromtimestamp(st.st_mtime).isoformat(),
+            "prefix": parsed.get("prefix"),
+            "backup_date": parsed.get("date"),
+            "kind": parsed.get("kind", SNAPSHOT),
+            "entry_count": len(data) if isinstance(data, dict) else 0,
+            "file_size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "content_hash": self._content_hash(data),
+        }
+        if base:
+            entry["base"] = base
+        self.backup_manifest[f.name] = entry
+        logger.debug(f"Indexed backup {f.name} into the manifest")
+        return entry
+
+    @staticmethod
+    def _manifest_prefix(name: str, entry: Dict[str, Any]) -> Optional[str]:
+        """The exact backup prefix of a manifest entry (older entries don't record it, so parse the name)."""
+        if entry.get("prefix"):
+            return entry["prefix"]
+        parsed = parse_backup_name(name)
+        return parsed["prefix"] if parsed else None
+
+    def _backup_dependents(self, name: str) -> List[str]:
+        """Names of delta backups that need the given snapshot to be restored."""
+        return [other for other, entry in self.backup_manifest.items() if entry.get("base") == name]
+
+    def _delete_backup(self, f: pathlib.Path) -> None:
+        f.unlink(missing_ok=True)
+        self.backup_manifest.pop(f.name, None)
+
+    def load_backup_data(self, name: str) -> Any:
+        """Read a backup by file name and return the cache data it holds, applying a delta to its base snapshot."""
+        path = path_manager.get_backup_file_path(name)
+        content = read_backup_file(path)
+        parsed = parse_backup_name(name)
+        if parsed and parsed["kind"] == DELTA:
+            base = content.get("base")
+            if not base:
+                raise ValueError(f"Delta backup {name} has no base snapshot")
+            return apply_delta(read_backup_file(path_manager.get_backup_file_path(base)), content)
+        # Snapshots, older plain .json backups and load/save error copies hold the data directly
+        return content
+
+    def list_backups(self, prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return manifest entries (with their file name) for existing backups, oldest first."""
+        backup_dir = path_manager.backup_path
+        with self.backup_lock:
+            entries = []
+            for name, entry in self.backup_manifest.items():
+                entry_prefix = self._manifest_prefix(name, entry)
+                if prefix is not None and entry_prefix != prefix:
+                    continue
+                if not (backup_dir / name).is_file():
+                    continue
+                parsed = parse_backup_name(name) or {}
+                entries.append({
+                    "name": name,
+                    **entry,
+                    "prefix": entry_prefix,
+                    "backup_date": entry.get("backup_date") or parsed.get("date"),
+                    "kind": entry.get("kind") or parsed.get("kind", SNAPSHOT),
+                })
+        entries.sort(key=lambda e: (e.get("backup_date") or "", e["name"]))
+        return entries
+
+    def restore_backup(self, prefix: str, at: Optional[str] = None) -> Optional[Tuple[str, Any]]:
+        """
+        Rebuild a cache section as it was at a point in time.
+        Uses the newest backup of prefix taken at or before `at` ("YYYY-MM-DDTHH-MM-SS" or ISO format; None = newest).
+        Returns (backup name, data), or None if there is no such backup.
+        """
+        cutoff = at.replace(":", "-")[:19] if at else None
+        candidates = [
+            e for e in self.list_backups(prefix)
+            if cutoff is None or (e.get("backup_date") or "") <= cutoff
+        ]
+        if not candidates:
+            return None
+        name = candidates[-1]["name"]
+        return name, self.load_backup_data(name)
+
     def prune_all_backups(self) -> None:
-        """Prune all backup files for known prefixes on initialization, printing only once."""
+        """Prune all backup files for known prefixes, printing only once."""
         logger.info("Pruning old backups for all known prefixes...")
         prefixes = [
             "sage_cache_info",
             "sage_cache_hash",
+            "sage_cache_ollama",
             "sage_cache_info-save-error",
             "sage_cache_hash-save-error",
             "sage_cache_info-error",
             "sage_cache_hash-error",
         ]
-        for prefix in prefixes:
-            self.prune_old_backups(prefix)
+        with self.backup_lock:
+            for prefix in prefixes:
+                self.prune_old_backups(prefix)
+
+            # Forget manifest entries whose backup files are gone
+            backup_dir = path_manager.backup_path
+            stale = [name for name in self.backup_manifest if not (backup_dir / name).is_file()]
+            for name in stale:
+                del self.backup_manifest[name]
+            self._save_backup_manifest()
+
+    def schedule_backup_prune(self) -> Optional[threading.Thread]:
+        """
+        Run prune_all_backups() on a background thread, so neither import nor metadata pulls wait on it.
+        Does nothing if a prune is already running. Returns the thread, if one was started.
+        """
+        if self.prune_thread is not None and self.prune_thread.is_alive():
+            return None
+
+        def _prune() -> None:
+            try:
+                self.prune_all_backups()
+            except Exception as e:
+                logger.error(f"Background backup prune failed: {e}")
+
+        self.prune_thread = threading.Thread(target=_prune, name="SageCacheBackupPrune", daemon=True)
+        self.prune_thread.start()
+        return self.prune_thread
 
     def by_path(self, file_path: str) -> dict:
         """Get cache info by file path."""
@@ -124,6 +407,21 @@ class SageCache:
         """Get cache info by file hash."""
         return self.info.get(file_hash, {})
 
+    def section_etag(self, *sections: str) -> str:
+        """Weak HTTP ETag for the current contents of the named sections ("hash", "info", "ollama_models")."""
+        versions = "-".join(str(getattr(self, section).version) for section in sections)
+        return f'W/"{self.instance_id}-{versions}"'
+
+    def full_info(self) -> Dict[str, Any]:
+        """
+        Plain copy of the info section including every entry's full Civitai data.
+        Entries that aren't loaded are read from the blob file for the copy only and stay unloaded.
+        The section is captured under the sections lock; the copy is expanded after releasing it.
+        """
+        with self.sections_lock:
+            captured = capture_info(self.info)
+        return expand_info(captured)
+
     def convert_old_cache(self) -> None:
         """Convert old cache format to new format, splitting into hash and info."""
         logger.info("Converting old cache format to new format.")
@@ -148,7 +446,7 @@ class SageCache:
 
     def prune_old_backups(self, prefix: str) -> None:
         """
-        Prune old backup files with smart deduplication.
+        Prune old backup files with smart deduplication, using the backup manifest instead of re-reading files.
         
         Strategy:
         1. Group backups by content hash (exact duplicates)
@@ -156,155 +454,300 @@ class SageCache:
         3. Group remaining backups by entry count (similar backups)
         4. For similar backups, keep the one with most data
         5. Keep only num_of_backups_to_keep most recent unique backups
+        Snapshots that a kept delta backup is based on are never deleted.
         """
         backups = []
         for f in path_manager.backup_path.iterdir():
-            if f.is_file() and f.name.startswith(prefix) and f.suffix == ".json":
+            parsed = parse_backup_name(f.name)
+            if f.is_file() and parsed and parsed["prefix"] == prefix:
                 try:
-                    ctime = f.stat().st_ctime
-                    file_size = f.stat().st_size
-                    backups.append((ctime, file_size, f))
+                    st = f.stat()
+                    backups.append((parsed["date"], st.st_ctime, st.st_size, f, st))
                 except Exception:
                     continue
         
         if not backups:
             return
         
-        backups.sort(reverse=True)  # Newest first
+        backups.sort(key=lambda x: x[:3], reverse=True)  # Newest first
         
-        # Phase 1: Deduplicate exact duplicates (by content hash)
-        # Keep newest file from each duplicate group
-        hash_to_best = {}
-        for ctime, file_size, f in backups:
-            try:
-                with f.open('rb') as file_obj:
-                    file_bytes = file_obj.read()
-                    file_hash = hashlib.sha256(file_bytes).hexdigest()
-                
-                if file_hash not in hash_to_best:
-                    # First file with this hash, keep it
-                    hash_to_best[file_hash] = (ctime, file_size, f, file_bytes)
-                else:
-                    # Duplicate found, delete it (we keep the newer one already stored)
-                    f.unlink(missing_ok=True)
-                    if f.name in self.backup_manifest:
-                        del self.backup_manifest[f.name]
-                    logger.debug(f"Deleted duplicate backup: {f.name}")
-            except Exception as e:
-                logger.warning(f"Error processing backup {f.name}: {e}")
-                continue
-        
-        # Phase 2: Smart similarity deduplication
-        # Compare backups by entry count, keep the one with most data
-        remaining_backups = []
-        for file_hash, (ctime, file_size, f, file_bytes) in hash_to_best.items():
-            try:
-                data = json.loads(file_bytes.decode('utf-8'))
-                entry_count = len(data) if isinstance(data, dict) else 0
-                remaining_backups.append((ctime, file_size, entry_count, f, file_hash))
-            except Exception as e:
-                logger.warning(f"Error parsing backup {f.name}: {e}")
-                # Keep it anyway, use file size as proxy for entry count
-                remaining_backups.append((ctime, file_size, file_size, f, file_hash))
-        
-        # Sort by entry count (descending) then time (descending)
-        remaining_backups.sort(key=lambda x: (x[2], x[0]), reverse=True)
-        
-        # Phase 3: Group by similar entry counts and keep best from each group
-        # Two backups are "similar" if their entry counts are within 5% of each other
-        similarity_threshold = 0.05
-        unique_backups = []
-        seen_entry_ranges = []
-        
-        for ctime, file_size, entry_count, f, file_hash in remaining_backups:
-            # Check if this backup is similar to any we've already kept
-            is_similar = False
-            for kept_count in seen_entry_ranges:
-                if kept_count == 0 and entry_count == 0:
-                    is_similar = True
-                    break
-                elif kept_count > 0:
-                    ratio = abs(entry_count - kept_count) / kept_count
-                    if ratio <= similarity_threshold:
+        with self.backup_lock:
+            to_delete: Dict[str, Tuple[pathlib.Path, str]] = {}
+
+            # Phase 1: Deduplicate exact duplicates (by content hash)
+            # Keep newest file from each duplicate group
+            hash_to_best = {}
+            for backup_date, ctime, file_size, f, st in backups:
+                try:
+                    entry = self._backup_file_metadata(f, st)
+                    file_hash = entry["content_hash"]
+                    
+                    if file_hash not in hash_to_best:
+                        # First file with this hash, keep it
+                        hash_to_best[file_hash] = ((backup_date, ctime), file_size, f, entry["entry_count"])
+                    else:
+                        # Duplicate found, delete it (we keep the newer one already stored)
+                        to_delete[f.name] = (f, "duplicate")
+                except Exception as e:
+                    logger.warning(f"Error processing backup {f.name}: {e}")
+                    continue
+            
+            # Phase 2: Smart similarity deduplication
+            # Compare backups by entry count, keep the one with most data
+            remaining_backups = [
+                (when, file_size, entry_count, f, file_hash)
+                for file_hash, (when, file_size, f, entry_count) in hash_to_best.items()
+            ]
+            
+            # Sort by entry count (descending) then time (descending)
+            remaining_backups.sort(key=lambda x: (x[2], x[0]), reverse=True)
+            
+            # Phase 3: Group by similar entry counts and keep best from each group
+            # Two backups are "similar" if their entry counts are within 5% of each other
+            similarity_threshold = 0.05
+            unique_backups = []
+            seen_entry_ranges = []
+            
+            for when, file_size, entry_count, f, file_hash in remaining_backups:
+                # Check if this backup is similar to any we've already kept
+                is_similar = False
+                for kept_count in seen_entry_ranges:
+                    if kept_count == 0 and entry_count == 0:
                         is_similar = True
                         break
+                    elif kept_count > 0:
+                        ratio = abs(entry_count - kept_count) / kept_count
+                        if ratio <= similarity_threshold:
+                            is_similar = True
+                            break
+                
+                if not is_similar:
+                    # This backup is sufficiently different, keep it
+                    unique_backups.append((when, f))
+                    seen_entry_ranges.append(entry_count)
+                else:
+                    # Similar to one we already kept, delete it
+                    to_delete[f.name] = (f, f"similar, {entry_count} entries")
             
-            if not is_similar:
-                # This backup is sufficiently different, keep it
-                unique_backups.append((ctime, f))
-                seen_entry_ranges.append(entry_count)
-            else:
-                # Similar to one we already kept, delete it
+            # Phase 4: Keep only num_of_backups_to_keep most recent
+            unique_backups.sort(key=lambda x: x[0], reverse=True)  # Sort by time, newest first
+            for _, f in unique_backups[self.num_of_backups_to_keep:]:
+                to_delete[f.name] = (f, "exceeded limit")
+
+            # Phase 5: Keep the base snapshots of every delta backup that survives
+            for _, f in unique_backups[:self.num_of_backups_to_keep]:
+                base = self.backup_manifest.get(f.name, {}).get("base")
+                if base:
+                    to_delete.pop(base, None)
+
+            for name, (f, reason) in to_delete.items():
                 try:
-                    f.unlink(missing_ok=True)
-                    if f.name in self.backup_manifest:
-                        del self.backup_manifest[f.name]
-                    logger.debug(f"Deleted similar backup: {f.name} ({entry_count} entries)")
+                    self._delete_backup(f)
+                    logger.debug(f"Deleted backup ({reason}): {name}")
                 except Exception:
                     pass
-        
-        # Phase 4: Keep only num_of_backups_to_keep most recent
-        unique_backups.sort(reverse=True)  # Sort by time, newest first
-        keep = unique_backups[:self.num_of_backups_to_keep]
-        keep_files = set(f for _, f in keep)
-        
-        for _, f in unique_backups[self.num_of_backups_to_keep:]:
-            try:
-                f.unlink(missing_ok=True)
-                if f.name in self.backup_manifest:
-                    del self.backup_manifest[f.name]
-                logger.debug(f"Deleted old backup (exceeded limit): {f.name}")
-            except Exception:
-                pass
-        
-        # Save manifest after pruning
-        self._save_backup_manifest()
+            
+            # Save manifest after pruning
+            self._save_backup_manifest()
 
     def _atomic_write_json(self, path: pathlib.Path, data: Any) -> None:
         """Write JSON data to a file atomically."""
+        if self.lazy_info and path == self.info_path:
+            # Written without loading entries that aren't loaded yet. The summary and blob files are rewritten only
+            # when the journal is compacted; without the journal every save rewrites the snapshot, so it is written
+            # alone and the next load rebuilds them.
+            content_hash = write_info_files(path, data, write_derived=self.journal is not None)
+            self.info_content_hash = (getattr(data, "version", None), content_hash)
+            return
         file_manager.atomic_write_json(path, data)
 
-    def _save_if_changed(self, current_data: Dict[str, Any], last_data: Dict[str, Any], path: pathlib.Path, label: str) -> tuple[bool, Dict[str, Any]]:
-        """Save one cache section if changed; returns (saved, new_last_data)."""
-        if current_data and current_data != last_data:
-            self._save_json(path, current_data, label)
-            return True, copy.deepcopy(current_data)
-        return False, last_data
+    def _save_section_if_changed(self, section: TrackedCacheDict, path: pathlib.Path, label: str, mtime_attr: str) -> bool:
+        """Rewrite one JSON cache file if any of its keys changed; returns whether it was saved."""
+        if not section or not section.has_changes:
+            return False
+        changed, removed = section.pending_changes()
+        if not self._save_json(path, section, label):
+            return False
+        section.acknowledge(changed, removed)
+        # Our own write: remember its mtime so the next load() doesn't read the file straight back.
+        try:
+            setattr(self, mtime_attr, path.stat().st_mtime)
+        except OSError:
+            setattr(self, mtime_attr, None)
+        self._note_own_write(path)
+        return True
+
+    def _save_sqlite_changes(self) -> bool:
+        """Write changed hash/info rows to the SQLite store; returns whether anything was written."""
+        if not (self.hash.has_changes or self.info.has_changes):
+            return False
+
+        hash_changed, hash_removed = self.hash.pending_changes()
+        info_changed, info_removed = self.info.pending_changes()
+        hash_upserts = {path: self.hash[path] for path in hash_changed if path in self.hash}
+        info_upserts = {key: self.info[key] for key in info_changed if key in self.info}
+
+        try:
+            self.sqlite_store.apply_changes(hash_upserts, hash_removed, info_upserts, info_removed)
+        except Exception as e:
+            logger.error(f"Unable to save cache changes to {self.db_path}: {e}")
+            return False
+
+        self.hash.acknowledge(hash_changed, hash_removed)
+        self.info.acknowledge(info_changed, info_removed)
+        self._note_own_write(self.db_path, self._sqlite_wal_path())
+        logger.debug(
+            f"Saved {len(hash_changed) + len(hash_removed)} path rows and "
+            f"{len(info_changed) + len(info_removed)} info rows to SQLite cache."
+        )
+        return True
+
+    def _journal_records(self, changed: Dict[str, int], removed: Dict[str, int], info_changed: Dict[str, int], info_removed: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Turn pending hash/info changes into journal operations."""
+        records: List[Dict[str, Any]] = []
+        for path in removed:
+            records.append({"op": "del_hash", "path": path})
+        for path in changed:
+            if path in self.hash:
+                records.append({"op": "set_hash", "path": path, "hash": self.hash[path]})
+        for file_hash in info_removed:
+            records.append({"op": "del_info", "hash": file_hash})
+        for file_hash in info_changed:
+            entry = self.info.get(file_hash)
+            if entry is None:
+                continue
+            fields = self.info.changed_fields(file_hash)
+            if fields is None:
+                records.append({"op": "set_info", "hash": file_hash, "info": dict(entry)})
+            elif fields == {"lastUsed"}:
+                records.append({"op": "touch_last_used", "hash": file_hash, "lastUsed": entry.get("lastUsed", "")})
+            else:
+                records.append({"op": "merge_info", "hash": file_hash, "info": {f: entry[f] for f in fields if f in entry}})
+        return records
+
+    def _append_journal(self, merge: bool = True) -> bool:
+        """
+        Append pending hash/info changes to the journal and fsync it; returns whether anything was written.
+        Pass merge=False if the disk changes were just merged under the same lock.
+        """
+        if not (self.hash.has_changes or self.info.has_changes):
+            return False
+
+        with self.sections_lock, self.lock:
+            # Apply what other processes appended first, so our offset covers the whole journal afterwards
+            if merge:
+                self._merge_disk_changes()
+            hash_changed, hash_removed = self.hash.pending_changes()
+            info_changed, info_removed = self.info.pending_changes()
+            records = self._journal_records(hash_changed, hash_removed, info_changed, info_removed)
+            try:
+                self.journal.append(records)
+            except Exception as e:
+                logger.error(f"Unable to append to cache journal {self.journal_path}: {e}")
+                return False
+            self.journal_signature = file_signature(self.journal_path)
+            self.journal_offset = self.journal.size()
+
+        self.hash.acknowledge(hash_changed, hash_removed)
+        self.info.acknowledge(info_changed, info_removed)
+        self._note_own_write(self.journal_path)
+        logger.debug(f"Appended {len(records)} operations to the cache journal.")
+        return True
+
+    def compact_journal(self, merge: bool = True) -> bool:
+        """
+        Write the hash/info snapshot files from memory and empty the journal.
+        Records appended by other processes are merged in first, under the cache lock, so none are dropped
+        (pass merge=False if that was just done under the same lock).
+        """
+        if self.journal is None:
+            return False
+
+        with self.sections_lock, self.lock:
+            if merge:
+                self._merge_disk_changes()
+            hash_changed, hash_removed = self.hash.pending_changes()
+            info_changed, info_removed = self.info.pending_changes()
+            for section, path, label, mtime_attr in (
+                (self.hash, self.hash_path, "hash cache", "hash_mtime"),
+                (self.info, self.info_path, "info cache", "info_mtime"),
+            ):
+                # Empty sections are written only over a snapshot we loaded, so a failed load can't wipe the file.
+                if not section and getattr(self, mtime_attr, None) is None:
+                    continue
+                if not self._save_json(path, section, label):
+                    return False
+                setattr(self, mtime_attr, path.stat().st_mtime)
+                self._note_own_write(path)
+
+            try:
+                self.journal.truncate()
+            except Exception as e:
+                logger.error(f"Unable to truncate cache journal {self.journal_path}: {e}")
+                return False
+            self.journal_signature = file_signature(self.journal_path)
+            self.journal_offset = 0
+
+        self.hash.acknowledge(hash_changed, hash_removed)
+        self.info.acknowledge(info_changed, info_removed)
+        self._note_own_write(self.journal_path)
+        logger.info("Compacted cache journal into the snapshot files.")
+        return True
 
     def _perform_save_pass(self) -> bool:
         """Run one save pass for all cache sections and return whether anything was saved."""
         saved = False
+        try:
+            with self.sections_lock, self.lock:
+                # Reload anything other processes wrote since our last load, keeping our unsaved changes on top
+                self._merge_disk_changes()
 
-        hash_saved, new_last_hash = self._save_if_changed(
-            self.hash, self.last_hash, self.hash_path, "hash cache"
-        )
-        if hash_saved:
-            self.last_hash = new_last_hash
-            saved = True
+                if self.sqlite_store is not None:
+                    saved = self._save_sqlite_changes()
+                elif self.journal is not None:
+                    # Disk changes were merged just above, under the same lock
+                    saved = self._append_journal(merge=False)
+                    if not self.batch_mode and self.journal.size() >= self.journal_compact_bytes:
+                        self.compact_journal(merge=False)
+                else:
+                    if self._save_section_if_changed(self.hash, self.hash_path, "hash cache", "hash_mtime"):
+                        saved = True
+                    if self._save_section_if_changed(self.info, self.info_path, "info cache", "info_mtime"):
+                        saved = True
 
-        info_saved, new_last_info = self._save_if_changed(
-            self.info, self.last_info, self.info_path, "info cache"
-        )
-        if info_saved:
-            self.last_info = new_last_info
-            saved = True
-
-        ollama_saved, new_last_ollama = self._save_if_changed(
-            self.ollama_models,
-            self.last_ollama_models,
-            self.ollama_models_path,
-            "Ollama models cache",
-        )
-        if ollama_saved:
-            self.last_ollama_models = new_last_ollama
-            saved = True
+                if self._save_section_if_changed(self.ollama_models, self.ollama_models_path, "Ollama models cache", "ollama_mtime"):
+                    saved = True
+                if self._save_section_if_changed(self.fingerprints, self.fingerprints_path, "fingerprint cache", "fingerprints_mtime"):
+                    saved = True
+        except CacheLockTimeout as e:
+            logger.error(f"Unable to save cache: {e}. Changes are kept and saved on the next save.")
+            return False
 
         return saved
 
-    def _save_json(self, path: pathlib.Path, data: Any, label: str) -> None:
-        """Save data to a JSON file atomically, backing up and pruning old backups on error."""
+    def _merge_disk_changes(self) -> None:
+        """
+        Bring the in-memory sections up to date with the files on disk before writing them (call with the lock held).
+        Journal records appended by other processes are applied directly; if a snapshot file was rewritten, the
+        section is reloaded and this process's unsaved changes are re-applied on top.
+        """
+        current_date = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+        for mtime_attr in ("hash_mtime", "info_mtime", "ollama_mtime", "fingerprints_mtime"):
+            if not hasattr(self, mtime_attr):
+                setattr(self, mtime_attr, None)
+        if self.sqlite_store is not None:
+            # Rows other processes changed are reloaded, so only the fields this process changed are written over them
+            self._load_sqlite_caches(current_date)
+        else:
+            self._load_json_caches(current_date)
+        self._load_ollama_cache(current_date)
+        self._load_fingerprint_cache(current_date)
+
+    def _save_json(self, path: pathlib.Path, data: Any, label: str) -> bool:
+        """Save data to a JSON file atomically, backing up the existing file on error. Returns whether it was saved."""
         try:
             self._atomic_write_json(path, data)
+            return True
         except Exception as e:
             logger.error(f"Unable to save {label} to {path}: {e}")
             current_date = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
@@ -317,27 +760,31 @@ class SageCache:
                     logger.info(f"Backed up problematic file to {error_backup_path}")
                 except Exception as backup_e:
                     logger.error(f"Unable to backup error file {path} to {error_backup_path}: {backup_e}")
+            return False
 
     def backup_json(self, backup_prefix: str, data: Any, current_date: str) -> None:
         """
-        Backup data to a JSON file atomically, with smart deduplication.
+        Back up data as a compressed snapshot, or a compressed delta against the latest snapshot, with smart deduplication.
         
         Strategy:
         1. Check manifest first for fast comparison (avoids reading files)
         2. If similar backup exists (within 5% entry count), compare which has more data
-        3. Keep the backup with more entries, delete the smaller one
+        3. Keep the backup with more entries, delete the smaller one (unless a delta depends on it)
         4. Skip if exact duplicate exists
         """
-        data_json = json.dumps(data, separators=(",", ":"), sort_keys=True, indent=4)
-        data_hash = hashlib.sha256(data_json.encode("utf-8")).hexdigest()
+        with self.backup_lock:
+            self._backup_json_locked(backup_prefix, data, current_date)
+
+    def _backup_json_locked(self, backup_prefix: str, data: Any, current_date: str) -> None:
+        data_hash = self._content_hash(data)
         entry_count = len(data) if isinstance(data, dict) else 0
         
         # Check manifest first for fast comparison
         similar_backup = None
         similar_entry_count = 0
         
-        for backup_name, manifest_entry in self.backup_manifest.items():
-            if not backup_name.startswith(backup_prefix):
+        for backup_name, manifest_entry in list(self.backup_manifest.items()):
+            if self._manifest_prefix(backup_name, manifest_entry) != backup_prefix:
                 continue
                 
             # Check for exact duplicate
@@ -361,35 +808,96 @@ class SageCache:
             return
         
         # If similar backup exists with less data, delete it and create new one
-        if similar_backup and similar_entry_count < entry_count:
+        if similar_backup and similar_entry_count < entry_count and not self._backup_dependents(similar_backup):
             similar_path = path_manager.get_backup_file_path(similar_backup)
             try:
                 if similar_path.exists():
-                    similar_path.unlink()
-                    del self.backup_manifest[similar_backup]
+                    self._delete_backup(similar_path)
                     # logger.info(f"Replaced smaller backup {similar_backup} ({similar_entry_count} entries) with larger backup ({entry_count} entries)")
             except Exception as e:
                 logger.warning(f"Failed to delete smaller backup {similar_backup}: {e}")
         
-        # Create new backup
+        # Create new backup: a delta against the latest snapshot if it is small enough, otherwise a new snapshot
         safe_date = current_date.replace(":", "-")
-        backup_path = path_manager.get_backup_file_path(f"{backup_prefix}-{safe_date}.json")
+        kind, content, base = SNAPSHOT, data, None
+        if isinstance(data, dict):
+            base, delta = self._delta_against_latest_snapshot(backup_prefix, data)
+            if delta is not None:
+                kind, content = DELTA, {"base": base, **delta}
+        backup_path = path_manager.get_backup_file_path(backup_file_name(backup_prefix, safe_date, kind))
         try:
-            temp_dir = backup_path.parent
-            with tempfile.NamedTemporaryFile('w', dir=temp_dir, delete=False, encoding='utf-8') as tf:
-                tf.write(data_json)
-                tf.flush()
-                os.fsync(tf.fileno())
-                tempname = tf.name
-            os.replace(tempname, backup_path)
+            write_backup_file(backup_path, content)
             
             # Update manifest
-            self._update_manifest_for_backup(backup_path, data)
+            self._update_manifest_for_backup(backup_path, entry_count, data_hash, kind, base if kind == DELTA else None)
             
-            logger.debug(f"Created backup: {backup_path.name} ({entry_count} entries)")
+            logger.debug(f"Created {kind} backup: {backup_path.name} ({entry_count} entries)")
         except Exception as e:
             logger.error(f"Unable to backup {backup_prefix} to {backup_path}: {e}")
 
+    def _delta_against_latest_snapshot(self, backup_prefix: str, data: Dict[str, Any]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Return (snapshot name, delta) for backing up data as a delta, or (None, None) if a full snapshot should be taken:
+        no usable snapshot, too many deltas on it already, or the delta would touch too much of the data.
+        """
+        backups = self.list_backups(backup_prefix)
+        snapshots = [e for e in backups if e["kind"] == SNAPSHOT and parse_backup_name(e["name"])["compression"]]
+        if not snapshots:
+            return None, None
+        base = snapshots[-1]["name"]
+        if len(self._backup_dependents(base)) >= self.backup_max_deltas:
+            return None, None
+        try:
+            base_data = self.load_backup_data(base)
+        except Exception as e:
+            logger.warning(f"Unable to read backup snapshot {base}, taking a new snapshot: {e}")
+            return None, None
+        if not isinstance(base_data, dict):
+            return None, None
+        delta = compute_delta(base_data, data)
+        if len(delta["set"]) + len(delta["del"]) > max(len(data), 1) * self.backup_delta_ratio:
+            return None, None
+        return base, delta
+
+    def _backup_section(self, backup_prefix: str, section: TrackedCacheDict, current_date: str) -> None:
+        """Back up a cache section unless it has not changed since it was last backed up."""
+        if self.backup_versions.get(backup_prefix) == section.version:
+            logger.debug(f"Skipping backup of {backup_prefix} - unchanged since last backup")
+            return
+        if backup_prefix == "sage_cache_info" and has_unloaded_entries(section):
+            self._backup_lazy_info(section, current_date)
+        else:
+            self.backup_json(backup_prefix, section, current_date)
+        self.backup_versions[backup_prefix] = section.version
+
+    def _backup_lazy_info(self, section: TrackedCacheDict, current_date: str) -> None:
+        """
+        Back up a lazily loaded info section on a background thread, reading the unloaded entries
+        from the blob file there, so a backup doesn't load every entry into memory for good.
+        """
+        if self.info_content_hash is not None and self.info_content_hash[0] == section.version:
+            content_hash = self.info_content_hash[1]
+            with self.backup_lock:
+                duplicate = any(
+                    entry.get("content_hash") == content_hash and self._manifest_prefix(name, entry) == "sage_cache_info"
+                    for name, entry in self.backup_manifest.items()
+                )
+            if duplicate:
+                logger.debug("Skipping backup of sage_cache_info - exact duplicate exists")
+                return
+
+        with self.sections_lock:
+            captured = capture_info(section)
+
+        def _backup() -> None:
+            try:
+                self.backup_json("sage_cache_info", expand_info(captured), current_date)
+            except Exception as e:
+                logger.error(f"Unable to back up the info cache: {e}")
+
+        self.backup_thread = threading.Thread(target=_backup, name="SageCacheInfoBackup", daemon=True)
+        self.backup_thread.start()
+
     def load_json_file(self, path: pathlib.Path, label: str, current_date: str) -> Optional[Any]:
         """Load data from a JSON file, backing up the file if an error occurs."""
         try:
@@ -411,7 +919,14 @@ class SageCache:
             return None
 
     def load(self) -> None:
-        """Load cache from disk only if not already loaded or if file has changed."""
+        """
+        Load cache from disk only if not already loaded or if file has changed.
+        While the file watcher is running, this returns immediately unless it saw another process write the cache files.
+        """
+        if self.watcher is not None and self.loaded_generation == self.generation and self.watcher.running:
+            self.reloads_avoided += 1
+            return
+
         current_date = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
         if not hasattr(self, 'hash_mtime'):
             self.hash_mtime = None
@@ -419,74 +934,341 @@ class SageCache:
             self.info_mtime = None
         if not hasattr(self, 'ollama_mtime'):
             self.ollama_mtime = None
+        if not hasattr(self, 'fingerprints_mtime'):
+            self.fingerprints_mtime = None
+        self._start_watcher()
+        # Read before loading, so a write that lands mid-load is picked up by the next call.
+        observed_generation = self.generation
         try:
-            hash_needs_reload = False
-            info_needs_reload = False
-            ollama_needs_reload = False
-
-            if self.ollama_models_path.is_file():
-                ollama_mtime = self.ollama_models_path.stat().st_mtime
-                if not self.ollama_models or self.ollama_mtime != ollama_mtime:
-                    ollama_needs_reload = True
-            
-            if self.hash_path.is_file():
-                hash_mtime = self.hash_path.stat().st_mtime
-                if not self.hash or self.hash_mtime != hash_mtime:
-                    hash_needs_reload = True
-            if self.info_path.is_file():
-                info_mtime = self.info_path.stat().st_mtime
-                if not self.info or self.info_mtime != info_mtime:
-                    info_needs_reload = True
+            # Under the cache lock, so a save in another process can't land between reading a snapshot and the journal,
+            # and under the sections lock, so no thread writes to a section while it is being replaced
+            with self.sections_lock, self.lock:
+                if self.sqlite_store is not None:
+                    self._load_sqlite_caches(current_date)
+                else:
+                    self._load_json_caches(current_date)
+                self._load_ollama_cache(current_date)
+                self._load_fingerprint_cache(current_date)
+            self.loaded_generation = observed_generation
+        except Exception as e:
+            logger.error(f"Unable to load cache: {e}")
+
+    def _sqlite_wal_path(self) -> pathlib.Path:
+        return self.db_path.with_name(self.db_path.name + "-wal")
+
+    def _watched_paths(self) -> List[pathlib.Path]:
+        """The files whose external modification should make load() re-check the disk."""
+        if self.sqlite_store is not None:
+            return [self.db_path, self._sqlite_wal_path(), self.ollama_models_path, self.fingerprints_path]
+        return [self.hash_path, self.info_path, self.journal_path, self.ollama_models_path, self.fingerprints_path, self.main_path]
+
+    def _start_watcher(self) -> None:
+        """Start the cache file watcher, if enabled and not already running."""
+        if self.watch_interval <= 0 or (self.watcher is not None and self.watcher.running):
+            return
+        try:
+            self.watcher = CacheFileWatcher(self._watched_paths(), self._on_external_change, self.watch_interval)
+            self.watcher.start()
+        except Exception as e:
+            logger.warning(f"Unable to start cache file watcher, cache.load() will check the files every call: {e}")
+            self.watcher = None
+
+    def stop_watcher(self) -> None:
+        """Stop the cache file watcher; load() goes back to checking the files on every call."""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def _on_external_change(self, path: pathlib.Path) -> None:
+        logger.debug(f"Cache file changed on disk: {path.name}")
+        self.generation += 1
+
+    def _note_own_write(self, *paths: pathlib.Path) -> None:
+        """Tell the watcher about files this process just wrote, so they don't invalidate the loaded cache."""
+        if self.watcher is not None:
+            self.watcher.refresh(*paths)
+
+    def invalidate(self) -> None:
+        """Force the next load() to re-check the cache files on disk."""
+        self.generation += 1
+
+    def _load_json_caches(self, current_date: str) -> None:
+        """Load the hash and info JSON files if they changed on disk, converting the old single-file format if needed."""
+        hash_needs_reload = False
+        info_needs_reload = False
+        journal_changed = False
+
+        if self.hash_path.is_file():
+            hash_mtime = self.hash_path.stat().st_mtime
+            if not self.hash or self.hash_mtime != hash_mtime:
+                hash_needs_reload = True
+        if self.info_path.is_file():
+            info_mtime = self.info_path.stat().st_mtime
+            if not self.info or self.info_mtime != info_mtime:
+                info_needs_reload = True
+        if self.journal is not None:
+            journal_signature = file_signature(self.journal_path)
+            journal_changed = journal_signature != self.journal_signature
+            if journal_changed and not (hash_needs_reload or info_needs_reload) and self._catch_up_journal(journal_signature):
+                return
+            if journal_changed or hash_needs_reload or info_needs_reload:
+                # Journal records apply on top of both snapshots, so reload them together.
+                hash_needs_reload = info_needs_reload = True
+
+        has_snapshots = self.hash_path.is_file() and self.info_path.is_file()
+        if has_snapshots or (journal_changed and self.journal.size() > 0):
+            # Unsaved changes of this process are re-applied over what is loaded, so they survive another process's save
+            hash_changes = self.hash.unsaved_changes() if hash_needs_reload and self.hash.has_changes else None
+            info_changes = self.info.unsaved_changes() if info_needs_reload and self.info.has_changes else None
+            hash_data = info_data = None
+            if hash_needs_reload:
+                #print("Loading hash cache from disk.")
+                hash_data = self.load_json_file(self.hash_path, "hash cache", current_date) if self.hash_path.is_file() else {}
+            info_content_hash = None
+            if info_needs_reload:
+                #print("Loading info cache from disk.")
+                if self.info_path.is_file():
+                    info_data, info_content_hash = self._load_info_file(current_date)
+                else:
+                    info_data = {}
+
+            if self.journal is not None and hash_needs_reload:
+                records, self.journal_offset = self.journal.read_from(0) or ([], 0)
+                if records:
+                    if hash_data is None:
+                        hash_data = {}
+                    if info_data is None:
+                        info_data = {}
+                    applied = CacheJournal.replay(records, hash_data, info_data)
+                    logger.info(f"Replayed {applied} cache journal operations.")
+                    info_content_hash = None
+                self.journal_signature = journal_signature
+
+            if hash_needs_reload:
+                if hash_data is not None:
+                    self._hash = self._loaded_section(self._hash, hash_data)
+                    self.hash_mtime = self.hash_path.stat().st_mtime if self.hash_path.is_file() else None
+                    self._backup_section("sage_cache_hash", self.hash, current_date)
+                else:
+                    self._hash = self._loaded_section(self._hash, {})
+                    self.hash_mtime = None
+            if info_needs_reload:
+                if info_data is not None:
+                    self._info = self._loaded_section(self._info, info_data)
+                    self.info_mtime = self.info_path.stat().st_mtime if self.info_path.is_file() else None
+                    self.info_content_hash = (self.info.version, info_content_hash) if info_content_hash else None
+                    self._backup_section("sage_cache_info", self.info, current_date)
+                else:
+                    self._info = self._loaded_section(self._info, {})
+                    self.info_mtime = None
+            if hash_changes:
+                self._hash.reapply_changes(hash_changes)
+            if info_changes:
+                self._info.reapply_changes(info_changes)
+        elif self.main_path.is_file():
+            data = self.load_json_file(self.main_path, "main cache", current_date)
+            if data is not None:
+                self.data = data
+                self.convert_old_cache()
+            else:
+                self.data = {}
+
+    def _load_info_file(self, current_date: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Load sage_cache_info.json, returning (data, content hash if known).
+        With lazy info loading, only the summary file is read when it matches the info file; otherwise the
+        info file is parsed once and the summary/blob files are written for it, and the entries are then
+        reloaded from them so their nested fields don't stay in memory.
+        """
+        if not self.lazy_info:
+            return self.load_json_file(self.info_path, "info cache", current_date), None
+
+        lazy = load_info_summary(self.info_path)
+        if lazy is not None:
+            return lazy
+        source_stat = self.info_path.stat()
+        info_data = self.load_json_file(self.info_path, "info cache", current_date)
+        if info_data is None:
+            return None, None
+        try:
+            write_info_files(self.info_path, info_data, write_snapshot=False, source_stat=source_stat)
+        except Exception as e:
+            logger.warning(f"Unable to write the info cache summary, loading it in full: {e}")
+            return info_data, None
+        lazy = load_info_summary(self.info_path)
+        if lazy is None:
+            # The info file changed while it was being read; the next load() picks up the new one.
+            return info_data, None
+        logger.info(f"Wrote the info cache summary for {len(info_data)} entries.")
+        return lazy
+
+    def _catch_up_journal(self, journal_signature: Any) -> bool:
+        """
+        Apply only the journal records appended (by other processes) since this process last read the journal.
+        Returns False if that isn't possible (first load, or the journal was truncated or replaced) and a full reload is needed.
+        """
+        if self.journal_signature is None or journal_signature is None or journal_signature[2] != self.journal_signature[2]:
+            return False
+        tail = self.journal.read_from(self.journal_offset)
+        if tail is None:
+            return False
+        records, self.journal_offset = tail
+        if records:
+            self._merge_journal_records(records)
+            self.journal_merges += 1
+            logger.debug(f"Applied {len(records)} cache journal operations written by another process.")
+        self.journal_signature = journal_signature
+        return True
+
+    def _merge_journal_records(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Apply journal records (or SQLite rows, as journal records) from another process to the in-memory sections.
+        They are already on disk, so they are
+        not tracked as unsaved changes, and keys (or info fields) with unsaved changes in this process keep our value.
+        """
+        hash_changed, hash_removed = self.hash.pending_changes()
+        info_changed, info_removed = self.info.pending_changes()
+        merged = []
+        for record in records:
+            op = record.get("op") if isinstance(record, dict) else None
+            if op in ("set_hash", "del_hash"):
+                if record.get("path") in hash_changed or record.get("path") in hash_removed:
+                    continue
+            elif record.get("hash") in info_removed:
+                continue
+            elif record.get("hash") in info_changed:
+                fields = self.info.changed_fields(record["hash"])
+                if fields is None or op == "del_info" or (op == "touch_last_used" and "lastUsed" in fields):
+                    continue
+                if op in ("set_info", "merge_info"):
+                    info = {field: value for field, value in record.get("info", {}).items() if field not in fields}
+                    record = {"op": "merge_info", "hash": record["hash"], "info": info}
+            merged.append(record)
+
+        CacheJournal.replay(merged, self.hash, self.info)
+
+        new_hash_changed, new_hash_removed = self.hash.pending_changes()
+        new_info_changed, new_info_removed = self.info.pending_changes()
+        self.hash.acknowledge(
+            {key: version for key, version in new_hash_changed.items() if key not in hash_changed},
+            {key: version for key, version in new_hash_removed.items() if key not in hash_removed},
+        )
+        self.info.acknowledge(
+            {key: version for key, version in new_info_changed.items() if key not in info_changed},
+            {key: version for key, version in new_info_removed.items() if key not in info_removed},
+        )
+
+    def _load_sqlite_caches(self, current_date: str) -> None:
+        """Load the hash and info caches from SQLite if another connection changed them since the last load."""
+        store = self.sqlite_store
+        if store.get_meta("json_migrated") is None:
+            self._migrate_json_to_sqlite(current_date)
+
+        data_version = store.data_version()
+        if self.sqlite_data_version is not None and self.sqlite_data_version == data_version:
+            return
+
+        changes = store.load_changes(self.sqlite_change_seq) if self.sqlite_change_seq is not None else None
+        if changes is not None:
+            # Only the rows saved since our last load; keys with unsaved changes in this process keep our value
+            hash_upserts, hash_deletes, info_upserts, info_deletes, self.sqlite_change_seq = changes
+            records = [{"op": "del_hash", "path": path} for path in hash_deletes]
+            records += [{"op": "set_hash", "path": path, "hash": file_hash} for path, file_hash in hash_upserts.items()]
+            records += [{"op": "del_info", "hash": file_hash} for file_hash in info_deletes]
+            records += [{"op": "set_info", "hash": file_hash, "info": info} for file_hash, info in info_upserts.items()]
+            self._merge_journal_records(records)
+            self.sqlite_data_version = data_version
+            logger.debug(f"Applied {len(records)} SQLite cache rows saved by another process.")
+            return
+
+        # Unsaved changes of this process are re-applied over what is loaded, so they survive another process's save
+        hash_changes = self.hash.unsaved_changes() if self.hash.has_changes else None
+        info_changes = self.info.unsaved_changes() if self.info.has_changes else None
+        change_seq = store.change_seq()
+        self._hash = self._loaded_section(self._hash, store.load_hashes())
+        self._info = self._loaded_section(self._info, store.load_info())
+        if hash_changes:
+            self._hash.reapply_changes(hash_changes)
+        if info_changes:
+            self._info.reapply_changes(info_changes)
+        self.sqlite_data_version = data_version
+        self.sqlite_change_seq = change_seq
+        if self.hash:
+            self._backup_section("sage_cache_hash", self.hash, current_date)
+        if self.info:
+            self._backup_section("sage_cache_info", self.info, current_date)
+
+    def _migrate_json_to_sqlite(self, current_date: str) -> None:
+        """
+        One-time import of the JSON cache files into an empty SQLite store.
+        The JSON files are left in place untouched, so switching back to the JSON backend is possible.
+        """
+        store = self.sqlite_store
+        if store.is_empty():
+            hash_data: Dict[str, str] = {}
+            info_data: Dict[str, Any] = {}
             if self.hash_path.is_file() and self.info_path.is_file():
-                if hash_needs_reload:
-                    #print("Loading hash cache from disk.")
-                    hash_data = self.load_json_file(self.hash_path, "hash cache", current_date)
-                    if hash_data is not None:
-                        self.hash = hash_data
-                        self.last_hash = copy.deepcopy(self.hash)
-                        self.hash_mtime = self.hash_path.stat().st_mtime
-                        self.backup_json("sage_cache_hash", self.hash, current_date)
-                    else:
-                        self.hash = {}
-                        self.last_hash = {}
-                        self.hash_mtime = None
-                if info_needs_reload:
-                    #print("Loading info cache from disk.")
-                    info_data = self.load_json_file(self.info_path, "info cache", current_date)
-                    if info_data is not None:
-                        self.info = info_data
-                        self.last_info = copy.deepcopy(self.info)
-                        self.info_mtime = self.info_path.stat().st_mtime
-                        self.backup_json("sage_cache_info", self.info, current_date)
-                    else:
-                        self.info = {}
-                        self.last_info = {}
-                        self.info_mtime = None
+                hash_data = self.load_json_file(self.hash_path, "hash cache", current_date) or {}
+                info_data = self.load_json_file(self.info_path, "info cache", current_date) or {}
             elif self.main_path.is_file():
                 data = self.load_json_file(self.main_path, "main cache", current_date)
                 if data is not None:
                     self.data = data
                     self.convert_old_cache()
-                else:
-                    self.data = {}
-            if self.ollama_models_path.is_file() and ollama_needs_reload:
-                ollama_data = self.load_json_file(self.ollama_models_path, "Ollama models cache", current_date)
-                if ollama_data is not None:
-                    self.ollama_models = ollama_data
-                    self.last_ollama_models = copy.deepcopy(self.ollama_models)
-                    self.ollama_mtime = self.ollama_models_path.stat().st_mtime
-                    self.backup_json("sage_cache_ollama", self.ollama_models, current_date)
-                else:
-                    self.ollama_models = {}
-                    self.last_ollama_models = {}
-                    self.ollama_mtime = None
-        except Exception as e:
-            logger.error(f"Unable to load cache: {e}")
+                    hash_data, info_data = self.hash, self.info
+
+            if hash_data or info_data:
+                store.import_all(hash_data, info_data)
+                logger.info(
+                    f"Migrated {len(hash_data)} paths and {len(info_data)} info entries "
+                    f"from the JSON cache to {self.db_path}."
+                )
+        store.set_meta("json_migrated", current_date)
+
+    def _load_side_section(self, attr: str, path: pathlib.Path, label: str, mtime_attr: str, current_date: str) -> bool:
+        """
+        Reload a cache section kept in its own JSON file (for both backends) if the file changed on disk,
+        re-applying this process's unsaved changes on top. Returns whether the file was read.
+        """
+        if not path.is_file():
+            return False
+        section = getattr(self, attr)
+        if section and getattr(self, mtime_attr) == path.stat().st_mtime:
+            return False
+        data = self.load_json_file(path, label, current_date)
+        changes = section.unsaved_changes() if section.has_changes else None
+        if data is not None:
+            setattr(self, attr, self._loaded_section(section, data))
+            setattr(self, mtime_attr, path.stat().st_mtime)
+        else:
+            setattr(self, attr, self._loaded_section(section, {}))
+            setattr(self, mtime_attr, None)
+        if changes:
+            getattr(self, attr).reapply_changes(changes)
+        return data is not None
+
+    def _load_ollama_cache(self, current_date: str) -> None:
+        """Load the Ollama models cache if it changed on disk."""
+        if self._load_side_section("_ollama_models", self.ollama_models_path, "Ollama models cache", "ollama_mtime", current_date):
+            self._backup_section("sage_cache_ollama", self.ollama_models, current_date)
+
+    def _load_fingerprint_cache(self, current_date: str) -> None:
+        """Load the file fingerprint cache if it changed on disk. It is derived data, so it isn't backed up."""
+        self._load_side_section("_fingerprints", self.fingerprints_path, "fingerprint cache", "fingerprints_mtime", current_date)
+
+    def in_batch(self) -> bool:
+        """Whether the calling thread started the active batch. Other threads' saves aren't deferred by it."""
+        return self.batch_mode and self.batch_thread == threading.get_ident()
 
     def save(self) -> None:
-        """Save cache to disk. Skipped if batch_mode is True."""
-        # Skip save if in batch mode
-        if self.batch_mode:
+        """Save cache to disk. Skipped inside this thread's batch, except for appending to the journal."""
+        # Skip save if in batch mode; the journal still keeps batched changes durable
+        if self.in_batch():
+            if self.journal is not None:
+                try:
+                    self._append_journal()
+                except CacheLockTimeout as e:
+                    logger.error(f"Unable to append to cache journal: {e}. Changes are kept and saved on the next save.")
             return
 
         saved = self._perform_save_pass()
@@ -496,8 +1278,9 @@ class SageCache:
     
     def begin_batch(self) -> None:
         """
-        Start a batch operation - suppress saves and backups until end_batch() is called.
-        Use this when performing bulk operations to avoid excessive I/O.
+        Start a batch operation - suppress this thread's saves and backups until end_batch() is called.
+        Use this when performing bulk operations to avoid excessive I/O. Saves from other threads (the
+        background hash queue, nodes, routes) still happen, and write the batch's changes so far with theirs.
         
         Example:
             cache.begin_batch()
@@ -512,6 +1295,7 @@ class SageCache:
             return
         
         self.batch_mode = True
+        self.batch_thread = threading.get_ident()
         self.batch_start_changes = self.pending_changes
         logger.info("Batch mode started - saves and backups deferred")
     
@@ -522,11 +1306,12 @@ class SageCache:
         Args:
             force_save: If True, save even if no changes detected. Default True for safety.
         """
-        if not self.batch_mode:
-            logger.warning("Batch mode not active - ignoring end_batch() call")
+        if not self.in_batch():
+            logger.warning("Batch mode not active in this thread - ignoring end_batch() call")
             return
         
         self.batch_mode = False
+        self.batch_thread = None
         changes_in_batch = self.pending_changes - self.batch_start_changes
         
         if force_save or changes_in_batch > 0:
@@ -561,13 +1346,13 @@ class SageCache:
             current_date = current_time.strftime("%Y-%m-%dT%H-%M-%S")
             saves_since_backup = self.save_count_since_backup
             
-            # Create backups
+            # Create backups (sections unchanged since their last backup are skipped)
             if self.hash:
-                self.backup_json("sage_cache_hash", self.hash, current_date)
+                self._backup_section("sage_cache_hash", self.hash, current_date)
             if self.info:
-                self.backup_json("sage_cache_info", self.info, current_date)
+                self._backup_section("sage_cache_info", self.info, current_date)
             if self.ollama_models:
-                self.backup_json("sage_cache_ollama", self.ollama_models, current_date)
+                self._backup_section("sage_cache_ollama", self.ollama_models, current_date)
             
             # Reset counters
             self.save_count_since_backup = 0
@@ -603,9 +1388,11 @@ class SageCache:
         Removes both hash and info if no other file uses the same hash.
         """
         file_hash = self.hash.get(file_path)
+        self.fingerprints.pop(file_path, None)
         if file_hash:
+            index = self.index
             del self.hash[file_path]
-            if file_hash not in self.hash.values():
+            if index.hash_refcount(file_hash) == 0:
                 self.info.pop(file_hash, None)
 
     def update_last_used_by_path(self, file_path: str) -> None:
@@ -641,14 +1428,19 @@ class SageCache:
 
     def get_models_by_model_id(self, model_id: Any) -> List[dict]:
         """
-        Return a list of all model info dicts with the same modelId.
-        For each, include a boolean 'latest_version_present' indicating if the update_version_id is present as an id in the cache.
+        Return copies of all model info dicts with the same modelId.
+        Each copy includes a boolean 'latest_version_present' indicating if the update_version_id is present as an id in the cache;
+        the cached entries themselves are left unchanged.
         """
-        id_to_info = {info.get("id"): info for info in self.info.values() if "id" in info}
-        models = [info for info in self.info.values() if info.get("modelId") == model_id]
-        for info in models:
+        index = self.index
+        models = []
+        for file_hash in index.hashes_for_model_id(model_id):
+            info = self.info.get(file_hash)
+            if info is None:
+                continue
             update_version_id = info.get("update_version_id")
-            info["latest_version_present"] = bool(update_version_id and update_version_id in id_to_info)
+            latest_version_present = bool(update_version_id and index.hash_for_version_id(update_version_id) is not None)
+            models.append(dict(full_entry(info), latest_version_present=latest_version_present))
         return models
 
 # Global cache instance
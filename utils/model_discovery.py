@@ -1,15 +1,17 @@
 """Model discovery helpers extracted from helpers.py."""
 
+import os
+
 import comfy.utils
 import folder_paths
 
 from .constants import MODEL_FILE_EXTENSIONS
+from .dir_walker import walk_files
+from .library_index import library_index
 from .logger import get_logger
 
 logger = get_logger('utils.model_discovery')
 
-# Module-level cache for get_model_list
-_model_list_cache = {}
 _MODEL_SOURCE_MAP: dict[str, tuple[str, list[str] | None]] = {
     'checkpoints': ('checkpoints', None),
     'unet': ('unet', ['diffusion_models', 'unet_gguf']),
@@ -19,28 +21,53 @@ _MODEL_SOURCE_MAP: dict[str, tuple[str, list[str] | None]] = {
 }
 
 
-def model_scan(the_path, force=False):
+# ComfyUI folder names holding the models SageUtils scans and watches
+MODEL_FOLDER_KEYS = {
+    'checkpoints': ['checkpoints'],
+    'loras': ['loras'],
+    'vae': ['vae', 'vae_approx'],
+    'text_encoders': ['text_encoders', 'clip', 't5'],
+    'diffusion_models': ['diffusion_models', 'unet'],
+}
+
+
+def get_model_folder_paths() -> list[str]:
+    """All existing model folders (checkpoints, loras, vae, text encoders, diffusion models), without duplicates."""
+    folders = []
+    for folder_keys in MODEL_FOLDER_KEYS.values():
+        for folder_key in folder_keys:
+            try:
+                if hasattr(folder_paths, 'get_folder_paths'):
+                    folder_list = folder_paths.get_folder_paths(folder_key)
+                else:
+                    folder_list = getattr(folder_paths, 'folder_names_and_paths', {}).get(folder_key, [[]])[0]
+            except Exception:
+                continue
+            folders.extend(folder for folder in folder_list if os.path.exists(folder))
+    return list(dict.fromkeys(folders))
+
+
+def model_scan(the_path, force=False, verify=False):
     the_paths = the_path
 
     logger.debug(f'Scanning paths: {the_paths}')
 
     model_list = []
-    import pathlib
-
     for directory in the_paths:
         logger.debug(f'Scanning directory: {directory}')
-        result = list(p.resolve() for p in pathlib.Path(directory).glob('**/*') if p.suffix in MODEL_FILE_EXTENSIONS)
-        model_list.extend(result)
+        model_list.extend(walked.path for walked in walk_files(directory, MODEL_FILE_EXTENSIONS, resolve=True))
 
-    model_list = list(set(model_list))
-    model_list = [str(x) for x in model_list]
+    model_list = list(dict.fromkeys(model_list))
     logger.info(f'Starting metadata scan for {len(model_list)} models.')
     pbar = comfy.utils.ProgressBar(len(model_list))
 
     # Local import minimizes module initialization coupling.
-    from .model_metadata import pull_metadata
+    from .model_metadata import hash_files_for_scan, pull_metadata
 
-    pull_metadata(model_list, force_all=force, pbar=pbar)
+    # Hash new (or, when forced, all changed) files in parallel up front instead of one at a time during the pull.
+    # verify rehashes every file even when its size, mtime and inode are unchanged.
+    known_hashes = hash_files_for_scan(model_list, force=force, verify=verify)
+    pull_metadata(model_list, force_all=force, pbar=pbar, known_hashes=known_hashes, verify=verify)
 
 
 def grab_model_list(model_type: str, extra_models: list[str] | None = None) -> list[str]:
@@ -61,23 +88,24 @@ def grab_model_list(model_type: str, extra_models: list[str] | None = None) -> l
 
 
 def get_model_list(model_type: str) -> list[str]:
-    """Get a list of model names based on the model type, with in-memory cache (1 min)."""
-    import time
-
-    global _model_list_cache
-    now = time.time()
-    cache_entry = _model_list_cache.get(model_type)
-    if cache_entry:
-        cached_time, cached_list = cache_entry
-        if now - cached_time < 60:
-            return cached_list
-
+    """
+    Get a list of model names based on the model type, from the library index. The list is shared between
+    calls; don't modify it.
+    """
     source_info = _MODEL_SOURCE_MAP.get(model_type)
     if source_info is None:
-        result = []
-    else:
-        base_model_type, extra_models = source_info
-        result = grab_model_list(base_model_type, extra_models)
-
-    _model_list_cache[model_type] = (now, result)
-    return result
+        return []
+
+    base_model_type, extra_models = source_info
+    sources = {}
+    folder_map = getattr(folder_paths, 'folder_names_and_paths', {})
+    map_legacy = getattr(folder_paths, 'map_legacy', lambda folder_name: folder_name)
+    for folder_name in [base_model_type, *(extra_models or [])]:
+        folder_name = map_legacy(folder_name)
+        if folder_name not in folder_map:
+            continue
+        folders, extensions = folder_map[folder_name]
+        # ComfyUI lists every file in a folder registered without extensions
+        extensions = tuple(sorted(extensions)) if extensions else None
+        sources.update(((folder, extensions), None) for folder in folders)
+    return library_index.merged_files(sources)
@@ -3,7 +3,7 @@
 from typing import Optional
 import folder_paths
 from .file_utils import name_from_path
-from .model_metadata import pull_metadata
+from .model_metadata import defer_full_hash, ensure_metadata
 from .model_cache import cache
 from .lora_stack import norm_lora_stack
 from .model_info_utils import as_list, iter_model_info_dicts, normalize_model_info_list
@@ -17,6 +17,16 @@ weight_dtype_options = ["default", "fp8_e4m3fn", "fp8_e4m3fn_fast", "fp8_e5m2"]
 single_clip_loader_options = ["stable_diffusion", "stable_cascade", "sd3", "stable_audio", "mochi", "ltxv", "pixart", "cosmos", "lumina2", "wan", "hidream", "chroma", "ace", "omnigen2", "qwen_image", "hunyuan_image", "flux2", "ovis", "longcat_image", "cogvideox", "lens", "pixeldit", "ideogram4", "boogu", "krea2", "joyimage"]
 dual_clip_loader_options = ["sdxl", "sd3", "flux", "hunyuan_video", "hidream", "hunyuan_image", "hunyuan_video_15", "kandinsky5", "kandinsky5_image", "ltxv", "newbie", "ace"]
 
+def _pull_model_hash(file_path: str) -> str:
+    """
+    Returns a model file's hash, pulling its metadata first. A large file that still needs a full hash is
+    hashed in the background instead (see defer_full_hash), and its hash is empty until that finishes.
+    """
+    if defer_full_hash(file_path):
+        return ""
+    ensure_metadata(file_path)
+    return cache.hash[file_path]
+
 def get_model_info_ckpt(ckpt_name: str) -> tuple:
     """
     Returns a model_info output for a checkpoint (CKPT) file.
@@ -28,8 +38,7 @@ def get_model_info_ckpt(ckpt_name: str) -> tuple:
         tuple: A tuple containing the model_info dictionary.
     """
     model_info = {"type": "CKPT", "path": folder_paths.get_full_path_or_raise("checkpoints", ckpt_name)}
-    pull_metadata(model_info["path"])
-    model_info["hash"] = cache.hash[model_info["path"]]
+    model_info["hash"] = _pull_model_hash(model_info["path"])
     return (model_info,)
 
 def get_model_info_unet(unet_name: str, weight_dtype: str = "default") -> tuple:
@@ -48,8 +57,7 @@ def get_model_info_unet(unet_name: str, weight_dtype: str = "default") -> tuple:
             unet_name = unet_name[len(base):].lstrip("/\\")
             break
     model_info = {"type": "UNET", "path": folder_paths.get_full_path_or_raise("diffusion_models", unet_name)}
-    pull_metadata(model_info["path"])
-    model_info["hash"] = cache.hash[model_info["path"]]
+    model_info["hash"] = _pull_model_hash(model_info["path"])
     if weight_dtype and (weight_dtype in weight_dtype_options):
         model_info["weight_dtype"] = weight_dtype
     else:
@@ -79,15 +87,16 @@ def get_model_info_clips(clip_names: list, clip_type: str = "") -> tuple:
         raise ValueError("clip_names can contain a maximum of 4 CLIP file names.")
     
     clip_paths = []
+    clip_hashes = []
     for key in clip_names:
         name = folder_paths.get_full_path_or_raise("text_encoders", key)
-        pull_metadata(name)
+        clip_hashes.append(_pull_model_hash(name))
         clip_paths.append(name)
 
     model_info = {
         "type": "CLIP",
         "path": clip_paths,
-        "hash": [cache.hash[name] for name in clip_paths],
+        "hash": clip_hashes,
         "clip_type": clip_type
     }
 
@@ -105,8 +114,7 @@ def get_model_info_vae(vae_name: str) -> tuple:
         tuple: A tuple containing the model_info dictionary.
     """
     model_info = {"type": "VAE", "path": folder_paths.get_full_path_or_raise("vae", vae_name)}
-    pull_metadata(model_info["path"])
-    model_info["hash"] = cache.hash[model_info["path"]]
+    model_info["hash"] = _pull_model_hash(model_info["path"])
     logger.debug(f"VAE model info: {model_info}")
     return (model_info,)
 
@@ -213,7 +221,8 @@ def collect_resource_hashes(model_info, lora_stack: Optional[list] = None) -> li
     if lora_stack:
         for lora in lora_stack:
             lora_path = folder_paths.get_full_path_or_raise("loras", lora[0])
-            pull_metadata(lora_path)
+            if not defer_full_hash(lora_path):
+                ensure_metadata(lora_path)
             lora_data = get_model_dict(lora_path, lora[1])
             if lora_data:
                 resource_hashes.append(lora_data)
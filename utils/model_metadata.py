@@ -1,22 +1,67 @@
 """Model metadata/cache maintenance helpers extracted from helpers facade."""
 
+import copy
 import datetime
+import os
 
 from .helpers_civitai import (
     get_civitai_model_version_json_by_hash,
     get_civitai_model_version_json_by_id,
+    get_civitai_model_versions_by_hashes,
     get_latest_model_version,
 )
+from .civitai_client import get_civitai_client
 from .logger import get_logger
+from .settings import get_setting_or_default
 from .model_cache import cache
-from .file_utils import days_since_last_used, get_file_modification_date, get_file_sha256
+from .file_utils import days_since_last_used, get_file_modification_date
+from .cache_lazy import full_entry
+from .hashing import (
+    AUTOV3_LENGTH, FINGERPRINT_FIELDS, FULL_HASH_SOURCE, QUICK_FINGERPRINT_SOURCE, HashingEngine, file_fingerprint,
+    full_hash_defer_bytes, hash_model_file, model_watch_interval, quick_fingerprint,
+)
+from .hash_queue import PRIORITY_LOADER, PRIORITY_WATCHER, HashQueue, ModelFolderWatcher
 from .type_utils import str_to_bool
 
 logger = get_logger('model.metadata')
 
+DEFAULT_RECHECK_HOURS = 24.0
+DEFAULT_RECHECK_MAX_DAYS = 30.0
+
+
+def civitai_recheck_delay(failed_count):
+    """
+    How long to wait before asking Civitai again about a file it didn't know: civitai_recheck_hours after
+    the first failed lookup, doubling with each further one, up to civitai_recheck_max_days.
+    """
+    try:
+        base = max(0.0, float(get_setting_or_default("civitai_recheck_hours", DEFAULT_RECHECK_HOURS)))
+        limit = max(0.0, float(get_setting_or_default("civitai_recheck_max_days", DEFAULT_RECHECK_MAX_DAYS))) * 24
+    except (TypeError, ValueError):
+        base, limit = DEFAULT_RECHECK_HOURS, DEFAULT_RECHECK_MAX_DAYS * 24
+    hours = min(base * 2 ** min(max(failed_count, 1) - 1, 32), limit)
+    return datetime.timedelta(hours=hours)
+
+
+def civitai_recheck_due(file_cache, now=None):
+    """False while a file Civitai didn't know is waiting out its next_check_at."""
+    next_check_at = file_cache.get('next_check_at')
+    if not next_check_at:
+        return True
+    try:
+        return (now or datetime.datetime.now()) >= datetime.datetime.fromisoformat(next_check_at)
+    except (TypeError, ValueError):
+        return True
 
-def update_cache_from_civitai_json(file_path, json_data, timestamp=True):
-    """Update cache entry from a successful CivitAI model-version payload."""
+
+_NOT_FETCHED = object()
+
+
+def update_cache_from_civitai_json(file_path, json_data, timestamp=True, latest_model=_NOT_FETCHED):
+    """
+    Update cache entry from a successful CivitAI model-version payload.
+    latest_model is the model's latest version id if it was already fetched (see get_latest_model_version()).
+    """
     the_files = json_data.get("files", [])
     hashes = {}
 
@@ -24,9 +69,11 @@ def update_cache_from_civitai_json(file_path, json_data, timestamp=True):
         hashes = the_files[0].get("hashes", {})
     update_available = True
 
-    latest_model = None
+    if latest_model is _NOT_FETCHED:
+        latest_model = None
+        if json_data.get("modelId", None) is not None:
+            latest_model = get_latest_model_version(json_data["modelId"])
     if json_data.get("modelId", None) is not None:
-        latest_model = get_latest_model_version(json_data["modelId"])
         if latest_model == json_data["id"] or latest_model is None:
             update_available = False
 
@@ -37,6 +84,7 @@ def update_cache_from_civitai_json(file_path, json_data, timestamp=True):
     file_cache.update({
         'civitai': "True",
         'civitai_failed_count': 0,
+        'next_check_at': None,
         'model': json_data.get("model", {}),
         'name': json_data.get("name", ""),
         'baseModel': json_data.get("baseModel", ""),
@@ -61,43 +109,198 @@ def update_cache_without_civitai_json(file_path, hash_value, timestamp=True):
     logger.info("Unable to find metadata on CivitAI.")
     file_cache['civitai'] = "False"
     file_cache['civitai_failed_count'] = file_cache.get('civitai_failed_count', 0) + 1
+    next_check_at = datetime.datetime.now() + civitai_recheck_delay(file_cache['civitai_failed_count'])
+    file_cache['next_check_at'] = next_check_at.isoformat(timespec='seconds')
     file_cache['hash'] = hash_value
     if timestamp:
         cache.update_last_used_by_path(file_path)
 
 
+def _same_file_version(record, fingerprint):
+    """Whether a fingerprint record was taken of the same version of the file as fingerprint (a path's own record)."""
+    if not isinstance(record, dict) or any(record.get(key) != fingerprint.get(key) for key in ("size", "mtime_ns", "inode")):
+        return False
+    return record.get("device") is None or record.get("device") == fingerprint.get("device")
+
+
+def find_fingerprint(file_path):
+    """
+    The fingerprint record of a file whose size, mtime, inode and device haven't changed since it was hashed, else None.
+    A file renamed or moved within the same filesystem keeps its inode and device, so it matches its old path's record
+    (found through cache.fingerprint_index).
+    """
+    try:
+        current = file_fingerprint(str(file_path))
+    except OSError:
+        return None
+    record = cache.fingerprints.get(str(file_path))
+    if _same_file_version(record, current):
+        return record
+    index = cache.fingerprint_index
+    for path in index.paths_with_stat(index.stat_key(current)):
+        record = cache.fingerprints.get(path)
+        if isinstance(record, dict):
+            return record
+    return None
+
+
+def fingerprinted_hash(file_path):
+    """The hash recorded for a file if its size, mtime, inode and device haven't changed since it was hashed, else None."""
+    record = find_fingerprint(file_path)
+    return record.get("hash") if record else None
+
+
+def remember_fingerprint(file_path, hash_value, fingerprint, digests=None):
+    """
+    Record the fingerprint a file had when it was hashed (taken before reading it, so a concurrent write
+    invalidates it), with the file's AutoV3/BLAKE3/quick hashes from hash_model_file() if there are any.
+    Each identity is stored with its source, so records written by other hashing schemes can be told apart.
+    """
+    if fingerprint is None:
+        return
+    record = dict(fingerprint, hash=hash_value, hash_source=FULL_HASH_SOURCE)
+    digests = digests or {}
+    if "autov3" in digests:
+        record["autov3"] = digests["autov3"][:AUTOV3_LENGTH]
+    if "blake3" in digests:
+        record["blake3"] = digests["blake3"]
+    quick = digests.get("quick")
+    with cache.sections_lock:
+        if quick is None:
+            # Keep a quick fingerprint taken of this same file version
+            previous = cache.fingerprints.get(str(file_path))
+            if _same_file_version(previous, record) and previous.get("quick_source") == QUICK_FINGERPRINT_SOURCE:
+                quick = previous.get("quick")
+        if quick is not None:
+            record["quick"] = quick
+            record["quick_source"] = QUICK_FINGERPRINT_SOURCE
+        if cache.fingerprints.get(str(file_path)) != record:
+            cache.fingerprints[str(file_path)] = record
+
+
+def record_quick_fingerprint(file_path):
+    """
+    Take a file's quick fingerprint (three small reads) and record it with the file's stat fingerprint.
+    The full hash is left pending if the file changed since it was hashed. Returns the record.
+    """
+    file_path = str(file_path)
+    fingerprint = file_fingerprint(file_path)
+    previous = cache.fingerprints.get(file_path)
+    if _same_file_version(previous, fingerprint) and previous.get("quick"):
+        return previous
+
+    quick = quick_fingerprint(file_path)
+    if isinstance(previous, dict) and previous.get("quick") and previous.get("quick") != quick:
+        logger.info(f"{file_path} changed since it was last hashed.")
+    record = dict(fingerprint, quick=quick, quick_source=QUICK_FINGERPRINT_SOURCE)
+    cache.fingerprints[file_path] = record
+    return record
+
+
+def duplicate_candidates():
+    """
+    Group model files by quick fingerprint. Returns a list of {"quick", "paths", "confirmed"} for groups of
+    two or more files; confirmed is True when every file in the group has the same full hash too.
+    """
+    groups = {}
+    for path, record in list(dict.items(cache.fingerprints)):
+        if isinstance(record, dict) and record.get("quick") and record.get("quick_source") == QUICK_FINGERPRINT_SOURCE:
+            groups.setdefault(record["quick"], []).append((path, record.get("hash")))
+
+    candidates = []
+    for quick, members in groups.items():
+        if len(members) < 2:
+            continue
+        hashes = {file_hash for _, file_hash in members}
+        candidates.append({
+            "quick": quick,
+            "paths": sorted(path for path, _ in members),
+            "confirmed": len(hashes) == 1 and None not in hashes,
+        })
+    return candidates
+
+
+def _hash_and_remember(file_path):
+    """Fully hash a file and record its fingerprint."""
+    try:
+        fingerprint = file_fingerprint(str(file_path))
+    except OSError:
+        fingerprint = None
+    logger.debug(f'Calculating hash for {file_path}')
+    digests = hash_model_file(str(file_path))
+    hash_value = digests["sha256"][:10]
+    remember_fingerprint(file_path, hash_value, fingerprint, digests)
+    return hash_value
+
+
+def local_autov3(file_path):
+    """The AutoV3 hash recorded for a file the last time it was hashed, if it is a safetensors file."""
+    record = cache.fingerprints.get(str(file_path))
+    return record.get("autov3") if isinstance(record, dict) else None
+
+
+def _info_with_same_tensors(file_path, hash_value):
+    """
+    A copy of the info entry of another file with the same AutoV3 hash (the same tensors, e.g. a copy whose
+    safetensors header was edited), so the new hash starts with that file's Civitai data.
+    """
+    autov3 = local_autov3(file_path)
+    if not autov3:
+        return None
+    for path in cache.fingerprint_index.paths_with_autov3(autov3):
+        record = cache.fingerprints.get(path)
+        if path == str(file_path) or not isinstance(record, dict):
+            continue
+        other_hash = record.get("hash")
+        if other_hash and other_hash != hash_value and other_hash in cache.info:
+            entry = copy.deepcopy(full_entry(cache.info[other_hash]))
+            entry["hash"] = hash_value
+            logger.info(f"{file_path} has the same tensors as {path}; reusing its cached metadata.")
+            return entry
+    return None
+
+
 def add_file_to_cache(file_path, hash_value=None):
     """Ensure a file path has hash/info cache entries and return its hash."""
     file_path = str(file_path)
     logger.info(f"Adding {file_path} to cache.")
     if hash_value is None:
-        hash_value = get_file_sha256(file_path)
-
-    if file_path not in cache.hash:
-        cache.hash[file_path] = hash_value
-
-    if cache.info.get(hash_value, None) is None:
-        cache.info[hash_value] = {
-            'civitai': "False",
-            'update_available': False,
-            'update_version_id': "",
-            'hash': hash_value,
-            'lastUsed': datetime.datetime.now().isoformat(),
-        }
+        hash_value = fingerprinted_hash(file_path) or _hash_and_remember(file_path)
+
+    # Checked and written under the sections lock, so a file added from two threads gets one entry
+    with cache.sections_lock:
+        if file_path not in cache.hash:
+            cache.hash[file_path] = hash_value
+
+        if cache.info.get(hash_value, None) is None:
+            cache.info[hash_value] = _info_with_same_tensors(file_path, hash_value) or {
+                'civitai': "False",
+                'update_available': False,
+                'update_version_id': "",
+                'hash': hash_value,
+                'lastUsed': datetime.datetime.now().isoformat(),
+            }
 
     logger.info(f"Added {file_path} to cache with hash {hash_value}.")
     return hash_value
 
 
-def recheck_hash(file_path, hash_value):
-    """Recompute a file hash and migrate cache references if it changed."""
-    new_hash = get_file_sha256(file_path)
+def recheck_hash(file_path, hash_value, new_hash=None, verify=False):
+    """
+    Recompute a file hash (unless new_hash was just computed) and migrate cache references if it changed.
+    Files whose fingerprint is unchanged since they were hashed keep their recorded hash unless verify is set.
+    """
+    if new_hash is None and not verify:
+        new_hash = fingerprinted_hash(file_path)
+    if new_hash is None:
+        new_hash = _hash_and_remember(file_path)
     if new_hash != hash_value:
         logger.info("Hash mismatch detected. Using new hash.")
         if file_path in cache.hash:
             logger.info(f"Updating cache for {file_path} with new hash {new_hash}.")
-            if new_hash not in cache.info and hash_value in cache.info:
-                cache.info[new_hash] = cache.info[hash_value]
+            with cache.sections_lock:
+                if new_hash not in cache.info and hash_value in cache.info:
+                    cache.info[new_hash] = cache.info[hash_value]
         else:
             logger.info(f"File {file_path} not in cache. Adding with new hash {new_hash}.")
             add_file_to_cache(file_path, new_hash)
@@ -105,15 +308,110 @@ def recheck_hash(file_path, hash_value):
     return hash_value
 
 
+def _needs_full_hash(file_path):
+    """Whether pulling metadata for a file would have to hash all of it."""
+    if fingerprinted_hash(file_path) is not None:
+        return False
+    if file_path not in cache.hash:
+        return True
+    last_used = cache.get_last_used_by_path(file_path)
+    modified = get_file_modification_date(file_path)
+    return last_used is not None and modified is not None and modified > last_used
+
+
+def _run_queued_pull(file_path, model_type=None, timestamp=False):
+    """Background queue runner: pull a file's metadata (hashing it first if needed) and return its hash."""
+    pull_metadata(file_path, timestamp=timestamp, model_type=model_type)
+    return cache.hash.get(file_path)
+
+
+# Background hash/metadata jobs, one per file; see utils/hash_queue.py
+hash_queue = HashQueue(_run_queued_pull)
+
+
+def ensure_metadata(file_path, model_type=None):
+    """
+    Pull metadata for one file now, as pull_metadata() would. If a background job is already processing
+    the file, wait for it instead of hashing the file a second time. Returns the file's hash.
+    """
+    return hash_queue.run_now(str(file_path), model_type=model_type, timestamp=True)
+
+
+def defer_full_hash(file_path, model_type=None):
+    """
+    If a file is at least model_hash_defer_bytes large and needs a full hash, or is already queued in the
+    background, record its quick fingerprint and leave the metadata pull (and the last-used update) to the
+    background queue. Returns whether it was deferred.
+    """
+    file_path = str(file_path)
+    queued = file_path in hash_queue.pending()
+    if not queued:
+        threshold = full_hash_defer_bytes()
+        if not threshold:
+            return False
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            return False
+        cache.load()
+        if size < threshold or not _needs_full_hash(file_path):
+            return False
+        record_quick_fingerprint(file_path)
+        logger.info(f"Hashing {file_path} ({size / (1024 ** 3):.1f} GB) in the background; its metadata is pulled once that finishes.")
+
+    future = hash_queue.submit(file_path, PRIORITY_LOADER, model_type=model_type, timestamp=True)
+    if queued:
+        # A job that had already started (e.g. from the folder watcher) won't see timestamp=True
+        future.add_done_callback(
+            lambda f: not f.cancelled() and f.exception() is None and update_model_timestamp(file_path)
+        )
+    return True
+
+
+def pending_full_hashes():
+    """Paths queued for (or in the middle of) a background hash and metadata pull."""
+    return hash_queue.pending()
+
+
+def _queue_if_unhashed(file_path):
+    cache.load()
+    if _needs_full_hash(file_path):
+        logger.info(f"New or changed model file {file_path}; hashing it in the background.")
+        hash_queue.submit(file_path, PRIORITY_WATCHER)
+
+
+def start_model_folder_watcher(folders=None):
+    """
+    Hash new or changed model files in the model folders (all of them by default) in the background, so they
+    are ready before first use. The files are found by the library index. Returns the watcher, or None if it is
+    disabled.
+    """
+    if model_watch_interval() <= 0:
+        return None
+    if folders is None:
+        from .model_discovery import get_model_folder_paths
+        folders = get_model_folder_paths()
+    watcher = ModelFolderWatcher(folders, _queue_if_unhashed)
+    watcher.start()
+    return watcher
+
+
 def pull_and_update_model_timestamp(file_paths, model_type):
-    """Pull metadata for one-or-many model paths and update last-used timestamps."""
+    """
+    Pull metadata for one-or-many model paths and update last-used timestamps.
+    Large files that would need a full hash, and files already queued, are updated in the background instead.
+    """
     if not isinstance(file_paths, (list, tuple)):
         file_paths = [file_paths]
 
+    pulled = []
     for path in file_paths:
-        pull_metadata(path, model_type=model_type)
+        if defer_full_hash(path, model_type):
+            continue
+        ensure_metadata(path, model_type=model_type)
+        pulled.append(path)
 
-    update_model_timestamp(file_paths)
+    update_model_timestamp(pulled)
 
 
 def update_model_timestamp(file_paths):
@@ -128,15 +426,207 @@ def update_model_timestamp(file_paths):
     cache.save()
 
 
-def pull_metadata(file_paths, timestamp=True, force_all=False, pbar=None, model_type=None):
-    """Pull model metadata from CivitAI and update cache entries."""
+def hash_files_for_scan(file_paths, force=False, on_result=None, should_cancel=None, verify=False):
+    """
+    Hash, in parallel, the files a metadata pull would hash one by one: files without a cached hash,
+    or every file when force is set. Returns {path: hash} to pass to pull_metadata(known_hashes=...).
+    Files whose fingerprint (size, mtime, inode, device) is unchanged reuse their recorded hash unless verify is set.
+    """
+    cache.load()
+    known_hashes = {}
+    fingerprints = {}
+    for path in dict.fromkeys(str(p) for p in file_paths):
+        if not force and path in cache.hash:
+            continue
+        recorded = None
+        if not verify:
+            record = find_fingerprint(path)
+            if record is not None:
+                recorded = record.get("hash")
+                # A renamed file: copy the record (and its AutoV3/BLAKE3 hashes) to the new path
+                remember_fingerprint(path, recorded, {key: record[key] for key in FINGERPRINT_FIELDS if key in record}, record)
+        if recorded is not None:
+            known_hashes[path] = recorded
+            continue
+        try:
+            fingerprints[path] = file_fingerprint(path)
+        except OSError:
+            fingerprints[path] = None
+    if known_hashes:
+        logger.info(f"Skipped hashing {len(known_hashes)} unchanged model files.")
+    if not fingerprints:
+        return known_hashes
+
+    logger.info(f"Hashing {len(fingerprints)} model files.")
+    engine = HashingEngine(hash_function=hash_model_file)
+    results = engine.hash_files(list(fingerprints), on_result=on_result, should_cancel=should_cancel)
+    for path, digests in results.items():
+        known_hashes[path] = digests["sha256"][:10]
+        remember_fingerprint(path, known_hashes[path], fingerprints[path], digests)
+    return known_hashes
+
+
+def _lookup_civitai(lookup):
+    """
+    The Civitai requests of one file's metadata pull; run on the Civitai client's threads, so it doesn't
+    touch the cache. lookup is (hash, AutoV3 hash or None, cached version id or None, version JSON already
+    found by the batch lookup or None). Returns (json_data, retried, dead_model, latest version id or None).
+    """
+    hash_value, autov3, cached_version_id, found = lookup
+    if found is not None:
+        json_data = copy.deepcopy(found)
+    else:
+        json_data = get_civitai_model_version_json_by_hash(hash_value)
+
+    if 'error' in json_data and autov3:
+        # AutoV2 covers the whole file, so it no longer matches once the safetensors header is edited;
+        # AutoV3 only covers the tensor data.
+        logger.debug(f"No match for AutoV2 hash {hash_value}; trying AutoV3 hash {autov3}.")
+        autov3_json = get_civitai_model_version_json_by_hash(autov3)
+        if 'error' not in autov3_json:
+            json_data = autov3_json
+
+    retried = False
+    dead_model = False
+    if 'error' in json_data:
+        if 'civitai_error' in json_data:
+            civitai_error = json_data['civitai_error']
+            if 'Model not found' in civitai_error or 'No model with id' in civitai_error:
+                dead_model = True
+
+        if dead_model is False:
+            if cached_version_id is not None:
+                logger.debug(f"Using cached model id {cached_version_id}")
+                json_data = get_civitai_model_version_json_by_id(cached_version_id)
+                retried = True
+            else:
+                logger.debug("No cached model id.")
+
+    latest_model = None
+    if 'error' not in json_data and json_data.get("modelId", None) is not None:
+        latest_model = get_latest_model_version(json_data["modelId"])
+    return json_data, retried, dead_model, latest_model
+
+
+METADATA_DAYS_RECHECK = 7
+
+
+def plan_metadata_pull(file_path, force_all=False, known_hashes=None, verify=False):
+    """
+    The local half of one file's metadata pull: give the file cache entries (hashing it unless known_hashes
+    has its hash) and decide whether Civitai has to be asked about it.
+    Returns (hash, info entry, lookup, skipped): lookup is the file's entry for resolve_civitai_lookups(),
+    or None if no lookup is needed; skipped is "recent" or "not_due" when a lookup was skipped for that reason.
+    Updates the cache, so it belongs on the thread that writes the cache.
+    """
+    known_hashes = known_hashes or {}
+    force = force_all
     pull_json = True
-    metadata_days_recheck = 7
+    skipped = None
+    hash_value = cache.hash.get(str(file_path), None)
+    fresh_hash = known_hashes.get(str(file_path))
+    if hash_value is None:
+        logger.debug(f"Hash not found in cache for {file_path}. Adding to cache.")
+        hash_value = add_file_to_cache(file_path, fresh_hash)
+
+    file_cache = cache.by_path(file_path)
+
+    last_used_date = datetime.datetime.fromisoformat(file_cache['lastUsed']) if 'lastUsed' in file_cache else None
+
+    modified = get_file_modification_date(file_path)
+    if last_used_date is not None and modified is not None and modified > last_used_date:
+        logger.info("File was modified after last used. Pulling metadata.")
+        force = True
+
+    civitai_val = False
+    try:
+        civitai_val = str_to_bool(file_cache.get('civitai', False))
+    except (TypeError, ValueError):
+        civitai_val = False
 
+    if not force and civitai_val is True:
+        if days_since_last_used(file_path) <= METADATA_DAYS_RECHECK:
+            skipped = "recent"
+            pull_json = False
+    elif not force and not civitai_recheck_due(file_cache):
+        logger.debug(f"{file_path} wasn't found on CivitAI; not checking again until {file_cache['next_check_at']}.")
+        skipped = "not_due"
+        pull_json = False
+
+    if file_cache.get('blacklist'):
+        if not force:
+            logger.info(f"File {file_path} is blacklisted (previously not found). Skipping metadata pull.")
+        pull_json = False
+
+    if force:
+        logger.debug(f"Force flag is set. Recalculating hash for {file_path}.")
+        hash_value = recheck_hash(file_path, hash_value, fresh_hash, verify=verify)
+
+    lookup = None
+    if pull_json or force:
+        logger.debug(f"Currently pulling metadata for {file_path}.")
+        cached_version_id = file_cache['id'] if 'modelId' in file_cache else None
+        lookup = (hash_value, local_autov3(file_path), cached_version_id, None)
+    return hash_value, file_cache, lookup, skipped
+
+
+def resolve_civitai_lookups(lookups):
+    """
+    Look up {path: lookup} (from plan_metadata_pull()) on Civitai, yielding (path, result, error) as each
+    finishes. With more than one lookup the hashes are first looked up in bulk (civitai_hash_batch_size per
+    request); the remaining lookups run concurrently on the shared Civitai client. Doesn't touch the cache.
+    """
+    lookups = dict(lookups)
+    if len(lookups) > 1 and get_civitai_client().hash_batch_size > 0:
+        # One bulk request per batch of hashes; only the misses are looked up one by one below
+        found = get_civitai_model_versions_by_hashes(
+            [h for hash_value, autov3, _, _ in lookups.values() for h in (hash_value, autov3) if h]
+        )
+        for file_path, (hash_value, autov3, cached_version_id, _) in lookups.items():
+            lookups[file_path] = (hash_value, autov3, cached_version_id, found.get(hash_value) or found.get(autov3))
+
+    yield from get_civitai_client().fan_out(lambda path: _lookup_civitai(lookups[path]), list(lookups))
+
+
+def apply_civitai_lookup(file_path, hash_value, file_cache, result, error, timestamp=True):
+    """Update a file's cache entries from its resolve_civitai_lookups() result."""
+    if error is not None:
+        logger.error(f"Error pulling metadata for {file_path}: {error}")
+        json_data, retried, dead_model, latest_model = {"error": str(error)}, False, False, None
+    else:
+        json_data, retried, dead_model, latest_model = result
+
+    if 'error' in json_data:
+        if retried:
+            logger.error(f"Error: {json_data['error']}")
+        if dead_model:
+            file_cache['blacklist'] = True
+        update_cache_without_civitai_json(file_path, hash_value, timestamp=timestamp)
+    else:
+        update_cache_from_civitai_json(file_path, json_data, timestamp=timestamp, latest_model=latest_model)
+
+
+def finish_metadata_pull(file_path, hash_value, file_cache, model_type=None):
+    """Store a file's (possibly new) hash and info entry at the end of its metadata pull."""
+    cache.hash[str(file_path)] = hash_value
+    cache.info[hash_value] = file_cache
+    if model_type is not None:
+        file_cache['model_type'] = model_type
+
+
+def pull_metadata(file_paths, timestamp=True, force_all=False, pbar=None, model_type=None, known_hashes=None, verify=False):
+    """
+    Pull model metadata from CivitAI and update cache entries.
+    known_hashes ({path: hash}, from hash_files_for_scan) are used instead of hashing those files again.
+    Forced rechecks skip rehashing files whose fingerprint is unchanged unless verify is set.
+    The files' hashes are first looked up in bulk (civitai_hash_batch_size per request); the remaining
+    Civitai lookups run concurrently on the shared Civitai client. The cache is only updated from the
+    calling thread.
+    """
     cache.load()
     cache.backup_counter += 1
     if cache.backup_counter >= cache.num_of_backups_to_keep:
-        cache.prune_all_backups()
+        cache.schedule_backup_prune()
         cache.backup_counter = 0
 
     if isinstance(file_paths, str):
@@ -146,90 +636,38 @@ def pull_metadata(file_paths, timestamp=True, force_all=False, pbar=None, model_
         logger.warning("No file paths provided.")
         return
 
-    num_not_pulled = 0
-
-    for file_path in file_paths:
-        force = force_all
-        hash_value = cache.hash.get(str(file_path), None)
-        if hash_value is None:
-            logger.debug(f"Hash not found in cache for {file_path}. Adding to cache.")
-            hash_value = add_file_to_cache(file_path)
+    skipped_counts = {"recent": 0, "not_due": 0}
+    lookups = {}
+    entries = {}
 
-        file_cache = cache.by_path(file_path)
-
-        last_used_date = datetime.datetime.fromisoformat(file_cache['lastUsed']) if 'lastUsed' in file_cache else None
-
-        modified = get_file_modification_date(file_path)
-        if last_used_date is not None and modified is not None and modified > last_used_date:
-            logger.info("File was modified after last used. Pulling metadata.")
-            force = True
-
-        civitai_val = False
-        try:
-            civitai_val = str_to_bool(file_cache.get('civitai', False))
-        except (TypeError, ValueError):
-            civitai_val = False
-
-        if not force and civitai_val is True:
-            if days_since_last_used(file_path) <= metadata_days_recheck:
-                num_not_pulled += 1
-                pull_json = False
-
-        if file_cache.get('blacklist'):
-            if not force:
-                logger.info(f"File {file_path} is blacklisted (previously not found). Skipping metadata pull.")
-            pull_json = False
+    def finish(file_path, hash_value, file_cache):
+        finish_metadata_pull(file_path, hash_value, file_cache, model_type)
+        if pbar is not None:
+            pbar.update(1)
 
-        if force:
-            logger.debug(f"Force flag is set. Recalculating hash for {file_path}.")
-            hash_value = recheck_hash(file_path, hash_value)
-
-        if pull_json or force:
-            logger.debug(f"Currently pulling metadata for {file_path}.")
-            json_data = get_civitai_model_version_json_by_hash(hash_value)
-
-            if 'error' in json_data:
-                retried = False
-                dead_model = False
-                if 'civitai_error' in json_data:
-                    civitai_error = json_data['civitai_error']
-                    if 'Model not found' in civitai_error or 'No model with id' in civitai_error:
-                        dead_model = True
-
-                if dead_model is False:
-                    if 'modelId' in file_cache:
-                        logger.debug(f"Using cached model id {file_cache.get('id', None)}")
-                        json_data = get_civitai_model_version_json_by_id(file_cache['id'])
-                        retried = True
-                    else:
-                        logger.debug("No cached model id.")
-
-                if 'error' in json_data:
-                    if retried:
-                        logger.error(f"Error: {json_data['error']}")
-                    if dead_model:
-                        file_cache['blacklist'] = True
-                    logger.info("Unable to find metadata on CivitAI.")
-                    file_cache['civitai'] = "False"
-                    file_cache['civitai_failed_count'] = file_cache.get('civitai_failed_count', 0) + 1
-                    update_cache_without_civitai_json(file_path, hash_value, timestamp=timestamp)
-
-            if 'error' not in json_data:
-                update_cache_from_civitai_json(file_path, json_data, timestamp=timestamp)
-            else:
-                retries = file_cache.get('civitai_failed_count', 0) + 1
-                file_cache['civitai_failed_count'] = retries
+    for file_path in file_paths:
+        hash_value, file_cache, lookup, skipped = plan_metadata_pull(file_path, force_all, known_hashes, verify)
+        if skipped is not None:
+            skipped_counts[skipped] += 1
+        if lookup is not None:
+            lookups[file_path] = lookup
+            entries[file_path] = file_cache
+        else:
+            finish(file_path, hash_value, file_cache)
 
-        cache.hash[file_path] = hash_value
-        cache.info[hash_value] = file_cache
-        if model_type is not None:
-            file_cache['model_type'] = model_type
+    for file_path, result, error in resolve_civitai_lookups(lookups):
+        hash_value = lookups[file_path][0]
+        file_cache = entries[file_path]
+        apply_civitai_lookup(file_path, hash_value, file_cache, result, error, timestamp=timestamp)
+        finish(file_path, hash_value, file_cache)
 
-        if pbar is not None:
-            pbar.update(1)
+    if lookups:
+        get_civitai_client().responses.save()
 
-    if num_not_pulled > 0:
+    if skipped_counts["recent"] > 0:
         logger.info(
-            f"Metadata pull complete. Skipped {num_not_pulled} files checked within the last {metadata_days_recheck} days."
+            f"Metadata pull complete. Skipped {skipped_counts['recent']} files checked within the last {METADATA_DAYS_RECHECK} days."
         )
+    if skipped_counts["not_due"] > 0:
+        logger.info(f"Skipped {skipped_counts['not_due']} files not found on CivitAI that aren't due for a recheck yet.")
     cache.save()
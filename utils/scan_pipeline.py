@@ -0,0 +1,366 @@
+"""
+Staged model scan.
+
+A scan streams files through bounded queues between stages, so the drives and the network are busy at
+the same time instead of taking turns:
+
+    enumerate -> stat filter -> hash pool -> cache writer <-> Civitai resolver
+
+- enumerate walks the folders (dir_walker.walk_files()) and passes on model files as it finds them.
+- The stat filter drops blacklisted files and sends files whose cached hash or fingerprint (size, mtime,
+  inode) is still good straight to the writer, past the hash pool.
+- The hash pool hashes the rest (model_hash_workers threads, model_hash_per_device per drive).
+- The cache writer (the thread that called run()) is the only scan thread that changes the cache: it records
+  new hashes, decides per file whether Civitai has to be asked (as pull_metadata() does), and applies the
+  answers as they come back.
+- The resolver looks files up on Civitai a batch at a time: a bulk by-hash request, then the misses
+  concurrently on the shared Civitai client.
+
+A full queue blocks the stage feeding it, so a fast stage never runs far ahead of a slow one and memory
+stays flat however many files there are. The resolver's answers are the one unbounded queue, so the
+resolver never waits on the writer that is waiting on it.
+
+The scan isn't the only writer: the background hash queue, loader nodes on the prompt thread and HTTP routes
+write to the cache while a scan runs. Each write, and each load and save, takes the cache's sections lock
+(SageCache.sections_lock), and the writer's batch (cache.begin_batch()) only defers the writer's own saves;
+the other threads keep saving, which also writes whatever the scan has recorded so far.
+"""
+
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .civitai_client import get_civitai_client
+from .constants import MODEL_FILE_EXTENSIONS
+from .dir_walker import walk_files
+from .hashing import FINGERPRINT_FIELDS, HashingEngine, file_fingerprint, hash_model_file
+from .logger import get_logger
+from .model_cache import cache
+from .model_metadata import (
+    apply_civitai_lookup, find_fingerprint, finish_metadata_pull, plan_metadata_pull,
+    remember_fingerprint, resolve_civitai_lookups,
+)
+
+logger = get_logger('model.scan_pipeline')
+
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_BATCH_SIZE = 50
+RESOLVE_QUEUE_BATCHES = 2
+POLL_SECONDS = 0.2
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class ScanPipeline:
+    """
+    One model scan of folders; run() blocks until every file is processed or should_cancel() is set.
+    force and verify mean what they do for hash_files_for_scan() and pull_metadata(). on_progress(pipeline)
+    is called from the writer as files finish; counts and queue_depths() give the state of each stage.
+    on_file(path, result) is called from the writer for each processed file, with result "found" or
+    "not_found" (looked up on Civitai), "cached" (no lookup needed) or "error".
+    The cache is saved every checkpoint_interval processed files, if set.
+    """
+
+    def __init__(
+        self,
+        folders: Iterable[str],
+        force: bool = False,
+        verify: bool = False,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        on_progress: Optional[Callable[['ScanPipeline'], None]] = None,
+        on_file: Optional[Callable[[str, str], None]] = None,
+        checkpoint_interval: Optional[int] = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        engine: Optional[HashingEngine] = None,
+    ):
+        self.folders = list(folders)
+        self.force = force
+        self.verify = verify
+        self.should_cancel = should_cancel
+        self.on_progress = on_progress
+        self.on_file = on_file
+        self.checkpoint_interval = checkpoint_interval
+        self.batch_size = max(1, int(batch_size))
+        self.engine = engine or HashingEngine(hash_function=hash_model_file)
+
+        self.found_queue: queue.Queue = queue.Queue(maxsize=queue_size)     # enumerate -> filter
+        self.hash_queue: queue.Queue = queue.Queue(maxsize=queue_size)      # filter -> hash pool
+        self.write_queue: queue.Queue = queue.Queue(maxsize=queue_size)     # filter, hash pool -> writer
+        self.resolve_queue: queue.Queue = queue.Queue(maxsize=RESOLVE_QUEUE_BATCHES)  # writer -> resolver
+        self.resolved_queue: queue.Queue = queue.Queue()                    # resolver -> writer
+
+        self.counts = {"found": 0, "skipped": 0, "hashed": 0, "hashed_bytes": 0, "looked_up": 0, "processed": 0, "errors": 0}
+        self.enumerating = True
+        self.current_file = ""
+        self._counts_lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        """Files the scan will process (grows while the folders are still being walked)."""
+        return self.counts["found"] - self.counts["skipped"]
+
+    def queue_depths(self) -> Dict[str, int]:
+        """How many items are waiting in front of each stage."""
+        return {
+            "filter": self.found_queue.qsize(),
+            "hash": self.hash_queue.qsize(),
+            "write": self.write_queue.qsize(),
+            "resolve": self._waiting_lookups(),
+            "apply": self.resolved_queue.qsize(),
+        }
+
+    def _waiting_lookups(self) -> int:
+        with self.resolve_queue.mutex:
+            return sum(len(batch) for batch in self.resolve_queue.queue if batch is not _DONE)
+
+    def _cancelled(self) -> bool:
+        return self.should_cancel is not None and self.should_cancel()
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._counts_lock:
+            self.counts[key] += amount
+
+    def _put(self, target: queue.Queue, item: Any) -> bool:
+        """Put item on target, waiting while it is full. Returns False if the scan was cancelled meanwhile."""
+        while True:
+            try:
+                target.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                if self._cancelled():
+                    return False
+
+    def _get(self, source: queue.Queue) -> Any:
+        """The next item from source, or _DONE if the scan was cancelled while waiting."""
+        while True:
+            try:
+                return source.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if self._cancelled():
+                    return _DONE
+
+    def _enumerate(self) -> None:
+        seen = set()
+        try:
+            for folder in self.folders:
+                for walked in walk_files(folder, MODEL_FILE_EXTENSIONS, resolve=True):
+                    if self._cancelled():
+                        return
+                    path = walked.path
+                    if path in seen:
+                        continue
+                    seen.add(path)
+                    self._count("found")
+                    if not self._put(self.found_queue, path):
+                        return
+        except Exception as e:
+            logger.error(f"Error walking model folders: {e}")
+        finally:
+            self.enumerating = False
+            self._put(self.found_queue, _DONE)
+
+    def _check(self, path: str):
+        """Where a found file goes next: (queue, item), or None to skip it."""
+        if not self.force:
+            hash_value = cache.hash.get(path)
+            if hash_value is not None:
+                if (cache.info.get(hash_value) or {}).get("blacklist", False):
+                    return None
+                return self.write_queue, (path, None, None, None, None)
+        if not self.verify:
+            record = find_fingerprint(path)
+            if record is not None and record.get("hash") is not None:
+                # Unchanged (or renamed) since it was hashed: the writer copies the record to this path
+                fingerprint = {key: record[key] for key in FINGERPRINT_FIELDS if key in record}
+                return self.write_queue, (path, record["hash"], fingerprint, record, None)
+        try:
+            fingerprint = file_fingerprint(path)
+        except OSError:
+            fingerprint = None
+        return self.hash_queue, (path, fingerprint)
+
+    def _filter(self) -> None:
+        try:
+            while True:
+                path = self._get(self.found_queue)
+                if path is _DONE:
+                    return
+                try:
+                    target = self._check(path)
+                except Exception as e:
+                    logger.error(f"Error checking {path}: {e}")
+                    target = self.hash_queue, (path, None)
+                if target is None:
+                    self._count("skipped")
+                    continue
+                if not self._put(*target):
+                    return
+        finally:
+            for _ in range(self.engine.max_workers):
+                self._put(self.hash_queue, _DONE)
+            self._put(self.write_queue, _DONE)
+
+    def _hash_worker(self) -> None:
+        try:
+            while True:
+                item = self._get(self.hash_queue)
+                if item is _DONE:
+                    return
+                path, fingerprint = item
+                self.current_file = path
+                try:
+                    digests = self.engine.hash_path(path, self._cancelled)
+                except Exception as e:
+                    logger.error(f"Error hashing {path}: {e}")
+                    self._put(self.write_queue, (path, None, None, None, e))
+                    continue
+                if digests is None:
+                    return
+                self._count("hashed")
+                if fingerprint is not None:
+                    self._count("hashed_bytes", fingerprint["size"])
+                if not self._put(self.write_queue, (path, digests["sha256"][:10], fingerprint, digests, None)):
+                    return
+        finally:
+            self._put(self.write_queue, _DONE)
+
+    def _resolve(self) -> None:
+        while True:
+            lookups = self._get(self.resolve_queue)
+            if lookups is _DONE:
+                return
+            try:
+                for path, result, error in resolve_civitai_lookups(lookups):
+                    self.resolved_queue.put((path, result, error))
+            except Exception as e:
+                logger.error(f"Error looking up models on Civitai: {e}")
+                for path in lookups:
+                    self.resolved_queue.put((path, None, e))
+
+    def _report(self) -> None:
+        if self.on_progress is not None:
+            self.on_progress(self)
+
+    def _processed(self, path: str, result: str) -> None:
+        self.current_file = path
+        self._count("processed")
+        if self.on_file is not None:
+            self.on_file(path, result)
+        processed = self.counts["processed"]
+        if self.checkpoint_interval and processed % self.checkpoint_interval == 0:
+            cache.end_batch(force_save=True)
+            logger.info(f"Checkpoint save at {processed} files")
+            cache.begin_batch()
+        self._report()
+
+    def _plan(self, item, batch: Dict[str, Any], pending: Dict[str, Any]) -> None:
+        path, hash_value, fingerprint, digests, error = item
+        if error is not None:
+            self._count("errors")
+            self._processed(path, "error")
+            return
+        try:
+            if hash_value is not None:
+                remember_fingerprint(path, hash_value, fingerprint, digests)
+            known_hashes = {path: hash_value} if hash_value is not None else None
+            hash_value, file_cache, lookup, _ = plan_metadata_pull(path, self.force, known_hashes, self.verify)
+        except Exception as e:
+            logger.error(f"Error processing {path}: {e}")
+            self._count("errors")
+            self._processed(path, "error")
+            return
+        if lookup is None:
+            finish_metadata_pull(path, hash_value, file_cache)
+            self._processed(path, "cached")
+        else:
+            batch[path] = lookup
+            pending[path] = (hash_value, file_cache)
+            self._report()
+
+    def _apply_resolved(self, pending: Dict[str, Any], timeout: Optional[float] = None) -> None:
+        """Apply the lookups the resolver has finished; wait up to timeout for the first one."""
+        while pending:
+            try:
+                path, result, error = self.resolved_queue.get(timeout=timeout) if timeout else self.resolved_queue.get_nowait()
+            except queue.Empty:
+                return
+            timeout = None
+            hash_value, file_cache = pending.pop(path)
+            try:
+                apply_civitai_lookup(path, hash_value, file_cache, result, error, timestamp=False)
+                finish_metadata_pull(path, hash_value, file_cache)
+                self._count("looked_up")
+                outcome = "found" if file_cache.get("civitai") == "True" else "not_found"
+            except Exception as e:
+                logger.error(f"Error processing {path}: {e}")
+                self._count("errors")
+                outcome = "error"
+            self._processed(path, outcome)
+
+    def _write(self) -> None:
+        producers = 1 + self.engine.max_workers
+        batch: Dict[str, Any] = {}
+        pending: Dict[str, Any] = {}
+
+        def send_batch() -> None:
+            if batch and self._put(self.resolve_queue, dict(batch)):
+                batch.clear()
+
+        try:
+            while not self._cancelled():
+                self._apply_resolved(pending)
+                if producers == 0:
+                    send_batch()
+                    if not pending:
+                        return
+                    self._apply_resolved(pending, timeout=POLL_SECONDS)
+                    continue
+                try:
+                    item = self.write_queue.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    # Nothing new to add for now: don't hold back a partial batch
+                    send_batch()
+                    self._report()
+                    continue
+                if item is _DONE:
+                    producers -= 1
+                    continue
+                self._plan(item, batch, pending)
+                if len(batch) >= self.batch_size:
+                    send_batch()
+        finally:
+            self._put(self.resolve_queue, _DONE)
+
+    def run(self) -> Dict[str, int]:
+        """Run the scan on the calling thread (as the cache writer) and return the final counts."""
+        cache.load()
+        threads = [
+            threading.Thread(target=self._enumerate, name="SageScanEnumerate", daemon=True),
+            threading.Thread(target=self._filter, name="SageScanFilter", daemon=True),
+            threading.Thread(target=self._resolve, name="SageScanResolve", daemon=True),
+        ]
+        threads.extend(
+            threading.Thread(target=self._hash_worker, name=f"SageScanHash{index}", daemon=True)
+            for index in range(self.engine.max_workers)
+        )
+        for thread in threads:
+            thread.start()
+
+        cache.begin_batch()
+        try:
+            self._write()
+        finally:
+            # Always end batch mode and save, even on cancellation or error
+            cache.end_batch(force_save=True)
+            for thread in threads:
+                thread.join(timeout=POLL_SECONDS * 5)
+            if self.counts["looked_up"]:
+                get_civitai_client().responses.save()
+
+        logger.info(
+            f"Scan finished: {self.counts['processed']} files processed, {self.counts['hashed']} hashed, "
+            f"{self.counts['looked_up']} looked up on Civitai, {self.counts['skipped']} skipped."
+        )
+        return dict(self.counts)
@@ -0,0 +1,216 @@
+"""
+Model scan progress, tracked per scan and pushed to the browser.
+
+Each scan started from the scan dialog gets a ScanProgress with its own id, so several scans (one running,
+others queued behind it) can be followed at once. Changes are pushed over ComfyUI's websocket
+(PromptServer.instance.send_sync) as "sage_utils.scan_progress" messages, coalesced to at most
+scan_progress_messages_per_second per scan: updates arriving faster are merged into the next message, and
+the files finished in between are listed in its "files". Status changes (queued, running, completed,
+cancelled, error) are always sent at once. GET /sage_cache/scan_progress still returns the same data for
+clients that poll.
+"""
+
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .logger import get_logger
+from .settings import get_setting_or_default
+
+logger = get_logger('model.scan_progress')
+
+SCAN_PROGRESS_EVENT = "sage_utils.scan_progress"
+DEFAULT_MESSAGES_PER_SECOND = 4.0
+RECENT_FILES_LIMIT = 100
+FINISHED_SCANS_KEPT = 10
+FINISHED_STATUSES = ("completed", "cancelled", "error")
+MIB = 1024 * 1024
+
+
+def send_to_clients(event: str, data: Dict[str, Any]) -> None:
+    """Send a message to every browser connected to ComfyUI (a no-op outside ComfyUI)."""
+    try:
+        from server import PromptServer
+    except ImportError:  # pragma: no cover - only available inside ComfyUI
+        return
+    instance = getattr(PromptServer, "instance", None)
+    if instance is not None:
+        instance.send_sync(event, data)
+
+
+class ScanProgress:
+    """
+    The state of one scan. state holds what the routes and messages report; cancelled is set by
+    ScanProgressTracker.cancel() and checked by the scan.
+    """
+
+    def __init__(self, scan_id: str, folders: Iterable[str], options: Dict[str, Any], clock: Callable[[], float]):
+        self.scan_id = scan_id
+        self.cancelled = threading.Event()
+        self._clock = clock
+        self.state: Dict[str, Any] = {
+            'scan_id': scan_id,
+            'folders': list(folders),
+            'options': dict(options),
+            'active': True,
+            'status': 'queued',
+            'current': 0,
+            'total': 0,
+            'hashed': 0,
+            'hashed_bytes': 0,
+            'current_file': '',
+            'error': None,
+            'queues': {},
+            'enumerating': True,
+            'created_time': clock(),
+            'start_time': None,
+            'end_time': None,
+        }
+        self.recent_files: List[Dict[str, str]] = []
+        self.last_sent = 0.0
+        self.timer: Optional[threading.Timer] = None
+
+    @property
+    def active(self) -> bool:
+        return self.state['active']
+
+    def snapshot(self) -> Dict[str, Any]:
+        """A copy of the state with elapsed time, throughput (files/s, MB/s) and ETA worked out."""
+        progress = dict(self.state, queues=dict(self.state['queues']))
+        start = progress['start_time']
+        end = progress['end_time'] or self._clock()
+        elapsed = max(0.0, end - start) if start else 0.0
+        progress['elapsed_time'] = elapsed
+        progress['files_per_second'] = progress['current'] / elapsed if elapsed > 0 else 0.0
+        progress['mb_per_second'] = progress['hashed_bytes'] / MIB / elapsed if elapsed > 0 else 0.0
+        remaining = progress['total'] - progress['current']
+        if progress['active'] and not progress['enumerating'] and progress['files_per_second'] > 0:
+            progress['eta_seconds'] = max(0, remaining) / progress['files_per_second']
+        else:
+            progress['eta_seconds'] = None
+        return progress
+
+
+class ScanProgressTracker:
+    """
+    The scans started since ComfyUI started (the last FINISHED_SCANS_KEPT finished ones are kept), by id.
+    send(event, data) defaults to send_to_clients(); max_per_second to the scan_progress_messages_per_second
+    setting (0 sends every update).
+    """
+
+    def __init__(
+        self,
+        send: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        max_per_second: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._send = send or send_to_clients
+        self._max_per_second = max_per_second
+        self._clock = clock
+        self._scans: Dict[str, ScanProgress] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def max_per_second(self) -> float:
+        if self._max_per_second is None:
+            return max(0.0, float(get_setting_or_default("scan_progress_messages_per_second", DEFAULT_MESSAGES_PER_SECOND)))
+        return self._max_per_second
+
+    def start(self, folders: Iterable[str], **options: Any) -> ScanProgress:
+        """Register a new (queued) scan and announce it."""
+        scan = ScanProgress(uuid.uuid4().hex[:12], folders, options, self._clock)
+        with self._lock:
+            self._scans[scan.scan_id] = scan
+            finished = [s for s in self._scans.values() if not s.active]
+            for old in finished[:max(0, len(finished) - FINISHED_SCANS_KEPT)]:
+                del self._scans[old.scan_id]
+        self._push(scan, force=True)
+        return scan
+
+    def get(self, scan_id: str) -> Optional[ScanProgress]:
+        with self._lock:
+            return self._scans.get(scan_id)
+
+    def scans(self) -> List[ScanProgress]:
+        """Tracked scans, oldest first."""
+        with self._lock:
+            return list(self._scans.values())
+
+    def latest(self) -> Optional[ScanProgress]:
+        """The running scan if there is one, else the most recently started one."""
+        scans = self.scans()
+        running = [scan for scan in scans if scan.state['status'] not in ('queued',) + FINISHED_STATUSES]
+        if running:
+            return running[-1]
+        return scans[-1] if scans else None
+
+    def busy(self) -> bool:
+        return any(scan.active for scan in self.scans())
+
+    def update(self, scan: ScanProgress, **fields: Any) -> None:
+        """Change a scan's state; a status change is pushed at once, anything else is coalesced."""
+        with self._lock:
+            if not scan.active:
+                return
+            status_changed = 'status' in fields and fields['status'] != scan.state['status']
+            if scan.state['start_time'] is None and fields.get('status', 'queued') != 'queued':
+                fields.setdefault('start_time', self._clock())
+            scan.state.update(fields)
+        self._push(scan, force=status_changed)
+
+    def file_done(self, scan: ScanProgress, path: str, result: str) -> None:
+        """Record a finished file; the files are listed in the next message."""
+        with self._lock:
+            scan.recent_files.append({'path': path, 'result': result})
+            del scan.recent_files[:-RECENT_FILES_LIMIT]
+
+    def finish(self, scan: ScanProgress, status: str, error: Optional[str] = None, **fields: Any) -> None:
+        """End a scan (completed, cancelled or error) and push its final state."""
+        with self._lock:
+            if not scan.active:
+                return
+            scan.state.update(fields, active=False, status=status, end_time=self._clock())
+            if error is not None:
+                scan.state['error'] = error
+        self._push(scan, force=True)
+
+    def cancel(self, scan_id: Optional[str] = None) -> List[str]:
+        """Cancel one scan, or every active scan when scan_id is None. Returns the ids cancelled."""
+        scans = [self.get(scan_id)] if scan_id is not None else self.scans()
+        cancelled = []
+        for scan in scans:
+            if scan is None or not scan.active:
+                continue
+            scan.cancelled.set()
+            self.finish(scan, 'cancelled', current_file='Scan cancelled by user')
+            cancelled.append(scan.scan_id)
+        return cancelled
+
+    def _push(self, scan: ScanProgress, force: bool = False) -> None:
+        with self._lock:
+            rate = self.max_per_second
+            wait = (scan.last_sent + 1.0 / rate) - self._clock() if rate > 0 else 0.0
+            if not force and wait > 0:
+                if scan.timer is None:
+                    scan.timer = threading.Timer(wait, self._flush, args=(scan,))
+                    scan.timer.daemon = True
+                    scan.timer.start()
+                return
+            if scan.timer is not None:
+                scan.timer.cancel()
+                scan.timer = None
+            message = scan.snapshot()
+            message['files'] = scan.recent_files
+            scan.recent_files = []
+            scan.last_sent = self._clock()
+            # Sent under the lock so messages can't overtake each other
+            try:
+                self._send(SCAN_PROGRESS_EVENT, message)
+            except Exception as e:
+                logger.debug(f"Unable to send scan progress: {e}")
+
+    def _flush(self, scan: ScanProgress) -> None:
+        with self._lock:
+            scan.timer = None
+        self._push(scan, force=True)
@@ -52,6 +52,67 @@ class SageSettingsModel(BaseModel):
     show_prompts_tab: bool = Field(True, description="Show Prompts (Prompt Builder) tab in sidebar")
     show_llm_tab: bool = Field(True, description="Show LLM tab in sidebar")
 
+    # Model Cache Settings
+    model_cache_backend: Literal["json", "sqlite"] = Field(
+        "json", description="Storage backend for the model hash/info cache ('sqlite' migrates the JSON cache files once and then only writes changed rows)"
+    )
+    model_cache_journal: bool = Field(
+        True, description="JSON cache backend: append each save's changes to sage_cache_journal.jsonl (fsync'd) and only rewrite the cache files when the journal grows large"
+    )
+    model_cache_watch_interval: float = Field(
+        2.0, description="Seconds between checks for cache file changes made by other processes (0 disables the watcher, so every cache load re-checks the files)"
+    )
+    model_cache_lazy_info: bool = Field(
+        True, description="JSON cache backend: keep only a summary of each info entry in memory and read the full Civitai data from disk when it is needed"
+    )
+    model_hash_workers: int = Field(
+        4, description="Number of model files hashed at once during scans"
+    )
+    model_hash_per_device: int = Field(
+        2, description="Maximum number of model files read at once from the same disk while hashing"
+    )
+    model_hash_defer_bytes: int = Field(
+        1024 * 1024 * 1024, description="Loaders hash model files at least this large in the background when they need a full hash, pulling their metadata afterwards (0 hashes them while loading)"
+    )
+    model_hash_autov3: bool = Field(
+        True, description="Also compute the AutoV3 hash (tensor data only) of safetensors files while hashing, used for Civitai lookups when the full-file hash has no match"
+    )
+    model_hash_blake3: bool = Field(
+        False, description="Also compute a BLAKE3 hash of each model file while hashing (needs the blake3 package) and record it with the file's fingerprint"
+    )
+    model_watch_interval: float = Field(
+        30.0, description="Hash new or changed model files in the background before first use (0 disables). The files are found by the library index, so how often the folders are checked is set by library_index_poll_interval; with watchdog installed changes are seen immediately"
+    )
+    scan_progress_messages_per_second: float = Field(
+        4.0, description="Most progress messages per second sent to the browser for each model scan; faster updates are merged (0 sends every update)"
+    )
+    library_index_poll_interval: float = Field(
+        30.0, description="Seconds between checks of the indexed model and input folders for added or removed files, on top of watchdog events when watchdog is installed (0 disables; only directory mtimes are compared)"
+    )
+
+    # Civitai API Settings
+    civitai_max_concurrency: int = Field(
+        4, description="Maximum number of Civitai API requests in flight at once (also the size of the connection pool)"
+    )
+    civitai_requests_per_second: float = Field(
+        4.0, description="Maximum rate of Civitai API requests, shared by all nodes and routes (0 disables the limit)"
+    )
+    civitai_max_retries: int = Field(
+        3, description="Times a Civitai API request is retried after a rate-limit (429/503) response or connection error, waiting as long as Retry-After asks"
+    )
+    civitai_hash_batch_size: int = Field(
+        100, description="Hashes looked up per request with Civitai's bulk by-hash endpoint when pulling metadata for several files (0 looks each file up separately)"
+    )
+    civitai_recheck_hours: float = Field(
+        24.0, description="Hours before a model that wasn't found on Civitai is looked up again; the wait doubles after each further miss"
+    )
+    civitai_recheck_max_days: float = Field(
+        30.0, description="Longest wait, in days, between Civitai lookups of a model that wasn't found there"
+    )
+    civitai_response_ttl: float = Field(
+        3600.0, description="Seconds a Civitai model payload (used for update checks) is reused from sage_civitai_responses.json before it is fetched or revalidated again (0 disables the response cache)"
+    )
+
     model_config = {"extra": "ignore"}  # silently drop deprecated/unknown keys on load
 
 
@@ -78,6 +139,25 @@ class SageSettingsEnv(BaseSettings):
     show_gallery_tab: Optional[bool] = None
     show_prompts_tab: Optional[bool] = None
     show_llm_tab: Optional[bool] = None
+    model_cache_backend: Optional[Literal["json", "sqlite"]] = None
+    model_cache_journal: Optional[bool] = None
+    model_cache_watch_interval: Optional[float] = None
+    model_cache_lazy_info: Optional[bool] = None
+    model_hash_workers: Optional[int] = None
+    model_hash_per_device: Optional[int] = None
+    model_hash_defer_bytes: Optional[int] = None
+    model_hash_autov3: Optional[bool] = None
+    model_hash_blake3: Optional[bool] = None
+    model_watch_interval: Optional[float] = None
+    scan_progress_messages_per_second: Optional[float] = None
+    library_index_poll_interval: Optional[float] = None
+    civitai_max_concurrency: Optional[int] = None
+    civitai_requests_per_second: Optional[float] = None
+    civitai_max_retries: Optional[int] = None
+    civitai_hash_batch_size: Optional[int] = None
+    civitai_recheck_hours: Optional[float] = None
+    civitai_recheck_max_days: Optional[float] = None
+    civitai_response_ttl: Optional[float] = None
 
     model_config = SettingsConfigDict(
         env_prefix="",
@@ -211,6 +291,19 @@ def get_setting(key: str, default: Any = None) -> Any:
     return get_settings().get(key, default)
 
 
+def get_setting_or_default(key: str, default: Any) -> Any:
+    """
+    Get a setting value for code that has to keep working without its settings: default is returned when
+    the setting is unset (None) or the settings can't be read.
+    """
+    try:
+        value = get_setting(key, default)
+    except Exception as e:
+        logger.debug(f"Unable to read setting '{key}', using default {default!r}: {e}")
+        return default
+    return default if value is None else value
+
+
 def set_setting(key: str, value: Any) -> bool:
     """Convenience function to set a setting value."""
     return get_settings().set(key, value)